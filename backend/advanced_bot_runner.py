@@ -11,6 +11,7 @@ import os
 from dotenv import load_dotenv
 from services.telegram_service import AdvancedTelegramBot
 from database.firebase import firebase_manager
+from database.sharded_counter import ShardedCounter
 from config.settings import get_config
 
 # Load environment variables
@@ -41,7 +42,8 @@ def run_bot_polling():
         bot = AdvancedTelegramBot(
             token=config.TELEGRAM_BOT_TOKEN,
             firebase_manager=firebase_manager,
-            supported_languages={'en': 'English', 'am': 'Amharic'}
+            supported_languages={'en': 'English', 'am': 'Amharic'},
+            counter=ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)
         )
         
         logger.info("Starting Advanced Telegram Bot with polling...")
@@ -72,7 +74,8 @@ def run_bot_webhook(webhook_url: str, port: int = 8443):
         bot = AdvancedTelegramBot(
             token=config.TELEGRAM_BOT_TOKEN,
             firebase_manager=firebase_manager,
-            supported_languages={'en': 'English', 'am': 'Amharic'}
+            supported_languages={'en': 'English', 'am': 'Amharic'},
+            counter=ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)
         )
         
         logger.info("Starting Advanced Telegram Bot with webhook...")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Stats Aggregation Job
+Folds new transactions and settlements into the daily admin rollups
+(stats/daily-YYYY-MM-DD). Safe to run repeatedly, e.g. as a Render cron job:
+
+    python aggregate_stats.py
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from services.stats_service import StatsAggregator, StatsError
+
+def main():
+    if not firebase_manager.initialize(get_config()):
+        sys.exit(1)
+    try:
+        result = StatsAggregator(firebase_manager).run()
+    except StatsError as e:
+        print(f"Stats aggregation failed: {e}")
+        sys.exit(1)
+    print(f"Processed {result['processed']} in {result['pages']} page(s); days updated: {', '.join(result['days']) or 'none'}")
+
+if __name__ == "__main__":
+    main()
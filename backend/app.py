@@ -1,53 +1,161 @@
 from flask import Flask, request, jsonify
-from flask_cors import CORS
+import importlib
 import time
-import requests
-from firebase_admin import firestore, auth as firebase_auth
 
 # Import our modules
-from config.settings import get_config
-from database.firebase import firebase_manager
+from config.settings import get_config, install_reload_signal, on_reload
+from database.firebase import firebase_auth, firebase_manager, firestore
 from services.chapa_service import ChapaService
-from services.telegram_service import TelegramService, AdvancedTelegramBot
+from services.telegram_service import TelegramService
+from services.lazy import LazyService
+from services.rate_limiter import RateLimiter, create_store
+from services.checkout_service import PreCheckoutValidator
+from services.ledger import Ledger
+from services.room_scheduler import RoomScheduler
+from services.notification_service import RoomEvent, EVENT_GAME_STARTING
+from services.invoice_payload import InvoicePayloadCodec, InvalidPayloadError, KIND_DEPOSIT, KIND_GAME_ENTRY
 from routes.payment_routes import payment_bp
 from routes.telegram_routes import telegram_bp
+from routes.game_routes import game_bp, notification_service, roster_service, sharded_counter
+from routes.admin_routes import admin_bp
+from routes.audio_routes import audio_bp
+from routes.leaderboard_routes import leaderboard_bp, leaderboard_service
+from routes.achievement_routes import achievement_bp, achievement_engine
+from routes.bonus_routes import bonus_bp
+from routes.transfer_routes import transfer_bp
+from routes.withdrawal_routes import withdrawal_bp
+from services.leaderboard_service import LeaderboardError
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Load configuration
+# Load and validate configuration (malformed values raise ConfigError here)
 config = get_config()
 app.config.from_object(config)
+for warning in config.validate()[1]:
+    print(f"[WARNING] {warning}")
 
-# Initialize CORS
-CORS(app, origins=config.CORS_ORIGINS, 
-     allow_headers=['Content-Type', 'Authorization'], 
-     supports_credentials=True)
+# Reload configuration on SIGHUP (python app.py; under gunicorn, gunicorn.conf.py reloads the master)
+install_reload_signal()
 
-# Initialize Firebase
-firebase_manager.initialize(config)
+# CORS: origins come from the live config snapshot, so a reload applies immediately
+@app.after_request
+def apply_cors(response):
+    origin = request.headers.get('Origin')
+    if origin and origin in get_config().CORS_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers.add('Vary', 'Origin')
+        if request.method == 'OPTIONS':
+            response.headers['Access-Control-Allow-Methods'] = response.headers.get('Allow', 'GET, POST, OPTIONS')
+            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Idempotency-Key'
+            response.headers['Access-Control-Max-Age'] = '600'
+    return response
+
+# Rate limiting runs before every other request hook, so a throttled request
+# never initializes Firebase, verifies a token or calls Chapa
+rate_limiter = RateLimiter(create_store(config.RATE_LIMIT_STORAGE_URL),
+                           trusted_proxies=config.RATE_LIMIT_TRUSTED_PROXIES)
+
+@app.before_request
+def apply_rate_limits():
+    if request.method == 'OPTIONS' or request.url_rule is None or not get_config().RATE_LIMIT_ENABLED:
+        return None
+    ip = rate_limiter.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+    retry_after = rate_limiter.check(request.url_rule.rule, ip, request.headers.get('Authorization'))
+    if retry_after:
+        response = jsonify({"error": "Too many requests", "retry_after": round(retry_after, 1)})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+        return response
+    return None
+
+# Firebase is initialized on first use in each worker (see before_request below)
 
 # Initialize services
+# The counter and roster come from game_routes, so every path shares one cache of shard sums
 chapa_service = ChapaService(config)
-telegram_service = TelegramService(config)
+telegram_service = TelegramService(config, roster_service, sharded_counter)
+payload_codec = InvoicePayloadCodec(config.INVOICE_PAYLOAD_SECRET, config.INVOICE_PAYLOAD_MAX_AGE)
+checkout_validator = PreCheckoutValidator(config, firebase_manager, payload_codec, roster_service)
 
-# Initialize Advanced Telegram Bot (optional)
-advanced_bot = None
-if config.TELEGRAM_BOT_TOKEN:
-    try:
-        advanced_bot = AdvancedTelegramBot(
-            token=config.TELEGRAM_BOT_TOKEN,
-            firebase_manager=firebase_manager,
-            supported_languages={'en': 'English', 'am': 'Amharic'}
-        )
-        print("Advanced Telegram Bot initialized successfully")
-    except Exception as e:
-        print(f"Failed to initialize Advanced Telegram Bot: {e}")
-        advanced_bot = None
+@on_reload
+def _apply_config(config):
+    # The services above copy keys and secrets out of the config when built
+    global chapa_service, telegram_service, payload_codec
+    chapa_service = ChapaService(config)
+    telegram_service = TelegramService(config, roster_service, sharded_counter)
+    payload_codec = InvoicePayloadCodec(config.INVOICE_PAYLOAD_SECRET, config.INVOICE_PAYLOAD_MAX_AGE)
+    checkout_validator.payload_codec = payload_codec
+    rate_limiter.trusted_proxies = config.RATE_LIMIT_TRUSTED_PROXIES
+
+def _announce_room_start(game_id, room):
+    notification_service.notify_room(RoomEvent(game_id, EVENT_GAME_STARTING, {'name': room.get('name', 'Bingo Game')}))
+
+# Room lifecycle (auto-start, timeouts, refunds, archiving); the thread is
+# started per worker after the fork when ROOM_SCHEDULER_ENABLED is set
+room_scheduler = RoomScheduler(firebase_manager, roster_service, Ledger(firebase_manager, sharded_counter),
+                               on_start=_announce_room_start)
+
+# Advanced Telegram Bot (optional): building it imports python-telegram-bot
+# and creates a PTB Application, so it is only done when the bot is started
+def _build_advanced_bot():
+    from services.telegram_service import AdvancedTelegramBot
+    config = get_config()
+    if not config.TELEGRAM_BOT_TOKEN:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN is not configured")
+    return AdvancedTelegramBot(
+        token=config.TELEGRAM_BOT_TOKEN,
+        firebase_manager=firebase_manager,
+        supported_languages={'en': 'English', 'am': 'Amharic'},
+        counter=sharded_counter,
+        leaderboard=leaderboard_service,
+        achievement_engine=achievement_engine
+    )
+
+advanced_bot = LazyService(_build_advanced_bot, 'Advanced Telegram Bot')
 
 # Register blueprints
 app.register_blueprint(payment_bp)
 app.register_blueprint(telegram_bp)
+app.register_blueprint(game_bp)
+app.register_blueprint(admin_bp)
+app.register_blueprint(audio_bp)
+app.register_blueprint(leaderboard_bp)
+app.register_blueprint(achievement_bp)
+app.register_blueprint(bonus_bp)
+app.register_blueprint(transfer_bp)
+app.register_blueprint(withdrawal_bp)
+
+# Endpoints that never touch Firebase, so probes do not trigger initialization
+LIGHTWEIGHT_ENDPOINTS = frozenset({'health_check', 'test_api', 'root', 'advanced_bot_status', 'static',
+                                   'audio.call_manifest', 'audio.get_call', 'audio.get_clip'})
+
+@app.before_request
+def ensure_firebase():
+    # Token verification and Firestore both need the default Firebase app
+    if request.endpoint not in LIGHTWEIGHT_ENDPOINTS:
+        firebase_manager.ensure_initialized()
+        # Rebuilds the boards from the last checkpoint, then follows settlements
+        leaderboard_service.ensure_started()
+    if get_config().ROOM_SCHEDULER_ENABLED:
+        room_scheduler.ensure_started()
+
+def warm_up():
+    """Load what the first real request would otherwise load, without opening connections.
+
+    Called by the gunicorn master before it forks workers (see gunicorn.conf.py),
+    so every worker inherits the imports instead of repeating them. Firebase
+    and the Telegram bot stay uninitialized: gRPC channels and bot sessions
+    must be created after the fork.
+    """
+    started = time.perf_counter()
+    # Used by FirebaseManager.initialize and by token verification
+    for module in ('firebase_admin.credentials', 'google.auth.transport.requests'):
+        importlib.import_module(module)
+    with app.test_request_context('/health'):
+        pass
+    print(f"Warm-up finished in {time.perf_counter() - started:.3f}s")
 
 # Print startup information
 print(f"Environment: {config.ENVIRONMENT}")
@@ -60,11 +168,13 @@ print(f"Telegram Bot Token configured: {'Yes' if config.TELEGRAM_BOT_TOKEN else
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
+    config = get_config()
     return jsonify({
         "status": "healthy",
         "environment": config.ENVIRONMENT,
         "chapa_configured": bool(config.CHAPA_SECRET_KEY),
-        "firebase_configured": firebase_manager.is_initialized(),
+        "firebase_configured": bool(config.FIREBASE_SERVICE_ACCOUNT_KEY) or firebase_manager.is_initialized(),
+        "firebase_initialized": firebase_manager.is_initialized(),
         "telegram_configured": bool(config.TELEGRAM_BOT_TOKEN),
         "timestamp": time.time()
     }), 200
@@ -72,6 +182,7 @@ def health_check():
 # Test endpoint
 @app.route('/api/test', methods=['GET'])
 def test_api():
+    config = get_config()
     return jsonify({
         "message": "API is working!",
         "environment": config.ENVIRONMENT,
@@ -81,6 +192,7 @@ def test_api():
 # Root endpoint
 @app.route('/', methods=['GET'])
 def root():
+        config = get_config()
         return jsonify({
         "message": "Bingo Backend API",
         "version": "2.0.0",
@@ -90,16 +202,21 @@ def root():
             "test": "/api/test",
             "payments": "/api/create-payment",
             "telegram": "/api/telegram/webhook",
+            "settlement": "/api/games/<game_id>/settle",
+            "sync": "/api/games/<game_id>/sync",
+            "leaderboard": "/api/leaderboard/<board>",
+            "transfers": "/api/wallet/transfers",
             "advanced_bot": "/api/advanced-bot/start"
         },
-        "advanced_bot_available": advanced_bot is not None
+        "advanced_bot_available": bool(config.TELEGRAM_BOT_TOKEN)
     }), 200
 
 # Advanced Bot Management
 @app.route('/api/advanced-bot/start', methods=['POST'])
 def start_advanced_bot():
     """Start the advanced Telegram bot"""
-    if not advanced_bot:
+    bot = advanced_bot.get()
+    if not bot:
         return jsonify({
             "error": "Advanced bot not available. Check TELEGRAM_BOT_TOKEN configuration."
         }), 400
@@ -107,7 +224,7 @@ def start_advanced_bot():
     try:
         # Start the bot in a separate thread
         import threading
-        bot_thread = threading.Thread(target=advanced_bot.run_polling, daemon=True)
+        bot_thread = threading.Thread(target=bot.run_polling, daemon=True)
         bot_thread.start()
         
         return jsonify({
@@ -122,9 +239,14 @@ def start_advanced_bot():
 @app.route('/api/advanced-bot/status', methods=['GET'])
 def advanced_bot_status():
     """Get the status of the advanced bot"""
+    available = bool(get_config().TELEGRAM_BOT_TOKEN)
+    if advanced_bot.is_built():
+        status = "running"
+    else:
+        status = "not_started" if available else "not_available"
     return jsonify({
-        "available": advanced_bot is not None,
-        "status": "running" if advanced_bot else "not_available"
+        "available": available,
+        "status": status
     }), 200
 
 # Telegram webhook handlers (these need access to services)
@@ -134,6 +256,7 @@ def handle_telegram_update(update):
         message = update['message']
         chat_id = message['chat']['id']
         text = message.get('text', '')
+        telegram_user_id = message['from']['id']
         telegram_username = message['from'].get('username', '')
 
         db = firebase_manager.get_db()
@@ -174,39 +297,32 @@ def handle_telegram_update(update):
                 for game in waiting_games:
                     game_id = game.id
                     break
+                player_info = {
+                    'userId': user_id,
+                    'displayName': user_doc.to_dict().get('displayName', 'Player'),
+                    'telegramChatId': chat_id,
+                    'telegramUsername': telegram_username
+                }
                 if not game_id:
                     # No waiting game, create a new one
                     new_game = db.collection('gameRooms').document()
                     new_game.set({
                         'name': f"{user_doc.to_dict().get('displayName', 'Player')}'s Game",
                         'status': 'waiting',
-                        'players': [{
-                            'userId': user_id,
-                            'displayName': user_doc.to_dict().get('displayName', 'Player'),
-                            'telegramChatId': chat_id,
-                            'telegramUsername': telegram_username
-                        }],
                         'createdAt': firestore.SERVER_TIMESTAMP,
                         'entryFee': 0,
-                        'maxPlayers': 10
+                        'maxPlayers': 10,
+                        **roster_service.room_fields()
                     })
                     game_id = new_game.id
-                else:
-                    # Add user to the waiting game
-                    game_ref = db.collection('gameRooms').document(game_id)
-                    game_ref.update({
-                        'players': firestore.ArrayUnion([{
-                            'userId': user_id,
-                            'displayName': user_doc.to_dict().get('displayName', 'Player'),
-                            'telegramChatId': chat_id,
-                            'telegramUsername': telegram_username
-                        }])
-                    })
+                # Add user to the game roster
+                if roster_service.add_player(game_id, player_info):
+                    room_scheduler.watch(game_id)
                 # Send the user a link to the game
                 game_url = f"https://bingo-game-39ba5.web.app/game/{game_id}"
                 telegram_service.send_message(chat_id, f"Welcome! Your game is ready. Click here to play: {game_url}")
         elif text.startswith('/help'):
-            telegram_service.send_message(chat_id, "Available commands:\n/start - Welcome\n/join <game_id> - Join a game\n/balance - Show your wallet balance\n/deposit <amount> - Deposit money\n/games - List active games\n/help - Show this help message")
+            telegram_service.send_message(chat_id, "Available commands:\n/start - Welcome\n/join <game_id> - Join a game\n/balance - Show your wallet balance\n/deposit <amount> - Deposit money\n/games - List active games\n/leaderboard [daily|weekly|all] - Top players\n/help - Show this help message")
         elif text.startswith('/balance'):
             if not user_id:
                 telegram_service.send_message(chat_id, "Your Telegram is not linked to a Bingo account. Please link it in your web profile.")
@@ -218,6 +334,13 @@ def handle_telegram_update(update):
                     telegram_service.send_message(chat_id, f"Your wallet balance: {balance} ETB")
                 else:
                     telegram_service.send_message(chat_id, "No wallet found for your account.")
+        elif text.startswith('/leaderboard'):
+            parts = text.split()
+            try:
+                board_id = leaderboard_service.resolve(parts[1] if len(parts) > 1 else 'all')
+                telegram_service.send_message(chat_id, format_leaderboard(board_id, user_id))
+            except LeaderboardError as e:
+                telegram_service.send_message(chat_id, f"{e}. Usage: /leaderboard [daily|weekly|all]")
         elif text.startswith('/deposit'):
             parts = text.split()
             if len(parts) == 2:
@@ -228,7 +351,7 @@ def handle_telegram_update(update):
                         return
                     
                     # Create payment invoice
-                    payload = f"deposit|{amount}"
+                    payload = payload_codec.encode_deposit(telegram_user_id, amount)
                     invoice = telegram_service.create_payment_invoice(
                         chat_id=chat_id,
                         title="Bingo Wallet Deposit",
@@ -262,10 +385,11 @@ def handle_telegram_update(update):
                     else:
                         game_data = game_doc.to_dict()
                         entry_fee = game_data.get('entryFee', 0)
+                        checkout_validator.remember_room(game_id, game_data)
                         
                         if entry_fee > 0:
                             # Create payment invoice for game entry
-                            payload = f"game_entry|{game_id}|{entry_fee}"
+                            payload = payload_codec.encode_game_entry(telegram_user_id, game_id, entry_fee)
                             invoice = telegram_service.create_payment_invoice(
                                 chat_id=chat_id,
                                 title=f"Game Entry: {game_data.get('name', 'Bingo Game')}",
@@ -288,37 +412,52 @@ def handle_telegram_update(update):
                                 'telegramUsername': telegram_username
                             }
                             # Add player to game
-                            game_ref.update({
-                                'players': firestore.ArrayUnion([player_info])
-                            })
-                            telegram_service.send_message(chat_id, f"You have joined game {game_id}!")
+                            if roster_service.add_player(game_id, player_info):
+                                checkout_validator.forget_room(game_id)
+                                room_scheduler.watch(game_id)
+                                telegram_service.send_message(chat_id, f"You have joined game {game_id}!")
+                            else:
+                                telegram_service.send_message(chat_id, f"You are already in game {game_id}.")
             else:
                 telegram_service.send_message(chat_id, "Usage: /join <game_id>")
         else:
             telegram_service.send_message(chat_id, "Unknown command. Use /help.")
 
+def format_leaderboard(board_id, user_id=None, limit=10):
+    """Plain-text top players of a board, with the user's own rank when they are on it"""
+    data = leaderboard_service.top(board_id, limit)
+    if not data['entries']:
+        return f"🏅 No winners on the {board_id} leaderboard yet."
+    lines = [f"🏅 Top players ({board_id})"]
+    for entry in data['entries']:
+        lines.append(f"{entry['rank']}. {entry['displayName']} - {entry['earnings']:,.2f} ETB ({entry['wins']} wins)")
+    rank = leaderboard_service.rank(board_id, user_id) if user_id else None
+    if rank:
+        lines.append(f"\nYour rank: #{rank['rank']} of {rank['size']}")
+    return '\n'.join(lines)
+
 def handle_pre_checkout_query(pre_checkout_query):
     """Handle pre-checkout queries from Telegram payments"""
+    query_id = pre_checkout_query.get('id')
     try:
-        query_id = pre_checkout_query['id']
-        user_id = pre_checkout_query['from']['id']
         currency = pre_checkout_query['currency']
         total_amount = pre_checkout_query['total_amount'] / 100  # Convert from cents
-        invoice_payload = pre_checkout_query.get('invoice_payload', '')
         
         print(f"Pre-checkout query: {query_id}, Amount: {total_amount} {currency}")
         
-        # Validate the payment
-        # You can add additional validation here (e.g., check user balance, game availability)
+        # Validate against cached room and account state within the latency budget
+        ok, error_message = checkout_validator.validate(pre_checkout_query)
+        if not ok:
+            print(f"Pre-checkout query {query_id} rejected: {error_message}")
         
-        # Approve the pre-checkout query
-        telegram_service.answer_pre_checkout_query(query_id, True)
+        telegram_service.answer_pre_checkout_query(query_id, ok, error_message)
         
         return jsonify({'status': 'ok'})
     except Exception as e:
         print(f"Error handling pre-checkout query: {e}")
         # Reject the pre-checkout query
-        telegram_service.answer_pre_checkout_query(query_id, False, 'Payment validation failed')
+        if query_id:
+            telegram_service.answer_pre_checkout_query(query_id, False, 'Payment validation failed')
         return jsonify({'error': str(e)}), 500
 
 def handle_successful_payment(successful_payment, message):
@@ -337,23 +476,22 @@ def handle_successful_payment(successful_payment, message):
         print(f"Provider charge ID: {provider_payment_charge_id}")
         print(f"Invoice payload: {invoice_payload}")
         
-        # Parse invoice payload to determine payment type
-        payment_type = 'deposit'  # default
+        # Decode the signed invoice payload; the charged amount comes from Telegram
+        payment_type = KIND_DEPOSIT
         game_id = None
         amount = total_amount
         
-        if invoice_payload:
-            try:
-                payload_data = invoice_payload.split('|')
-                if len(payload_data) >= 2:
-                    payment_type = payload_data[0]
-                    if payment_type == 'game_entry' and len(payload_data) >= 3:
-                        game_id = payload_data[1]
-                        amount = float(payload_data[2])
-                    elif payment_type == 'deposit':
-                        amount = float(payload_data[1]) if len(payload_data) > 1 else total_amount
-            except Exception as e:
-                print(f"Error parsing invoice payload: {e}")
+        try:
+            payload = payload_codec.decode(invoice_payload)
+            if abs(payload.amount - total_amount) > 0.005:
+                print(f"Invoice amount {payload.amount} does not match charged amount {total_amount}, crediting as deposit")
+            else:
+                payment_type = payload.kind
+                game_id = payload.game_id
+                amount = payload.amount
+        except InvalidPayloadError as e:
+            # Money was charged regardless, so credit it to the wallet rather than drop it
+            print(f"Untrusted invoice payload, crediting as deposit: {e}")
         
         db = firebase_manager.get_db()
         if not db:
@@ -409,15 +547,19 @@ def handle_successful_payment(successful_payment, message):
 
         # Process the payment based on type
         success = False
-        if payment_type == 'deposit':
+        if payment_type == KIND_DEPOSIT:
             success = telegram_service.process_telegram_deposit(
                 firebase_user_id, amount, telegram_payment_charge_id, provider_payment_charge_id, db
             )
-        elif payment_type == 'game_entry':
+        elif payment_type == KIND_GAME_ENTRY:
             success = telegram_service.process_telegram_game_entry(
                 firebase_user_id, game_id, amount, telegram_payment_charge_id, provider_payment_charge_id, db
             )
 
+        if success and game_id:
+            checkout_validator.forget_room(game_id)
+            room_scheduler.watch(game_id)
+
         if success:
             # Send confirmation message
             telegram_service.send_message(chat_id, f"✅ Payment successful! {amount} {currency} has been processed.")
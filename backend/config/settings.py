@@ -1,83 +1,437 @@
 import os
+import json
+import signal
+import threading
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, List, Mapping, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# CORS origins allowed in every environment (FRONTEND_URL and
+# CORS_EXTRA_ORIGINS are added on top)
+DEFAULT_CORS_ORIGINS = (
+    'http://localhost:5173',  # Vite dev server
+    'http://localhost:5174',  # Vite dev server (alternative port)
+    'http://localhost:3000',  # Alternative dev server
+    'https://localhost:5173', # HTTPS dev
+    'https://localhost:5174', # HTTPS dev (alternative port)
+    'https://localhost:3000', # HTTPS alternative
+    'https://project-bolt-github-cjfyq9oi.vercel.app',  # Vercel deployment
+    'https://project-bolt-github-cjfyq9oi-git-main.vercel.app'  # Vercel preview
+)
+
+# PlayHT stock voice used for number calls unless TTS_VOICES is set
+DEFAULT_TTS_VOICES = (
+    ('default', 's3://voice-cloning-zero-shot/d9ff78ba-d016-47f6-b0ef-dd630f59414e/female-cs/manifest.json'),
+)
+
+DEFAULT_ADMIN_UIDS = (
+    "TxA6TQmBAGRZ9rt91YOX6UIymcX2",
+)
+
+ENVIRONMENTS = ('development', 'production', 'testing')
+# Placeholders from the sample .env that must never sign anything in production
+DEFAULT_SECRET_KEY = 'your-secret-key-here'
+PLACEHOLDER_SECRETS = (DEFAULT_SECRET_KEY, 'your-invoice-signing-secret')
+
+class ConfigError(ValueError):
+    """Raised when the environment does not produce a valid configuration"""
+
+class _EnvReader:
+    """Typed environment lookups that collect errors instead of raising on the first one"""
+
+    def __init__(self, env: Mapping[str, str]):
+        self.env = env
+        self.errors: List[str] = []
+
+    def text(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.env.get(key, default)
+
+    def flag(self, key: str, default: bool) -> bool:
+        value = self.env.get(key)
+        return default if value is None else value.lower() == 'true'
+
+    def number(self, key: str, default, cast):
+        value = self.env.get(key)
+        if value is None:
+            return default
+        try:
+            return cast(value)
+        except ValueError:
+            self.errors.append(f"{key} must be a number, got {value!r}")
+            return default
+
+    def items(self, key: str) -> Tuple[str, ...]:
+        return tuple(item.strip() for item in self.env.get(key, '').split(',') if item.strip())
+
+    def pairs(self, key: str, default: Tuple[Tuple[str, str], ...] = ()) -> Tuple[Tuple[str, str], ...]:
+        """Comma-separated name=value pairs, in order"""
+        if key not in self.env:
+            return default
+        pairs = []
+        for item in self.items(key):
+            name, sep, value = item.partition('=')
+            if not sep or not name.strip() or not value.strip():
+                self.errors.append(f"{key} entries must look like name=value, got {item!r}")
+                continue
+            pairs.append((name.strip(), value.strip()))
+        return tuple(pairs)
+
+@dataclass(frozen=True)
 class Config:
-    """Base configuration class"""
-    
+    """Immutable configuration snapshot built once from the environment.
+
+    The active snapshot is returned by get_config() and can be swapped
+    atomically with reload_config(), so request handlers always see one
+    consistent set of values. Services built once at import register with
+    on_reload() to pick up the new values.
+    """
+
     # Flask Configuration
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
-    DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    
+    SECRET_KEY: str
+    DEBUG: bool
+    TESTING: bool
+
     # Environment
-    ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
-    
+    ENVIRONMENT: str
+
     # Frontend URL
-    FRONTEND_URL = os.getenv("VITE_FRONTEND_URL", "http://localhost:3000")
-    
-    # CORS Configuration
-    CORS_ORIGINS = [
-        'http://localhost:5173',  # Vite dev server
-        'http://localhost:5174',  # Vite dev server (alternative port)
-        'http://localhost:3000',  # Alternative dev server
-        'https://localhost:5173', # HTTPS dev
-        'https://localhost:5174', # HTTPS dev (alternative port)
-        'https://localhost:3000', # HTTPS alternative
-        FRONTEND_URL,            # Production URL
-        'https://project-bolt-github-cjfyq9oi.vercel.app',  # Vercel deployment
-        'https://project-bolt-github-cjfyq9oi-git-main.vercel.app'  # Vercel preview
-    ]
-    
+    FRONTEND_URL: str
+
+    # CORS Configuration (set for O(1) origin checks)
+    CORS_ORIGINS: FrozenSet[str]
+
     # Chapa Configuration
-    CHAPA_SECRET_KEY = os.getenv("CHAPA_SECRET_KEY")
-    CHAPA_PUBLIC_KEY = os.getenv("CHAPA_PUBLIC_KEY")
-    CHAPA_BASE_URL = os.getenv("CHAPA_BASE_URL", "https://api.chapa.co/v1")
-    
+    CHAPA_SECRET_KEY: Optional[str]
+    CHAPA_PUBLIC_KEY: Optional[str]
+    CHAPA_BASE_URL: str
+
+    # Chapa reconciliation (pending deposits are re-verified until settled or expired)
+    CHAPA_RECONCILE_CONCURRENCY: int
+    CHAPA_VERIFY_RATE_PER_SECOND: float
+    CHAPA_RECONCILE_BATCH: int
+    CHAPA_PENDING_MAX_AGE_HOURS: float
+
+    # Chapa payouts (withdrawals are reserved, queued and sent in bulk transfer requests)
+    WITHDRAWAL_MIN_AMOUNT: float
+    WITHDRAWAL_MAX_AMOUNT: float
+    CHAPA_PAYOUT_CONCURRENCY: int
+    CHAPA_PAYOUT_CHUNK: int
+    CHAPA_PAYOUT_BATCH: int
+
     # Callback Configuration
-    CALLBACK_BASE_URL = os.getenv("CALLBACK_BASE_URL", "http://localhost:5000")
-    
+    CALLBACK_BASE_URL: str
+
     # Telegram Configuration
-    TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-    TELEGRAM_PAYMENT_PROVIDER_TOKEN = os.getenv('TELEGRAM_PAYMENT_PROVIDER_TOKEN')
-    
+    TELEGRAM_BOT_TOKEN: Optional[str]
+    TELEGRAM_PAYMENT_PROVIDER_TOKEN: Optional[str]
+
+    # Telegram login (custom tokens are valid for an hour; reuse must be shorter)
+    TELEGRAM_LOGIN_MAX_AGE: int
+    TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS: float
+
+    # Pre-checkout validation (Telegram allows 10 seconds to answer)
+    PRECHECKOUT_BUDGET_SECONDS: float
+    PRECHECKOUT_CACHE_TTL: float
+    PRECHECKOUT_FAIL_OPEN: bool
+
+    # Signed invoice payloads (defaults to SECRET_KEY outside production)
+    INVOICE_PAYLOAD_SECRET: str
+    INVOICE_PAYLOAD_MAX_AGE: int
+
+    # Sharded counters (roster sizes, prize pools, player stats)
+    COUNTER_SHARDS: int
+    COUNTER_STALENESS_SECONDS: float
+
+    # Prize settlement
+    HOUSE_COMMISSION: float
+
+    # Telegram room notifications (Telegram allows ~30 messages/second per bot)
+    NOTIFY_CONCURRENCY: int
+    NOTIFY_RATE_PER_SECOND: float
+    NOTIFY_MAX_ATTEMPTS: int
+    # Send Telegram players their card as a photo that is edited as numbers are called
+    TELEGRAM_CARD_IMAGES: bool
+
+    # Admin analytics rollups (days are bucketed in UTC+3, East Africa Time)
+    STATS_UTC_OFFSET_HOURS: float
+    STATS_SETTLE_SECONDS: int
+    STATS_CACHE_TTL: float
+
+    # Daily bonus (paid once a player has checked in on MIN_DAYS days and played MIN_GAMES games)
+    DAILY_BONUS_AMOUNT: float
+    DAILY_BONUS_MIN_DAYS: int
+    DAILY_BONUS_MIN_GAMES: int
+
+    # Player-to-player transfers (wallets may override the daily limit; higher scores wait for an admin)
+    TRANSFER_MAX_AMOUNT: float
+    TRANSFER_DAILY_LIMIT: float
+    TRANSFER_REVIEW_SCORE: int
+
+    # Leaderboards (in-memory boards follow settlements and are checkpointed to Firestore)
+    LEADERBOARD_REFRESH_SECONDS: float
+    LEADERBOARD_CHECKPOINT_SECONDS: float
+
+    # In-game chat (history kept per room, per-player token bucket, extra blocked words)
+    CHAT_HISTORY: int
+    CHAT_FLUSH_SECONDS: float
+    CHAT_RATE_PER_MINUTE: int
+    CHAT_BURST: int
+    CHAT_BLOCKED_WORDS: Tuple[str, ...]
+
+    # Reconnect sync (events kept per room, gap served as events, per-worker cache)
+    SYNC_MAX_EVENTS: int
+    SYNC_MAX_GAP: int
+    SYNC_CACHE_SECONDS: float
+
+    # Room lifecycle scheduler (auto-start, timeouts, archiving)
+    ROOM_SCHEDULER_ENABLED: bool
+    ROOM_START_DEADLINE_SECONDS: int
+    ROOM_PLAY_TIMEOUT_SECONDS: int
+    ROOM_ARCHIVE_AFTER_SECONDS: int
+    ROOM_RESYNC_SECONDS: float
+
+    # Rate limiting (empty storage URL keeps token buckets in each worker)
+    RATE_LIMIT_ENABLED: bool
+    RATE_LIMIT_STORAGE_URL: Optional[str]
+    RATE_LIMIT_TRUSTED_PROXIES: int
+
     # Firebase Configuration
-    FIREBASE_SERVICE_ACCOUNT_KEY = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
-    
+    FIREBASE_SERVICE_ACCOUNT_KEY: Optional[str]
+
     # PlayHT Configuration (for TTS)
-    PLAYHT_API_KEY = os.getenv('PLAYHT_API_KEY')
-    PLAYHT_USER_ID = os.getenv('PLAYHT_USER_ID')
-    
+    PLAYHT_API_KEY: Optional[str]
+    PLAYHT_USER_ID: Optional[str]
+
+    # Number-call audio (alias=voice id pairs; the first voice is the default)
+    TTS_CACHE_DIR: str
+    TTS_VOICES: Tuple[Tuple[str, str], ...]
+    TTS_LANGUAGES: Tuple[str, ...]
+    TTS_TELEGRAM_VOICE: bool
+
     # Admin Configuration
-    ADMIN_UIDS = [
-        "TxA6TQmBAGRZ9rt91YOX6UIymcX2"
-    ]
-
-class DevelopmentConfig(Config):
-    """Development configuration"""
-    DEBUG = True
-    ENVIRONMENT = 'development'
-
-class ProductionConfig(Config):
-    """Production configuration"""
-    DEBUG = False
-    ENVIRONMENT = 'production'
-
-class TestingConfig(Config):
-    """Testing configuration"""
-    TESTING = True
-    DEBUG = True
-    ENVIRONMENT = 'testing'
-
-# Configuration mapping
-config = {
-    'development': DevelopmentConfig,
-    'production': ProductionConfig,
-    'testing': TestingConfig,
-    'default': DevelopmentConfig
-}
-
-def get_config():
-    """Get configuration based on environment"""
-    env = os.getenv('ENVIRONMENT', 'development')
-    return config.get(env, config['default']) 
\ No newline at end of file
+    ADMIN_UIDS: FrozenSet[str]
+
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> 'Config':
+        """Build a snapshot from the environment, raising ConfigError on malformed values"""
+        read = _EnvReader(os.environ if env is None else env)
+
+        environment = read.text('ENVIRONMENT', 'development')
+        if environment not in ENVIRONMENTS:
+            environment = 'development'
+        secret_key = read.text('SECRET_KEY', DEFAULT_SECRET_KEY)
+        frontend_url = read.text('VITE_FRONTEND_URL', 'http://localhost:3000')
+
+        config = cls(
+            SECRET_KEY=secret_key,
+            DEBUG=environment != 'production',
+            TESTING=environment == 'testing',
+            ENVIRONMENT=environment,
+            FRONTEND_URL=frontend_url,
+            CORS_ORIGINS=frozenset(DEFAULT_CORS_ORIGINS + (frontend_url,) + read.items('CORS_EXTRA_ORIGINS')),
+            CHAPA_SECRET_KEY=read.text('CHAPA_SECRET_KEY'),
+            CHAPA_PUBLIC_KEY=read.text('CHAPA_PUBLIC_KEY'),
+            CHAPA_BASE_URL=read.text('CHAPA_BASE_URL', 'https://api.chapa.co/v1'),
+            CHAPA_RECONCILE_CONCURRENCY=read.number('CHAPA_RECONCILE_CONCURRENCY', 4, int),
+            CHAPA_VERIFY_RATE_PER_SECOND=read.number('CHAPA_VERIFY_RATE_PER_SECOND', 5.0, float),
+            CHAPA_RECONCILE_BATCH=read.number('CHAPA_RECONCILE_BATCH', 100, int),
+            CHAPA_PENDING_MAX_AGE_HOURS=read.number('CHAPA_PENDING_MAX_AGE_HOURS', 24.0, float),
+            WITHDRAWAL_MIN_AMOUNT=read.number('WITHDRAWAL_MIN_AMOUNT', 50.0, float),
+            WITHDRAWAL_MAX_AMOUNT=read.number('WITHDRAWAL_MAX_AMOUNT', 50000.0, float),
+            CHAPA_PAYOUT_CONCURRENCY=read.number('CHAPA_PAYOUT_CONCURRENCY', 4, int),
+            CHAPA_PAYOUT_CHUNK=read.number('CHAPA_PAYOUT_CHUNK', 100, int),
+            CHAPA_PAYOUT_BATCH=read.number('CHAPA_PAYOUT_BATCH', 500, int),
+            CALLBACK_BASE_URL=read.text('CALLBACK_BASE_URL', 'http://localhost:5000'),
+            TELEGRAM_BOT_TOKEN=read.text('TELEGRAM_BOT_TOKEN'),
+            TELEGRAM_PAYMENT_PROVIDER_TOKEN=read.text('TELEGRAM_PAYMENT_PROVIDER_TOKEN'),
+            TELEGRAM_LOGIN_MAX_AGE=read.number('TELEGRAM_LOGIN_MAX_AGE', 24 * 3600, int),
+            TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS=read.number('TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS', 600.0, float),
+            PRECHECKOUT_BUDGET_SECONDS=read.number('PRECHECKOUT_BUDGET_SECONDS', 3.0, float),
+            PRECHECKOUT_CACHE_TTL=read.number('PRECHECKOUT_CACHE_TTL', 15.0, float),
+            PRECHECKOUT_FAIL_OPEN=read.flag('PRECHECKOUT_FAIL_OPEN', False),
+            INVOICE_PAYLOAD_SECRET=read.text('INVOICE_PAYLOAD_SECRET') or ('' if environment == 'production' else secret_key),
+            INVOICE_PAYLOAD_MAX_AGE=read.number('INVOICE_PAYLOAD_MAX_AGE', 7 * 24 * 3600, int),
+            COUNTER_SHARDS=read.number('COUNTER_SHARDS', 10, int),
+            COUNTER_STALENESS_SECONDS=read.number('COUNTER_STALENESS_SECONDS', 5.0, float),
+            HOUSE_COMMISSION=read.number('HOUSE_COMMISSION', 0.10, float),
+            NOTIFY_CONCURRENCY=read.number('NOTIFY_CONCURRENCY', 20, int),
+            NOTIFY_RATE_PER_SECOND=read.number('NOTIFY_RATE_PER_SECOND', 25.0, float),
+            NOTIFY_MAX_ATTEMPTS=read.number('NOTIFY_MAX_ATTEMPTS', 3, int),
+            TELEGRAM_CARD_IMAGES=read.flag('TELEGRAM_CARD_IMAGES', False),
+            STATS_UTC_OFFSET_HOURS=read.number('STATS_UTC_OFFSET_HOURS', 3.0, float),
+            STATS_SETTLE_SECONDS=read.number('STATS_SETTLE_SECONDS', 600, int),
+            STATS_CACHE_TTL=read.number('STATS_CACHE_TTL', 60.0, float),
+            DAILY_BONUS_AMOUNT=read.number('DAILY_BONUS_AMOUNT', 5.0, float),
+            DAILY_BONUS_MIN_DAYS=read.number('DAILY_BONUS_MIN_DAYS', 3, int),
+            DAILY_BONUS_MIN_GAMES=read.number('DAILY_BONUS_MIN_GAMES', 1, int),
+            TRANSFER_MAX_AMOUNT=read.number('TRANSFER_MAX_AMOUNT', 10000.0, float),
+            TRANSFER_DAILY_LIMIT=read.number('TRANSFER_DAILY_LIMIT', 5000.0, float),
+            TRANSFER_REVIEW_SCORE=read.number('TRANSFER_REVIEW_SCORE', 50, int),
+            LEADERBOARD_REFRESH_SECONDS=read.number('LEADERBOARD_REFRESH_SECONDS', 15.0, float),
+            LEADERBOARD_CHECKPOINT_SECONDS=read.number('LEADERBOARD_CHECKPOINT_SECONDS', 300.0, float),
+            CHAT_HISTORY=read.number('CHAT_HISTORY', 100, int),
+            CHAT_FLUSH_SECONDS=read.number('CHAT_FLUSH_SECONDS', 5.0, float),
+            CHAT_RATE_PER_MINUTE=read.number('CHAT_RATE_PER_MINUTE', 20, int),
+            CHAT_BURST=read.number('CHAT_BURST', 5, int),
+            CHAT_BLOCKED_WORDS=read.items('CHAT_BLOCKED_WORDS'),
+            SYNC_MAX_EVENTS=read.number('SYNC_MAX_EVENTS', 200, int),
+            SYNC_MAX_GAP=read.number('SYNC_MAX_GAP', 50, int),
+            SYNC_CACHE_SECONDS=read.number('SYNC_CACHE_SECONDS', 1.0, float),
+            ROOM_SCHEDULER_ENABLED=read.flag('ROOM_SCHEDULER_ENABLED', False),
+            ROOM_START_DEADLINE_SECONDS=read.number('ROOM_START_DEADLINE_SECONDS', 15 * 60, int),
+            ROOM_PLAY_TIMEOUT_SECONDS=read.number('ROOM_PLAY_TIMEOUT_SECONDS', 2 * 3600, int),
+            ROOM_ARCHIVE_AFTER_SECONDS=read.number('ROOM_ARCHIVE_AFTER_SECONDS', 24 * 3600, int),
+            ROOM_RESYNC_SECONDS=read.number('ROOM_RESYNC_SECONDS', 60.0, float),
+            RATE_LIMIT_ENABLED=read.flag('RATE_LIMIT_ENABLED', True),
+            RATE_LIMIT_STORAGE_URL=read.text('RATE_LIMIT_STORAGE_URL'),
+            RATE_LIMIT_TRUSTED_PROXIES=read.number('RATE_LIMIT_TRUSTED_PROXIES', 1, int),
+            FIREBASE_SERVICE_ACCOUNT_KEY=read.text('FIREBASE_SERVICE_ACCOUNT_KEY'),
+            PLAYHT_API_KEY=read.text('PLAYHT_API_KEY'),
+            PLAYHT_USER_ID=read.text('PLAYHT_USER_ID'),
+            TTS_CACHE_DIR=read.text('TTS_CACHE_DIR', 'audio_cache'),
+            TTS_VOICES=read.pairs('TTS_VOICES', DEFAULT_TTS_VOICES),
+            TTS_LANGUAGES=read.items('TTS_LANGUAGES') or ('en', 'am'),
+            TTS_TELEGRAM_VOICE=read.flag('TTS_TELEGRAM_VOICE', False),
+            ADMIN_UIDS=frozenset(read.items('ADMIN_UIDS') or DEFAULT_ADMIN_UIDS),
+        )
+
+        errors = read.errors + config.validate()[0]
+        if errors:
+            raise ConfigError('; '.join(errors))
+        return config
+
+    def validate(self) -> Tuple[List[str], List[str]]:
+        """Return (errors, warnings). Errors block startup and reloads."""
+        errors: List[str] = []
+        warnings: List[str] = []
+
+        if not 0 < self.PRECHECKOUT_BUDGET_SECONDS < 10:
+            errors.append("PRECHECKOUT_BUDGET_SECONDS must be between 0 and 10 (Telegram's deadline)")
+        if not 0 <= self.HOUSE_COMMISSION < 1:
+            errors.append("HOUSE_COMMISSION must be in [0, 1)")
+        for key in ('COUNTER_SHARDS', 'NOTIFY_CONCURRENCY', 'NOTIFY_MAX_ATTEMPTS',
+                    'CHAPA_RECONCILE_CONCURRENCY', 'CHAPA_RECONCILE_BATCH', 'CHAPA_PAYOUT_CONCURRENCY',
+                    'CHAPA_PAYOUT_BATCH', 'CHAT_HISTORY', 'CHAT_RATE_PER_MINUTE', 'CHAT_BURST',
+                    'SYNC_MAX_EVENTS', 'SYNC_MAX_GAP'):
+            if getattr(self, key) < 1:
+                errors.append(f"{key} must be at least 1")
+        for key in ('NOTIFY_RATE_PER_SECOND', 'CHAPA_VERIFY_RATE_PER_SECOND', 'CHAPA_PENDING_MAX_AGE_HOURS',
+                    'ROOM_START_DEADLINE_SECONDS', 'ROOM_PLAY_TIMEOUT_SECONDS', 'ROOM_RESYNC_SECONDS',
+                    'LEADERBOARD_REFRESH_SECONDS', 'LEADERBOARD_CHECKPOINT_SECONDS', 'CHAT_FLUSH_SECONDS'):
+            if getattr(self, key) <= 0:
+                errors.append(f"{key} must be positive")
+        if self.SYNC_MAX_GAP > self.SYNC_MAX_EVENTS:
+            errors.append("SYNC_MAX_GAP must not exceed SYNC_MAX_EVENTS")
+        if self.SYNC_CACHE_SECONDS < 0:
+            errors.append("SYNC_CACHE_SECONDS must not be negative")
+        if not 1 <= self.CHAPA_PAYOUT_CHUNK <= 100:
+            errors.append("CHAPA_PAYOUT_CHUNK must be between 1 and 100 (Chapa's bulk transfer limit)")
+        if not 0 < self.WITHDRAWAL_MIN_AMOUNT <= self.WITHDRAWAL_MAX_AMOUNT:
+            errors.append("WITHDRAWAL_MIN_AMOUNT must be positive and at most WITHDRAWAL_MAX_AMOUNT")
+        if not -12 <= self.STATS_UTC_OFFSET_HOURS <= 14:
+            errors.append("STATS_UTC_OFFSET_HOURS must be between -12 and 14")
+        if self.STATS_SETTLE_SECONDS < 0:
+            errors.append("STATS_SETTLE_SECONDS must not be negative")
+        if not 0 <= self.TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS <= 1800:
+            errors.append("TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS must be between 0 and 1800 (tokens expire after an hour)")
+        if self.TELEGRAM_LOGIN_MAX_AGE < 1:
+            errors.append("TELEGRAM_LOGIN_MAX_AGE must be at least 1")
+        if self.ROOM_ARCHIVE_AFTER_SECONDS < 0:
+            errors.append("ROOM_ARCHIVE_AFTER_SECONDS must not be negative")
+        for key in ('DAILY_BONUS_AMOUNT', 'DAILY_BONUS_MIN_DAYS', 'DAILY_BONUS_MIN_GAMES'):
+            if getattr(self, key) < 0:
+                errors.append(f"{key} must not be negative")
+        for key in ('TRANSFER_MAX_AMOUNT', 'TRANSFER_DAILY_LIMIT'):
+            if getattr(self, key) <= 0:
+                errors.append(f"{key} must be positive")
+        if not 0 <= self.TRANSFER_REVIEW_SCORE <= 100:
+            errors.append("TRANSFER_REVIEW_SCORE must be between 0 and 100")
+        if self.RATE_LIMIT_TRUSTED_PROXIES < 0:
+            errors.append("RATE_LIMIT_TRUSTED_PROXIES must not be negative")
+
+        if not self.TTS_VOICES:
+            errors.append("TTS_VOICES must name at least one voice")
+
+        if self.FIREBASE_SERVICE_ACCOUNT_KEY:
+            try:
+                json.loads(self.FIREBASE_SERVICE_ACCOUNT_KEY)
+            except ValueError:
+                errors.append("FIREBASE_SERVICE_ACCOUNT_KEY is not valid JSON")
+        elif not any(os.path.isfile(name) for name in ('serviceAccountKey.json', 'serviceAccountkey.json')):
+            warnings.append("No Firebase service account key (env or file) found")
+
+        for key in ('CHAPA_SECRET_KEY', 'CHAPA_PUBLIC_KEY', 'TELEGRAM_BOT_TOKEN', 'TELEGRAM_PAYMENT_PROVIDER_TOKEN'):
+            if not getattr(self, key):
+                warnings.append(f"{key} is missing")
+        if self.ENVIRONMENT == 'production' and self.SECRET_KEY == DEFAULT_SECRET_KEY:
+            warnings.append("SECRET_KEY is still the default value")
+        if self.ENVIRONMENT == 'production' and (not self.INVOICE_PAYLOAD_SECRET
+                                                 or self.INVOICE_PAYLOAD_SECRET in PLACEHOLDER_SECRETS):
+            errors.append("INVOICE_PAYLOAD_SECRET must be set to a private value in production")
+
+        return errors, warnings
+
+_current: Optional[Config] = None
+_lock = threading.Lock()
+_listeners: List[Callable[[Config], None]] = []
+
+def get_config() -> Config:
+    """Get the active configuration snapshot"""
+    config = _current
+    if config is None:
+        with _lock:
+            if _current is None:
+                _swap(Config.from_env())
+            config = _current
+    return config
+
+def reload_config() -> Config:
+    """Re-read .env and the environment and atomically swap in a new snapshot.
+
+    Raises ConfigError and keeps the current snapshot if the new one is invalid.
+    """
+    load_dotenv(override=True)
+    config = Config.from_env()
+    with _lock:
+        _swap(config)
+    for listener in list(_listeners):
+        try:
+            listener(config)
+        except Exception as e:
+            print(f"Error applying reloaded configuration in {getattr(listener, '__qualname__', listener)}: {e}")
+    print(f"Configuration reloaded ({config.ENVIRONMENT})")
+    return config
+
+def on_reload(listener: Callable[[Config], None]) -> Callable[[Config], None]:
+    """Call listener with every snapshot reload_config() swaps in (usable as a decorator).
+
+    For services that copy values out of the config when they are built;
+    anything that calls get_config() per use needs no listener.
+    """
+    _listeners.append(listener)
+    return listener
+
+def _swap(config: Config) -> None:
+    global _current
+    _current = config
+
+def install_reload_signal(signum: Optional[int] = None) -> bool:
+    """Reload the configuration when the process receives signum (SIGHUP by default).
+
+    Only possible from the main thread on platforms with the signal; returns
+    False otherwise.
+    """
+    signum = signum or getattr(signal, 'SIGHUP', None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def _handler(signum, frame):
+        try:
+            reload_config()
+        except ConfigError as e:
+            print(f"Configuration reload rejected: {e}")
+
+    signal.signal(signum, _handler)
+    return True
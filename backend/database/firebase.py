@@ -1,11 +1,43 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore, auth as firebase_auth
+import importlib
+import threading
 from typing import Optional
 
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    firebase_admin.firestore pulls in google-cloud-firestore and gRPC, and
+    firebase_admin.auth the HTTP and JWT stacks; importing them where they
+    are first used keeps them off the startup path of workers that only
+    serve /health. Attributes resolve to the real module's, so
+    ``firestore.SERVER_TIMESTAMP`` and ``@firestore.transactional`` work as
+    with the module itself.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+# Import these from here rather than from firebase_admin
+firestore = _LazyModule('firebase_admin.firestore')
+firebase_auth = _LazyModule('firebase_admin.auth')
+
 class FirebaseManager:
-    """Firebase database manager"""
+    """Firebase database manager
+
+    The Firestore client is created on first use in each process rather than
+    at import time: gRPC channels must not be shared across a fork, and
+    workers that only serve /health never need one.
+    """
     
     _instance = None
     _initialized = False
@@ -18,10 +50,15 @@ class FirebaseManager:
     def __init__(self):
         if not self._initialized:
             self.db = None
+            self._attempted = False
+            self._lock = threading.Lock()
             self._initialized = True
     
     def initialize(self, config):
         """Initialize Firebase connection"""
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         try:
             service_account_key = config.FIREBASE_SERVICE_ACCOUNT_KEY
             if service_account_key:
@@ -35,7 +72,10 @@ class FirebaseManager:
                 except FileNotFoundError:
                     cred = credentials.Certificate("./serviceAccountkey.json")
             
-            firebase_admin.initialize_app(cred)
+            try:
+                firebase_admin.get_app()
+            except ValueError:
+                firebase_admin.initialize_app(cred)
             self.db = firestore.client()
             print("Firebase initialized successfully")
             return True
@@ -43,9 +83,22 @@ class FirebaseManager:
             print(f"Firebase initialization error: {e}")
             self.db = None
             return False
+        finally:
+            self._attempted = True
     
+    def ensure_initialized(self):
+        """Initialize from the active configuration unless already attempted in this process"""
+        if not self._attempted:
+            with self._lock:
+                if not self._attempted:
+                    from config.settings import get_config
+                    self.initialize(get_config())
+        return self.db is not None
+
     def get_db(self):
         """Get Firestore database instance"""
+        if self.db is None:
+            self.ensure_initialized()
         return self.db
     
     def is_initialized(self):
@@ -0,0 +1,71 @@
+import random
+import time
+from typing import Dict, Optional
+
+from database.firebase import firestore
+
+from services.cache import TTLCache
+
+# Counters whose sums are cached per process; expired ones are dropped first
+MAX_CACHED_COUNTERS = 10000
+
+class ShardedCounter:
+    """Distributed counters spread over N shard documents.
+
+    A counter lives in a shard collection, e.g.
+    ``gameRooms/{id}/counters/totals/shards/{0..N-1}``. Writers add to a random
+    shard with ``firestore.Increment`` so concurrent updates do not contend on
+    one document; readers sum the shards. Aggregated reads are cached per
+    process for ``staleness`` seconds, since dashboards and bot replies do not
+    need to-the-write accuracy. Writes do not invalidate the cache, otherwise a
+    busy counter would be re-summed on every read.
+
+    One shard document can hold several numeric fields, so related totals
+    (prize pool and entry count, for example) share a single write.
+    """
+
+    def __init__(self, num_shards: int = 10, staleness: float = 5.0):
+        self.num_shards = num_shards
+        self.staleness = staleness
+        self._cache = TTLCache(ttl=staleness, max_entries=MAX_CACHED_COUNTERS)
+
+    @staticmethod
+    def shards_for(doc_ref, name: str = 'totals'):
+        """Shard collection for a named counter attached to a document"""
+        return doc_ref.collection('counters').document(name).collection('shards')
+
+    def increment(self, shards_ref, fields: Dict[str, float], batch=None) -> None:
+        """Add to one random shard. Joins the given batch/transaction when provided."""
+        shard_ref = shards_ref.document(str(random.randrange(self.num_shards)))
+        update = {field: firestore.Increment(amount) for field, amount in fields.items()}
+        if batch is not None:
+            batch.set(shard_ref, update, merge=True)
+        else:
+            shard_ref.set(update, merge=True)
+
+    def get_totals(self, shards_ref, max_staleness: Optional[float] = None) -> Dict[str, float]:
+        """Sum every field over all shards, served from cache within the staleness window"""
+        max_staleness = self.staleness if max_staleness is None else max_staleness
+        path = self._path(shards_ref)
+        # Callers may accept sums older than the default window, so age is checked here
+        cached = self._cache.get(path, allow_stale=True)
+        if cached and time.monotonic() - cached[0] <= max_staleness:
+            return cached[1]
+
+        totals: Dict[str, float] = {}
+        for shard in shards_ref.stream():
+            for field, value in shard.to_dict().items():
+                if isinstance(value, (int, float)):
+                    totals[field] = totals.get(field, 0) + value
+
+        self._cache.set(path, (time.monotonic(), totals))
+        return totals
+
+    def get(self, shards_ref, field: str, max_staleness: Optional[float] = None) -> float:
+        """Sum of a single field over all shards"""
+        return self.get_totals(shards_ref, max_staleness).get(field, 0)
+
+    @staticmethod
+    def _path(collection_ref) -> str:
+        parent = collection_ref.parent
+        return f"{parent.path}/{collection_ref.id}" if parent is not None else collection_ref.id
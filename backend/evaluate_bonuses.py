@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Daily Bonus Evaluation Job
+Resets broken daily-bonus streaks and pre-qualifies recently active players.
+Run once a night after midnight East Africa Time, e.g. as a Render cron job:
+
+    python evaluate_bonuses.py
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from database.sharded_counter import ShardedCounter
+from services.bonus_service import BonusService, BonusError
+from services.ledger import Ledger
+
+def main():
+    parser = argparse.ArgumentParser(description='Reset broken bonus streaks and pre-qualify players')
+    parser.add_argument('--max-pages', type=int, help='stop after this many pages of players')
+    args = parser.parse_args()
+
+    config = get_config()
+    if not firebase_manager.initialize(config):
+        sys.exit(1)
+    ledger = Ledger(firebase_manager, ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS))
+    try:
+        counts = BonusService.from_config(firebase_manager, ledger, config).evaluate(args.max_pages)
+    except BonusError as e:
+        print(f"Bonus evaluation failed: {e}")
+        sys.exit(1)
+    print(f"Evaluated {counts['users']} player(s): {counts['reset']} streak(s) reset, "
+          f"{counts['qualified']} newly qualified")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Bulk Export Script
+Streams Firestore transactions or users to gzip NDJSON or Parquet in
+constant memory, checkpointing as it goes so an interrupted export resumes
+where it stopped.
+
+Usage:
+    python export_data.py transactions --output transactions.ndjson.gz
+    python export_data.py transactions --format parquet --output transactions_parquet --since 2024-01-01
+    python export_data.py users --output users.ndjson.gz --fresh
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from services.export_service import (
+    DEFAULT_PAGE_SIZE, DEFAULT_ROWS_PER_PART, EXPORTS, FORMATS,
+    ExportError, FirestoreExporter, export_to_file, parse_time
+)
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Firestore collections for reconciliation')
+    parser.add_argument('collection', choices=sorted(EXPORTS))
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--output', help='output file (ndjson) or directory (parquet)')
+    parser.add_argument('--since', help='only documents created at or after this date (ISO 8601)')
+    parser.add_argument('--until', help='only documents created before this date (ISO 8601)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--rows-per-part', type=int, default=DEFAULT_ROWS_PER_PART,
+                        help='rows per Parquet part file (parts are the resume unit)')
+    parser.add_argument('--fresh', action='store_true', help='ignore an existing checkpoint and start over')
+    args = parser.parse_args()
+
+    output = args.output or (f'{args.collection}.ndjson.gz' if args.format == 'ndjson' else f'{args.collection}_parquet')
+    if not firebase_manager.initialize(get_config()):
+        sys.exit(1)
+
+    try:
+        result = export_to_file(
+            FirestoreExporter(firebase_manager, page_size=args.page_size),
+            args.collection,
+            output,
+            fmt=args.format,
+            since=parse_time(args.since),
+            until=parse_time(args.until),
+            resume=not args.fresh,
+            rows_per_part=args.rows_per_part
+        )
+    except ExportError as e:
+        print(f"Export failed: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nExport interrupted; run the same command again to resume")
+        sys.exit(130)
+
+    print(f"Done: {result['rows']} rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Gunicorn configuration (loaded automatically from the working directory)
+#
+# The app is imported once in the master and warmed up before workers are
+# forked, so cold starts pay the import cost once and respawned workers start
+# with everything already loaded. Firebase and the Telegram bot are created
+# lazily inside each worker after the fork.
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = 120
+preload_app = True
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before workers are forked"""
+    from app import warm_up
+    warm_up()
+
+def post_fork(server, worker):
+    """Lets /api/admin/config/reload ask the master to reload every worker"""
+    os.environ['GUNICORN_MASTER_PID'] = str(server.pid)
+
+def on_reload(server):
+    """SIGHUP: refresh the master's configuration (and the services registered
+    with config.settings.on_reload) before gunicorn replaces the workers, so
+    the new workers are forked with it"""
+    from config.settings import reload_config, ConfigError
+    try:
+        reload_config()
+    except ConfigError as e:
+        server.log.error(f"Configuration reload rejected: {e}")
+
+def worker_exit(server, worker):
+    """Save chat messages still waiting for the next periodic flush"""
+    from routes.game_routes import chat_service
+    try:
+        chat_service.flush()
+    except Exception as e:
+        server.log.error(f"Chat flush on exit failed: {e}")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Number-Call Audio Prerender
+Synthesizes every number call (B-1 ... O-75) for each configured language
+and voice into the on-disk audio cache (TTS_CACHE_DIR). Clips already in the
+cache are skipped, so it is cheap to run on every deploy:
+
+    python prerender_audio.py
+    python prerender_audio.py --language am --voice default
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from services.call_audio import AudioError, CallAudioCache
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render number-call audio')
+    parser.add_argument('--language', action='append', help='language to render (default: TTS_LANGUAGES)')
+    parser.add_argument('--voice', action='append', help='voice alias to render (default: every TTS_VOICES entry)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    cache = CallAudioCache.from_config(get_config())
+    if not cache.synthesizer:
+        print("PLAYHT_API_KEY and PLAYHT_USER_ID are required to render audio")
+        sys.exit(1)
+    try:
+        counts = cache.prerender(args.language, args.voice, concurrency=args.concurrency)
+    except AudioError as e:
+        print(f"Prerender failed: {e}")
+        sys.exit(1)
+    print(f"Audio cache {cache.cache_dir}: {counts}")
+    if counts['failed']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Chapa Payout Job
+Sends queued withdrawals to Chapa in bulk transfer requests and verifies
+submitted ones, settling or releasing their reserved funds. Safe to run
+repeatedly or in several processes, e.g. as a Render worker:
+
+    python process_payouts.py
+    python process_payouts.py --loop 30
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from services.payout_service import PayoutQueue, PayoutError
+
+def main():
+    parser = argparse.ArgumentParser(description='Send and verify queued Chapa payouts')
+    parser.add_argument('--limit', type=int, help='withdrawals to handle per run (default CHAPA_PAYOUT_BATCH)')
+    parser.add_argument('--loop', type=float, metavar='SECONDS', help='keep running with this pause between runs')
+    args = parser.parse_args()
+
+    if not firebase_manager.initialize(get_config()):
+        sys.exit(1)
+
+    try:
+        while True:
+            queue = PayoutQueue.from_config(firebase_manager)
+            counts = queue.process(limit=args.limit)
+            print(f"Payouts: {counts or 'nothing due'}")
+            if not args.loop:
+                break
+            # A full run means more is due; go again without waiting
+            if sum(counts.values()) < (args.limit or queue.batch):
+                time.sleep(args.loop)
+    except PayoutError as e:
+        print(f"Payout run failed: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Chapa Reconciliation Job
+Verifies pending Chapa deposits whose callback never arrived and credits,
+fails or reschedules them. Safe to run repeatedly or alongside the callback,
+e.g. as a Render cron job:
+
+    python reconcile_payments.py
+    python reconcile_payments.py --loop 60
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from services.reconciliation_service import PaymentReconciler, ReconciliationError
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile pending Chapa deposits')
+    parser.add_argument('--limit', type=int, help='payments to verify per sweep (default CHAPA_RECONCILE_BATCH)')
+    parser.add_argument('--loop', type=float, metavar='SECONDS', help='keep sweeping with this pause between sweeps')
+    args = parser.parse_args()
+
+    if not firebase_manager.initialize(get_config()):
+        sys.exit(1)
+
+    try:
+        while True:
+            counts = PaymentReconciler.from_config(firebase_manager).sweep(limit=args.limit)
+            print(f"Reconciled: {counts or 'nothing due'}")
+            if not args.loop:
+                break
+            time.sleep(args.loop)
+    except ReconciliationError as e:
+        print(f"Reconciliation failed: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from flask import Blueprint, request, jsonify
+from database.firebase import firebase_manager
+from services.achievement_service import AchievementEngine
+from services.events import event_bus
+from routes.auth import require_auth
+
+achievement_bp = Blueprint('achievements', __name__, url_prefix='/api/achievements')
+
+# Evaluates settlement and ledger events published in this process
+achievement_engine = AchievementEngine(firebase_manager)
+achievement_engine.subscribe(event_bus)
+
+@achievement_bp.route('', methods=['GET'])
+@require_auth
+def my_achievements():
+    """The caller's unlocked achievements, points and progress"""
+    try:
+        return jsonify({'status': 'success', 'data': achievement_engine.progress(request.user['uid'])}), 200
+    except Exception as e:
+        print(f"Achievement progress error for {request.user['uid']}: {e}")
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+import os
+import signal
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config.settings import reload_config, ConfigError
+from database.firebase import firebase_manager
+from services.stats_service import StatsAggregator, StatsService, StatsError
+from services.reconciliation_service import PaymentReconciler, ReconciliationError
+from services.payout_service import PayoutQueue, PayoutError
+from services.export_service import FirestoreExporter, ExportError, parse_time, stream_ndjson_gzip
+from services.transfer_service import TransferError, TransferNotFound, TransferRejected
+from routes.transfer_routes import transfer_processor
+from routes.auth import require_admin
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+stats_aggregator = StatsAggregator(firebase_manager)
+stats_service = StatsService(firebase_manager)
+exporter = FirestoreExporter(firebase_manager)
+
+@admin_bp.route('/config/reload', methods=['POST'])
+@require_admin
+def reload_configuration():
+    """Re-read the environment and swap in a new configuration snapshot.
+
+    The snapshot is validated in the worker serving the request. Under
+    gunicorn the master is then sent SIGHUP: it reloads too and replaces
+    every worker with one forked from the new state.
+    """
+    try:
+        config = reload_config()
+    except ConfigError as e:
+        return jsonify({'status': 'error', 'message': 'Configuration rejected', 'error': str(e)}), 400
+
+    # Set by gunicorn.conf.py in each worker
+    master_pid = int(os.environ.get('GUNICORN_MASTER_PID') or 0)
+    if master_pid and master_pid == os.getppid():
+        os.kill(master_pid, signal.SIGHUP)
+
+    _, warnings = config.validate()
+    return jsonify({
+        'status': 'success',
+        'environment': config.ENVIRONMENT,
+        'scope': 'all workers' if master_pid else 'this process',
+        'warnings': warnings
+    }), 200
+
+@admin_bp.route('/stats/daily', methods=['GET'])
+@require_admin
+def daily_stats():
+    """Daily rollups for the dashboard (?from=YYYY-MM-DD&to=YYYY-MM-DD, default last 30 days)"""
+    try:
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else stats_service.today()
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    try:
+        return jsonify({'status': 'success', 'data': stats_service.daily(start, end)}), 200
+    except StatsError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error loading daily stats: {e}")
+        return jsonify({'status': 'error', 'message': 'Failed to load stats', 'error': str(e)}), 500
+
+@admin_bp.route('/stats/aggregate', methods=['POST'])
+@require_admin
+def aggregate_stats():
+    """Fold new transactions and settlements into the daily rollups"""
+    try:
+        result = stats_aggregator.run()
+        stats_service.invalidate()
+        return jsonify({'status': 'success', 'data': result}), 200
+    except StatsError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except Exception as e:
+        print(f"Stats aggregation error: {e}")
+        return jsonify({'status': 'error', 'message': 'Aggregation failed', 'error': str(e)}), 500
+
+@admin_bp.route('/payments/reconcile', methods=['POST'])
+@require_admin
+def reconcile_payments():
+    """Verify due pending Chapa deposits and settle, fail or reschedule them"""
+    try:
+        limit = request.args.get('limit', type=int)
+        counts = PaymentReconciler.from_config(firebase_manager).sweep(limit=limit)
+        return jsonify({'status': 'success', 'data': counts}), 200
+    except ReconciliationError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        print(f"Payment reconciliation error: {e}")
+        return jsonify({'status': 'error', 'message': 'Reconciliation failed', 'error': str(e)}), 500
+
+@admin_bp.route('/withdrawals/process', methods=['POST'])
+@require_admin
+def process_withdrawals():
+    """Send queued withdrawals to Chapa and verify submitted ones now"""
+    try:
+        limit = request.args.get('limit', type=int)
+        counts = PayoutQueue.from_config(firebase_manager).process(limit=limit)
+        return jsonify({'status': 'success', 'data': counts}), 200
+    except PayoutError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        print(f"Payout processing error: {e}")
+        return jsonify({'status': 'error', 'message': 'Payout processing failed', 'error': str(e)}), 500
+
+@admin_bp.route('/transfers/pending', methods=['GET'])
+@require_admin
+def pending_transfers():
+    """Player transfers held for review, highest fraud score first"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        return jsonify({'status': 'success', 'data': transfer_processor.pending(limit)}), 200
+    except TransferError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        print(f"Error loading pending transfers: {e}")
+        return jsonify({'status': 'error', 'message': 'Failed to load transfers', 'error': str(e)}), 500
+
+@admin_bp.route('/transfers/<transfer_id>/<action>', methods=['POST'])
+@require_admin
+def review_transfer(transfer_id, action):
+    """Approve (moves the money, re-checking balance and limits) or reject a held transfer"""
+    if action not in ('approve', 'reject'):
+        return jsonify({'status': 'error', 'message': 'Action must be approve or reject'}), 404
+    notes = str((request.get_json(silent=True) or {}).get('notes') or '')
+    try:
+        review = transfer_processor.approve if action == 'approve' else transfer_processor.reject
+        result = review(transfer_id, request.user['uid'], notes)
+        return jsonify({'status': 'success', 'data': result}), 200
+    except TransferNotFound as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except TransferRejected as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except TransferError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        print(f"Transfer review error for {transfer_id}: {e}")
+        return jsonify({'status': 'error', 'message': 'Review failed', 'error': str(e)}), 500
+
+@admin_bp.route('/export/<collection>', methods=['GET'])
+@require_admin
+def export_collection(collection):
+    """Stream a collection as gzip NDJSON (?since=&until= ISO dates, ?after=<last exported id> to resume)"""
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+        exporter.check(collection, since, until)
+        after = request.args.get('after')
+        cursor = exporter.cursor_after(collection, after) if after else None
+    except ExportError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    print(f"Admin {request.user['uid']} exporting {collection} (since={since}, until={until}, after={after})")
+    return Response(
+        stream_with_context(stream_ndjson_gzip(exporter, collection, since, until, cursor)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename={collection}.ndjson.gz'}
+    )
@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify, send_file, url_for
+from config.settings import get_config
+from services.call_audio import AUDIO_MIMETYPE, AudioError, CallAudioCache
+
+audio_bp = Blueprint('audio', __name__, url_prefix='/api/audio')
+
+call_audio = CallAudioCache.from_config(get_config())
+
+# Clip URLs contain the content digest, so they never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Call-name URLs revalidate with the ETag once a day
+CALL_MAX_AGE = 24 * 3600
+
+def _send_clip(digest: str, max_age: int, immutable: bool = False):
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(call_audio.path_for(digest), mimetype=AUDIO_MIMETYPE, conditional=True,
+                         etag=digest, max_age=max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = immutable
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+@audio_bp.route('/calls/<language>', methods=['GET'])
+def call_manifest(language):
+    """Clip URL for every number call of a language and voice (null until rendered)"""
+    try:
+        _, language, voice = call_audio.resolve('B-1', language, request.args.get('voice'))
+    except AudioError as e:
+        return jsonify({'error': str(e)}), 404
+    calls = {
+        call: url_for('audio.get_clip', digest=digest) if digest else None
+        for call, digest in call_audio.manifest(language, voice).items()
+    }
+    response = jsonify({'language': language, 'voice': voice, 'calls': calls})
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+@audio_bp.route('/calls/<language>/<call>.mp3', methods=['GET'])
+def get_call(language, call):
+    """Audio for one call, e.g. /api/audio/calls/en/B-12.mp3 (rendered on first request)"""
+    try:
+        call, language, voice = call_audio.resolve(call, language, request.args.get('voice'))
+    except AudioError as e:
+        return jsonify({'error': str(e)}), 404
+    try:
+        digest = call_audio.get(call, language, voice)
+    except AudioError as e:
+        print(f"Call audio error for {call} ({language}, {voice}): {e}")
+        return jsonify({'error': str(e)}), 503
+    return _send_clip(digest, CALL_MAX_AGE)
+
+@audio_bp.route('/clips/<digest>.mp3', methods=['GET'])
+def get_clip(digest):
+    """Audio by content digest (immutable)"""
+    try:
+        return _send_clip(digest, IMMUTABLE_MAX_AGE, immutable=True)
+    except (AudioError, FileNotFoundError):
+        return jsonify({'error': 'Clip not found'}), 404
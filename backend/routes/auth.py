@@ -0,0 +1,34 @@
+from flask import request, jsonify
+from functools import wraps
+
+from config.settings import get_config
+from database.firebase import firebase_auth
+
+def require_auth(f):
+    """Authentication decorator"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
+
+        id_token = auth_header.split('Bearer ')[-1]
+        try:
+            decoded_token = firebase_auth.verify_id_token(id_token)
+            request.user = decoded_token
+        except Exception as e:
+            return jsonify({'error': f'Invalid or expired token: {str(e)}'}), 401
+
+        return f(*args, **kwargs)
+
+    return decorated
+
+def require_admin(f):
+    """Authentication decorator that also requires an admin UID"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.user['uid'] not in get_config().ADMIN_UIDS:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+
+    return require_auth(decorated)
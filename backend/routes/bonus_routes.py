@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify
+from config.settings import get_config, on_reload
+from database.firebase import firebase_manager
+from database.sharded_counter import ShardedCounter
+from services.bonus_service import BonusService, BonusError
+from services.ledger import Ledger
+from routes.auth import require_auth
+
+bonus_bp = Blueprint('bonus', __name__, url_prefix='/api/bonus')
+
+config = get_config()
+bonus_service = BonusService.from_config(
+    firebase_manager,
+    Ledger(firebase_manager, ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)),
+    config
+)
+on_reload(bonus_service.configure)
+
+@bonus_bp.route('/daily', methods=['GET'])
+@require_auth
+def daily_status():
+    """Whether the caller can claim today's bonus, and their streak"""
+    try:
+        return jsonify({'status': 'success', 'data': bonus_service.status(request.user['uid'])}), 200
+    except BonusError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Bonus status error for {request.user['uid']}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bonus_bp.route('/daily/claim', methods=['POST'])
+@require_auth
+def claim_daily():
+    """Check in for today and receive the daily bonus if qualified (once per day)"""
+    try:
+        result = bonus_service.claim(request.user['uid'])
+    except BonusError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Bonus claim error for {request.user['uid']}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'data': result}), 200
@@ -0,0 +1,196 @@
+from flask import Blueprint, Response, request, jsonify
+from config.settings import get_config, on_reload
+from database.firebase import firebase_manager
+from database.sharded_counter import ShardedCounter
+from services.settlement_service import SettlementService, SettlementError
+from services.roster_service import RosterService
+from services.chat_service import ChatService, ChatError, ChatNotAllowed, ChatRateLimited
+from services.room_log import RoomEventLog, RoomLogError, RoomNotFound
+from services import sync_codec
+from services.notification_service import (
+    NotificationService, RoomEvent, EVENT_NUMBER_CALLED, EVENT_WINNER, HOST_EVENTS
+)
+from services.win_engine import COLUMNS
+from routes.audio_routes import call_audio
+from routes.leaderboard_routes import leaderboard_service
+from routes.auth import require_auth
+
+game_bp = Blueprint('game', __name__, url_prefix='/api/games')
+
+config = get_config()
+sharded_counter = ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)
+settlement_service = SettlementService(firebase_manager, sharded_counter, config.HOUSE_COMMISSION)
+roster_service = RosterService(firebase_manager, sharded_counter)
+notification_service = NotificationService(config, firebase_manager, roster_service, call_audio=call_audio)
+chat_service = ChatService.from_config(firebase_manager, roster_service.has_player, config)
+room_log = RoomEventLog.from_config(firebase_manager, config)
+
+@on_reload
+def _apply_config(config):
+    sharded_counter.staleness = config.COUNTER_STALENESS_SECONDS
+    settlement_service.house_commission = config.HOUSE_COMMISSION
+    chat_service.configure(config)
+    room_log.configure(config)
+
+MAX_CHAT_LIMIT = 100
+
+def _load_managed_room(db, game_id, user_id):
+    """Return (room, error_response) for a room the user hosts or administers"""
+    room_doc = db.collection('gameRooms').document(game_id).get()
+    if not room_doc.exists:
+        return None, (jsonify({'error': 'Game room not found'}), 404)
+    room = room_doc.to_dict()
+    if user_id not in (room.get('hostId'), room.get('createdBy')) and user_id not in get_config().ADMIN_UIDS:
+        return None, (jsonify({'error': 'Not allowed to manage this game'}), 403)
+    return room, None
+
+@game_bp.route('/<game_id>/settle', methods=['POST'])
+@require_auth
+def settle_game(game_id):
+    """Verify winners and pay out a finished game in one batch"""
+    try:
+        db = firebase_manager.get_db()
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+
+        # Only the room host or an admin may trigger settlement
+        user_id = request.user['uid']
+        room, error_response = _load_managed_room(db, game_id, user_id)
+        if error_response:
+            return error_response
+
+        # Admins may supply the call sequence and cards explicitly (e.g. from
+        # an audit copy); hosts always settle from the stored room state
+        data = {}
+        if user_id in get_config().ADMIN_UIDS:
+            data = request.get_json(silent=True) or {}
+        result = settlement_service.settle(
+            game_id,
+            called_numbers=data.get('calledNumbers'),
+            cards=data.get('cards')
+        )
+
+        leaderboard_service.record_settlement(game_id, room.get('gameMode'), result['winners'])
+
+        try:
+            _announce_winners(db, game_id, room, result['winners'])
+        except Exception as e:
+            print(f"Error announcing winners for game {game_id}: {e}")
+
+        return jsonify({'status': 'success', 'data': result}), 200
+
+    except SettlementError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except Exception as e:
+        print(f"Settlement error for game {game_id}: {e}")
+        return jsonify({'status': 'error', 'message': 'Settlement failed', 'error': str(e)}), 500
+
+@game_bp.route('/<game_id>/notify', methods=['POST'])
+@require_auth
+def notify_room(game_id):
+    """Broadcast a game event to every Telegram player in the room"""
+    try:
+        db = firebase_manager.get_db()
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+
+        room, error_response = _load_managed_room(db, game_id, request.user['uid'])
+        if error_response:
+            return error_response
+
+        data = request.get_json(silent=True) or {}
+        event_type = data.get('event')
+        if event_type not in HOST_EVENTS:
+            return jsonify({'error': f'Hosts can only send: {", ".join(HOST_EVENTS)}'}), 400
+
+        # Messages are built from the room, never from client text
+        event_data = {'name': room.get('name', 'Bingo Game')}
+        if event_type == EVENT_NUMBER_CALLED:
+            number = int((data.get('data') or {}).get('number') or room.get('currentCall') or 0)
+            if not 1 <= number <= 75 or number not in (room.get('calledNumbers') or []):
+                return jsonify({'error': 'Number has not been called in this game'}), 400
+            event_data['call'] = f"{COLUMNS[(number - 1) // 15]}-{number}"
+        notification_service.notify_room(RoomEvent(game_id, event_type, event_data))
+        return jsonify({'status': 'queued'}), 202
+
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid event data: {e}'}), 400
+    except Exception as e:
+        print(f"Notification error for game {game_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@game_bp.route('/<game_id>/chat', methods=['GET'])
+@require_auth
+def chat_history(game_id):
+    """Recent chat messages, oldest first (players of the game only; ?after=<last message id> for newer ones)"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_CHAT_LIMIT)
+        messages = chat_service.recent(game_id, request.user['uid'], request.args.get('after'), limit)
+    except ChatNotAllowed as e:
+        return jsonify({'error': str(e)}), 403
+    except ChatError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Chat history error for {game_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'data': messages}), 200
+
+@game_bp.route('/<game_id>/chat', methods=['POST'])
+@require_auth
+def send_chat(game_id):
+    """Send a chat message to the room (players of the game only)"""
+    data = request.get_json(silent=True) or {}
+    user = request.user
+    try:
+        message = chat_service.send(game_id, user['uid'], user.get('name') or data.get('playerName'),
+                                    str(data.get('message') or ''), data.get('type', 'text'))
+    except ChatRateLimited as e:
+        response = jsonify({'error': str(e), 'retryAfter': round(e.retry_after, 1)})
+        response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+        return response, 429
+    except ChatNotAllowed as e:
+        return jsonify({'error': str(e)}), 403
+    except ChatError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Chat send error for {game_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'data': message}), 201
+
+@game_bp.route('/<game_id>/sync', methods=['GET'])
+@require_auth
+def sync_room(game_id):
+    """Room events after ?since=<seq>, or a compact snapshot when they cannot be replayed"""
+    try:
+        result = room_log.sync(game_id, request.args.get('since', type=int), request.user['uid'])
+    except RoomNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except RoomLogError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Sync error for {game_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    # Clients that ask for the binary codec get it; JSON is the default and the
+    # fallback for room data the codec cannot represent
+    response = None
+    if request.accept_mimetypes.best_match(['application/json', sync_codec.MEDIA_TYPE]) == sync_codec.MEDIA_TYPE:
+        try:
+            response = Response(sync_codec.encode_sync(result), mimetype=sync_codec.MEDIA_TYPE)
+        except sync_codec.CodecError as e:
+            print(f"Sync codec fallback for {game_id}: {e}")
+    if response is None:
+        response = jsonify({'status': 'success', 'data': result})
+    response.headers['Vary'] = 'Accept'
+    return response, 200
+
+def _announce_winners(db, game_id, room, winners):
+    refs = [db.collection('users').document(w['userId']) for w in winners]
+    names = {doc.id: doc.to_dict().get('displayName', 'Player')
+             for doc in db.get_all(refs, field_paths=['displayName']) if doc.exists}
+    notification_service.notify_room(RoomEvent(game_id, EVENT_WINNER, {
+        'name': room.get('name', 'Bingo Game'),
+        'winner': ', '.join(names.get(w['userId'], 'Player') for w in winners),
+        'pattern': winners[0]['pattern'],
+        'amount': winners[0]['amount']
+    }))
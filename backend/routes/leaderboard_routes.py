@@ -0,0 +1,50 @@
+from flask import Blueprint, request, jsonify
+from config.settings import get_config
+from database.firebase import firebase_manager
+from services.leaderboard_service import LeaderboardService, LeaderboardError
+from routes.auth import require_auth
+
+leaderboard_bp = Blueprint('leaderboard', __name__, url_prefix='/api/leaderboard')
+
+leaderboard_service = LeaderboardService.from_config(firebase_manager, get_config())
+
+MAX_LIMIT = 100
+
+@leaderboard_bp.route('/<board>', methods=['GET'])
+@require_auth
+def top_players(board):
+    """Top players of a board (all, daily, weekly, a game mode or a board id) with the caller's rank"""
+    try:
+        board_id = leaderboard_service.resolve(board)
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except LeaderboardError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    try:
+        data = leaderboard_service.top(board_id, limit, offset)
+        data['me'] = leaderboard_service.rank(board_id, request.user['uid'])
+    except LeaderboardError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Leaderboard error for {board_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    response = jsonify({'status': 'success', 'data': data})
+    response.cache_control.private = True
+    response.cache_control.max_age = 10
+    return response
+
+@leaderboard_bp.route('/<board>/users/<user_id>', methods=['GET'])
+@require_auth
+def user_rank(board, user_id):
+    """A player's rank on a board (null rank if they have no win on it)"""
+    try:
+        board_id = leaderboard_service.resolve(board)
+    except LeaderboardError as e:
+        return jsonify({'error': str(e)}), 404
+    try:
+        rank = leaderboard_service.rank(board_id, user_id)
+    except LeaderboardError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'status': 'success', 'data': rank or {'board': board_id, 'rank': None}}), 200
@@ -1,27 +1,12 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
-from firebase_admin import auth as firebase_auth
 from services.chapa_service import ChapaService
 from database.firebase import firebase_manager
+from config.settings import get_config
+from services.reconciliation_service import PaymentReconciler
+from routes.auth import require_auth
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/api')
 
-def require_auth(f):
-    """Authentication decorator"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
-        id_token = auth_header.split('Bearer ')[-1]
-        try:
-            decoded_token = firebase_auth.verify_id_token(id_token)
-            request.user = decoded_token
-        except Exception as e:
-            return jsonify({'error': f'Invalid or expired token: {str(e)}'}), 401
-        return f(*args, **kwargs)
-    return decorated
-
 @payment_bp.route('/payment/initiate', methods=['POST'])
 @require_auth
 def initiate_payment():
@@ -76,29 +61,19 @@ def initiate_payment():
             }
         }
         
-        # Initialize Chapa service
-        from config.settings import get_config
-        config = get_config()
-        chapa_service = ChapaService(config)
+        # Create payment (raises if Chapa rejects it)
+        reconciler = PaymentReconciler.from_config(firebase_manager)
+        result = reconciler.chapa_service.create_payment(payment_data)
         
-        # Create payment
-        result = chapa_service.create_payment(payment_data)
+        # Record the pending deposit so it settles even if the callback is lost
+        reconciler.record_pending(result['tx_ref'], user_id, amount)
+        print(f"Payment initiated: {result['tx_ref']} for user {user_id}, amount: {amount} ETB")
         
-        if result.get('status') == 'success':
-            # Log payment initiation
-            print(f"Payment initiated: {data['tx_ref']} for user {user_id}, amount: {amount} ETB")
-            
-            return jsonify({
-                "status": "success",
-                "message": "Payment initialized successfully",
-                "data": result.get('data', {})
-            }), 200
-        else:
-            return jsonify({
-                "status": "error",
-                "message": result.get('message', 'Payment initialization failed'),
-                "error": result.get('error')
-            }), 400
+        return jsonify({
+            "status": "success",
+            "message": "Payment initialized successfully",
+            "data": result
+        }), 200
             
     except Exception as e:
         print(f"Payment initiation error: {e}")
@@ -157,11 +132,11 @@ def wallet_deposit():
             'phone': phone
         }
 
-        # Initialize Chapa service (you'll need to pass config)
-        from config.settings import get_config
-        config = get_config()
-        chapa_service = ChapaService(config)
-        result = chapa_service.create_payment(deposit_payload)
+        reconciler = PaymentReconciler.from_config(firebase_manager)
+        result = reconciler.chapa_service.create_payment(deposit_payload)
+
+        # Record the pending deposit so it settles even if the callback is lost
+        reconciler.record_pending(result['tx_ref'], user_id, amount)
 
         return jsonify(result)
 
@@ -171,91 +146,35 @@ def wallet_deposit():
 
 @payment_bp.route('/payment-callback', methods=['POST', 'GET'])
 def payment_callback():
-    """Handle Chapa payment callback"""
+    """Handle Chapa payment callback
+
+    Chapa calls back with GET ?trx_ref=...&status=... and webhooks POST a JSON
+    body with tx_ref. Either way the payment is verified with Chapa and settled
+    through the reconciler, so a callback that repeats or races a
+    reconciliation sweep is credited once.
+    """
     try:
         if request.method == 'GET':
-            # Handle GET request (usually for testing)
-            return jsonify({"message": "Payment callback endpoint is working"}), 200
-        
-        # Handle POST request with payment verification
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data received"}), 400
-        
-        print(f"Payment callback received: {data}")
-        
-        # Extract transaction reference
-        tx_ref = data.get('tx_ref')
-        if not tx_ref:
-            return jsonify({"error": "Missing transaction reference"}), 400
-        
-        # Verify payment with Chapa
-        from config.settings import get_config
-        config = get_config()
-        chapa_service = ChapaService(config)
-        
-        verification_result = chapa_service.verify_payment(tx_ref)
-        
-        if verification_result.get('status') == 'success':
-            # Payment is successful, update user wallet
-            payment_data = verification_result.get('data', {})
-            amount = payment_data.get('amount', 0)
-            user_id = payment_data.get('metadata', {}).get('user_id')
-            
-            if user_id and amount > 0:
-                # Update user wallet in Firebase
-                try:
-                    db = firebase_manager.get_db()
-                    user_ref = db.collection('users').document(user_id)
-                    
-                    # Get current wallet balance
-                    user_doc = user_ref.get()
-                    if user_doc.exists:
-                        current_balance = user_doc.to_dict().get('wallet_balance', 0)
-                        new_balance = current_balance + amount
-                        
-                        # Update wallet balance
-                        user_ref.update({
-                            'wallet_balance': new_balance,
-                            'last_updated': firebase_manager.get_timestamp()
-                        })
-                        
-                        # Log transaction
-                        transaction_ref = db.collection('transactions').document()
-                        transaction_ref.set({
-                            'user_id': user_id,
-                            'type': 'deposit',
-                            'amount': amount,
-                            'currency': 'ETB',
-                            'tx_ref': tx_ref,
-                            'status': 'completed',
-                            'created_at': firebase_manager.get_timestamp(),
-                            'payment_method': 'chapa',
-                            'description': f'Wallet deposit via Chapa'
-                        })
-                        
-                        print(f"Payment completed: {tx_ref}, user {user_id}, amount: {amount} ETB")
-                        
-                        return jsonify({
-                            "status": "success",
-                            "message": "Payment processed successfully"
-                        }), 200
-                    else:
-                        print(f"User not found: {user_id}")
-                        return jsonify({"error": "User not found"}), 404
-                        
-                except Exception as e:
-                    print(f"Error updating user wallet: {e}")
-                    return jsonify({"error": "Failed to update user wallet"}), 500
-            else:
-                print(f"Invalid payment data: {payment_data}")
-                return jsonify({"error": "Invalid payment data"}), 400
+            tx_ref = request.args.get('trx_ref') or request.args.get('tx_ref')
+            if not tx_ref:
+                # Plain GET without a reference (usually for testing)
+                return jsonify({"message": "Payment callback endpoint is working"}), 200
         else:
-            print(f"Payment verification failed: {verification_result}")
-            return jsonify({
-                "status": "error",
-                "message": "Payment verification failed"
-            }), 400
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({"error": "No data received"}), 400
+            print(f"Payment callback received: {data}")
+            tx_ref = data.get('tx_ref') or data.get('trx_ref')
+            if not tx_ref:
+                return jsonify({"error": "Missing transaction reference"}), 400
+
+        outcome = PaymentReconciler.from_config(firebase_manager).reconcile(tx_ref)
+        print(f"Payment callback for {tx_ref}: {outcome}")
+        return jsonify({
+            "status": "success",
+            "tx_ref": tx_ref,
+            "outcome": outcome
+        }), 200
             
     except Exception as e:
         print(f"Payment callback error: {e}")
@@ -270,9 +189,7 @@ def verify_payment(tx_ref):
             return jsonify({"error": "Missing transaction reference"}), 400
         
         # Initialize Chapa service
-        from config.settings import get_config
-        config = get_config()
-        chapa_service = ChapaService(config)
+        chapa_service = ChapaService(get_config())
         
         # Verify payment
         result = chapa_service.verify_payment(tx_ref)
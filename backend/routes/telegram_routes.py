@@ -1,26 +1,13 @@
 from flask import Blueprint, request, jsonify
-from functools import wraps
-from firebase_admin import auth as firebase_auth, firestore
 from services.telegram_service import TelegramService
+from services.telegram_auth import TelegramAuthError, TelegramLoginService, verify_init_data, verify_login_widget
 from database.firebase import firebase_manager
+from config.settings import get_config
+from routes.auth import require_auth
 
 telegram_bp = Blueprint('telegram', __name__, url_prefix='/api/telegram')
 
-def require_auth(f):
-    """Authentication decorator"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
-        id_token = auth_header.split('Bearer ')[-1]
-        try:
-            decoded_token = firebase_auth.verify_id_token(id_token)
-            request.user = decoded_token
-        except Exception as e:
-            return jsonify({'error': f'Invalid or expired token: {str(e)}'}), 401
-        return f(*args, **kwargs)
-    return decorated
+telegram_login_service = TelegramLoginService(firebase_manager)
 
 @telegram_bp.route('/webhook', methods=['POST'])
 def telegram_webhook():
@@ -51,53 +38,30 @@ def telegram_payment_webhook():
 
 @telegram_bp.route('/login', methods=['POST'])
 def telegram_login():
-    """Handle Telegram login"""
-    data = request.get_json()
-    telegram_id = str(data.get('telegram_id'))
-    username = data.get('username')
-    first_name = data.get('first_name')
-    last_name = data.get('last_name')
-    
-    if not telegram_id:
-        return jsonify({'error': 'Missing telegram_id'}), 400
-    
-    db = firebase_manager.get_db()
-    if not db:
-        return jsonify({'error': 'Database unavailable'}), 500
-    
-    # Try to find user by telegramChatId
-    users = db.collection('users').where('telegramChatId', '==', telegram_id).stream()
-    user_doc = None
-    user_id = None
-    
-    for doc in users:
-        user_doc = doc
-        user_id = doc.id
-        break
+    """Exchange signed Telegram login data for a Firebase custom token
+
+    Accepts the Login Widget fields (id, first_name, ..., auth_date, hash) or
+    a Mini App's raw initData as {"init_data": "..."}. The signature is
+    checked against the bot token before anything else is done.
+    """
+    config = get_config()
+    if not config.TELEGRAM_BOT_TOKEN:
+        return jsonify({'error': 'Telegram login is not configured'}), 503
     
-    if not user_id:
-        # Create a new user in Firebase Auth and Firestore
-        try:
-            user_record = firebase_auth.create_user(
-                display_name=f"{first_name or ''} {last_name or ''}".strip() or username or f"tg_{telegram_id}",
-                uid=f"tg_{telegram_id}"
-            )
-        except Exception:
-            # User may already exist in Auth
-            user_record = firebase_auth.get_user(f"tg_{telegram_id}")
-        
-        user_id = user_record.uid
-        db.collection('users').document(user_id).set({
-            'displayName': user_record.display_name,
-            'telegramChatId': telegram_id,
-            'telegramUsername': username,
-            'createdAt': firestore.SERVER_TIMESTAMP,
-            'updatedAt': firestore.SERVER_TIMESTAMP
-        }, merge=True)
+    data = request.get_json(silent=True) or {}
+    try:
+        if 'init_data' in data:
+            user = verify_init_data(data['init_data'], config.TELEGRAM_BOT_TOKEN, config.TELEGRAM_LOGIN_MAX_AGE)
+        else:
+            user = verify_login_widget(data, config.TELEGRAM_BOT_TOKEN, config.TELEGRAM_LOGIN_MAX_AGE)
+    except TelegramAuthError as e:
+        return jsonify({'error': f'Telegram login rejected: {e}'}), 401
     
-    # Create a Firebase custom token
-    custom_token = firebase_auth.create_custom_token(user_id)
-    return jsonify({'token': custom_token.decode() if hasattr(custom_token, 'decode') else custom_token})
+    try:
+        return jsonify({'token': telegram_login_service.login(user)})
+    except Exception as e:
+        print(f"Telegram login error: {e}")
+        return jsonify({'error': 'Login failed'}), 500
 
 @telegram_bp.route('/user/telegram-chat-id', methods=['GET'])
 @require_auth
@@ -0,0 +1,35 @@
+from flask import Blueprint, request, jsonify
+from config.settings import get_config, on_reload
+from database.firebase import firebase_manager
+from services.transfer_service import TransferProcessor, TransferError, TransferRejected
+from routes.auth import require_auth
+
+transfer_bp = Blueprint('transfers', __name__, url_prefix='/api/wallet/transfers')
+
+# One processor per worker, so its wallet locks and velocity features cover every transfer here
+transfer_processor = TransferProcessor.from_config(firebase_manager, get_config())
+on_reload(transfer_processor.configure)
+
+@transfer_bp.route('', methods=['POST'])
+@require_auth
+def create_transfer():
+    """Send ETB to another player (held for admin review if it looks risky)"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('toUserId') or 'amount' not in data:
+        return jsonify({'error': 'toUserId and amount are required'}), 400
+    try:
+        result = transfer_processor.transfer(
+            request.user['uid'],
+            str(data['toUserId']),
+            data['amount'],
+            str(data.get('reason') or ''),
+            request.headers.get('Idempotency-Key') or data.get('requestId')
+        )
+    except TransferRejected as e:
+        return jsonify({'error': str(e)}), 400
+    except TransferError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Transfer error for {request.user['uid']}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'data': result}), 200 if result['duplicate'] else 201
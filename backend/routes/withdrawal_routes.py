@@ -0,0 +1,31 @@
+from flask import Blueprint, request, jsonify
+from database.firebase import firebase_manager
+from services.payout_service import PayoutQueue, PayoutError, WithdrawalRejected
+from routes.auth import require_auth
+
+withdrawal_bp = Blueprint('withdrawals', __name__, url_prefix='/api/wallet/withdrawals')
+
+@withdrawal_bp.route('', methods=['POST'])
+@require_auth
+def request_withdrawal():
+    """Reserve funds and queue a Chapa payout to the caller's bank or mobile wallet account"""
+    data = request.get_json(silent=True) or {}
+    if 'amount' not in data:
+        return jsonify({'error': 'amount is required'}), 400
+    try:
+        result = PayoutQueue.from_config(firebase_manager).request(
+            request.user['uid'],
+            data['amount'],
+            str(data.get('accountName') or ''),
+            str(data.get('accountNumber') or ''),
+            data.get('bankCode'),
+            request.headers.get('Idempotency-Key') or data.get('requestId')
+        )
+    except WithdrawalRejected as e:
+        return jsonify({'error': str(e)}), 400
+    except PayoutError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Withdrawal error for {request.user['uid']}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'data': result}), 200 if result['duplicate'] else 202
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Room Lifecycle Worker
+Auto-starts waiting rooms, cancels and refunds rooms that time out and moves
+finished rooms to gameRoomsArchive. Run it as a single background worker, or
+with --once from a cron job:
+
+    python schedule_rooms.py
+    python schedule_rooms.py --once
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import get_config
+from database.firebase import firebase_manager
+from database.sharded_counter import ShardedCounter
+from services.ledger import Ledger
+from services.roster_service import RosterService
+from services.room_scheduler import RoomScheduler
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the game room lifecycle scheduler')
+    parser.add_argument('--once', action='store_true', help='act on every room that is due now, then exit')
+    args = parser.parse_args()
+
+    config = get_config()
+    if not firebase_manager.initialize(config):
+        sys.exit(1)
+
+    counter = ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)
+    scheduler = RoomScheduler(firebase_manager, RosterService(firebase_manager, counter),
+                              Ledger(firebase_manager, counter))
+
+    if args.once:
+        scheduled = scheduler.resync()
+        ran = scheduler.run_due()
+        print(f"Rooms: {scheduled} tracked, {ran} acted on, {scheduler.pending()} waiting for a later deadline")
+        return
+
+    scheduler.ensure_started()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        print("\nStopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from services.events import Event, EventBus, GAME_PLAYED, GAME_WON, LEDGER_POSTED
+
+COLLECTION = 'achievementProgress'
+
+# Internal event raised after unlocks, for achievements about achievements
+ACHIEVEMENT_UNLOCKED = 'achievement_unlocked'
+
+# Event ids remembered per user, so a redelivered event is not counted twice
+RECENT_EVENTS = 200
+# Events are collected for up to this long (or this many) and written in one batch
+FLUSH_SECONDS = 0.5
+MAX_EVENTS_PER_FLUSH = 400
+# Each user costs two writes (progress and the users mirror) of the 500 in a batch
+MAX_USERS_PER_BATCH = 200
+MAX_ATTEMPTS = 3
+
+def _cents(amount: Any) -> int:
+    return int(round(float(amount or 0) * 100))
+
+# Counter increments for each event type. Counters are kept under short names
+# in one map per user, shared by every rule that reads them.
+COUNTERS: Dict[str, Callable[[Event], Dict[str, int]]] = {
+    GAME_PLAYED: lambda event: {'played': 1},
+    GAME_WON: lambda event: {'won': 1, 'wonCents': _cents(event.data.get('amount'))},
+    LEDGER_POSTED: lambda event: ({'deposits': 1, 'depositCents': _cents(event.data.get('amount'))}
+                                  if event.data.get('kind') == 'deposit' else {}),
+}
+
+@dataclass(frozen=True)
+class AchievementRule:
+    """Unlocked on an event of type ``event`` once ``counter`` reaches
+    ``target`` (if set) and ``when`` accepts the event (if set)"""
+    id: str
+    name: str
+    description: str
+    icon: str
+    points: int
+    event: str
+    counter: Optional[str] = None
+    target: int = 1
+    when: Optional[Callable[[Event], bool]] = None
+
+def _won_mode(mode: str, **limits) -> Callable[[Event], bool]:
+    def check(event: Event) -> bool:
+        data = event.data
+        if data.get('gameMode') != mode:
+            return False
+        if 'max_seconds' in limits and not (data.get('durationSeconds') or float('inf')) < limits['max_seconds']:
+            return False
+        return data.get('players', 0) >= limits.get('min_players', 0)
+    return check
+
+# Ids match the web client's catalogue where the achievement exists there
+RULES: Tuple[AchievementRule, ...] = (
+    AchievementRule('first_game', 'First Game', 'Finish your first game', '🎲', 5, GAME_PLAYED, 'played', 1),
+    AchievementRule('regular', 'Regular', 'Play 50 games', '📅', 25, GAME_PLAYED, 'played', 50),
+    AchievementRule('veteran', 'Veteran', 'Play 500 games', '🎖️', 75, GAME_PLAYED, 'played', 500),
+    AchievementRule('first_win', 'First Victory', 'Win your first Bingo game', '🥇', 10, GAME_WON, 'won', 1),
+    AchievementRule('winner_10', 'Seasoned Winner', 'Win 10 games', '🏅', 25, GAME_WON, 'won', 10),
+    AchievementRule('big_winner', 'Big Winner', 'Win 1,000 ETB in prizes', '💰', 50, GAME_WON, 'wonCents', 100000),
+    AchievementRule('full_house', 'Full House', 'Win with a full house', '🃏', 25, GAME_WON,
+                    when=lambda event: event.data.get('pattern') == 'Full House'),
+    AchievementRule('four_corners', 'Corner Stone', 'Win with the four corners', '📐', 10, GAME_WON,
+                    when=lambda event: event.data.get('pattern') == 'Four Corners'),
+    AchievementRule('speed_demon', 'Speed Demon', 'Win a Speed Bingo game in under 3 minutes', '⚡', 25, GAME_WON,
+                    when=_won_mode('speed', max_seconds=180)),
+    AchievementRule('tournament_champion', 'Tournament Champion', 'Win a tournament with 16+ players', '👑', 100,
+                    GAME_WON, when=_won_mode('tournament', min_players=16)),
+    AchievementRule('first_deposit', 'First Deposit', 'Make your first deposit', '💳', 5, LEDGER_POSTED, 'deposits', 1),
+    AchievementRule('collector', 'Achievement Collector', 'Unlock 10 achievements', '🏆', 75,
+                    ACHIEVEMENT_UNLOCKED, 'unlocked', 10),
+)
+
+class AchievementEngine:
+    """Server-side achievement evaluation driven by game and ledger events.
+
+    Rules are indexed by event type, so an event only runs the rules that
+    listen for it and a user's already unlocked rules are skipped; the cost
+    of an event does not grow with the size of the catalogue. Per-user state
+    is one ``achievementProgress/{uid}`` document: a map of counters, the
+    unlocked ids with their time, and the ids of recent events (so a
+    redelivered event is ignored).
+
+    Events are queued by the bus subscription and a background thread writes
+    them in batches: one ``get_all`` for the users involved, then one batch
+    with every user's new state written under an update-time precondition
+    (retried on conflict). Unlocked ids are mirrored into
+    ``users/{uid}.achievements`` for the web client, but only the progress
+    document, which clients cannot write, is authoritative.
+    """
+
+    def __init__(self, firebase_manager, rules: Sequence[AchievementRule] = RULES):
+        self.firebase_manager = firebase_manager
+        self.rules = {rule.id: rule for rule in rules}
+        self._index: Dict[str, List[AchievementRule]] = {}
+        for rule in rules:
+            self._index.setdefault(rule.event, []).append(rule)
+        self._queue: 'queue.Queue[Event]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        return db
+
+    def subscribe(self, bus: EventBus) -> None:
+        """Listen on the bus for every event type a counter or rule uses"""
+        for event_type in set(COUNTERS) | (set(self._index) - {ACHIEVEMENT_UNLOCKED}):
+            bus.subscribe(event_type, self.submit)
+
+    def submit(self, event: Event) -> None:
+        """Queue an event for the next batch"""
+        self._queue.put(event)
+        if not (self._thread and self._thread.is_alive()):
+            with self._thread_lock:
+                if not (self._thread and self._thread.is_alive()):
+                    self._thread = threading.Thread(target=self._run, name='achievements', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            events = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_SECONDS
+            while len(events) < MAX_EVENTS_PER_FLUSH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.process(events)
+            except Exception as e:
+                print(f"Achievement processing error ({len(events)} events): {e}")
+
+    def flush(self) -> int:
+        """Process everything queued now, in the caller's thread; returns the number of events"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            self.process(events)
+        return len(events)
+
+    def process(self, events: Sequence[Event]) -> Dict[str, List[str]]:
+        """Apply events and write the results; returns newly unlocked ids per user"""
+        by_user: Dict[str, List[Event]] = {}
+        for event in events:
+            by_user.setdefault(event.user_id, []).append(event)
+        user_ids = list(by_user)
+        unlocked: Dict[str, List[str]] = {}
+        for start in range(0, len(user_ids), MAX_USERS_PER_BATCH):
+            chunk = {user_id: by_user[user_id] for user_id in user_ids[start:start + MAX_USERS_PER_BATCH]}
+            unlocked.update(self._commit(chunk))
+        for user_id, ids in unlocked.items():
+            print(f"Achievements unlocked for {user_id}: {', '.join(ids)}")
+        return unlocked
+
+    def _commit(self, by_user: Dict[str, List[Event]]) -> Dict[str, List[str]]:
+        db = self._db()
+        progress = db.collection(COLLECTION)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            batch = db.batch()
+            unlocked: Dict[str, List[str]] = {}
+            writes = 0
+            for snap in db.get_all([progress.document(user_id) for user_id in by_user]):
+                result = self.evaluate((snap.to_dict() or {}) if snap.exists else {}, by_user[snap.id])
+                if result is None:
+                    continue
+                state, newly = result
+                if snap.exists:
+                    batch.update(snap.reference, state, option=db.write_option(last_update_time=snap.update_time))
+                else:
+                    batch.create(snap.reference, state)
+                writes += 1
+                if newly:
+                    batch.set(db.collection('users').document(snap.id),
+                              {'achievements': firestore.ArrayUnion(newly)}, merge=True)
+                    unlocked[snap.id] = newly
+            if not writes:
+                return {}
+            try:
+                batch.commit()
+                return unlocked
+            except (FailedPrecondition, AlreadyExists):
+                # Another worker updated one of these users; re-read and re-apply
+                if attempt == MAX_ATTEMPTS:
+                    raise
+        return {}
+
+    def evaluate(self, state: Dict[str, Any], events: Sequence[Event]) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        """New progress state and unlocked ids after events, or None if every event was already applied"""
+        counters = dict(state.get('counters') or {})
+        unlocked = dict(state.get('unlocked') or {})
+        recent = list(state.get('events') or [])
+        seen = set(recent)
+        newly: List[str] = []
+        for event in events:
+            if event.event_id in seen:
+                continue
+            seen.add(event.event_id)
+            recent.append(event.event_id)
+            for name, amount in COUNTERS.get(event.type, lambda e: {})(event).items():
+                counters[name] = counters.get(name, 0) + amount
+            newly.extend(self._check(event.type, event, counters, unlocked))
+        if len(recent) == len(state.get('events') or []):
+            return None
+        if newly:
+            counters['unlocked'] = len(unlocked)
+            newly.extend(self._check(ACHIEVEMENT_UNLOCKED, None, counters, unlocked))
+            counters['unlocked'] = len(unlocked)
+        return {
+            'counters': counters,
+            'unlocked': unlocked,
+            'points': sum(self.rules[rule_id].points for rule_id in unlocked if rule_id in self.rules),
+            'events': recent[-RECENT_EVENTS:],
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }, newly
+
+    def _check(self, event_type: str, event: Optional[Event], counters: Dict[str, int],
+               unlocked: Dict[str, Any]) -> List[str]:
+        newly = []
+        for rule in self._index.get(event_type, ()):
+            if rule.id in unlocked:
+                continue
+            if rule.counter and counters.get(rule.counter, 0) < rule.target:
+                continue
+            if rule.when and not rule.when(event):
+                continue
+            unlocked[rule.id] = datetime.now(timezone.utc)
+            newly.append(rule.id)
+        return newly
+
+    def progress(self, user_id: str) -> Dict[str, Any]:
+        """Unlocked achievements and progress towards counter-based ones"""
+        doc = self._db().collection(COLLECTION).document(user_id).get()
+        state = (doc.to_dict() or {}) if doc.exists else {}
+        counters = state.get('counters') or {}
+        unlocked = state.get('unlocked') or {}
+        items = []
+        for rule in self.rules.values():
+            item = self.describe(rule)
+            unlocked_at = unlocked.get(rule.id)
+            item['unlocked'] = unlocked_at is not None
+            item['unlockedAt'] = unlocked_at.isoformat() if isinstance(unlocked_at, datetime) else None
+            if rule.counter:
+                item['progress'] = min(counters.get(rule.counter, 0), rule.target)
+                item['maxProgress'] = rule.target
+            items.append(item)
+        return {'points': state.get('points', 0), 'unlockedCount': len(unlocked), 'achievements': items}
+
+    @staticmethod
+    def describe(rule: AchievementRule) -> Dict[str, Any]:
+        return {'id': rule.id, 'name': rule.name, 'description': rule.description,
+                'icon': rule.icon, 'points': rule.points}
@@ -0,0 +1,254 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+
+from services.achievement_service import COLLECTION as ACHIEVEMENT_COLLECTION
+from services.ledger import Ledger
+
+STREAKS_COLLECTION = 'dailyStreaks'
+CLAIMS_COLLECTION = 'bonusClaims'
+
+# Users who claimed within this many days are walked by the nightly job
+ACTIVE_DAYS = 14
+# Streak documents per page of the nightly job (one write each, plus reads of
+# the same number of progress documents)
+PAGE_SIZE = 400
+
+class BonusError(Exception):
+    """Raised when a bonus cannot be claimed or evaluated"""
+
+def claim_id(user_id: str, day: str) -> str:
+    """Idempotency key of a user's claim for a day"""
+    return f'{user_id}_{day}'
+
+class BonusService:
+    """Daily bonus claims and streaks.
+
+    Days are counted in STATS_UTC_OFFSET_HOURS (East Africa Time), not the
+    browser's timezone. A claim reads the user's ``dailyStreaks`` document
+    and commits a single batch holding ``bonusClaims/{uid}_{day}`` (created
+    with ``create()``, the idempotency key), the streak update and, when the
+    user qualifies, the wallet credit through the Ledger
+    (``ledger/bonus_{uid}_{day}``). Two racing claims for the same day cannot
+    both commit, so a bonus is paid at most once per user-day.
+
+    A user qualifies after claiming on DAILY_BONUS_MIN_DAYS days and playing
+    DAILY_BONUS_MIN_GAMES games (counted by the server in
+    ``achievementProgress``). The nightly job resets broken streaks and sets
+    ``gamesQualified`` ahead of time, so most claims need no extra read.
+    """
+
+    def __init__(self, firebase_manager, ledger: Ledger, amount: float = 5.0, min_days: int = 3,
+                 min_games: int = 1, utc_offset_hours: float = 3.0):
+        self.firebase_manager = firebase_manager
+        self.ledger = ledger
+        self.amount = amount
+        self.min_days = min_days
+        self.min_games = min_games
+        self.offset = timedelta(hours=utc_offset_hours)
+
+    @classmethod
+    def from_config(cls, firebase_manager, ledger: Ledger, config) -> 'BonusService':
+        return cls(firebase_manager, ledger, config.DAILY_BONUS_AMOUNT, config.DAILY_BONUS_MIN_DAYS,
+                   config.DAILY_BONUS_MIN_GAMES, config.STATS_UTC_OFFSET_HOURS)
+
+    def configure(self, config) -> None:
+        """Apply reloaded DAILY_BONUS_* settings"""
+        self.amount = config.DAILY_BONUS_AMOUNT
+        self.min_days = config.DAILY_BONUS_MIN_DAYS
+        self.min_games = config.DAILY_BONUS_MIN_GAMES
+        self.offset = timedelta(hours=config.STATS_UTC_OFFSET_HOURS)
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise BonusError('Database unavailable')
+        return db
+
+    def today(self) -> date:
+        return (datetime.now(timezone.utc) + self.offset).date()
+
+    @staticmethod
+    def next_streak(streak: Dict[str, Any], day: date) -> int:
+        """Streak after a claim on day"""
+        if streak.get('lastClaimDay') == (day - timedelta(days=1)).isoformat():
+            return int(streak.get('currentStreak') or 0) + 1
+        return 1
+
+    def _games_qualified(self, db, user_id: str, streak: Dict[str, Any]) -> bool:
+        if streak.get('gamesQualified') or self.min_games <= 0:
+            return True
+        progress = db.collection(ACHIEVEMENT_COLLECTION).document(user_id).get()
+        played = ((progress.to_dict() or {}).get('counters') or {}).get('played', 0) if progress.exists else 0
+        return played >= self.min_games
+
+    def status(self, user_id: str) -> Dict[str, Any]:
+        """Whether the user can claim today and how far they are from qualifying"""
+        db = self._db()
+        day = self.today()
+        doc = db.collection(STREAKS_COLLECTION).document(user_id).get()
+        streak = (doc.to_dict() or {}) if doc.exists else {}
+        days = int(streak.get('totalDaysPlayed') or 0)
+        claimed = streak.get('lastClaimDay') == day.isoformat()
+        current = int(streak.get('currentStreak') or 0)
+        if not claimed and streak.get('lastClaimDay') != (day - timedelta(days=1)).isoformat():
+            current = 0
+        return {
+            'day': day.isoformat(),
+            'canClaim': not claimed,
+            'claimedToday': claimed,
+            'currentStreak': current,
+            'longestStreak': int(streak.get('longestStreak') or 0),
+            'totalDaysPlayed': days,
+            'gamesQualified': self._games_qualified(db, user_id, streak),
+            'daysRequired': self.min_days,
+            'bonusEarned': float(streak.get('bonusEarned') or 0),
+            'amount': self.amount
+        }
+
+    def claim(self, user_id: str) -> Dict[str, Any]:
+        """Record today's check-in and pay the bonus if the user qualifies.
+
+        Returns the outcome; ``alreadyClaimed`` is True (and nothing is
+        written) if today was claimed before.
+        """
+        db = self._db()
+        day = self.today()
+        day_id = day.isoformat()
+        streak_ref = db.collection(STREAKS_COLLECTION).document(user_id)
+        doc = streak_ref.get()
+        streak = (doc.to_dict() or {}) if doc.exists else {}
+        if streak.get('lastClaimDay') == day_id:
+            return self._result(day_id, False, 0, int(streak.get('currentStreak') or 0), True)
+
+        current = self.next_streak(streak, day)
+        days = int(streak.get('totalDaysPlayed') or 0) + 1
+        games_qualified = self._games_qualified(db, user_id, streak)
+        qualified = games_qualified and days >= self.min_days and self.amount > 0
+        amount = self.amount if qualified else 0
+
+        key = claim_id(user_id, day_id)
+        batch = db.batch()
+        batch.create(db.collection(CLAIMS_COLLECTION).document(key), {
+            'userId': user_id,
+            'day': day_id,
+            'streak': current,
+            'amount': amount,
+            'createdAt': firestore.SERVER_TIMESTAMP
+        })
+        batch.set(streak_ref, {
+            'userId': user_id,
+            'currentStreak': current,
+            'longestStreak': max(int(streak.get('longestStreak') or 0), current),
+            'lastClaimDay': day_id,
+            'lastPlayDate': firestore.SERVER_TIMESTAMP,
+            'totalDaysPlayed': firestore.Increment(1),
+            'bonusEarned': firestore.Increment(amount),
+            'gamesQualified': games_qualified,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+
+        try:
+            if qualified:
+                batch.set(db.collection('transactions').document(f'bonus_{key}'), {
+                    'userId': user_id,
+                    'type': 'bonus',
+                    'amount': amount,
+                    'currency': 'ETB',
+                    'status': 'completed',
+                    'description': f'Daily bonus ({current}-day streak)',
+                    'metadata': {'day': day_id, 'streak': current, 'source': 'daily_bonus'},
+                    'createdAt': firestore.SERVER_TIMESTAMP
+                })
+                if not self.ledger.post(f'bonus_{key}', user_id, amount, 'bonus', {'day': day_id}, batch=batch):
+                    return self._result(day_id, False, 0, current, True)
+            else:
+                batch.commit()
+        except AlreadyExists:
+            return self._result(day_id, False, 0, current, True)
+
+        return self._result(day_id, qualified, amount, current, False, days)
+
+    def _result(self, day: str, awarded: bool, amount: float, streak: int, already: bool,
+                days: Optional[int] = None) -> Dict[str, Any]:
+        if already:
+            message = 'You have already checked in today.'
+        elif awarded:
+            message = f'Daily bonus awarded! +{amount:g} ETB'
+        else:
+            message = (f'Checked in ({days}/{self.min_days} days). Play at least {self.min_games} game(s) '
+                       f'and check in on {self.min_days} days to qualify for the daily bonus.')
+        return {'day': day, 'awarded': awarded, 'amount': amount, 'streak': streak,
+                'alreadyClaimed': already, 'message': message}
+
+    def evaluate(self, max_pages: Optional[int] = None) -> Dict[str, int]:
+        """Nightly pass over recently active users: reset broken streaks and pre-qualify.
+
+        Walks ``dailyStreaks`` claimed within ACTIVE_DAYS in pages. Each
+        page is one get_all of the players' progress and one batch, written
+        with update-time preconditions; a page that races a claim is read
+        and applied again.
+        """
+        db = self._db()
+        day = self.today()
+        yesterday = (day - timedelta(days=1)).isoformat()
+        since = (day - timedelta(days=ACTIVE_DAYS)).isoformat()
+        collection = db.collection(STREAKS_COLLECTION)
+        counts = {'users': 0, 'reset': 0, 'qualified': 0, 'pages': 0}
+        last = None
+        while max_pages is None or counts['pages'] < max_pages:
+            query = (collection.where('lastClaimDay', '>=', since)
+                     .order_by('lastClaimDay')
+                     .order_by('__name__')
+                     .limit(PAGE_SIZE))
+            if last is not None:
+                query = query.start_after({'lastClaimDay': last.get('lastClaimDay'), '__name__': last.reference})
+            docs = list(query.stream())
+            if not docs:
+                break
+            for attempt in range(2):
+                try:
+                    reset, qualified = self._evaluate_page(db, docs, yesterday)
+                    break
+                except (FailedPrecondition, NotFound):
+                    if attempt:
+                        raise
+                    docs = [doc for doc in db.get_all([doc.reference for doc in docs]) if doc.exists]
+            counts['users'] += len(docs)
+            counts['reset'] += reset
+            counts['qualified'] += qualified
+            counts['pages'] += 1
+            last = docs[-1]
+            if len(docs) < PAGE_SIZE:
+                break
+        print(f"Bonus evaluation for {day.isoformat()}: {counts}")
+        return counts
+
+    def _evaluate_page(self, db, docs: List[Any], yesterday: str):
+        pending = [doc for doc in docs if not doc.get('gamesQualified')]
+        played: Dict[str, float] = {}
+        if pending and self.min_games > 0:
+            refs = [db.collection(ACHIEVEMENT_COLLECTION).document(doc.id) for doc in pending]
+            played = {snap.id: ((snap.to_dict() or {}).get('counters') or {}).get('played', 0)
+                      for snap in db.get_all(refs) if snap.exists}
+
+        batch = db.batch()
+        writes = reset = qualified = 0
+        for doc in docs:
+            data = doc.to_dict() or {}
+            update: Dict[str, Any] = {}
+            if data.get('lastClaimDay', '') < yesterday and data.get('currentStreak'):
+                update['currentStreak'] = 0
+                reset += 1
+            if not data.get('gamesQualified') and (self.min_games <= 0 or played.get(doc.id, 0) >= self.min_games):
+                update['gamesQualified'] = True
+                qualified += 1
+            if update:
+                update['updatedAt'] = firestore.SERVER_TIMESTAMP
+                batch.update(doc.reference, update, option=db.write_option(last_update_time=doc.update_time))
+                writes += 1
+        if writes:
+            batch.commit()
+        return reset, qualified
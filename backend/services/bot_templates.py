@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict, Tuple
+
+if TYPE_CHECKING:
+    from telegram import InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+BOT_TEXTS = {
+    'welcome': {
+        'en': '👋 Welcome, {name}!\nThis is the Bingo Game Bot. Use the menu below to get started.',
+        'am': '👋 እንኳን ደህና መጡ {name}! ይህ የቢንጎ ጨዋታ ቦት ነው። ለመጀመር ዝርዝሩን ይጠቀሙ።'
+    },
+    'profile_btn': {'en': '👤 Profile', 'am': '👤 መገለጫ'},
+    'wallet_btn': {'en': '💰 Wallet', 'am': '💰 ቦሌት'},
+    'achievements_btn': {'en': '🏆 Achievements', 'am': '🏆 ሽልማቶች'},
+    'language_btn': {'en': '🌐 Language', 'am': '🌐 ቋንቋ'},
+    'support_btn': {'en': '🆘 Support', 'am': '🆘 ድጋፍ'},
+    'help': {
+        'en': 'Use the menu or type /profile, /wallet, /achievements, /leaderboard, /language, /support, /register.',
+        'am': 'ዝርዝሩን ይጠቀሙ ወይም /profile, /wallet, /achievements, /leaderboard, /language, /support, /register ይተይቡ።'
+    },
+    'register_instruction': {
+        'en': '📱 To register your phone number, please share your contact information. This helps us verify your account and provide better service.',
+        'am': '📱 የስልክ ቁጥርዎን ለመመዝገብ እባክዎን የእርስዎን አድራሻ ያጋሩ። ይህ መለያዎን ለመረጋገጥ እና የተሻለ አገልግሎት ለመስጠት ያገለግለናል።'
+    },
+    'share_phone': {
+        'en': '📱 Share Phone Number',
+        'am': '📱 የስልክ ቁጥር ያጋሩ'
+    },
+    'share_phone_prompt': {
+        'en': '📱 Please tap the button below to share your phone number:',
+        'am': '📱 የስልክ ቁጥርዎን ለመጋራት እባክዎን ከታች ያለውን ቁልፍ ይጫኑ:'
+    },
+    'phone_registered_success': {
+        'en': '✅ Phone number registered successfully! You can now use all bot features.',
+        'am': '✅ የስልክ ቁጥር በተሳካት ሁኔታ ተመዝግቧል! አሁን ሁሉንም የቦት ባህሪያት መጠቀም ይችላሉ።'
+    },
+    'invalid_contact': {
+        'en': '❌ Invalid contact. Please share your own phone number.',
+        'am': '❌ የማያገለግል አድራሻ። እባክዎን የራስዎን የስልክ ቁጥር ያጋሩ።'
+    },
+    'database_error': {
+        'en': '❌ Database error. Please try again later.',
+        'am': '❌ የዳታቤዝ ስህተት። እባክዎን በኋላ ዳግም ይሞክሩ።'
+    },
+    'profile': {
+        'en': '👤 Name: {name}\nLevel: {level}\nGames: {games}\nWins: {wins}\nAchievements: {achievements}',
+        'am': '👤 ስም: {name}\nደረጃ: {level}\nጨዋታዎች: {games}\nአሸናፊዎች: {wins}\nሽልማቶች: {achievements}'
+    },
+    'profile_not_found': {'en': 'Profile not found. Please register on the web app.', 'am': 'መገለጫ አልተገኘም። እባክዎን በድህረ ገጹ ይመዝገቡ።'},
+    'balance': {'en': '💰 Your wallet balance: {balance} ETB', 'am': '💰 የእርስዎ ቦሌት ሂሳብ: {balance} ብር'},
+    'wallet_not_found': {'en': 'No wallet found. Please register on the web app.', 'am': 'ቦሌት አልተገኘም። እባክዎን በድህረ ገጹ ይመዝገቡ።'},
+    'achievements': {'en': '🏆 Your Achievements:', 'am': '🏆 የእርስዎ ሽልማቶች:'},
+    'no_achievements': {'en': 'No achievements yet.', 'am': 'ምንም ሽልማት የለም።'},
+    'achievement_points': {'en': 'Points: {points}', 'am': 'ነጥቦች: {points}'},
+    'leaderboard_title': {'en': '🏅 Top players ({board})', 'am': '🏅 ምርጥ ተጫዋቾች ({board})'},
+    'leaderboard_entry': {
+        'en': '{rank}. {name} - {earnings:,.2f} ETB ({wins} wins)',
+        'am': '{rank}. {name} - {earnings:,.2f} ብር ({wins} ድሎች)'
+    },
+    'leaderboard_rank': {'en': 'Your rank: #{rank} of {size}', 'am': 'የእርስዎ ደረጃ: #{rank} ከ {size}'},
+    'leaderboard_empty': {'en': 'No winners on this leaderboard yet.', 'am': 'በዚህ ደረጃ ሰንጠረዥ ላይ እስካሁን አሸናፊ የለም።'},
+    'leaderboard_usage': {'en': 'Usage: /leaderboard [daily|weekly|all]', 'am': 'አጠቃቀም: /leaderboard [daily|weekly|all]'},
+    'choose_language': {'en': 'Choose your language:', 'am': 'ቋንቋዎን ይምረጡ።'},
+    'language_set': {'en': 'Language updated!', 'am': 'ቋንቋ ተቀይሯል!'},
+    'support': {'en': 'For support, contact @YourSupportUsername.', 'am': 'ለድጋፍ እባክዎን @YourSupportUsername ያነጋግሩ።'},
+    'unknown_command': {'en': 'Unknown command. Use the menu or /help.', 'am': 'ያልታወቀ ትእዛዝ። ዝርዝሩን ይጠቀሙ ወይም /help ይተይቡ።'}
+}
+
+class BotTemplates:
+    """Per-language cache of bot texts and static keyboards.
+
+    Texts resolve their English fallback once and keyboards are built once per
+    (name, language); handlers only substitute per-user fields.
+    """
+
+    def __init__(self, supported_languages: Dict[str, str]):
+        self.supported_languages = supported_languages
+        self._texts: Dict[Tuple[str, str], str] = {}
+        self._keyboards: Dict[Tuple[str, str], object] = {}
+        self._builders: Dict[str, Callable[[str], object]] = {
+            'main_menu': self._build_main_menu,
+            'register': self._build_register,
+            'languages': self._build_languages,
+            'share_contact': self._build_share_contact,
+        }
+        for lang in supported_languages:
+            for key in BOT_TEXTS:
+                self.text(key, lang)
+            for name in self._builders:
+                self.keyboard(name, lang)
+
+    def text(self, key: str, lang: str) -> str:
+        """Static text for (key, lang), falling back to English"""
+        cache_key = (key, lang)
+        text = self._texts.get(cache_key)
+        if text is None:
+            variants = BOT_TEXTS.get(key, {})
+            text = variants.get(lang, variants.get('en', ''))
+            self._texts[cache_key] = text
+        return text
+
+    def render(self, key: str, lang: str, **fields) -> str:
+        """Text for (key, lang) with per-user fields substituted"""
+        return self.text(key, lang).format(**fields)
+
+    def keyboard(self, name: str, lang: str):
+        """Prebuilt keyboard markup for (name, lang)"""
+        cache_key = (name, lang)
+        markup = self._keyboards.get(cache_key)
+        if markup is None:
+            markup = self._builders[name](lang)
+            self._keyboards[cache_key] = markup
+        return markup
+
+    # python-telegram-bot is imported by the builders, not at module load, so
+    # importing the texts does not pull in the bot library
+
+    def _build_main_menu(self, lang: str) -> InlineKeyboardMarkup:
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton(self.text('profile_btn', lang), callback_data='profile')],
+            [InlineKeyboardButton(self.text('wallet_btn', lang), callback_data='wallet')],
+            [InlineKeyboardButton(self.text('achievements_btn', lang), callback_data='achievements')],
+            [InlineKeyboardButton(self.text('language_btn', lang), callback_data='language')],
+            [InlineKeyboardButton(self.text('support_btn', lang), callback_data='support')],
+        ])
+
+    def _build_register(self, lang: str) -> InlineKeyboardMarkup:
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton(self.text('share_phone', lang), callback_data='request_contact')]
+        ])
+
+    def _build_languages(self, lang: str) -> InlineKeyboardMarkup:
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        return InlineKeyboardMarkup([[InlineKeyboardButton(name, callback_data=f'lang_{code}')]
+                                     for code, name in self.supported_languages.items()])
+
+    def _build_share_contact(self, lang: str) -> ReplyKeyboardMarkup:
+        from telegram import KeyboardButton, ReplyKeyboardMarkup
+        # Contact sharing is only available on reply keyboards
+        return ReplyKeyboardMarkup(
+            [[KeyboardButton(self.text('share_phone', lang), request_contact=True)]],
+            resize_keyboard=True,
+            one_time_keyboard=True
+        )
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry"""
+
+    _MISSING = object()
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None, allow_stale: bool = False) -> Any:
+        """Return the cached value, or default when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if not allow_stale and expires_at < time.monotonic():
+            return default
+        return value
+
+    def is_fresh(self, key: Hashable) -> bool:
+        """Check whether a key holds a value that has not expired yet"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for ttl seconds (defaults to the cache ttl)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict()
+            self._entries[key] = (expires_at, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return a fresh cached value or load, store and return a new one"""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single key"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self) -> None:
+        # Drop expired entries first, then the oldest tenth if still full
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._entries.items() if expires_at < now]
+        for key in expired:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            oldest = sorted(self._entries.items(), key=lambda item: item[1][0])
+            for key, _ in oldest[:max(1, self.max_entries // 10)]:
+                del self._entries[key]
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from database.firebase import firestore
+
+# Bingo columns: B 1-15, I 16-30, N 31-45, G 46-60, O 61-75
+LETTERS = 'BINGO'
+ALL_CALLS = tuple(f'{LETTERS[(n - 1) // 15]}-{n}' for n in range(1, 76))
+_CALL_PATTERN = re.compile(r'^([BINGO])-?(\d{1,2})$')
+
+# How each letter is spoken; the number is left to the voice
+LETTER_NAMES = {
+    'en': {letter: letter for letter in LETTERS},
+    'am': {'B': 'ቢ', 'I': 'አይ', 'N': 'ኤን', 'G': 'ጂ', 'O': 'ኦ'},
+}
+
+# Bump to re-render every clip (changes every render key)
+RENDER_VERSION = 1
+AUDIO_FORMAT = 'mp3'
+AUDIO_MIMETYPE = 'audio/mpeg'
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+FILE_ID_COLLECTION = 'telegramAudioFiles'
+
+class AudioError(ValueError):
+    """Raised for unknown calls, languages or voices, or when synthesis fails"""
+
+def normalize_call(call: str) -> str:
+    """'b12', 'B12' or 'B-12' -> 'B-12'; rejects numbers outside the letter's column"""
+    match = _CALL_PATTERN.match((call or '').strip().upper())
+    if not match:
+        raise AudioError(f'Invalid call: {call!r}')
+    letter, number = match.group(1), int(match.group(2))
+    if not 1 <= number <= 75 or LETTERS[(number - 1) // 15] != letter:
+        raise AudioError(f'Invalid call: {call!r}')
+    return f'{letter}-{number}'
+
+def phrase(call: str, language: str) -> str:
+    """Text spoken for a call, e.g. 'B, 12.'"""
+    letter, number = call.split('-')
+    return f'{LETTER_NAMES[language][letter]}, {number}.'
+
+class PlayHTSynthesizer:
+    """Renders text with the PlayHT streaming TTS API"""
+
+    URL = 'https://api.play.ht/api/v2/tts/stream'
+
+    def __init__(self, api_key: str, user_id: str, timeout: float = 30):
+        self.api_key = api_key
+        self.user_id = user_id
+        self.timeout = timeout
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        response = requests.post(self.URL, json={
+            'text': text,
+            'voice': voice,
+            'output_format': AUDIO_FORMAT,
+            'voice_engine': 'PlayHT2.0'
+        }, headers={
+            'AUTHORIZATION': self.api_key,
+            'X-USER-ID': self.user_id,
+            'accept': AUDIO_MIMETYPE
+        }, timeout=self.timeout)
+        if response.status_code != 200 or not response.content:
+            raise AudioError(f'PlayHT returned HTTP {response.status_code}: {response.text[:200]}')
+        return response.content
+
+class CallAudioCache:
+    """Content-addressed on-disk cache of spoken number calls.
+
+    The set of clips is finite (75 calls per language and voice), so each is
+    synthesized once and kept forever. Audio is stored under the SHA-256 of
+    its bytes (``objects/ab/abcd....mp3``), which doubles as a strong ETag
+    and an immutable URL; ``keys/<render key>`` maps a (call, language,
+    voice, render version) to that digest. Files are written to a temporary
+    name and renamed, so concurrent workers sharing the directory never see a
+    partial clip.
+    """
+
+    def __init__(self, cache_dir: str, voices: Dict[str, str], languages: Iterable[str], synthesizer=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.voices = dict(voices)
+        self.languages = tuple(lang for lang in languages if lang in LETTER_NAMES)
+        self.synthesizer = synthesizer
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._digests: Dict[str, str] = {}
+
+    @classmethod
+    def from_config(cls, config) -> 'CallAudioCache':
+        synthesizer = None
+        if config.PLAYHT_API_KEY and config.PLAYHT_USER_ID:
+            synthesizer = PlayHTSynthesizer(config.PLAYHT_API_KEY, config.PLAYHT_USER_ID)
+        return cls(config.TTS_CACHE_DIR, dict(config.TTS_VOICES), config.TTS_LANGUAGES, synthesizer)
+
+    @property
+    def default_voice(self) -> Optional[str]:
+        return next(iter(self.voices), None)
+
+    def resolve(self, call: str, language: str, voice: Optional[str] = None) -> Tuple[str, str, str]:
+        """Validate and normalize (call, language, voice alias)"""
+        voice = voice or self.default_voice
+        if language not in self.languages:
+            raise AudioError(f'Unsupported language: {language!r}')
+        if voice not in self.voices:
+            raise AudioError(f'Unknown voice: {voice!r}')
+        return normalize_call(call), language, voice
+
+    def render_key(self, call: str, language: str, voice: str) -> str:
+        spec = f'{RENDER_VERSION}|{self.voices[voice]}|{language}|{phrase(call, language)}|{AUDIO_FORMAT}'
+        return hashlib.sha256(spec.encode()).hexdigest()
+
+    def path_for(self, digest: str) -> str:
+        if not _DIGEST_PATTERN.match(digest):
+            raise AudioError('Invalid clip digest')
+        return os.path.join(self.cache_dir, 'objects', digest[:2], f'{digest}.{AUDIO_FORMAT}')
+
+    def lookup(self, call: str, language: str, voice: str) -> Optional[str]:
+        """Digest of an already rendered clip, without synthesizing"""
+        key = self.render_key(call, language, voice)
+        digest = self._digests.get(key)
+        if digest:
+            return digest
+        try:
+            with open(os.path.join(self.cache_dir, 'keys', key)) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(self.path_for(digest)):
+            return None
+        self._digests[key] = digest
+        return digest
+
+    def get(self, call: str, language: str, voice: str) -> str:
+        """Digest of the clip, synthesizing it on first use"""
+        digest = self.lookup(call, language, voice)
+        if digest:
+            return digest
+        key = self.render_key(call, language, voice)
+        with self._lock_for(key):
+            # Another thread may have rendered it while we waited
+            digest = self.lookup(call, language, voice)
+            if digest:
+                return digest
+            if not self.synthesizer:
+                raise AudioError('Text-to-speech is not configured')
+            audio = self.synthesizer.synthesize(phrase(call, language), self.voices[voice])
+            digest = hashlib.sha256(audio).hexdigest()
+            self._write(self.path_for(digest), audio)
+            self._write(os.path.join(self.cache_dir, 'keys', key), digest.encode())
+            self._digests[key] = digest
+            return digest
+
+    def manifest(self, language: str, voice: str) -> Dict[str, Optional[str]]:
+        """Digest of every call for a language and voice (None if not rendered yet)"""
+        return {call: self.lookup(call, language, voice) for call in ALL_CALLS}
+
+    def prerender(self, languages: Optional[Iterable[str]] = None, voices: Optional[Iterable[str]] = None,
+                  concurrency: int = 4) -> Dict[str, int]:
+        """Render every missing clip; returns counts of cached, rendered and failed clips"""
+        jobs = [(call, language, voice)
+                for language in (languages or self.languages)
+                for voice in (voices or self.voices)
+                for call in ALL_CALLS]
+        counts = {'cached': 0, 'rendered': 0, 'failed': 0}
+        missing = []
+        for job in jobs:
+            if self.lookup(*self.resolve(*job)):
+                counts['cached'] += 1
+            else:
+                missing.append(job)
+
+        def render(job):
+            try:
+                self.get(*job)
+                return 'rendered'
+            except Exception as e:
+                print(f"Error rendering {job}: {e}")
+                return 'failed'
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tts') as pool:
+            for outcome in pool.map(render, missing):
+                counts[outcome] += 1
+        return counts
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+class TelegramFileIds:
+    """Telegram file_ids of uploaded files, so each file is uploaded once per bot.
+
+    Kept in memory and in ``{collection}/{botId}_{digest}`` (voice clips
+    by default); file_ids are only valid for the bot that uploaded them.
+    """
+
+    def __init__(self, firebase_manager, bot_token: Optional[str], collection: str = FILE_ID_COLLECTION):
+        self.firebase_manager = firebase_manager
+        self.bot_id = (bot_token or '').split(':')[0]
+        self.collection = collection
+        self._file_ids: Dict[str, str] = {}
+
+    def _ref(self, digest: str):
+        db = self.firebase_manager.get_db()
+        return db.collection(self.collection).document(f'{self.bot_id}_{digest}') if db else None
+
+    def get(self, digest: str) -> Optional[str]:
+        file_id = self._file_ids.get(digest)
+        if file_id is None:
+            ref = self._ref(digest)
+            doc = ref.get() if ref else None
+            if doc is not None and doc.exists:
+                file_id = doc.to_dict().get('fileId')
+                self._file_ids[digest] = file_id
+        return file_id
+
+    def get_many(self, digests: Iterable[str]) -> Dict[str, str]:
+        """file_ids of the digests that have one, with one batched read for those not in memory"""
+        digests = list(digests)
+        found = {digest: self._file_ids[digest] for digest in digests if digest in self._file_ids}
+        missing = [digest for digest in set(digests) if digest not in found]
+        db = self.firebase_manager.get_db() if missing else None
+        if db:
+            refs = [db.collection(self.collection).document(f'{self.bot_id}_{digest}') for digest in missing]
+            for doc in db.get_all(refs):
+                file_id = doc.to_dict().get('fileId') if doc.exists else None
+                if file_id:
+                    digest = doc.id.split('_', 1)[1]
+                    self._file_ids[digest] = found[digest] = file_id
+        return found
+
+    def remember(self, digest: str, file_id: str) -> None:
+        self._file_ids[digest] = file_id
+        ref = self._ref(digest)
+        if ref:
+            ref.set({'fileId': file_id, 'createdAt': firestore.SERVER_TIMESTAMP})
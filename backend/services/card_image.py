@@ -0,0 +1,172 @@
+import hashlib
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+from services.win_engine import CELL_COUNT, COLUMNS, FREE_SPACE
+
+TILE = 48
+WIDTH = TILE * 5
+# A header row with the column letters, then the 5x5 grid
+HEIGHT = TILE * 6
+# Canvases kept per process for incremental re-rendering (WIDTH * HEIGHT bytes each)
+MAX_CANVASES = 500
+
+# Palette indexes of the 8-bit indexed PNG
+_BACKGROUND, _GRID, _INK, _MARKED, _MARKED_INK, _HEADER, _HEADER_INK, _FREE = range(8)
+_PALETTE = bytes((
+    255, 255, 255,
+    203, 213, 225,
+    30, 41, 59,
+    22, 163, 74,
+    255, 255, 255,
+    124, 58, 237,
+    255, 255, 255,
+    250, 204, 21,
+))
+
+# 5x7 bitmap glyphs (the star marks the free space)
+_FONT = {
+    '0': ('01110', '10001', '10011', '10101', '11001', '10001', '01110'),
+    '1': ('00100', '01100', '00100', '00100', '00100', '00100', '01110'),
+    '2': ('01110', '10001', '00001', '00010', '00100', '01000', '11111'),
+    '3': ('11110', '00001', '00001', '01110', '00001', '00001', '11110'),
+    '4': ('00010', '00110', '01010', '10010', '11111', '00010', '00010'),
+    '5': ('11111', '10000', '11110', '00001', '00001', '10001', '01110'),
+    '6': ('00110', '01000', '10000', '11110', '10001', '10001', '01110'),
+    '7': ('11111', '00001', '00010', '00100', '01000', '01000', '01000'),
+    '8': ('01110', '10001', '10001', '01110', '10001', '10001', '01110'),
+    '9': ('01110', '10001', '10001', '01111', '00001', '00010', '01100'),
+    'B': ('11110', '10001', '10001', '11110', '10001', '10001', '11110'),
+    'I': ('01110', '00100', '00100', '00100', '00100', '00100', '01110'),
+    'N': ('10001', '11001', '10101', '10011', '10001', '10001', '10001'),
+    'G': ('01110', '10001', '10000', '10111', '10001', '10001', '01111'),
+    'O': ('01110', '10001', '10001', '10001', '10001', '10001', '01110'),
+    '*': ('00100', '00100', '11111', '01110', '01110', '11011', '10001'),
+}
+_GLYPH_SCALE = 3
+
+def _tile(text: str, fill: int, ink: int) -> Tuple[bytes, ...]:
+    """One TILE x TILE cell: a one-pixel grid border, fill, and the text centred"""
+    rows = [bytearray([_GRID]) + bytearray([fill]) * (TILE - 2) + bytearray([_GRID]) for _ in range(TILE)]
+    rows[0] = rows[-1] = bytearray([_GRID]) * TILE
+    glyph_width, glyph_height = 5 * _GLYPH_SCALE, 7 * _GLYPH_SCALE
+    spacing = _GLYPH_SCALE
+    left = (TILE - (len(text) * glyph_width + (len(text) - 1) * spacing)) // 2
+    top = (TILE - glyph_height) // 2
+    for position, char in enumerate(text):
+        x0 = left + position * (glyph_width + spacing)
+        for gy, line in enumerate(_FONT[char]):
+            for gx, bit in enumerate(line):
+                if bit == '1':
+                    for dy in range(_GLYPH_SCALE):
+                        row = rows[top + gy * _GLYPH_SCALE + dy]
+                        start = x0 + gx * _GLYPH_SCALE
+                        row[start:start + _GLYPH_SCALE] = bytes([ink]) * _GLYPH_SCALE
+    return tuple(bytes(row) for row in rows)
+
+class GlyphAtlas:
+    """Every tile a card can show, rasterized once: numbers 1-75 marked and
+    unmarked, the free space and the BINGO header letters"""
+
+    def __init__(self):
+        self.numbers: Dict[Tuple[int, bool], Tuple[bytes, ...]] = {}
+        for number in range(1, 76):
+            self.numbers[(number, False)] = _tile(str(number), _BACKGROUND, _INK)
+            self.numbers[(number, True)] = _tile(str(number), _MARKED, _MARKED_INK)
+        self.free = _tile('*', _FREE, _INK)
+        self.headers = tuple(_tile(letter, _HEADER, _HEADER_INK) for letter in COLUMNS)
+
+    def cell(self, number: int, marked: bool) -> Tuple[bytes, ...]:
+        if number == FREE_SPACE:
+            return self.free
+        return self.numbers[(number, marked)]
+
+def encode_png(pixels: bytes, width: int, height: int, palette: bytes = _PALETTE) -> bytes:
+    """An 8-bit indexed PNG of width x height palette indexes"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    raw = b''.join(b'\x00' + pixels[y * width:(y + 1) * width] for y in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0))
+            + chunk(b'PLTE', palette)
+            + chunk(b'IDAT', zlib.compress(raw, 6))
+            + chunk(b'IEND', b''))
+
+class _Canvas:
+    __slots__ = ('numbers', 'mask', 'pixels', 'digest', 'png')
+
+    def __init__(self, numbers: Tuple[int, ...]):
+        self.numbers = numbers
+        self.mask: Optional[int] = None
+        self.pixels = bytearray(WIDTH * HEIGHT)
+        self.digest = ''
+        self.png = b''
+
+class CardRenderer:
+    """Draws bingo cards with their marks as small indexed PNGs.
+
+    Cells are copied from a GlyphAtlas rasterized at startup, so drawing is
+    only byte-slice copies. The last canvas of each card (keyed by the
+    caller, e.g. game and player) is kept, and a new mark mask re-draws just
+    the cells whose state flipped before the image is re-encoded. Images are
+    identified by the SHA-256 of their bytes, so an unchanged card yields
+    the same digest and an already uploaded image can be reused.
+    """
+
+    def __init__(self, max_canvases: int = MAX_CANVASES):
+        self.atlas = GlyphAtlas()
+        self.max_canvases = max_canvases
+        self._canvases: 'OrderedDict[str, _Canvas]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, key: str, numbers: Sequence[int], mask: int) -> Tuple[str, bytes]:
+        """(digest, PNG bytes) of a card (25 numbers, row-major) with the marks in mask"""
+        if len(numbers) != CELL_COUNT:
+            raise ValueError(f'Cards have {CELL_COUNT} cells')
+        numbers = tuple(int(number) for number in numbers)
+        with self._lock:
+            canvas = self._canvases.pop(key, None)
+            if canvas is None or canvas.numbers != numbers:
+                canvas = _Canvas(numbers)
+            self._canvases[key] = canvas
+            while len(self._canvases) > self.max_canvases:
+                self._canvases.popitem(last=False)
+
+        # Callers render one card from one thread at a time; the canvas is
+        # only mutated here
+        if canvas.mask == mask:
+            return canvas.digest, canvas.png
+        if canvas.mask is None:
+            for column, tile in enumerate(self.atlas.headers):
+                self._blit(canvas.pixels, tile, column * TILE, 0)
+            changed = (1 << CELL_COUNT) - 1
+        else:
+            changed = canvas.mask ^ mask
+        for index in range(CELL_COUNT):
+            if changed >> index & 1:
+                row, column = divmod(index, 5)
+                tile = self.atlas.cell(numbers[index], bool(mask >> index & 1))
+                self._blit(canvas.pixels, tile, column * TILE, (row + 1) * TILE)
+        canvas.mask = mask
+        canvas.png = encode_png(bytes(canvas.pixels), WIDTH, HEIGHT)
+        canvas.digest = hashlib.sha256(canvas.png).hexdigest()
+        return canvas.digest, canvas.png
+
+    @staticmethod
+    def _blit(pixels: bytearray, tile: Tuple[bytes, ...], x: int, y: int) -> None:
+        for offset, row in enumerate(tile):
+            start = (y + offset) * WIDTH + x
+            pixels[start:start + TILE] = row
+
+    def forget(self, prefix: str) -> None:
+        """Drop the canvases whose keys start with prefix (e.g. a finished game)"""
+        with self._lock:
+            for key in [key for key in self._canvases if key.startswith(prefix)]:
+                del self._canvases[key]
+
+def card_key(game_id: str, user_id: str) -> str:
+    return f'{game_id}/{user_id}'
@@ -1,8 +1,52 @@
 import requests
 import uuid
 import time
-from typing import Dict, Any, Optional
-from firebase_admin import firestore
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+# Normalized outcomes of a Chapa verify call
+VERIFY_SUCCESS = 'success'
+VERIFY_PENDING = 'pending'
+VERIFY_FAILED = 'failed'
+VERIFY_NOT_FOUND = 'not_found'
+VERIFY_RATE_LIMITED = 'rate_limited'
+VERIFY_ERROR = 'error'
+
+# Outcomes of submitting payouts (rate limits and errors use the VERIFY_ values)
+SUBMIT_ACCEPTED = 'accepted'
+# A transfer in the request is invalid (account, bank, amount); nothing was queued
+SUBMIT_REJECTED = 'rejected'
+# A reference was already used: an earlier submission reached Chapa
+SUBMIT_DUPLICATE = 'duplicate'
+# Refused for the merchant account (credentials, balance); nothing was queued
+SUBMIT_REFUSED = 'refused'
+
+# Validation answers from Chapa that say nothing about the transfers themselves
+_DUPLICATE_HINTS = ('already', 'duplicate', 'exist', 'used')
+_REFUSED_HINTS = ('balance', 'insufficient', 'unauthorized', 'api key', 'secret key')
+
+# Transfers per bulk transfer request (Chapa's limit)
+MAX_BULK_TRANSFERS = 100
+
+@dataclass
+class ChapaVerification:
+    """Result of verifying a tx_ref with Chapa"""
+    state: str
+    amount: float = 0.0
+    currency: Optional[str] = None
+    reference: Optional[str] = None
+    message: str = ''
+
+@dataclass
+class ChapaSubmission:
+    """Result of submitting a bulk transfer to Chapa.
+
+    VERIFY_ERROR means the outcome is unknown (Chapa may have queued the
+    transfers), so their references must be verified before resubmitting.
+    """
+    state: str
+    batch_id: Optional[str] = None
+    message: str = ''
 
 class ChapaService:
     """Chapa payment service"""
@@ -41,7 +85,8 @@ class ChapaService:
             response = requests.post(
                 f"{self.base_url}/transaction/initialize",
                 headers=headers,
-                json=payload
+                json=payload,
+                timeout=15
             )
             chapa_res = response.json()
             
@@ -62,60 +107,89 @@ class ChapaService:
         try:
             response = requests.get(
                 f"{self.base_url}/transaction/verify/{tx_ref}",
-                headers=headers
+                headers=headers,
+                timeout=10
             )
             return response.json()
         except Exception as e:
             raise Exception(f"Payment verification failed: {str(e)}")
-    
-    def process_payment_callback(self, data: Dict[str, Any], db) -> bool:
-        """Process payment callback from Chapa"""
+
+    def check_payment(self, tx_ref: str) -> ChapaVerification:
+        """Verify a payment and normalize the outcome; never raises"""
+        return self._check(f"{self.base_url}/transaction/verify/{tx_ref}")
+
+    def check_transfer(self, reference: str) -> ChapaVerification:
+        """Verify a payout by its reference and normalize the outcome; never raises"""
+        return self._check(f"{self.base_url}/transfers/verify/{reference}")
+
+    def bulk_transfer(self, title: str, transfers: List[Dict[str, Any]]) -> ChapaSubmission:
+        """Queue up to MAX_BULK_TRANSFERS payouts in one request; never raises.
+
+        Each transfer has account_name, account_number, amount, reference
+        and bank_code.
+        """
+        headers = {"Authorization": f"Bearer {self.secret_key}"}
         try:
-            tx_ref = data.get('tx_ref')
-            status = data.get('status')
-            amount = data.get('amount')
-            
-            if not all([tx_ref, status, amount]):
-                print(f"Incomplete payment data: {data}")
-                return False
-            
-            if status != 'success':
-                print(f"Payment failed for tx_ref: {tx_ref}")
-                return False
-            
-            # Update transaction status in database
-            transaction_ref = db.collection('transactions').where('tx_ref', '==', tx_ref).limit(1)
-            transactions = transaction_ref.stream()
-            
-            for transaction in transactions:
-                transaction_data = transaction.to_dict()
-                user_id = transaction_data.get('userId')
-                
-                if user_id:
-                    # Update wallet balance
-                    wallet_ref = db.collection('wallets').document(user_id)
-                    wallet_doc = wallet_ref.get()
-                    
-                    if wallet_doc.exists:
-                        current_balance = wallet_doc.to_dict().get('balance', 0)
-                        new_balance = current_balance + float(amount)
-                        wallet_ref.update({
-                            'balance': new_balance,
-                            'updatedAt': firestore.SERVER_TIMESTAMP
-                        })
-                        
-                        # Update transaction status
-                        transaction.reference.update({
-                            'status': 'completed',
-                            'updatedAt': firestore.SERVER_TIMESTAMP
-                        })
-                        
-                        print(f"Payment processed successfully for user {user_id}: {amount} ETB")
-                        return True
-            
-            print(f"No transaction found for tx_ref: {tx_ref}")
-            return False
-            
-        except Exception as e:
-            print(f"Error processing payment callback: {e}")
-            return False 
\ No newline at end of file
+            response = requests.post(
+                f"{self.base_url}/bulk-transfers",
+                headers=headers,
+                json={"title": title, "currency": "ETB", "bulk_data": transfers},
+                timeout=30
+            )
+        except requests.RequestException as e:
+            return ChapaSubmission(VERIFY_ERROR, message=str(e))
+
+        if response.status_code == 429:
+            return ChapaSubmission(VERIFY_RATE_LIMITED, message='Chapa rate limit reached')
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        message = str(body.get('message', '')) or f'HTTP {response.status_code}'
+        if response.status_code < 300 and body.get('status') == 'success':
+            data = body.get('data') or {}
+            batch_id = data.get('id') if isinstance(data, dict) else None
+            return ChapaSubmission(SUBMIT_ACCEPTED, batch_id=str(batch_id) if batch_id else None, message=message)
+        lowered = message.lower()
+        if response.status_code in (401, 403) or any(hint in lowered for hint in _REFUSED_HINTS):
+            return ChapaSubmission(SUBMIT_REFUSED, message=message)
+        if response.status_code in (400, 409, 422):
+            if 'reference' in lowered and any(hint in lowered for hint in _DUPLICATE_HINTS):
+                return ChapaSubmission(SUBMIT_DUPLICATE, message=message)
+            if response.status_code != 409:
+                return ChapaSubmission(SUBMIT_REJECTED, message=message)
+        # 5xx and anything unexpected: Chapa may have queued the transfers
+        return ChapaSubmission(VERIFY_ERROR, message=message)
+
+    def _check(self, url: str) -> ChapaVerification:
+        headers = {"Authorization": f"Bearer {self.secret_key}"}
+        try:
+            response = requests.get(url, headers=headers, timeout=10)
+        except requests.RequestException as e:
+            return ChapaVerification(VERIFY_ERROR, message=str(e))
+
+        if response.status_code == 429:
+            return ChapaVerification(VERIFY_RATE_LIMITED, message='Chapa rate limit reached')
+        try:
+            body = response.json()
+        except ValueError:
+            return ChapaVerification(VERIFY_ERROR, message=f'HTTP {response.status_code}')
+
+        message = str(body.get('message', ''))
+        data = body.get('data') or {}
+        if body.get('status') != 'success' or not data:
+            if response.status_code in (400, 404) or 'not found' in message.lower():
+                return ChapaVerification(VERIFY_NOT_FOUND, message=message)
+            return ChapaVerification(VERIFY_ERROR, message=message or f'HTTP {response.status_code}')
+
+        # data.status is the payment (or transfer) state; anything unexpected is checked again later
+        state = data.get('status')
+        if state not in (VERIFY_SUCCESS, VERIFY_FAILED):
+            state = VERIFY_PENDING
+        return ChapaVerification(
+            state,
+            amount=float(data.get('amount') or 0),
+            currency=data.get('currency'),
+            reference=data.get('reference') or data.get('chapa_transfer_id'),
+            message=message
+        )
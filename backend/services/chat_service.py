@@ -0,0 +1,322 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from database.firebase import firestore
+
+from services.rate_limiter import Limit, MemoryBucketStore, SCOPE_USER
+
+COLLECTION = 'chatLogs'
+
+MAX_MESSAGE_LENGTH = 500
+MESSAGE_TYPES = ('text', 'emote')
+# Rooms whose buffers are kept per process; the least recently used are dropped
+MAX_ROOMS = 2000
+# Chunk documents read when a room's history is first needed in this process
+LOAD_CHUNKS = 5
+# Rooms written per flush batch (one chunk document each)
+MAX_ROOMS_PER_BATCH = 400
+
+# Common English and Amharic insults and profanity; CHAT_BLOCKED_WORDS adds more
+DEFAULT_BLOCKED_WORDS = (
+    'fuck', 'fucking', 'shit', 'bitch', 'bastard', 'asshole', 'dick', 'cunt', 'whore', 'slut',
+    'motherfucker', 'idiot', 'stupid',
+    'ደደብ', 'ደንቆሮ', 'ጅል', 'ሞኝ', 'ሸርሙጣ', 'ዲቃላ', 'አህያ', 'ውሻ', 'ቆሻሻ', 'ሌባ',
+)
+
+class ChatError(Exception):
+    """Raised when a chat message cannot be sent"""
+
+class ChatNotAllowed(ChatError):
+    """Raised when the sender is not a player of the game"""
+
+class ChatRateLimited(ChatError):
+    """Raised when a player sends faster than their token bucket allows"""
+
+    def __init__(self, retry_after: float):
+        super().__init__('You are sending messages too quickly')
+        self.retry_after = retry_after
+
+class WordFilter:
+    """Aho-Corasick matcher for a blocked word list.
+
+    The automaton is built once, so a message is scanned in a single pass
+    whatever the size of the list. Matching is case-insensitive and only
+    whole words are masked (``str.isalnum`` treats Ethiopic syllables as
+    letters, so Amharic words get the same word boundaries as English).
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for word in {word.strip().lower() for word in words if word and word.strip()}:
+            node = 0
+            for char in word:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node] += (len(word),)
+
+        # Breadth-first, so a node's failure link is final before its children use it
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = 0 if node == 0 else self._goto[fail].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) spans of blocked whole words in text"""
+        folded = text.lower()
+        if len(folded) != len(text):
+            # Spans must index the original text
+            folded = text
+        spans = []
+        node = 0
+        for index, char in enumerate(folded):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length in self._out[node]:
+                start, end = index - length + 1, index + 1
+                if (start == 0 or not folded[start - 1].isalnum()) and (end == len(folded) or not folded[end].isalnum()):
+                    spans.append((start, end))
+        return spans
+
+    def censor(self, text: str) -> Tuple[str, bool]:
+        """text with blocked words masked, and whether anything was masked"""
+        spans = self.find(text)
+        if not spans:
+            return text, False
+        chars = list(text)
+        for start, end in spans:
+            chars[start:end] = '*' * (end - start)
+        return ''.join(chars), True
+
+class _Room:
+    __slots__ = ('messages', 'ids', 'pending', 'members', 'loaded', 'refreshed', 'mark')
+
+    def __init__(self, history: int):
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.ids: Set[str] = set()
+        self.pending: List[Dict[str, Any]] = []
+        self.members: Set[str] = set()
+        self.loaded = False
+        self.refreshed = 0.0
+        self.mark: Optional[datetime] = None
+
+    def merge(self, messages: Iterable[Dict[str, Any]]) -> None:
+        new = [message for message in messages if message.get('id') not in self.ids]
+        if not new:
+            return
+        ordered = sorted(list(self.messages) + new, key=lambda message: message['id'])
+        self.messages.clear()
+        self.messages.extend(ordered)
+        self.ids = {message['id'] for message in self.messages}
+
+class ChatService:
+    """In-game chat with in-memory history and batched persistence.
+
+    Each room keeps its last CHAT_HISTORY messages in a bounded deque, so
+    history on join is served from memory. Players are limited by a token
+    bucket each and messages pass through the blocked-word filter before
+    they are stored.
+
+    New messages are written by a background thread every
+    CHAT_FLUSH_SECONDS as one ``chatLogs`` chunk document per room holding
+    all of that room's messages since the last flush. A busy room therefore
+    costs one write per flush, not one per message. A worker that has not
+    seen a room loads its recent chunks, and re-reads newer chunks at most
+    once per flush interval, so players on other workers see each other's
+    messages within about one interval.
+
+    Message ids start with the send time in milliseconds and a per-process
+    sequence, so they sort in time order and clients poll with
+    ``after=<last id>``.
+    """
+
+    def __init__(self, firebase_manager, is_member: Callable[[str, str], bool], history: int = 100,
+                 flush_seconds: float = 5.0, rate_per_minute: int = 20, burst: int = 5,
+                 blocked_words: Iterable[str] = ()):
+        self.firebase_manager = firebase_manager
+        self.is_member = is_member
+        self.history = history
+        self.flush_seconds = flush_seconds
+        self.limit = Limit(SCOPE_USER, rate_per_minute / 60.0, burst)
+        self.buckets = MemoryBucketStore()
+        self.filter = WordFilter(tuple(DEFAULT_BLOCKED_WORDS) + tuple(blocked_words))
+        self._rooms: 'OrderedDict[str, _Room]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_config(cls, firebase_manager, is_member: Callable[[str, str], bool], config) -> 'ChatService':
+        return cls(firebase_manager, is_member, config.CHAT_HISTORY, config.CHAT_FLUSH_SECONDS,
+                   config.CHAT_RATE_PER_MINUTE, config.CHAT_BURST, config.CHAT_BLOCKED_WORDS)
+
+    def configure(self, config) -> None:
+        """Apply reloaded CHAT_* settings (rooms already in memory keep their history length)"""
+        self.history = config.CHAT_HISTORY
+        self.flush_seconds = config.CHAT_FLUSH_SECONDS
+        self.limit = Limit(SCOPE_USER, config.CHAT_RATE_PER_MINUTE / 60.0, config.CHAT_BURST)
+        self.filter = WordFilter(tuple(DEFAULT_BLOCKED_WORDS) + tuple(config.CHAT_BLOCKED_WORDS))
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise ChatError('Database unavailable')
+        return db
+
+    def _room(self, game_id: str) -> _Room:
+        with self._lock:
+            room = self._rooms.pop(game_id, None)
+            if room is None:
+                room = _Room(self.history)
+            self._rooms[game_id] = room
+            if len(self._rooms) > MAX_ROOMS:
+                # Rooms with unsaved messages are kept until they are flushed
+                for stale_id in list(self._rooms)[:len(self._rooms) - MAX_ROOMS]:
+                    if not self._rooms[stale_id].pending:
+                        del self._rooms[stale_id]
+            return room
+
+    def send(self, game_id: str, user_id: str, name: str, text: str, message_type: str = 'text') -> Dict[str, Any]:
+        """Filter and store a player's message; returns it as stored"""
+        text = (text or '').strip()
+        if not text:
+            raise ChatError('Message is empty')
+        if len(text) > MAX_MESSAGE_LENGTH:
+            raise ChatError(f'Messages are limited to {MAX_MESSAGE_LENGTH} characters')
+        if message_type not in MESSAGE_TYPES:
+            raise ChatError(f"Message type must be one of {', '.join(MESSAGE_TYPES)}")
+        wait = self.buckets.take(f'chat:{user_id}', self.limit)
+        if wait > 0:
+            raise ChatRateLimited(wait)
+
+        room = self._room(game_id)
+        self._check_member(game_id, room, user_id)
+
+        text, censored = self.filter.censor(text)
+        now = datetime.now(timezone.utc)
+        message = {
+            'id': f'{int(now.timestamp() * 1000):013d}-{next(self._sequence) % 1000000:06d}-{uuid.uuid4().hex[:6]}',
+            'playerId': user_id,
+            'playerName': (name or 'Player')[:50],
+            'message': text,
+            'type': message_type,
+            'timestamp': now.isoformat(),
+            'censored': censored
+        }
+        with self._lock:
+            room.messages.append(message)
+            room.ids = {item['id'] for item in room.messages}
+            room.pending.append(message)
+        self._ensure_flusher()
+        return message
+
+    def recent(self, game_id: str, user_id: str, after: Optional[str] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Messages of a room for one of its players, oldest first (only those after the given id, if any)"""
+        room = self._room(game_id)
+        self._check_member(game_id, room, user_id)
+        self._sync(game_id, room)
+        with self._lock:
+            messages = [message for message in room.messages if after is None or message['id'] > after]
+        return messages[-limit:] if limit else messages
+
+    def _check_member(self, game_id: str, room: _Room, user_id: str) -> None:
+        # Members are remembered per room, so polling players cost one roster read
+        if user_id in room.members:
+            return
+        if not self.is_member(game_id, user_id):
+            raise ChatNotAllowed('Only players in this game can chat')
+        room.members.add(user_id)
+
+    def _sync(self, game_id: str, room: _Room) -> None:
+        """Load the room's persisted history, or newer chunks written by other workers"""
+        now = time.monotonic()
+        if room.loaded and now - room.refreshed < self.flush_seconds:
+            return
+        chunks = self._db().collection(COLLECTION).where('gameId', '==', game_id)
+        if room.loaded and room.mark is not None:
+            docs = list(chunks.where('createdAt', '>', room.mark).order_by('createdAt').stream())
+        else:
+            docs = list(chunks.order_by('createdAt', direction=firestore.Query.DESCENDING).limit(LOAD_CHUNKS).stream())
+        messages = []
+        for doc in docs:
+            data = doc.to_dict() or {}
+            messages.extend(data.get('messages') or [])
+            created = data.get('createdAt')
+            if isinstance(created, datetime) and (room.mark is None or created > room.mark):
+                room.mark = created
+        with self._lock:
+            room.merge(messages)
+            room.loaded = True
+            room.refreshed = now
+
+    def _ensure_flusher(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='chat-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Chat flush error: {e}")
+
+    def flush(self) -> int:
+        """Write every room's unsaved messages, one chunk document per room; returns the message count"""
+        with self._lock:
+            pending = {game_id: room.pending for game_id, room in self._rooms.items() if room.pending}
+            for game_id in pending:
+                self._rooms[game_id].pending = []
+        if not pending:
+            return 0
+
+        db = self._db()
+        written = 0
+        game_ids = list(pending)
+        for start in range(0, len(game_ids), MAX_ROOMS_PER_BATCH):
+            chunk = game_ids[start:start + MAX_ROOMS_PER_BATCH]
+            batch = db.batch()
+            for game_id in chunk:
+                messages = pending[game_id]
+                batch.set(db.collection(COLLECTION).document(f"{game_id}_{messages[0]['id']}"), {
+                    'gameId': game_id,
+                    'messages': messages,
+                    'count': len(messages),
+                    'createdAt': firestore.SERVER_TIMESTAMP
+                })
+            try:
+                batch.commit()
+                written += sum(len(pending[game_id]) for game_id in chunk)
+            except Exception:
+                # Put this and the remaining rooms' messages back in front of anything
+                # sent meanwhile; the next flush retries
+                with self._lock:
+                    for game_id in game_ids[start:]:
+                        room = self._rooms.get(game_id)
+                        if room is None:
+                            room = self._rooms[game_id] = _Room(self.history)
+                        room.pending = pending[game_id] + room.pending
+                raise
+        return written
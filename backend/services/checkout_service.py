@@ -0,0 +1,159 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import get_config
+from services.cache import TTLCache
+from services.invoice_payload import InvalidPayloadError, InvoicePayloadCodec, KIND_DEPOSIT, KIND_GAME_ENTRY
+
+MAX_DEPOSIT_AMOUNT = 50000
+
+class PreCheckoutValidator:
+    """Validates Telegram pre-checkout queries against cached room and account state.
+
+    Telegram cancels the checkout if answerPreCheckoutQuery is not called within
+    10 seconds, so every Firestore lookup runs under a hard latency budget. When a
+    lookup misses the budget, a stale cached value is used if there is one;
+    otherwise the configured fail-open/fail-closed policy decides.
+    """
+
+    def __init__(self, config, firebase_manager, payload_codec: InvoicePayloadCodec, roster_service=None):
+        self.firebase_manager = firebase_manager
+        self.payload_codec = payload_codec
+        self.roster_service = roster_service
+        self._rooms = TTLCache(config.PRECHECKOUT_CACHE_TTL)
+        self._accounts = TTLCache(config.PRECHECKOUT_CACHE_TTL)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='precheckout')
+
+    @property
+    def budget(self) -> float:
+        # Read per query so the budget can be tuned with a config reload
+        return get_config().PRECHECKOUT_BUDGET_SECONDS
+
+    @property
+    def fail_open(self) -> bool:
+        return get_config().PRECHECKOUT_FAIL_OPEN
+
+    def remember_room(self, game_id: str, game_data: Dict[str, Any]) -> None:
+        """Prime the room cache from a document the caller already read"""
+        self._rooms.set(game_id, self._room_state(game_data, self._roster_count(game_id, game_data)))
+
+    def forget_room(self, game_id: str) -> None:
+        """Invalidate the cached room state after a roster or status change"""
+        self._rooms.invalidate(game_id)
+
+    def validate(self, pre_checkout_query: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """Return (ok, error_message) for a pre-checkout query"""
+        deadline = time.monotonic() + self.budget
+
+        try:
+            payload = self.payload_codec.decode(pre_checkout_query.get('invoice_payload', ''))
+        except InvalidPayloadError as e:
+            print(f"Rejecting pre-checkout query with invalid payload: {e}")
+            return False, 'Invalid payment request'
+
+        telegram_id = pre_checkout_query.get('from', {}).get('id')
+        if telegram_id != payload.user_id:
+            return False, 'This invoice was issued to another user'
+
+        if pre_checkout_query.get('currency') != 'ETB':
+            return False, 'Unsupported currency'
+
+        total_amount = pre_checkout_query.get('total_amount', 0) / 100
+        if payload.amount <= 0 or abs(total_amount - payload.amount) > 0.005:
+            return False, 'Payment amount mismatch'
+
+        if payload.kind == KIND_DEPOSIT and payload.amount > MAX_DEPOSIT_AMOUNT:
+            return False, 'Maximum deposit amount is 50,000 ETB'
+
+        account = self._lookup(self._accounts, str(telegram_id), self._load_account, deadline)
+        if account is None:
+            if not self.fail_open:
+                return False, 'Payment service is busy, please try again'
+        elif account.get('locked'):
+            return False, 'Your wallet is locked. Please contact support.'
+
+        if payload.kind == KIND_GAME_ENTRY:
+            room = self._lookup(self._rooms, payload.game_id, self._load_room, deadline)
+            if room is None:
+                if not self.fail_open:
+                    return False, 'Payment service is busy, please try again'
+            elif not room['exists']:
+                return False, 'Game not found'
+            elif room['status'] != 'waiting':
+                return False, 'This game has already started'
+            elif room['maxPlayers'] and room['playerCount'] >= room['maxPlayers']:
+                return False, 'This game is full'
+            elif abs(room['entryFee'] - payload.amount) > 0.005:
+                return False, 'Entry fee has changed, please request a new invoice'
+
+        return True, None
+
+    def _lookup(self, cache: TTLCache, key: str, loader, deadline: float) -> Optional[Dict[str, Any]]:
+        """Serve from cache, otherwise load within the remaining budget.
+
+        Returns None when the value could not be determined in time.
+        """
+        if cache.is_fresh(key):
+            return cache.get(key)
+
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            future = self._executor.submit(loader, key)
+            try:
+                value = future.result(timeout=remaining)
+                cache.set(key, value)
+                return value
+            except FutureTimeoutError:
+                print(f"Pre-checkout lookup for {key} exceeded the latency budget")
+            except Exception as e:
+                print(f"Pre-checkout lookup for {key} failed: {e}")
+
+        # Out of time: a stale answer beats none
+        return cache.get(key, allow_stale=True)
+
+    def _load_room(self, game_id: str) -> Dict[str, Any]:
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        game_doc = db.collection('gameRooms').document(game_id).get()
+        if not game_doc.exists:
+            return {'exists': False}
+        game_data = game_doc.to_dict()
+        return self._room_state(game_data, self._roster_count(game_id, game_data))
+
+    def _roster_count(self, game_id: str, game_data: Dict[str, Any]) -> Optional[int]:
+        # The roster summary is one read and lags joins by about a second,
+        # which is fine for a soft capacity check
+        if not self.roster_service or not self.roster_service.uses_roster(game_data):
+            return None
+        summary = self.roster_service.get_summary(game_id)
+        return summary.get('playerCount', 0) if summary else 0
+
+    def _load_account(self, telegram_id: str) -> Dict[str, Any]:
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        firebase_user_id = None
+        for doc in db.collection('users').where('telegramChatId', '==', telegram_id).limit(1).stream():
+            firebase_user_id = doc.id
+            if doc.to_dict().get('isBanned'):
+                return {'locked': True}
+        if not firebase_user_id:
+            # Unknown users are created on successful payment
+            return {'locked': False}
+        wallet_doc = db.collection('wallets').document(firebase_user_id).get()
+        status = wallet_doc.to_dict().get('status', 'active') if wallet_doc.exists else 'active'
+        return {'locked': status != 'active'}
+
+    @staticmethod
+    def _room_state(game_data: Dict[str, Any], roster_count: Optional[int] = None) -> Dict[str, Any]:
+        # Rooms created before the sharded roster are counted from their players array
+        player_count = len(game_data.get('players', [])) if roster_count is None else roster_count
+        return {
+            'exists': True,
+            'status': game_data.get('status', 'waiting'),
+            'playerCount': player_count,
+            'maxPlayers': game_data.get('maxPlayers', 0),
+            'entryFee': float(game_data.get('entryFee', 0)),
+        }
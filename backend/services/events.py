@@ -0,0 +1,47 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+# Event types published by the backend
+GAME_PLAYED = 'game_played'
+GAME_WON = 'game_won'
+LEDGER_POSTED = 'ledger_posted'
+
+@dataclass(frozen=True)
+class Event:
+    """Something that happened to one user.
+
+    event_id is deterministic (derived from the settlement or ledger entry),
+    so a consumer can tell a redelivered event from a new one.
+    """
+    type: str
+    user_id: str
+    event_id: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+class EventBus:
+    """In-process publish/subscribe by event type.
+
+    Handlers run synchronously in the publisher's thread, so they should
+    only hand the event off (to a queue, for example). A failing handler is
+    logged and does not affect the publisher or other handlers.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[Event], None]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: str, handler: Callable[[Event], None]) -> None:
+        with self._lock:
+            # Copy on write, so publish() can iterate without the lock
+            self._handlers = {**self._handlers, event_type: self._handlers.get(event_type, []) + [handler]}
+
+    def publish(self, event: Event) -> None:
+        for handler in self._handlers.get(event.type, ()):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Event handler error for {event.type} ({event.event_id}): {e}")
+
+# Shared by the services of this process
+event_bus = EventBus()
@@ -0,0 +1,326 @@
+import base64
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+
+# Firestore errors worth retrying; the page is re-read from the same cursor,
+# so a retry costs at most one page of reads
+RETRYABLE_ERRORS = (DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable)
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_ROWS_PER_PART = 100000
+FORMATS = ('ndjson', 'parquet')
+
+class ExportError(Exception):
+    """Raised when an export cannot be started or resumed"""
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """How a collection is paged and which fields become Parquet columns"""
+    order_field: Optional[str]
+    columns: Tuple[str, ...]
+    float_columns: Tuple[str, ...] = ()
+    time_columns: Tuple[str, ...] = ()
+
+EXPORTS = {
+    'transactions': ExportSpec(
+        order_field='createdAt',
+        columns=('userId', 'type', 'amount', 'currency', 'status', 'gameId', 'paymentMethod',
+                 'tx_ref', 'description', 'createdAt'),
+        float_columns=('amount',),
+        time_columns=('createdAt',),
+    ),
+    'users': ExportSpec(
+        order_field=None,
+        columns=('displayName', 'email', 'phoneNumber', 'telegramChatId', 'telegramUsername',
+                 'isAdmin', 'createdAt'),
+        time_columns=('createdAt',),
+    ),
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if hasattr(value, 'path'):
+        # DocumentReference
+        return value.path
+    if hasattr(value, 'latitude') and hasattr(value, 'longitude'):
+        return {'latitude': value.latitude, 'longitude': value.longitude}
+    return str(value)
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO date or datetime; naive values are taken as UTC"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'Invalid date: {value!r} (use YYYY-MM-DD or ISO 8601)')
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+class FirestoreExporter:
+    """Pages through a collection with query cursors.
+
+    Only one page of snapshots is held at a time, so memory stays flat no
+    matter how large the collection is. Pages are ordered by the spec's
+    order field and the document id, which makes the last document of a
+    page a complete cursor for resuming.
+    """
+
+    def __init__(self, firebase_manager, page_size: int = DEFAULT_PAGE_SIZE, max_attempts: int = 5):
+        self.firebase_manager = firebase_manager
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise ExportError('Database unavailable')
+        return db
+
+    @staticmethod
+    def spec(collection: str) -> ExportSpec:
+        spec = EXPORTS.get(collection)
+        if not spec:
+            raise ExportError(f"Unsupported collection: {collection} (choose from {', '.join(EXPORTS)})")
+        return spec
+
+    def check(self, collection: str, since: Optional[datetime] = None,
+              until: Optional[datetime] = None) -> ExportSpec:
+        """Validate an export request before any document is read"""
+        spec = self.spec(collection)
+        if (since or until) and not spec.order_field:
+            raise ExportError(f'{collection} cannot be filtered by date')
+        return spec
+
+    def cursor_after(self, collection: str, doc_id: str) -> Dict[str, Any]:
+        """Build a resume cursor from the id of the last exported document"""
+        snapshot = self._db().collection(collection).document(doc_id).get()
+        if not snapshot.exists:
+            raise ExportError(f'Cursor document {doc_id} not found')
+        return self.cursor_for(collection, snapshot)
+
+    def cursor_for(self, collection: str, snapshot) -> Dict[str, Any]:
+        order_field = self.spec(collection).order_field
+        cursor = {'docId': snapshot.id}
+        if order_field:
+            cursor[order_field] = snapshot.get(order_field).isoformat()
+        return cursor
+
+    def iter_pages(self, collection: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   cursor: Optional[Dict[str, Any]] = None) -> Iterator[List[Any]]:
+        """Yield pages of snapshots after cursor until the collection is exhausted"""
+        spec = self.check(collection, since, until)
+        ref = self._db().collection(collection)
+        query = ref
+        if spec.order_field:
+            if since:
+                query = query.where(spec.order_field, '>=', since)
+            if until:
+                query = query.where(spec.order_field, '<', until)
+            query = query.order_by(spec.order_field)
+        query = query.order_by('__name__').limit(self.page_size)
+
+        while True:
+            page_query = query
+            if cursor:
+                values = {'__name__': ref.document(cursor['docId'])}
+                if spec.order_field:
+                    values[spec.order_field] = parse_time(cursor[spec.order_field])
+                page_query = query.start_after(values)
+            page = self._fetch(page_query)
+            if not page:
+                return
+            yield page
+            if len(page) < self.page_size:
+                return
+            cursor = self.cursor_for(collection, page[-1])
+
+    def _fetch(self, query) -> List[Any]:
+        for attempt in range(self.max_attempts):
+            try:
+                return list(query.stream())
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = min(2 ** attempt, 30)
+                print(f"Export page read failed ({e.__class__.__name__}), retrying in {delay}s")
+                time.sleep(delay)
+        return []
+
+    @staticmethod
+    def to_record(snapshot) -> Dict[str, Any]:
+        return {'id': snapshot.id, **(snapshot.to_dict() or {})}
+
+def encode_ndjson_page(records: List[Dict[str, Any]]) -> bytes:
+    """One page as a complete gzip member; concatenated members form a valid .gz file"""
+    lines = ''.join(json.dumps(record, default=_json_default, ensure_ascii=False) + '\n' for record in records)
+    return gzip.compress(lines.encode('utf-8'))
+
+def stream_ndjson_gzip(exporter: FirestoreExporter, collection: str, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, cursor: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """gzip NDJSON for an HTTP response, one member per page"""
+    for page in exporter.iter_pages(collection, since, until, cursor):
+        yield encode_ndjson_page([exporter.to_record(doc) for doc in page])
+
+class _ParquetParts:
+    """Writes part-NNNNN.parquet files, one row group per page.
+
+    A part is only recorded in the checkpoint once its footer is written, so
+    a crash leaves at most one unfinished part, which resume deletes.
+    """
+
+    def __init__(self, directory: str, spec: ExportSpec, rows_per_part: int):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError('Parquet export requires pyarrow (pip install pyarrow)')
+        self.pa, self.pq = pa, pq
+        self.directory = directory
+        self.spec = spec
+        self.rows_per_part = rows_per_part
+        fields = [pa.field('id', pa.string())]
+        for column in spec.columns:
+            if column in spec.time_columns:
+                fields.append(pa.field(column, pa.timestamp('us', tz='UTC')))
+            elif column in spec.float_columns:
+                fields.append(pa.field(column, pa.float64()))
+            else:
+                fields.append(pa.field(column, pa.string()))
+        # Fields outside the fixed columns are kept as a JSON string
+        fields.append(pa.field('extra', pa.string()))
+        self.schema = pa.schema(fields)
+        self.writer = None
+        self.part_rows = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def part_path(self, index: int) -> str:
+        return os.path.join(self.directory, f'part-{index:05d}.parquet')
+
+    def clear(self) -> None:
+        """Remove parts left by an earlier export into the same directory"""
+        for name in os.listdir(self.directory):
+            if name.startswith('part-') and name.endswith('.parquet'):
+                os.remove(os.path.join(self.directory, name))
+
+    def open(self, index: int) -> None:
+        path = self.part_path(index)
+        if os.path.exists(path):
+            os.remove(path)
+        self.writer = self.pq.ParquetWriter(path, self.schema, compression='snappy')
+        self.part_rows = 0
+
+    def write_page(self, records: List[Dict[str, Any]]) -> None:
+        columns = {name: [] for name in self.schema.names}
+        known = set(self.spec.columns) | {'id'}
+        for record in records:
+            for column in self.spec.columns:
+                value = record.get(column)
+                if value is None or column in self.spec.time_columns:
+                    columns[column].append(value if isinstance(value, datetime) else None)
+                elif column in self.spec.float_columns:
+                    columns[column].append(float(value))
+                else:
+                    columns[column].append(value if isinstance(value, str) else json.dumps(value, default=_json_default))
+            columns['id'].append(record['id'])
+            extra = {k: v for k, v in record.items() if k not in known}
+            columns['extra'].append(json.dumps(extra, default=_json_default, ensure_ascii=False) if extra else None)
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        self.part_rows += len(records)
+
+    def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+def export_to_file(exporter: FirestoreExporter, collection: str, output: str, fmt: str = 'ndjson',
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   resume: bool = True, rows_per_part: int = DEFAULT_ROWS_PER_PART) -> Dict[str, Any]:
+    """Export a collection to gzip NDJSON (a file) or Parquet (a directory of parts).
+
+    Progress is checkpointed to ``<output>.checkpoint.json`` after every page
+    (NDJSON) or finished part (Parquet). With resume, an interrupted export
+    continues from the checkpoint: output past it is truncated or deleted and
+    reading restarts at the saved cursor, so no rows are duplicated and
+    already exported pages are not read again.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format: {fmt} (choose from {', '.join(FORMATS)})")
+    spec = exporter.check(collection, since, until)
+    checkpoint_path = output.rstrip('/\\') + '.checkpoint.json'
+    params = {
+        'collection': collection,
+        'format': fmt,
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat() if until else None,
+    }
+
+    state = {**params, 'cursor': None, 'rows': 0, 'offset': 0, 'parts': 0, 'complete': False}
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            saved = json.load(f)
+        if any(saved.get(key) != value for key, value in params.items()):
+            raise ExportError(f'{checkpoint_path} belongs to a different export; remove it or use a new output')
+        if saved.get('complete'):
+            return saved
+        state = saved
+        print(f"Resuming export of {collection} after {state['rows']} rows")
+
+    def save_checkpoint():
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    started = time.monotonic()
+    pages = exporter.iter_pages(collection, since, until, state['cursor'])
+    if fmt == 'ndjson':
+        with open(output, 'ab' if state['cursor'] else 'wb') as f:
+            # Drop anything written after the last checkpoint
+            f.truncate(state['offset'])
+            f.seek(state['offset'])
+            for page in pages:
+                f.write(encode_ndjson_page([exporter.to_record(doc) for doc in page]))
+                f.flush()
+                os.fsync(f.fileno())
+                state.update(cursor=exporter.cursor_for(collection, page[-1]), rows=state['rows'] + len(page),
+                             offset=f.tell())
+                save_checkpoint()
+    else:
+        parts = _ParquetParts(output, spec, rows_per_part)
+        if not state['cursor']:
+            parts.clear()
+        cursor = state['cursor']
+        rows = state['rows']
+        try:
+            for page in pages:
+                if parts.writer is None:
+                    parts.open(state['parts'])
+                parts.write_page([exporter.to_record(doc) for doc in page])
+                cursor = exporter.cursor_for(collection, page[-1])
+                rows += len(page)
+                if parts.part_rows >= rows_per_part:
+                    parts.close()
+                    state.update(cursor=cursor, rows=rows, parts=state['parts'] + 1)
+                    save_checkpoint()
+        except BaseException:
+            # The open part is not in the checkpoint; resume rewrites it
+            parts.close()
+            raise
+        if parts.writer is not None:
+            parts.close()
+            state.update(cursor=cursor, rows=rows, parts=state['parts'] + 1)
+
+    state['complete'] = True
+    save_checkpoint()
+    print(f"Exported {state['rows']} {collection} rows to {output} in {time.monotonic() - started:.1f}s")
+    return state
@@ -0,0 +1,107 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# Telegram accepts 1-128 bytes of invoice payload
+MAX_PAYLOAD_LENGTH = 128
+
+PAYLOAD_VERSION = 1
+KIND_DEPOSIT = 'deposit'
+KIND_GAME_ENTRY = 'game_entry'
+
+_KIND_CODES = {KIND_DEPOSIT: 1, KIND_GAME_ENTRY: 2}
+_KIND_NAMES = {code: name for name, code in _KIND_CODES.items()}
+
+# version, kind, telegram user id, amount in cents, issued at (unix seconds), game id length
+_HEADER = struct.Struct('>BBQIIB')
+_MAC_LENGTH = 10
+_MAX_GAME_ID_LENGTH = 40
+
+class InvalidPayloadError(ValueError):
+    """Raised when an invoice payload is malformed or fails signature checks"""
+
+@dataclass(frozen=True)
+class InvoicePayload:
+    """Typed view of a Telegram invoice payload"""
+    kind: str
+    amount: float
+    user_id: int
+    game_id: Optional[str] = None
+    issued_at: int = 0
+
+class InvoicePayloadCodec:
+    """Encodes invoice payloads as compact, versioned, HMAC-signed base64url strings.
+
+    Layout (big-endian): version:u8 | kind:u8 | user:u64 | cents:u32 | issued:u32 |
+    game_len:u8 | game_id | mac[10]. The MAC covers everything before it, so the
+    amount and game can be trusted on decode without a Firestore lookup.
+    """
+
+    def __init__(self, secret: str, max_age: Optional[int] = None):
+        if not secret:
+            raise ValueError('Invoice payload secret is required')
+        self._key = secret.encode('utf-8')
+        self.max_age = max_age
+
+    def encode_deposit(self, user_id: int, amount: float) -> str:
+        """Encode a wallet deposit payload"""
+        return self._encode(KIND_DEPOSIT, user_id, amount, '')
+
+    def encode_game_entry(self, user_id: int, game_id: str, amount: float) -> str:
+        """Encode a game entry fee payload"""
+        if not game_id:
+            raise ValueError('game_id is required for game entry payloads')
+        return self._encode(KIND_GAME_ENTRY, user_id, amount, game_id)
+
+    def decode(self, raw: str) -> InvoicePayload:
+        """Verify and decode a payload, raising InvalidPayloadError when it cannot be trusted"""
+        if not raw or len(raw) > MAX_PAYLOAD_LENGTH:
+            raise InvalidPayloadError('Payload is empty or too long')
+        try:
+            data = base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4))
+        except (binascii.Error, ValueError):
+            raise InvalidPayloadError('Payload is not valid base64')
+
+        if len(data) < _HEADER.size + _MAC_LENGTH:
+            raise InvalidPayloadError('Payload is truncated')
+
+        view = memoryview(data)
+        body_length = len(data) - _MAC_LENGTH
+        expected_mac = hmac.new(self._key, view[:body_length], hashlib.sha256).digest()[:_MAC_LENGTH]
+        if not hmac.compare_digest(expected_mac, view[body_length:]):
+            raise InvalidPayloadError('Payload signature mismatch')
+
+        version, kind_code, user_id, cents, issued_at, game_length = _HEADER.unpack_from(view)
+        if version != PAYLOAD_VERSION:
+            raise InvalidPayloadError(f'Unsupported payload version {version}')
+        kind = _KIND_NAMES.get(kind_code)
+        if kind is None:
+            raise InvalidPayloadError(f'Unknown payload kind {kind_code}')
+        if _HEADER.size + game_length != body_length:
+            raise InvalidPayloadError('Payload length mismatch')
+        if self.max_age is not None and time.time() - issued_at > self.max_age:
+            raise InvalidPayloadError('Payload has expired')
+
+        game_id = None
+        if game_length:
+            game_id = bytes(view[_HEADER.size:body_length]).decode('ascii')
+
+        return InvoicePayload(kind, cents / 100, user_id, game_id, issued_at)
+
+    def _encode(self, kind: str, user_id: int, amount: float, game_id: str) -> str:
+        cents = round(amount * 100)
+        if cents <= 0 or cents > 0xFFFFFFFF:
+            raise ValueError(f'Amount out of range: {amount}')
+        game_bytes = game_id.encode('ascii')
+        if len(game_bytes) > _MAX_GAME_ID_LENGTH:
+            raise ValueError(f'game_id longer than {_MAX_GAME_ID_LENGTH} characters')
+
+        body = _HEADER.pack(PAYLOAD_VERSION, _KIND_CODES[kind], int(user_id), cents,
+                            int(time.time()), len(game_bytes)) + game_bytes
+        mac = hmac.new(self._key, body, hashlib.sha256).digest()[:_MAC_LENGTH]
+        return base64.urlsafe_b64encode(body + mac).rstrip(b'=').decode('ascii')
@@ -0,0 +1,43 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+class LazyService(Generic[T]):
+    """Builds a service on first use and keeps it for the life of the process.
+
+    The factory runs at most once per process even when the first requests
+    arrive concurrently. If it fails the error is printed and get() returns
+    None until reset() is called.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        self.factory = factory
+        self.name = name
+        self._instance: Optional[T] = None
+        self._attempted = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[T]:
+        if not self._attempted:
+            with self._lock:
+                if not self._attempted:
+                    try:
+                        self._instance = self.factory()
+                        print(f"{self.name} initialized successfully")
+                    except Exception as e:
+                        print(f"Failed to initialize {self.name}: {e}")
+                        self._instance = None
+                    finally:
+                        self._attempted = True
+        return self._instance
+
+    def is_built(self) -> bool:
+        """True once the service has been built successfully"""
+        return self._instance is not None
+
+    def reset(self) -> None:
+        """Drop the instance so the next get() builds a new one"""
+        with self._lock:
+            self._instance = None
+            self._attempted = False
@@ -0,0 +1,560 @@
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from services.cache import TTLCache
+
+COLLECTION = 'leaderboards'
+CHECKPOINT_DOC_ID = 'checkpoint'
+
+BOARD_ALL = 'all'
+DAILY_PREFIX = 'daily-'
+WEEKLY_PREFIX = 'weekly-'
+MODE_PREFIX = 'mode-'
+_BOARD_PATTERN = re.compile(r'^(all|daily-\d{4}-\d{2}-\d{2}|weekly-\d{4}-W\d{2}|mode-[A-Za-z0-9_-]{1,32})$')
+_MODE_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+# Daily and weekly boards kept in memory (the current one and the one before)
+PERIODS_KEPT = 2
+# Settlements read per catch-up query
+PAGE_SIZE = 500
+# Settlements newer than this are left for the next catch-up, so one committed
+# a moment earlier with a slightly older server timestamp is not skipped
+TAIL_LAG_SECONDS = 5
+# Board entries per checkpoint chunk document (well under the 1 MiB limit)
+CHUNK_SIZE = 2000
+MAX_BATCH_WRITES = 500
+NAME_TTL = 3600
+# Cached top-K pages kept before the cache is cleared
+MAX_CACHED_PAGES = 1000
+
+class LeaderboardError(Exception):
+    """Raised for unknown boards or when the boards cannot be loaded"""
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * level
+        self.width: List[int] = [0] * level
+
+class SkipList:
+    """Indexable skip list of unique, comparable keys in ascending order.
+
+    Each forward link records how many positions it skips, so insert,
+    remove, rank and seeking to a rank are all O(log n) expected.
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        update: List[_Node] = [self._head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = rank[i + 1] if i + 1 < self._level else 0
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.width[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.width[i] = self._size
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.next[i] = update[i].next[i]
+            update[i].next[i] = new
+            new.width[i] = update[i].width[i] - (rank[0] - rank[i])
+            update[i].width[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        update: List[_Node] = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+        target = node.next[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].next[i] is target:
+                update[i].width[i] += target.width[i] - 1
+                update[i].next[i] = target.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """1-based position of key, or None if absent"""
+        node = self._head
+        position = 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key <= key:
+                position += node.width[i]
+                node = node.next[i]
+        return position if node is not self._head and node.key == key else None
+
+    def iter_from(self, position: int) -> Iterator:
+        """Keys from 1-based position onwards"""
+        node = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and traversed + node.width[i] < position:
+                traversed += node.width[i]
+                node = node.next[i]
+        node = node.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+class Board:
+    """One leaderboard: prize earnings (in cents) and wins per user, ranked by earnings then wins"""
+
+    def __init__(self):
+        self.scores: Dict[str, Tuple[int, int]] = {}
+        self.order = SkipList()
+        self.version = 0
+
+    @staticmethod
+    def _key(user_id: str, cents: int, wins: int) -> Tuple[int, int, str]:
+        return (-cents, -wins, user_id)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, user_id: str, cents: int, wins: int) -> None:
+        old = self.scores.get(user_id)
+        if old is not None:
+            self.order.remove(self._key(user_id, *old))
+            cents, wins = old[0] + cents, old[1] + wins
+        self.scores[user_id] = (cents, wins)
+        self.order.insert(self._key(user_id, cents, wins))
+        self.version += 1
+
+    def rank(self, user_id: str) -> Optional[int]:
+        score = self.scores.get(user_id)
+        return self.order.rank(self._key(user_id, *score)) if score else None
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[str, int, int]]:
+        entries = []
+        for neg_cents, neg_wins, user_id in self.order.iter_from(offset + 1):
+            if len(entries) >= limit:
+                break
+            entries.append((user_id, -neg_cents, -neg_wins))
+        return entries
+
+def _mark_key(mark: Optional[Dict[str, Any]]) -> Tuple:
+    if not mark:
+        return ()
+    return (mark['createdAt'], mark['docId'])
+
+class LeaderboardService:
+    """Ranked prize leaderboards kept in memory and fed by settlements.
+
+    Boards: ``all``, ``daily-YYYY-MM-DD`` and ``weekly-YYYY-Www`` (days in
+    STATS_UTC_OFFSET_HOURS, like the admin stats) and ``mode-<gameMode>``.
+    Each is a skip list ordered by earnings then wins, so a settlement
+    updates a winner in O(log n) and rank and top-K queries cost O(log n)
+    (plus K) instead of an ``order_by`` scan of ``users``.
+
+    The ``settlements`` collection is the source of truth. Every worker
+    follows it from a ``{createdAt, docId}`` mark (like the stats
+    aggregator), so games settled by other workers show up within
+    LEADERBOARD_REFRESH_SECONDS; games settled in this worker are applied at
+    once and skipped when the catch-up reaches them. Every
+    LEADERBOARD_CHECKPOINT_SECONDS the boards and mark are written to
+    ``leaderboards/checkpoint`` (entries in chunk documents under a new
+    generation, switched over by the final write), and a new worker loads the
+    latest checkpoint and replays only the settlements after it.
+    """
+
+    def __init__(self, firebase_manager, utc_offset_hours: float = 3.0,
+                 refresh_seconds: float = 15.0, checkpoint_seconds: float = 300.0):
+        self.firebase_manager = firebase_manager
+        self.offset = timedelta(hours=utc_offset_hours)
+        self.refresh_seconds = refresh_seconds
+        self.checkpoint_seconds = checkpoint_seconds
+        self.boards: Dict[str, Board] = {}
+        self._mark: Optional[Dict[str, Any]] = None
+        # Games applied directly, skipped once the catch-up reaches them
+        self._applied: Dict[str, float] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._tail_lock = threading.Lock()
+        self._top_cache: Dict[Tuple[str, int, int], Tuple[int, List[Tuple[str, int, int]]]] = {}
+        self._names = TTLCache(NAME_TTL)
+        self._checkpointed_mark: Tuple = ()
+        self._next_checkpoint = 0.0
+        self._last_sync = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls, firebase_manager, config) -> 'LeaderboardService':
+        return cls(firebase_manager, config.STATS_UTC_OFFSET_HOURS,
+                   config.LEADERBOARD_REFRESH_SECONDS, config.LEADERBOARD_CHECKPOINT_SECONDS)
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise LeaderboardError('Database unavailable')
+        return db
+
+    # Board ids
+
+    def _local(self, when: Optional[datetime]) -> datetime:
+        when = when or datetime.now(timezone.utc)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return when.astimezone(timezone.utc) + self.offset
+
+    def daily_board(self, when: Optional[datetime] = None) -> str:
+        return DAILY_PREFIX + self._local(when).date().isoformat()
+
+    def weekly_board(self, when: Optional[datetime] = None) -> str:
+        year, week, _ = self._local(when).isocalendar()
+        return f'{WEEKLY_PREFIX}{year}-W{week:02d}'
+
+    def boards_for(self, when: Optional[datetime], game_mode: Optional[str]) -> Tuple[str, ...]:
+        mode = game_mode if game_mode and _MODE_PATTERN.match(game_mode) else 'classic'
+        return (BOARD_ALL, self.daily_board(when), self.weekly_board(when), MODE_PREFIX + mode)
+
+    def resolve(self, name: str) -> str:
+        """Board id for 'all', 'daily', 'weekly', a game mode or an explicit board id"""
+        if name == 'daily':
+            return self.daily_board()
+        if name == 'weekly':
+            return self.weekly_board()
+        if _BOARD_PATTERN.match(name or ''):
+            return name
+        if _MODE_PATTERN.match(name or ''):
+            # A bare game mode such as 'speed'
+            return MODE_PREFIX + name
+        raise LeaderboardError(f'Unknown leaderboard: {name!r}')
+
+    # Updates
+
+    def record_settlement(self, game_id: str, game_mode: Optional[str], winners: Sequence[Dict[str, Any]],
+                          when: Optional[datetime] = None) -> None:
+        """Apply a settlement made in this process right away"""
+        with self._lock:
+            if not self._loaded or game_id in self._applied:
+                # Before the first load the catch-up will read it from settlements
+                return
+            self._apply(game_id, game_mode, winners, when)
+            self._applied[game_id] = time.time()
+
+    def _apply(self, game_id: str, game_mode: Optional[str], winners: Sequence[Dict[str, Any]],
+               when: Optional[datetime]) -> None:
+        for board_id in self.boards_for(when, game_mode):
+            board = self.boards.get(board_id)
+            if board is None:
+                board = self.boards[board_id] = Board()
+            for winner in winners:
+                board.add(winner['userId'], int(round(float(winner.get('amount') or 0) * 100)), 1)
+
+    def _prune(self) -> None:
+        """Drop daily and weekly boards older than the last PERIODS_KEPT periods"""
+        for prefix in (DAILY_PREFIX, WEEKLY_PREFIX):
+            periodic = sorted(board_id for board_id in self.boards if board_id.startswith(prefix))
+            for board_id in periodic[:-PERIODS_KEPT]:
+                del self.boards[board_id]
+
+    # Queries
+
+    def top(self, board_id: str, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        """Top entries of a board with display names"""
+        self.ensure_loaded()
+        with self._lock:
+            board = self.boards.get(board_id) or Board()
+            key = (board_id, limit, offset)
+            cached = self._top_cache.get(key)
+            if cached and cached[0] == board.version and board_id in self.boards:
+                rows = cached[1]
+            else:
+                rows = board.top(limit, offset)
+                if board_id in self.boards:
+                    if len(self._top_cache) >= MAX_CACHED_PAGES:
+                        self._top_cache.clear()
+                    self._top_cache[key] = (board.version, rows)
+            size = len(board)
+        names = self.display_names([user_id for user_id, _, _ in rows])
+        return {
+            'board': board_id,
+            'size': size,
+            'entries': [{
+                'rank': offset + i + 1,
+                'userId': user_id,
+                'displayName': names.get(user_id, 'Player'),
+                'earnings': cents / 100,
+                'wins': wins
+            } for i, (user_id, cents, wins) in enumerate(rows)]
+        }
+
+    def rank(self, board_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """A user's position on a board, or None if they have no win on it"""
+        self.ensure_loaded()
+        with self._lock:
+            board = self.boards.get(board_id)
+            position = board.rank(user_id) if board else None
+            if position is None:
+                return None
+            cents, wins = board.scores[user_id]
+            return {'board': board_id, 'rank': position, 'size': len(board), 'earnings': cents / 100, 'wins': wins}
+
+    def display_names(self, user_ids: Sequence[str]) -> Dict[str, str]:
+        names = {}
+        missing = []
+        for user_id in user_ids:
+            name = self._names.get(user_id)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+        if missing:
+            db = self._db()
+            refs = [db.collection('users').document(user_id) for user_id in missing]
+            for doc in db.get_all(refs, field_paths=['displayName']):
+                name = (doc.to_dict() or {}).get('displayName') if doc.exists else None
+                names[doc.id] = name or 'Player'
+                self._names.set(doc.id, names[doc.id])
+        return names
+
+    # Loading, catch-up and checkpoints
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._sync_lock:
+                if not self._loaded:
+                    self._load()
+
+    def ensure_started(self) -> None:
+        """Start the catch-up and checkpoint thread once per process"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._sync_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='leaderboards', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.ensure_loaded()
+                self.sync()
+                if time.time() >= self._next_checkpoint:
+                    self.checkpoint()
+            except Exception as e:
+                print(f"Leaderboard sync error: {e}")
+            self._stop.wait(self.refresh_seconds)
+
+    def _load(self) -> None:
+        """Rebuild from the latest checkpoint and replay the settlements after it"""
+        db = self._db()
+        started = time.perf_counter()
+        checkpoint_ref = db.collection(COLLECTION).document(CHECKPOINT_DOC_ID)
+        checkpoint = checkpoint_ref.get()
+        boards: Dict[str, Board] = {}
+        mark = None
+        if checkpoint.exists:
+            data = checkpoint.to_dict() or {}
+            mark = data.get('mark')
+            generation = data.get('generation')
+            chunks = checkpoint_ref.collection('chunks')
+            refs = [chunks.document(f'{generation}_{board_id}_{i}')
+                    for board_id, count in (data.get('boards') or {}).items() for i in range(count)]
+            for doc in (db.get_all(refs) if refs else []):
+                if not doc.exists:
+                    continue
+                chunk = doc.to_dict()
+                board = boards.setdefault(chunk['board'], Board())
+                for user_id, cents, wins in zip(chunk['userIds'], chunk['cents'], chunk['wins']):
+                    board.add(user_id, int(cents), int(wins))
+        with self._lock:
+            self.boards = boards
+            self._mark = mark
+            self._checkpointed_mark = _mark_key(mark)
+            self._prune()
+        replayed = self.sync(force=True)
+        with self._lock:
+            self._loaded = True
+            self._next_checkpoint = time.time() + self.checkpoint_seconds
+        print(f"Leaderboards loaded: {len(self.boards)} board(s), {replayed} settlement(s) replayed "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def sync(self, force: bool = False) -> int:
+        """Apply settlements past the mark; returns how many were read"""
+        if not force and time.time() - self._last_sync < self.refresh_seconds / 2:
+            return 0
+        # One catch-up at a time, or two could apply the same page
+        with self._tail_lock:
+            return self._tail()
+
+    def _tail(self) -> int:
+        db = self._db()
+        collection = db.collection('settlements')
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=TAIL_LAG_SECONDS)
+        read = 0
+        while True:
+            query = (collection.where('createdAt', '<', cutoff)
+                     .order_by('createdAt')
+                     .order_by('__name__')
+                     .limit(PAGE_SIZE))
+            mark = self._mark
+            if mark:
+                query = query.start_after({
+                    'createdAt': mark['createdAt'],
+                    '__name__': collection.document(mark['docId'])
+                })
+            docs = list(query.stream())
+            if not docs:
+                break
+            modes = self._game_modes(db, docs)
+            with self._lock:
+                for doc in docs:
+                    data = doc.to_dict()
+                    game_id = data.get('gameId') or doc.id
+                    if self._applied.pop(game_id, None) is None:
+                        self._apply(game_id, modes.get(game_id), data.get('winners') or [], data.get('createdAt'))
+                self._mark = {'createdAt': docs[-1].get('createdAt'), 'docId': docs[-1].id}
+                self._prune()
+            read += len(docs)
+            if len(docs) < PAGE_SIZE:
+                break
+        with self._lock:
+            # Settlements applied directly but never seen by the catch-up (their
+            # commit reported an error, for example) are forgotten after a day
+            stale = time.time() - 24 * 3600
+            for game_id in [g for g, applied_at in self._applied.items() if applied_at < stale]:
+                del self._applied[game_id]
+        self._last_sync = time.time()
+        return read
+
+    @staticmethod
+    def _game_modes(db, docs) -> Dict[str, str]:
+        # Settlements carry the room's gameMode; older ones fall back to the room
+        modes = {}
+        missing = []
+        for doc in docs:
+            data = doc.to_dict()
+            game_id = data.get('gameId') or doc.id
+            if data.get('gameMode'):
+                modes[game_id] = data['gameMode']
+            else:
+                missing.append(game_id)
+        if missing:
+            refs = [db.collection('gameRooms').document(game_id) for game_id in missing]
+            for room in db.get_all(refs, field_paths=['gameMode']):
+                if room.exists:
+                    modes[room.id] = (room.to_dict() or {}).get('gameMode') or 'classic'
+        return modes
+
+    def checkpoint(self) -> bool:
+        """Write the boards and mark if they are ahead of the stored checkpoint; returns True if written"""
+        self._next_checkpoint = time.time() + self.checkpoint_seconds
+        with self._lock:
+            if not self._loaded or not self._mark or _mark_key(self._mark) <= self._checkpointed_mark:
+                return False
+            mark = dict(self._mark)
+            snapshot = {board_id: list(board.scores.items()) for board_id, board in self.boards.items()}
+
+        db = self._db()
+        checkpoint_ref = db.collection(COLLECTION).document(CHECKPOINT_DOC_ID)
+        current = checkpoint_ref.get()
+        stored = (current.to_dict() or {}) if current.exists else {}
+        if _mark_key(stored.get('mark')) >= _mark_key(mark):
+            # Another worker already checkpointed this far
+            self._checkpointed_mark = _mark_key(stored.get('mark'))
+            return False
+
+        generation = f'{int(time.time() * 1000):x}{random.randrange(16 ** 4):04x}'
+        chunks = checkpoint_ref.collection('chunks')
+        counts: Dict[str, int] = {}
+        writes = []
+        for board_id, scores in snapshot.items():
+            counts[board_id] = (len(scores) + CHUNK_SIZE - 1) // CHUNK_SIZE
+            for i in range(counts[board_id]):
+                part = scores[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE]
+                writes.append((chunks.document(f'{generation}_{board_id}_{i}'), {
+                    'board': board_id,
+                    'userIds': [user_id for user_id, _ in part],
+                    'cents': [score[0] for _, score in part],
+                    'wins': [score[1] for _, score in part],
+                }))
+        self._write_all(db, writes)
+
+        # The new generation becomes visible with this single write
+        data = {'mark': mark, 'generation': generation, 'boards': counts, 'updatedAt': firestore.SERVER_TIMESTAMP}
+        try:
+            if current.exists:
+                checkpoint_ref.update(data, option=db.write_option(last_update_time=current.update_time))
+            else:
+                checkpoint_ref.create(data)
+        except (FailedPrecondition, AlreadyExists):
+            self._delete_all(db, [ref for ref, _ in writes])
+            return False
+
+        if stored.get('generation'):
+            old = [chunks.document(f"{stored['generation']}_{board_id}_{i}")
+                   for board_id, count in (stored.get('boards') or {}).items() for i in range(count)]
+            self._delete_all(db, old)
+        self._checkpointed_mark = _mark_key(mark)
+        print(f"Leaderboard checkpoint {generation}: {len(counts)} board(s), {len(writes)} chunk(s)")
+        return True
+
+    @staticmethod
+    def _write_all(db, writes) -> None:
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            batch = db.batch()
+            for ref, data in writes[start:start + MAX_BATCH_WRITES]:
+                batch.set(ref, data)
+            batch.commit()
+
+    @staticmethod
+    def _delete_all(db, refs) -> None:
+        for start in range(0, len(refs), MAX_BATCH_WRITES):
+            batch = db.batch()
+            for ref in refs[start:start + MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
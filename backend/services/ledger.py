@@ -0,0 +1,76 @@
+from typing import Any, Dict, Optional
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from database.sharded_counter import ShardedCounter
+from services.events import Event, LEDGER_POSTED, event_bus
+
+# Platform totals updated for each kind of posting (see stats/totals)
+TOTALS_FIELDS = {
+    'deposit': ('deposits', 'depositCount'),
+    'refund': ('refunds', 'refundCount'),
+    'bonus': ('bonuses', 'bonusCount'),
+}
+
+class LedgerError(Exception):
+    """Raised when a posting cannot be written"""
+
+class Ledger:
+    """Idempotent wallet postings.
+
+    Every posting has a deterministic id (``chapa_<tx_ref>`` for a Chapa
+    deposit) and is written with ``create()`` in the same batch as the wallet
+    increment and the caller's own status updates. The same payment reported
+    by a callback, a reconciliation sweep and a retry is therefore applied
+    exactly once: later attempts fail as a whole with AlreadyExists.
+    """
+
+    def __init__(self, firebase_manager, counter: Optional[ShardedCounter] = None):
+        self.firebase_manager = firebase_manager
+        self.counter = counter
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise LedgerError('Database unavailable')
+        return db
+
+    def post(self, entry_id: str, user_id: str, amount: float, kind: str,
+             metadata: Optional[Dict[str, Any]] = None, batch=None) -> bool:
+        """Credit amount to the user's wallet once.
+
+        Writes already added to batch are committed together with the posting.
+        Returns False if the posting already exists (nothing is written).
+        """
+        if amount <= 0:
+            raise LedgerError(f'Posting amount must be positive, got {amount}')
+        db = self._db()
+        batch = batch if batch is not None else db.batch()
+
+        batch.create(db.collection('ledger').document(entry_id), {
+            'userId': user_id,
+            'kind': kind,
+            'amount': amount,
+            'currency': 'ETB',
+            'metadata': metadata or {},
+            'createdAt': firestore.SERVER_TIMESTAMP
+        })
+        batch.set(db.collection('wallets').document(user_id), {
+            'balance': firestore.Increment(amount),
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+        if self.counter and kind in TOTALS_FIELDS:
+            amount_field, count_field = TOTALS_FIELDS[kind]
+            self.counter.increment(ShardedCounter.shards_for(db.collection('stats').document('totals')),
+                                   {amount_field: amount, count_field: 1}, batch)
+
+        try:
+            batch.commit()
+        except AlreadyExists:
+            return False
+        event_bus.publish(Event(LEDGER_POSTED, user_id, f'ledger_{entry_id}', {'kind': kind, 'amount': amount}))
+        return True
+
+    def exists(self, entry_id: str) -> bool:
+        return self._db().collection('ledger').document(entry_id).get().exists
@@ -0,0 +1,582 @@
+import asyncio
+import html
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.firebase import firestore
+
+from config.settings import get_config
+from services import win_engine
+from services.call_audio import TelegramFileIds
+from services.card_image import CardRenderer, card_key
+from services.token_bucket import TokenBucket
+
+EVENT_GAME_STARTING = 'game_starting'
+EVENT_NUMBER_CALLED = 'number_called'
+EVENT_WINNER = 'winner'
+# Events a room's host may broadcast; winner messages come from settlement only
+HOST_EVENTS = (EVENT_GAME_STARTING, EVENT_NUMBER_CALLED)
+
+TEMPLATES = {
+    EVENT_GAME_STARTING: {
+        'en': '🎮 {name} is starting now! Get your card ready.',
+        'am': '🎮 {name} አሁን ይጀምራል! ካርድዎን ያዘጋጁ።'
+    },
+    EVENT_NUMBER_CALLED: {
+        'en': '📢 {call}',
+        'am': '📢 {call}'
+    },
+    EVENT_WINNER: {
+        'en': '🏆 {winner} won {name} with {pattern}! Prize: {amount} ETB',
+        'am': '🏆 {winner} {name}ን በ{pattern} አሸንፈዋል! ሽልማት: {amount} ብር'
+    }
+}
+
+# Card photos of Telegram players: gameRooms/{id}/telegramCards/{uid} holds the
+# message to edit; uploaded images are shared through their file_ids
+CARD_MESSAGES = 'telegramCards'
+CARD_FILE_ID_COLLECTION = 'telegramCardImages'
+CARD_EVENTS = (EVENT_GAME_STARTING, EVENT_NUMBER_CALLED)
+CARD_CAPTION = {
+    'en': '🎟 Your card for {name}',
+    'am': '🎟 የ{name} ካርድዎ'
+}
+# Games whose players' card numbers are cached (cards are write-once)
+MAX_CARD_GAMES = 200
+
+@dataclass
+class RoomEvent:
+    """A game event to broadcast to every Telegram player in a room"""
+    game_id: str
+    event_type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class CardUpdate:
+    """A player's card photo to send or edit"""
+    user_id: str
+    chat_id: str
+    message_id: Optional[int]
+    mask: int
+    digest: str
+    png: bytes
+    file_id: Optional[str] = None
+    caption: str = ''
+
+class _AsyncRateLimiter:
+    """A TokenBucket shared by all sender tasks on the event loop, with a global pause"""
+
+    def __init__(self, rate: float, burst: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                wait = self.bucket.take(now)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Back off globally after Telegram answers 429"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class NotificationService:
+    """Fans room events out to Telegram players.
+
+    Recipients are resolved once per event, the message is rendered once per
+    language, and delivery runs on a dedicated asyncio loop with a shared
+    keep-alive session, a concurrency cap and a token bucket sized to the
+    Telegram broadcast limit. Each recipient is retried with backoff; those
+    that still fail are written to ``notificationDeadLetters`` in one batch.
+
+    With a CallAudioCache and TTS_TELEGRAM_VOICE, number calls go out as voice
+    clips: each clip is uploaded once and every later send reuses its
+    Telegram file_id.
+
+    With TELEGRAM_CARD_IMAGES, players with a card also get it as a photo
+    that is edited in place (``editMessageMedia``) as numbers are called. A
+    room has at most one card pass running; calls that arrive meanwhile
+    are coalesced into one more pass with the latest state, so each player
+    gets at most one edit per pass and only when their marks changed.
+    Images are rendered by a CardRenderer and identical images share one
+    upload through their digest.
+    """
+
+    def __init__(self, config, firebase_manager, roster_service=None, call_audio=None):
+        self.bot_token = config.TELEGRAM_BOT_TOKEN
+        self.firebase_manager = firebase_manager
+        self.roster_service = roster_service
+        self.call_audio = call_audio
+        self.file_ids = TelegramFileIds(firebase_manager, self.bot_token) if call_audio else None
+        self.card_file_ids = TelegramFileIds(firebase_manager, self.bot_token, CARD_FILE_ID_COLLECTION)
+        self._card_renderer: Optional[CardRenderer] = None
+        self._card_numbers: 'OrderedDict[str, Dict[str, List[int]]]' = OrderedDict()
+        self._card_lock = threading.Lock()
+        # game_id -> whether another pass was requested; only touched on the loop thread
+        self._card_passes: Dict[str, bool] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._limiter: Optional[_AsyncRateLimiter] = None
+
+    def notify_room(self, event: RoomEvent):
+        """Schedule delivery in the background and return a concurrent Future"""
+        recipients = self.resolve_recipients(event.game_id)
+        languages = {lang for _, lang in recipients}
+        messages = self.render(event, languages)
+        clips = self.voice_clips(event, languages)
+        future = asyncio.run_coroutine_threadsafe(self._deliver(event, recipients, messages, clips), self._get_loop())
+        if event.event_type in CARD_EVENTS and get_config().TELEGRAM_CARD_IMAGES and self.bot_token:
+            self._get_loop().call_soon_threadsafe(self._request_card_pass, event.game_id)
+        elif event.event_type == EVENT_WINNER:
+            self._get_loop().call_soon_threadsafe(self._forget_cards, event.game_id)
+        return future
+
+    def voice_clips(self, event: RoomEvent, languages) -> Dict[str, Tuple[str, Optional[str]]]:
+        """(clip digest, Telegram file_id or None) per language for a number call"""
+        if (event.event_type != EVENT_NUMBER_CALLED or not self.call_audio
+                or not get_config().TTS_TELEGRAM_VOICE or 'call' not in event.data):
+            return {}
+        clips = {}
+        for lang in languages:
+            try:
+                digest = self.call_audio.get(*self.call_audio.resolve(event.data['call'], lang))
+                clips[lang] = (digest, self.file_ids.get(digest))
+            except Exception as e:
+                # Unsupported language or synthesis failure: that language gets text
+                print(f"No voice clip for {event.data['call']} ({lang}): {e}")
+        return clips
+
+    def resolve_recipients(self, game_id: str) -> List[Tuple[str, str]]:
+        """(telegramChatId, language) for every player in the room"""
+        db = self.firebase_manager.get_db()
+        if not db:
+            return []
+        room_doc = db.collection('gameRooms').document(game_id).get()
+        if not room_doc.exists:
+            return []
+        chat_ids = self._telegram_players(game_id, room_doc.to_dict())
+        if not chat_ids:
+            return []
+        languages = self._languages(db, chat_ids)
+        return [(chat_id, languages.get(user_id, 'en')) for user_id, chat_id in chat_ids.items()]
+
+    def _telegram_players(self, game_id: str, room: Dict[str, Any]) -> Dict[str, str]:
+        """telegramChatId by userId for the room's players"""
+        players = list(room.get('players', []))
+        if self.roster_service:
+            players.extend(self.roster_service.list_players(game_id))
+
+        chat_ids: Dict[str, str] = {}
+        for player in players:
+            if not isinstance(player, dict):
+                continue
+            chat_id = player.get('telegramChatId')
+            user_id = player.get('userId') or player.get('id')
+            if chat_id and user_id:
+                chat_ids[user_id] = str(chat_id)
+        return chat_ids
+
+    @staticmethod
+    def _languages(db, user_ids) -> Dict[str, str]:
+        # One batched read for every player's language preference
+        refs = [db.collection('users').document(user_id) for user_id in user_ids]
+        languages = {}
+        for doc in db.get_all(refs, field_paths=['settings.language']):
+            if doc.exists:
+                languages[doc.id] = (doc.to_dict().get('settings') or {}).get('language', 'en')
+        return languages
+
+    @staticmethod
+    def render(event: RoomEvent, languages) -> Dict[str, str]:
+        """Render the event text once per language (values are escaped for parse_mode HTML)"""
+        templates = TEMPLATES.get(event.event_type)
+        if not templates:
+            raise ValueError(f'Unknown event type: {event.event_type}')
+        data = {key: html.escape(str(value), quote=False) for key, value in event.data.items()}
+        return {lang: templates.get(lang, templates['en']).format(**data) for lang in languages}
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='notification-loop', daemon=True).start()
+            return self._loop
+
+    def _shared_limiter(self, config) -> _AsyncRateLimiter:
+        if self._limiter is None:
+            # Created on the loop thread; shared by every broadcast and card pass
+            # so that overlapping events still respect one global send rate
+            self._limiter = _AsyncRateLimiter(config.NOTIFY_RATE_PER_SECOND, burst=config.NOTIFY_CONCURRENCY)
+        self._limiter.bucket.rate = config.NOTIFY_RATE_PER_SECOND
+        return self._limiter
+
+    async def _deliver(self, event: RoomEvent, recipients: List[Tuple[str, str]],
+                       messages: Dict[str, str],
+                       clips: Optional[Dict[str, Tuple[str, Optional[str]]]] = None) -> Dict[str, int]:
+        if not self.bot_token or not recipients:
+            return {'sent': 0, 'failed': 0}
+        # Imported on first broadcast; web workers that never notify skip it
+        import aiohttp
+
+        # Tuning knobs are read per broadcast so a config reload applies to the next one
+        config = get_config()
+        concurrency = config.NOTIFY_CONCURRENCY
+        max_attempts = config.NOTIFY_MAX_ATTEMPTS
+        api = f"https://api.telegram.org/bot{self.bot_token}"
+        clips = dict(clips or {})
+        limiter = self._shared_limiter(config)
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(total=10)
+        failures: List[Tuple[str, str]] = []
+        started = time.monotonic()
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            # A clip without a file_id is uploaded once, to the first recipient
+            # of its language; everyone else gets the returned file_id
+            uploaded = set()
+            for lang, (digest, file_id) in list(clips.items()):
+                if file_id:
+                    continue
+                chat_id = next(chat for chat, chat_lang in recipients if chat_lang == lang)
+                await limiter.acquire()
+                file_id = await self._upload_voice(session, api, chat_id, digest, messages[lang])
+                if file_id:
+                    clips[lang] = (digest, file_id)
+                    uploaded.add(chat_id)
+                    await asyncio.get_running_loop().run_in_executor(None, self.file_ids.remember, digest, file_id)
+                else:
+                    del clips[lang]
+
+            async def send(chat_id: str, lang: str) -> bool:
+                if chat_id in uploaded:
+                    return True
+                if lang in clips:
+                    url = f"{api}/sendVoice"
+                    payload = {'chat_id': chat_id, 'voice': clips[lang][1], 'caption': messages[lang],
+                               'parse_mode': 'HTML'}
+                else:
+                    url = f"{api}/sendMessage"
+                    payload = {'chat_id': chat_id, 'text': messages[lang], 'parse_mode': 'HTML'}
+                async with semaphore:
+                    error = await self._send_with_retry(session, limiter, url, payload, max_attempts)
+                if error:
+                    failures.append((chat_id, error))
+                    return False
+                return True
+
+            results = await asyncio.gather(*(send(chat_id, lang) for chat_id, lang in recipients))
+
+        sent = sum(1 for ok in results if ok)
+        print(f"Notified room {event.game_id} ({event.event_type}): {sent}/{len(recipients)} "
+              f"in {time.monotonic() - started:.2f}s")
+        if failures:
+            # Firestore calls block, keep them off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._record_dead_letters, event, failures)
+        return {'sent': sent, 'failed': len(failures)}
+
+    async def _upload_voice(self, session, api: str, chat_id: str, digest: str, caption: str) -> Optional[str]:
+        """Send a clip as a new upload; returns its file_id, or None to fall back to text"""
+        import aiohttp
+        try:
+            with open(self.call_audio.path_for(digest), 'rb') as f:
+                form = aiohttp.FormData()
+                form.add_field('chat_id', chat_id)
+                form.add_field('caption', caption)
+                form.add_field('parse_mode', 'HTML')
+                form.add_field('voice', f, filename=f'{digest[:12]}.mp3', content_type='audio/mpeg')
+                async with session.post(f"{api}/sendVoice", data=form) as response:
+                    body = await response.json(content_type=None)
+            if response.status == 200:
+                result = body.get('result', {})
+                # Telegram may deliver an MP3 as audio rather than voice
+                return (result.get('voice') or result.get('audio') or {}).get('file_id')
+            print(f"Voice upload to {chat_id} failed: {body.get('description')}")
+        except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Voice upload to {chat_id} failed: {e}")
+        return None
+
+    async def _send_with_retry(self, session, limiter: _AsyncRateLimiter, url: str,
+                               payload: Dict[str, Any], max_attempts: int) -> Optional[str]:
+        """Send one message; returns None on success or the last error"""
+        _, error = await self._call_with_retry(session, limiter, url, lambda: {'json': payload}, max_attempts)
+        return error
+
+    async def _call_with_retry(self, session, limiter: _AsyncRateLimiter, url: str,
+                               build: Callable[[], Dict[str, Any]], max_attempts: int) -> Tuple[Any, Optional[str]]:
+        """Call a Bot API method; returns (result, None) on success or (None, last error).
+
+        build returns the request arguments (``json=`` or ``data=``) and is
+        called per attempt, since a multipart form can only be sent once.
+        """
+        import aiohttp
+        error = None
+        for attempt in range(max_attempts):
+            await limiter.acquire()
+            try:
+                async with session.post(url, **build()) as response:
+                    if response.status == 200:
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = {}
+                        return body.get('result', True), None
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        # An HTML error page or an empty body from a proxy; retry it
+                        body = {}
+                    if not isinstance(body, dict):
+                        body = {}
+                    error = body.get('description', f'HTTP {response.status}')
+                    if response.status == 429:
+                        limiter.pause(body.get('parameters', {}).get('retry_after', 1))
+                        continue
+                    if response.status in (400, 403):
+                        # Blocked bot or bad chat id: retrying will not help
+                        return None, error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or e.__class__.__name__
+            await asyncio.sleep(min(2 ** attempt, 8) * (0.5 + random.random() / 2))
+        return None, error
+
+    def _request_card_pass(self, game_id: str) -> None:
+        # Runs on the loop thread; a pass already running for the room is
+        # asked to go round once more instead of starting a second one
+        if game_id in self._card_passes:
+            self._card_passes[game_id] = True
+            return
+        self._card_passes[game_id] = False
+        asyncio.ensure_future(self._run_card_passes(game_id))
+
+    async def _run_card_passes(self, game_id: str) -> None:
+        try:
+            while True:
+                self._card_passes[game_id] = False
+                try:
+                    await self._update_cards(game_id)
+                except Exception as e:
+                    print(f"Error updating card images for game {game_id}: {e}")
+                if not self._card_passes[game_id]:
+                    break
+        finally:
+            del self._card_passes[game_id]
+
+    def _forget_cards(self, game_id: str) -> None:
+        with self._card_lock:
+            self._card_numbers.pop(game_id, None)
+        if self._card_renderer:
+            self._card_renderer.forget(card_key(game_id, ''))
+
+    async def _update_cards(self, game_id: str) -> Dict[str, int]:
+        """Send or edit the card photo of every Telegram player whose marks changed"""
+        loop = asyncio.get_running_loop()
+        # Firestore reads and rendering block, keep them off the event loop
+        updates = await loop.run_in_executor(None, self._plan_cards, game_id)
+        if not updates:
+            return {'sent': 0, 'failed': 0}
+        import aiohttp
+
+        config = get_config()
+        api = f"https://api.telegram.org/bot{self.bot_token}"
+        limiter = self._shared_limiter(config)
+        semaphore = asyncio.Semaphore(config.NOTIFY_CONCURRENCY)
+        connector = aiohttp.TCPConnector(limit=config.NOTIFY_CONCURRENCY)
+        timeout = aiohttp.ClientTimeout(total=20)
+        sent: List[Tuple[CardUpdate, int, Optional[str]]] = []
+        started = time.monotonic()
+
+        # Players whose images are identical share one upload: the first
+        # of each group uploads, the rest reuse the returned file_id
+        groups: Dict[str, List[CardUpdate]] = {}
+        for update in updates:
+            groups.setdefault(update.digest, []).append(update)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def apply(update: CardUpdate) -> Optional[str]:
+                async with semaphore:
+                    result = await self._send_card(session, limiter, api, update, config.NOTIFY_MAX_ATTEMPTS)
+                if result:
+                    sent.append((update, *result))
+                    return result[1]
+                return None
+
+            async def apply_group(group: List[CardUpdate]) -> None:
+                file_id = await apply(group[0])
+                for update in group[1:]:
+                    update.file_id = update.file_id or file_id
+                await asyncio.gather(*(apply(update) for update in group[1:]))
+
+            await asyncio.gather(*(apply_group(group) for group in groups.values()))
+
+        print(f"Updated card images for game {game_id}: {len(sent)}/{len(updates)} "
+              f"in {time.monotonic() - started:.2f}s")
+        if sent:
+            await loop.run_in_executor(None, self._save_cards, game_id, sent)
+        return {'sent': len(sent), 'failed': len(updates) - len(sent)}
+
+    def _plan_cards(self, game_id: str) -> List[CardUpdate]:
+        db = self.firebase_manager.get_db()
+        if not db:
+            return []
+        room_ref = db.collection('gameRooms').document(game_id)
+        room_doc = room_ref.get()
+        if not room_doc.exists:
+            return []
+        room = room_doc.to_dict()
+        chat_ids = self._telegram_players(game_id, room)
+        if not chat_ids:
+            return []
+        cards = self._cards_for(db, room_ref, game_id, chat_ids)
+        states = {doc.id: doc.to_dict() or {} for doc in room_ref.collection(CARD_MESSAGES).stream()}
+        called = room.get('calledNumbers') or []
+        with self._card_lock:
+            if self._card_renderer is None:
+                self._card_renderer = CardRenderer()
+            renderer = self._card_renderer
+
+        updates = []
+        for user_id, chat_id in chat_ids.items():
+            numbers = cards.get(user_id)
+            if not numbers:
+                continue
+            mask = win_engine.marked_mask(numbers, called)
+            state = states.get(user_id, {})
+            same_chat = state.get('chatId') == chat_id
+            if same_chat and state.get('mask') == mask:
+                continue
+            digest, png = renderer.render(card_key(game_id, user_id), numbers, mask)
+            updates.append(CardUpdate(user_id, chat_id, state.get('messageId') if same_chat else None,
+                                      mask, digest, png))
+        if not updates:
+            return []
+
+        file_ids = self.card_file_ids.get_many(update.digest for update in updates)
+        new_players = [update.user_id for update in updates if not update.message_id]
+        languages = self._languages(db, new_players) if new_players else {}
+        for update in updates:
+            update.file_id = file_ids.get(update.digest)
+            template = CARD_CAPTION.get(languages.get(update.user_id, 'en'), CARD_CAPTION['en'])
+            update.caption = template.format(name=room.get('name', 'Bingo Game'))
+        return updates
+
+    def _cards_for(self, db, room_ref, game_id: str, user_ids) -> Dict[str, List[int]]:
+        """Card numbers of the given players (those without a card are left out)"""
+        with self._card_lock:
+            cards = self._card_numbers.pop(game_id, None) or {}
+            self._card_numbers[game_id] = cards
+            while len(self._card_numbers) > MAX_CARD_GAMES:
+                self._card_numbers.popitem(last=False)
+            missing = [user_id for user_id in user_ids if user_id not in cards]
+        if missing:
+            refs = [room_ref.collection('cards').document(user_id) for user_id in missing]
+            for doc in db.get_all(refs):
+                if not doc.exists:
+                    continue
+                try:
+                    cards[doc.id] = win_engine.card_from_columns(doc.to_dict() or {})
+                except (TypeError, ValueError) as e:
+                    print(f"Skipping malformed card of {doc.id} in game {game_id}: {e}")
+        return cards
+
+    async def _send_card(self, session, limiter: _AsyncRateLimiter, api: str, update: CardUpdate,
+                         max_attempts: int) -> Optional[Tuple[int, Optional[str]]]:
+        """Edit the player's card message, or send a new one; returns (message_id, file_id) or None"""
+        if update.message_id:
+            result, error = await self._call_with_retry(session, limiter, f"{api}/editMessageMedia",
+                                                        self._card_request(update, edit=True), max_attempts)
+            if result is not None:
+                return update.message_id, self._photo_file_id(result)
+            if error and 'not modified' in error:
+                return update.message_id, update.file_id
+            # The message was deleted or is too old to edit: send a fresh one
+            print(f"Card edit in {update.chat_id} failed ({error}); sending a new card")
+        result, error = await self._call_with_retry(session, limiter, f"{api}/sendPhoto",
+                                                    self._card_request(update, edit=False), max_attempts)
+        if isinstance(result, dict) and result.get('message_id'):
+            return result['message_id'], self._photo_file_id(result)
+        print(f"Card photo to {update.chat_id} failed: {error}")
+        return None
+
+    @staticmethod
+    def _card_request(update: CardUpdate, edit: bool) -> Callable[[], Dict[str, Any]]:
+        def build() -> Dict[str, Any]:
+            if update.file_id:
+                if edit:
+                    return {'json': {'chat_id': update.chat_id, 'message_id': update.message_id,
+                                     'media': {'type': 'photo', 'media': update.file_id}}}
+                return {'json': {'chat_id': update.chat_id, 'photo': update.file_id, 'caption': update.caption}}
+            import aiohttp
+            form = aiohttp.FormData()
+            form.add_field('chat_id', update.chat_id)
+            filename = f'{update.digest[:12]}.png'
+            if edit:
+                form.add_field('message_id', str(update.message_id))
+                form.add_field('media', json.dumps({'type': 'photo', 'media': 'attach://card'}))
+                form.add_field('card', update.png, filename=filename, content_type='image/png')
+            else:
+                form.add_field('caption', update.caption)
+                form.add_field('photo', update.png, filename=filename, content_type='image/png')
+            return {'data': form}
+        return build
+
+    @staticmethod
+    def _photo_file_id(message: Any) -> Optional[str]:
+        # Telegram returns the photo in several sizes, largest last
+        photos = message.get('photo') if isinstance(message, dict) else None
+        return photos[-1].get('file_id') if photos else None
+
+    def _save_cards(self, game_id: str, sent: List[Tuple[CardUpdate, int, Optional[str]]]) -> None:
+        db = self.firebase_manager.get_db()
+        if not db:
+            return
+        try:
+            messages = db.collection('gameRooms').document(game_id).collection(CARD_MESSAGES)
+            for start in range(0, len(sent), 500):
+                batch = db.batch()
+                for update, message_id, _ in sent[start:start + 500]:
+                    batch.set(messages.document(update.user_id), {
+                        'chatId': update.chat_id,
+                        'messageId': message_id,
+                        'mask': update.mask,
+                        'digest': update.digest,
+                        'updatedAt': firestore.SERVER_TIMESTAMP
+                    })
+                batch.commit()
+            uploaded = {update.digest: file_id for update, _, file_id in sent if file_id and not update.file_id}
+            for digest, file_id in uploaded.items():
+                self.card_file_ids.remember(digest, file_id)
+        except Exception as e:
+            print(f"Error saving card messages for game {game_id}: {e}")
+
+    def _record_dead_letters(self, event: RoomEvent, failures: List[Tuple[str, str]]) -> None:
+        db = self.firebase_manager.get_db()
+        if not db:
+            return
+        try:
+            # Batches hold at most 500 writes
+            for start in range(0, len(failures), 500):
+                batch = db.batch()
+                for chat_id, error in failures[start:start + 500]:
+                    batch.set(db.collection('notificationDeadLetters').document(), {
+                        'gameId': event.game_id,
+                        'eventType': event.event_type,
+                        'chatId': chat_id,
+                        'error': error,
+                        'createdAt': firestore.SERVER_TIMESTAMP
+                    })
+                batch.commit()
+        except Exception as e:
+            print(f"Error recording notification dead letters: {e}")
@@ -0,0 +1,440 @@
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from config.settings import get_config
+from services.chapa_service import (
+    ChapaService, ChapaSubmission, ChapaVerification, MAX_BULK_TRANSFERS, SUBMIT_ACCEPTED, SUBMIT_DUPLICATE,
+    SUBMIT_REFUSED, SUBMIT_REJECTED, VERIFY_FAILED, VERIFY_NOT_FOUND, VERIFY_PENDING, VERIFY_RATE_LIMITED,
+    VERIFY_SUCCESS
+)
+from services.token_bucket import TokenBucket
+
+COLLECTION = 'withdrawals'
+
+STATUS_QUEUED = 'queued'
+STATUS_SUBMITTED = 'submitted'
+STATUS_PAID = 'paid'
+STATUS_FAILED = 'failed'
+# Chapa never settled it either way; the reservation is held for an operator
+STATUS_REVIEW = 'review'
+
+# Chapa needs a moment before a queued transfer can be verified; polls then
+# back off exponentially up to an hour apart
+FIRST_POLL_SECONDS = 60
+RETRY_SECONDS = 60
+MAX_BACKOFF_SECONDS = 3600
+# A claimed withdrawal is skipped by other runs for this long
+CLAIM_SECONDS = 300
+MAX_ATTEMPTS = 5
+# A sent transfer Chapa does not list yet is only resent (or failed) once this has passed
+NOT_FOUND_GRACE_SECONDS = 1800
+# Pending / not-found answers after which a submitted withdrawal goes to review
+MAX_POLLS = 24
+REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+OUTCOME_SUBMITTED = 'submitted'
+OUTCOME_PAID = 'paid'
+OUTCOME_FAILED = 'failed'
+OUTCOME_RETRY = 'retry'
+OUTCOME_CONFLICT = 'conflict'
+OUTCOME_REVIEW = 'review'
+
+class PayoutError(Exception):
+    """Raised when withdrawals cannot be queued or processed"""
+
+class WithdrawalRejected(PayoutError):
+    """Raised when a withdrawal request breaks a limit or the wallet cannot pay it"""
+
+def withdrawal_id(user_id: str, request_id: Optional[str]) -> str:
+    """Document id and Chapa reference of a withdrawal (deterministic when the client sends a requestId)"""
+    if not request_id:
+        return f'wd-{uuid.uuid4().hex}'
+    return 'wd-' + hashlib.sha256(f'{user_id}:{request_id}'.encode('utf-8')).hexdigest()[:32]
+
+class PayoutQueue:
+    """Chapa payouts for wallet withdrawals.
+
+    A request reserves the funds in a Firestore transaction: the wallet
+    ``balance`` moves into ``reservedBalance`` and ``withdrawals/{id}`` is
+    created with the next time to act (``nextCheckAt``), together with a
+    pending ``transactions/{id}`` record. The queue is therefore durable and
+    a withdrawal is never paid without a reservation.
+
+    A run claims due withdrawals (like the deposit reconciler) and, on a
+    small thread pool behind a shared rate limit:
+
+    - submits queued ones to Chapa's bulk transfer API, up to
+      CHAPA_PAYOUT_CHUNK per request; a chunk Chapa rejects is retried one
+      transfer at a time, so one bad account fails only itself
+    - verifies submitted ones: success settles the reservation; failure
+      returns it to the balance; still pending is polled again with backoff,
+      and after MAX_POLLS polls the withdrawal is held for review with its
+      funds still reserved
+
+    A withdrawal is marked in flight (with ``submittedAt``) before it is
+    sent. If the submission's outcome is unknown (a timeout, a 5xx or a
+    crash), its reference is verified before it is sent again, and a
+    not-found answer is only trusted NOT_FOUND_GRACE_SECONDS after it was
+    sent; Chapa answering that a reference was already used counts as
+    submitted. Only a transfer Chapa rejects on its own is failed on
+    submission; credential or merchant balance refusals leave everything
+    queued and stop the run. Every final write carries an update-time
+    precondition from the claim, so a reservation is settled or released
+    once.
+    """
+
+    def __init__(self, firebase_manager, chapa_service: ChapaService, min_amount: float = 50.0,
+                 max_amount: float = 50000.0, chunk_size: int = MAX_BULK_TRANSFERS, concurrency: int = 4,
+                 rate_per_second: float = 5.0, batch: int = 500):
+        self.firebase_manager = firebase_manager
+        self.chapa_service = chapa_service
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.chunk_size = min(chunk_size, MAX_BULK_TRANSFERS)
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.batch = batch
+
+    @classmethod
+    def from_config(cls, firebase_manager, config=None) -> 'PayoutQueue':
+        """Queue bound to the active configuration (Chapa keys can be reloaded)"""
+        config = config or get_config()
+        return cls(firebase_manager, ChapaService(config), config.WITHDRAWAL_MIN_AMOUNT,
+                   config.WITHDRAWAL_MAX_AMOUNT, config.CHAPA_PAYOUT_CHUNK, config.CHAPA_PAYOUT_CONCURRENCY,
+                   config.CHAPA_VERIFY_RATE_PER_SECOND, config.CHAPA_PAYOUT_BATCH)
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise PayoutError('Database unavailable')
+        return db
+
+    def request(self, user_id: str, amount: Any, account_name: str, account_number: str, bank_code: Any,
+                request_id: Optional[str] = None) -> Dict[str, Any]:
+        """Reserve amount from the user's wallet and queue its payout.
+
+        Returns the withdrawal; ``duplicate`` is True if request_id was
+        queued before (nothing is reserved twice).
+        """
+        try:
+            amount = round(float(amount), 2)
+        except (TypeError, ValueError):
+            raise WithdrawalRejected('Invalid withdrawal amount')
+        account_name = (account_name or '').strip()
+        account_number = (account_number or '').strip()
+        if not account_name or not account_number or bank_code in (None, ''):
+            raise WithdrawalRejected('accountName, accountNumber and bankCode are required')
+        if not amount >= self.min_amount:
+            raise WithdrawalRejected(f'Minimum withdrawal is {self.min_amount:g} ETB')
+        if amount > self.max_amount:
+            raise WithdrawalRejected(f'Maximum withdrawal is {self.max_amount:g} ETB')
+        if request_id is not None and not REQUEST_ID.match(request_id):
+            raise WithdrawalRejected('requestId must be 1-64 letters, digits, _ or -')
+
+        db = self._db()
+        now = datetime.now(timezone.utc)
+        key = withdrawal_id(user_id, request_id)
+        withdrawal_ref = db.collection(COLLECTION).document(key)
+        wallet_ref = db.collection('wallets').document(user_id)
+        record = {
+            'userId': user_id,
+            'amount': amount,
+            'currency': 'ETB',
+            'accountName': account_name,
+            'accountNumber': account_number,
+            'bankCode': str(bank_code),
+            'status': STATUS_QUEUED,
+            'inFlight': False,
+            'attempts': 0,
+            'createdAt': now,
+            'nextCheckAt': now
+        }
+
+        @firestore.transactional
+        def _reserve(transaction):
+            existing = withdrawal_ref.get(transaction=transaction)
+            if existing.exists:
+                return existing.to_dict(), True
+            wallet = wallet_ref.get(transaction=transaction)
+            if not wallet.exists:
+                raise WithdrawalRejected('Wallet not found')
+            data = wallet.to_dict() or {}
+            if data.get('isLocked'):
+                raise WithdrawalRejected('Wallet is locked for security reasons')
+            balance = float(data.get('balance') or 0)
+            if balance < amount:
+                raise WithdrawalRejected('Insufficient balance')
+            transaction.update(wallet_ref, {
+                'balance': round(balance - amount, 2),
+                'reservedBalance': round(float(data.get('reservedBalance') or 0) + amount, 2),
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            })
+            transaction.create(withdrawal_ref, record)
+            transaction.set(db.collection('transactions').document(key), {
+                'userId': user_id,
+                'type': 'withdrawal',
+                'amount': amount,
+                'currency': 'ETB',
+                'status': 'pending',
+                'paymentMethod': 'chapa',
+                'description': f'Withdrawal to {account_name}',
+                'metadata': {'withdrawalId': key, 'bankCode': str(bank_code)},
+                'createdAt': firestore.SERVER_TIMESTAMP,
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            })
+            return record, False
+
+        result, duplicate = _reserve(db.transaction())
+        if not duplicate:
+            print(f"Withdrawal {key} queued: user {user_id}, amount: {amount} ETB")
+        return {'id': key, 'amount': result.get('amount'), 'status': result.get('status'), 'duplicate': duplicate}
+
+    def process(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Submit and verify every due withdrawal once; returns a count per outcome"""
+        db = self._db()
+        now = datetime.now(timezone.utc)
+        due = (db.collection(COLLECTION)
+               .where('nextCheckAt', '<=', now)
+               .order_by('nextCheckAt')
+               .limit(limit or self.batch)
+               .stream())
+        claimed: List[Tuple[Any, Dict[str, Any], Any]] = []
+        for doc in due:
+            update_time = self._claim(db, doc, now)
+            if update_time is not None:
+                claimed.append((doc.reference, doc.to_dict() or {}, update_time))
+
+        counts: Dict[str, int] = {}
+        if not claimed:
+            return counts
+
+        def count(outcome: str, n: int = 1) -> None:
+            counts[outcome] = counts.get(outcome, 0) + n
+
+        limiter = TokenBucket(self.rate_per_second)
+        # Set on a rate limit or a refusal for the whole merchant account
+        halted = threading.Event()
+        started = time.monotonic()
+        # Queued withdrawals that were never sent go straight out; the rest are verified first
+        to_submit, to_verify = [], []
+        for item in claimed:
+            fresh = item[1].get('status') == STATUS_QUEUED and not item[1].get('inFlight')
+            (to_submit if fresh else to_verify).append(item)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='chapa-payout') as pool:
+            def verify(reference: str) -> ChapaVerification:
+                if halted.is_set():
+                    return ChapaVerification(VERIFY_RATE_LIMITED, message='Skipped after Chapa refused a request')
+                limiter.wait()
+                verification = self.chapa_service.check_transfer(reference)
+                if verification.state == VERIFY_RATE_LIMITED:
+                    halted.set()
+                return verification
+
+            futures = {pool.submit(verify, item[0].id): item for item in to_verify}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    outcome = self._apply_verification(db, item, future.result())
+                except Exception as e:
+                    print(f"Error verifying withdrawal {item[0].id}: {e}")
+                    outcome = OUTCOME_RETRY
+                if outcome == VERIFY_NOT_FOUND:
+                    # Not listed long after it was sent; resending the same reference is safe
+                    to_submit.append(item)
+                else:
+                    count(outcome)
+
+            if to_submit:
+                to_submit = self._mark_in_flight(db, to_submit)
+                chunks = [to_submit[i:i + self.chunk_size] for i in range(0, len(to_submit), self.chunk_size)]
+                futures = {pool.submit(self._submit, db, chunk, limiter, halted): chunk for chunk in chunks}
+                for future in as_completed(futures):
+                    try:
+                        for outcome, n in future.result().items():
+                            count(outcome, n)
+                    except Exception as e:
+                        print(f"Error submitting {len(futures[future])} withdrawal(s): {e}")
+                        count(OUTCOME_RETRY, len(futures[future]))
+
+        print(f"Chapa payouts: {counts} for {len(claimed)} withdrawal(s) in {time.monotonic() - started:.1f}s")
+        return counts
+
+    def _claim(self, db, doc, now: datetime):
+        """Push the withdrawal's next check past the claim window; None if another run got it first"""
+        try:
+            result = doc.reference.update({
+                'nextCheckAt': now + timedelta(seconds=CLAIM_SECONDS),
+                'claimedAt': now
+            }, option=db.write_option(last_update_time=doc.update_time))
+            return result.update_time
+        except (FailedPrecondition, NotFound):
+            return None
+
+    def _mark_in_flight(self, db, items: List[Tuple[Any, Dict[str, Any], Any]]):
+        """Record that these are about to be sent, before sending them"""
+        marked = []
+        now = datetime.now(timezone.utc)
+        for start in range(0, len(items), 500):
+            chunk = items[start:start + 500]
+            batch = db.batch()
+            for ref, data, update_time in chunk:
+                batch.update(ref, {'inFlight': True, 'attempts': data.get('attempts', 0) + 1, 'submittedAt': now},
+                             option=db.write_option(last_update_time=update_time))
+            try:
+                results = batch.commit()
+            except (FailedPrecondition, NotFound):
+                # Claim lost to another run (after CLAIM_SECONDS); leave these to it
+                continue
+            marked.extend((ref, {**data, 'inFlight': True, 'attempts': data.get('attempts', 0) + 1, 'submittedAt': now},
+                           result.update_time)
+                          for (ref, data, _), result in zip(chunk, results))
+        return marked
+
+    def _submit(self, db, chunk, limiter: TokenBucket, halted: threading.Event) -> Dict[str, int]:
+        if halted.is_set():
+            submission = ChapaSubmission(VERIFY_RATE_LIMITED, message='Skipped after Chapa refused a request')
+        else:
+            limiter.wait()
+            submission = self.chapa_service.bulk_transfer(f'Bingo withdrawals ({len(chunk)})', [{
+                'account_name': data['accountName'],
+                'account_number': data['accountNumber'],
+                'amount': data['amount'],
+                'reference': ref.id,
+                'bank_code': data['bankCode']
+            } for ref, data, _ in chunk])
+            if submission.state in (VERIFY_RATE_LIMITED, SUBMIT_REFUSED):
+                halted.set()
+            if submission.state == SUBMIT_REFUSED:
+                print(f"Chapa refused payouts for the merchant account: {submission.message}")
+
+        if submission.state in (SUBMIT_REJECTED, SUBMIT_DUPLICATE) and len(chunk) > 1:
+            # One invalid account or reused reference fails the whole request; find it by sending each alone
+            counts: Dict[str, int] = {}
+            for item in chunk:
+                for outcome, n in self._submit(db, [item], limiter, halted).items():
+                    counts[outcome] = counts.get(outcome, 0) + n
+            return counts
+
+        outcomes = [self._apply_submission(db, item, submission) for item in chunk]
+        counts = {}
+        for outcome in outcomes:
+            counts[outcome] = counts.get(outcome, 0) + 1
+        return counts
+
+    def _apply_submission(self, db, item, submission: ChapaSubmission) -> str:
+        ref, data, update_time = item
+        now = datetime.now(timezone.utc)
+        if submission.state in (SUBMIT_ACCEPTED, SUBMIT_DUPLICATE):
+            # A reused reference means an earlier attempt reached Chapa; poll it like a new one
+            return self._update(db, item, {
+                'status': STATUS_SUBMITTED,
+                'chapaBatchId': submission.batch_id or data.get('chapaBatchId'),
+                'polls': 0,
+                'nextCheckAt': now + timedelta(seconds=FIRST_POLL_SECONDS)
+            }, OUTCOME_SUBMITTED)
+        if submission.state == SUBMIT_REJECTED:
+            return self._finish(db, item, STATUS_FAILED, submission.message)
+        if submission.state in (VERIFY_RATE_LIMITED, SUBMIT_REFUSED):
+            # Definitely not sent
+            return self._update(db, item, {
+                'inFlight': False,
+                'attempts': data.get('attempts', 1) - 1,
+                'lastError': submission.message,
+                'nextCheckAt': now + timedelta(seconds=RETRY_SECONDS)
+            }, OUTCOME_RETRY)
+        # Unknown: stays in flight, so the next run verifies it before sending again
+        return self._reschedule(db, item, data.get('attempts', 1), submission.message)
+
+    def _apply_verification(self, db, item, verification: ChapaVerification) -> str:
+        ref, data, update_time = item
+        if verification.state == VERIFY_SUCCESS:
+            return self._finish(db, item, STATUS_PAID, verification.message)
+        if verification.state == VERIFY_FAILED:
+            return self._finish(db, item, STATUS_FAILED, verification.message or 'Transfer failed')
+        if verification.state == VERIFY_NOT_FOUND and data.get('status') == STATUS_QUEUED:
+            # Sent with an unknown outcome; Chapa may not list a queued transfer straight away
+            sent = data.get('submittedAt') or data.get('createdAt')
+            if sent is None or datetime.now(timezone.utc) - sent >= timedelta(seconds=NOT_FOUND_GRACE_SECONDS):
+                if data.get('attempts', 0) >= MAX_ATTEMPTS:
+                    return self._finish(db, item, STATUS_FAILED, f'Not accepted by Chapa after {MAX_ATTEMPTS} attempts')
+                return VERIFY_NOT_FOUND
+        # Still processing (or Chapa could not answer): poll again later
+        fields: Dict[str, Any] = {}
+        if verification.state == VERIFY_PENDING and data.get('status') == STATUS_QUEUED:
+            # The earlier submission did reach Chapa
+            fields['status'] = STATUS_SUBMITTED
+        polls = data.get('polls', 0) + (1 if verification.state in (VERIFY_PENDING, VERIFY_NOT_FOUND) else 0)
+        if polls >= MAX_POLLS:
+            return self._hold(db, item, f'No final answer from Chapa after {polls} checks'
+                              + (f': {verification.message}' if verification.message else ''))
+        fields['polls'] = polls
+        return self._reschedule(db, item, max(polls, 1), verification.message, fields)
+
+    def _hold(self, db, item, reason: str) -> str:
+        """Stop polling and keep the funds reserved until an operator settles the withdrawal"""
+        ref, data, _ = item
+        outcome = self._update(db, item, {
+            'status': STATUS_REVIEW,
+            'statusReason': reason,
+            'nextCheckAt': firestore.DELETE_FIELD
+        }, OUTCOME_REVIEW)
+        if outcome == OUTCOME_REVIEW:
+            print(f"Withdrawal {ref.id} needs review: user {data['userId']}, amount: {data['amount']} ETB ({reason})")
+        return outcome
+
+    def _reschedule(self, db, item, attempts: int, message: str, fields: Optional[Dict[str, Any]] = None) -> str:
+        delay = min(RETRY_SECONDS * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS) * random.uniform(0.8, 1.2)
+        return self._update(db, item, {
+            **(fields or {}),
+            'lastError': message or None,
+            'nextCheckAt': datetime.now(timezone.utc) + timedelta(seconds=delay)
+        }, OUTCOME_RETRY)
+
+    @staticmethod
+    def _update(db, item, fields: Dict[str, Any], outcome: str) -> str:
+        ref, _, update_time = item
+        try:
+            ref.update(fields, option=db.write_option(last_update_time=update_time))
+        except (FailedPrecondition, NotFound):
+            return OUTCOME_CONFLICT
+        return outcome
+
+    def _finish(self, db, item, status: str, reason: str) -> str:
+        """Settle the reservation (paid) or return it to the balance (failed), once"""
+        ref, data, update_time = item
+        amount = float(data['amount'])
+        wallet = {'reservedBalance': firestore.Increment(-amount), 'updatedAt': firestore.SERVER_TIMESTAMP}
+        if status == STATUS_FAILED:
+            wallet['balance'] = firestore.Increment(amount)
+        batch = db.batch()
+        batch.update(ref, {
+            'status': status,
+            'inFlight': False,
+            'statusReason': reason or None,
+            'completedAt': datetime.now(timezone.utc),
+            'nextCheckAt': firestore.DELETE_FIELD
+        }, option=db.write_option(last_update_time=update_time))
+        batch.update(db.collection('wallets').document(data['userId']), wallet)
+        batch.set(db.collection('transactions').document(ref.id), {
+            'status': 'completed' if status == STATUS_PAID else 'failed',
+            'statusReason': reason or None,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+        try:
+            batch.commit()
+        except (FailedPrecondition, NotFound):
+            return OUTCOME_CONFLICT
+        print(f"Withdrawal {ref.id} {status}: user {data['userId']}, amount: {amount} ETB"
+              + (f" ({reason})" if status == STATUS_FAILED and reason else ''))
+        return OUTCOME_PAID if status == STATUS_PAID else OUTCOME_FAILED
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from services.token_bucket import TokenBucket
+
+SCOPE_USER = 'user'
+SCOPE_IP = 'ip'
+
+# Buckets kept per process; the least recently used are dropped beyond this
+MAX_BUCKETS = 50000
+
+@dataclass(frozen=True)
+class Limit:
+    """A token bucket: refills at rate tokens per second up to burst tokens"""
+    scope: str
+    rate: float
+    burst: int
+
+def per_minute(scope: str, count: int, burst: Optional[int] = None) -> Limit:
+    return Limit(scope, count / 60.0, burst or count)
+
+# Route policies by URL rule. A request must get a token from every limit of
+# its route. Routes without a policy are not limited.
+POLICIES: Dict[str, Tuple[Limit, ...]] = {
+    # Each one creates a Chapa checkout and writes two documents
+    '/api/payment/initiate': (per_minute(SCOPE_USER, 5), per_minute(SCOPE_IP, 20)),
+    '/api/wallet/deposit': (per_minute(SCOPE_USER, 5), per_minute(SCOPE_IP, 20)),
+    '/api/payment/verify/<tx_ref>': (per_minute(SCOPE_USER, 20), per_minute(SCOPE_IP, 60)),
+    # Chapa redirects the payer here, so it is keyed by IP only
+    '/api/payment-callback': (per_minute(SCOPE_IP, 30, burst=10),),
+    # One claim per day succeeds; retries only cost reads
+    '/api/bonus/daily/claim': (per_minute(SCOPE_USER, 10), per_minute(SCOPE_IP, 60)),
+    # Each one runs a Firestore transaction over two wallets
+    '/api/wallet/transfers': (per_minute(SCOPE_USER, 10), per_minute(SCOPE_IP, 30)),
+    # Each one reserves funds for a real payout
+    '/api/wallet/withdrawals': (per_minute(SCOPE_USER, 5), per_minute(SCOPE_IP, 20)),
+    # Unauthenticated; may call Firebase Auth create_user and create_custom_token
+    '/api/telegram/login': (per_minute(SCOPE_IP, 10),),
+    # Telegram delivers from a handful of addresses, so these are generous
+    '/api/telegram/webhook': (Limit(SCOPE_IP, 30.0, 100),),
+    '/api/telegram/payment-webhook': (Limit(SCOPE_IP, 10.0, 30),),
+}
+
+class MemoryBucketStore:
+    """Token buckets in this process (each gunicorn worker limits on its own)"""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or TokenBucket(limit.rate, limit.burst)
+            # Limits can change with a config reload; existing buckets follow them
+            bucket.rate, bucket.burst = limit.rate, float(limit.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return bucket.take()
+
+# Same bucket as TokenBucket.take, evaluated atomically on the server.
+# KEYS[1] = bucket, ARGV = rate, burst, now; returns the wait in milliseconds.
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return math.ceil(wait * 1000)
+"""
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through Redis (or a compatible server such as Valkey or KeyDB).
+
+    Needs the optional ``redis`` package. If the server cannot be reached the
+    bucket is taken from a local MemoryBucketStore instead, so an outage
+    degrades to per-worker limits rather than blocking or failing requests.
+    """
+
+    def __init__(self, url: str, prefix: str = 'ratelimit:'):
+        import redis  # Optional dependency, only needed for shared buckets
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self._fallback = MemoryBucketStore()
+        self._errors = redis.RedisError
+
+    def take(self, key: str, limit: Limit) -> float:
+        try:
+            return self._take(keys=[self.prefix + key], args=[limit.rate, limit.burst, time.time()]) / 1000.0
+        except self._errors as e:
+            print(f"Rate limit store unavailable, limiting locally: {e}")
+            return self._fallback.take(key, limit)
+
+def create_store(url: Optional[str]):
+    """Bucket store for RATE_LIMIT_STORAGE_URL (in-process when empty)"""
+    if not url:
+        return MemoryBucketStore()
+    try:
+        return RedisBucketStore(url)
+    except ImportError:
+        print("RATE_LIMIT_STORAGE_URL is set but the redis package is not installed; limiting per worker")
+        return MemoryBucketStore()
+
+class RateLimiter:
+    """Per-route token-bucket limits keyed by user and by client IP.
+
+    Meant to run before anything else touches a request, so a throttled
+    request never reaches Firebase initialization, token verification,
+    Chapa or Firestore. Users are identified by a hash of their bearer
+    token rather than by verifying it, which costs nothing and cannot be
+    used to spend another user's tokens without holding their token.
+    """
+
+    def __init__(self, store=None, policies: Optional[Dict[str, Tuple[Limit, ...]]] = None,
+                 trusted_proxies: int = 1):
+        self.store = store or MemoryBucketStore()
+        self.policies = POLICIES if policies is None else policies
+        self.trusted_proxies = trusted_proxies
+
+    def client_ip(self, remote_addr: Optional[str], forwarded_for: Optional[str]) -> str:
+        """Client address, trusting as many X-Forwarded-For hops as there are proxies in front"""
+        if self.trusted_proxies and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+            if len(hops) >= self.trusted_proxies:
+                return hops[-self.trusted_proxies]
+        return remote_addr or 'unknown'
+
+    @staticmethod
+    def user_key(authorization: Optional[str]) -> Optional[str]:
+        if not authorization or not authorization.startswith('Bearer '):
+            return None
+        return hashlib.sha256(authorization[7:].encode()).hexdigest()[:32]
+
+    def check(self, rule: Optional[str], ip: str, authorization: Optional[str] = None) -> float:
+        """Take a token from every limit of the route; returns 0 if allowed, else the retry delay in seconds"""
+        limits = self.policies.get(rule) if rule else None
+        if not limits:
+            return 0.0
+        user = self.user_key(authorization)
+        wait = 0.0
+        for limit in limits:
+            # Requests without a token are keyed by IP (they are rejected by auth anyway)
+            subject = user if limit.scope == SCOPE_USER and user else ip
+            wait = max(wait, self.store.take(f'{rule}|{limit.scope}|{subject}', limit))
+        return wait
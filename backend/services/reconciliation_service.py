@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from database.firebase import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from config.settings import get_config
+from services.chapa_service import (
+    ChapaService, ChapaVerification, VERIFY_ERROR, VERIFY_FAILED, VERIFY_NOT_FOUND,
+    VERIFY_PENDING, VERIFY_RATE_LIMITED, VERIFY_SUCCESS
+)
+from database.sharded_counter import ShardedCounter
+from services.ledger import Ledger
+from services.token_bucket import TokenBucket
+
+PENDING_COLLECTION = 'pendingPayments'
+
+# First check shortly after initiation (most callbacks arrive well within
+# this), then back off exponentially up to an hour between checks
+FIRST_CHECK_SECONDS = 120
+MAX_BACKOFF_SECONDS = 3600
+# A claimed record is skipped by other sweeps for this long
+CLAIM_SECONDS = 300
+
+OUTCOME_SETTLED = 'settled'
+OUTCOME_DUPLICATE = 'duplicate'
+OUTCOME_FAILED = 'failed'
+OUTCOME_EXPIRED = 'expired'
+OUTCOME_RETRY = 'retry'
+OUTCOME_UNKNOWN = 'unknown'
+
+class ReconciliationError(Exception):
+    """Raised when payments cannot be reconciled"""
+
+def ledger_entry_id(tx_ref: str) -> str:
+    return f'chapa_{tx_ref}'
+
+class PaymentReconciler:
+    """Settles Chapa deposits whose callback never arrived.
+
+    Initiating a payment writes ``transactions/{tx_ref}`` (status pending) and
+    ``pendingPayments/{tx_ref}`` with the next time to check. A sweep claims
+    due records, verifies them with Chapa on a small thread pool behind a
+    shared rate limit, and then:
+
+    - success: credits the verified amount through the Ledger, completing
+      the transaction and removing the pending record in the same batch
+    - failed: marks the transaction failed
+    - still pending / not found: checks again later with exponential backoff,
+      or expires it once older than CHAPA_PENDING_MAX_AGE_HOURS
+    - rate limited: stops verifying for this sweep and reschedules the rest
+
+    The Chapa callback goes through the same path, so a payment reported by
+    both is credited once.
+    """
+
+    def __init__(self, firebase_manager, chapa_service: ChapaService, ledger: Ledger):
+        self.firebase_manager = firebase_manager
+        self.chapa_service = chapa_service
+        self.ledger = ledger
+
+    @classmethod
+    def from_config(cls, firebase_manager, config=None) -> 'PaymentReconciler':
+        """Reconciler bound to the active configuration (Chapa keys can be reloaded)"""
+        config = config or get_config()
+        counter = ShardedCounter(config.COUNTER_SHARDS, config.COUNTER_STALENESS_SECONDS)
+        return cls(firebase_manager, ChapaService(config), Ledger(firebase_manager, counter))
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise ReconciliationError('Database unavailable')
+        return db
+
+    def record_pending(self, tx_ref: str, user_id: str, amount: float, source: str = 'web') -> None:
+        """Record an initiated payment so it is settled even if the callback is lost"""
+        db = self._db()
+        now = datetime.now(timezone.utc)
+        batch = db.batch()
+        batch.set(db.collection('transactions').document(tx_ref), {
+            'userId': user_id,
+            'type': 'deposit',
+            'amount': amount,
+            'currency': 'ETB',
+            'status': 'pending',
+            'paymentMethod': 'chapa',
+            'tx_ref': tx_ref,
+            'metadata': {'source': source},
+            'createdAt': firestore.SERVER_TIMESTAMP,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        batch.set(db.collection(PENDING_COLLECTION).document(tx_ref), {
+            'userId': user_id,
+            'amount': amount,
+            'attempts': 0,
+            'createdAt': now,
+            'nextCheckAt': now + timedelta(seconds=FIRST_CHECK_SECONDS)
+        })
+        batch.commit()
+
+    def reconcile(self, tx_ref: str) -> str:
+        """Verify and apply a single payment now (used by the Chapa callback)"""
+        db = self._db()
+        pending_doc = db.collection(PENDING_COLLECTION).document(tx_ref).get()
+        pending = pending_doc.to_dict() if pending_doc.exists else None
+        return self.apply(tx_ref, pending, self.chapa_service.check_payment(tx_ref))
+
+    def sweep(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Verify every due pending payment once; returns a count per outcome"""
+        db = self._db()
+        config = get_config()
+        now = datetime.now(timezone.utc)
+        due = (db.collection(PENDING_COLLECTION)
+               .where('nextCheckAt', '<=', now)
+               .order_by('nextCheckAt')
+               .limit(limit or config.CHAPA_RECONCILE_BATCH)
+               .stream())
+        claimed = [doc for doc in due if self._claim(db, doc, now)]
+
+        counts: Dict[str, int] = {}
+        if not claimed:
+            return counts
+
+        limiter = TokenBucket(config.CHAPA_VERIFY_RATE_PER_SECOND)
+        rate_limited = threading.Event()
+
+        def verify(tx_ref: str) -> ChapaVerification:
+            if rate_limited.is_set():
+                return ChapaVerification(VERIFY_RATE_LIMITED, message='Skipped after Chapa rate limit')
+            limiter.wait()
+            verification = self.chapa_service.check_payment(tx_ref)
+            if verification.state == VERIFY_RATE_LIMITED:
+                rate_limited.set()
+            return verification
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=config.CHAPA_RECONCILE_CONCURRENCY,
+                                thread_name_prefix='chapa-reconcile') as pool:
+            futures = {pool.submit(verify, doc.id): doc for doc in claimed}
+            for future in as_completed(futures):
+                doc = futures[future]
+                try:
+                    outcome = self.apply(doc.id, doc.to_dict(), future.result())
+                except Exception as e:
+                    print(f"Error reconciling {doc.id}: {e}")
+                    outcome = OUTCOME_RETRY
+                counts[outcome] = counts.get(outcome, 0) + 1
+
+        print(f"Chapa reconciliation: {counts} for {len(claimed)} payment(s) in {time.monotonic() - started:.1f}s")
+        return counts
+
+    def _claim(self, db, doc, now: datetime) -> bool:
+        """Push the record's next check past the claim window unless another sweep got it first"""
+        try:
+            doc.reference.update({
+                'nextCheckAt': now + timedelta(seconds=CLAIM_SECONDS),
+                'claimedAt': now
+            }, option=db.write_option(last_update_time=doc.update_time))
+            return True
+        except (FailedPrecondition, NotFound):
+            return False
+
+    def apply(self, tx_ref: str, pending: Optional[Dict[str, Any]], verification: ChapaVerification) -> str:
+        """Settle, fail, expire or reschedule a payment based on a verification"""
+        db = self._db()
+        transaction_ref = db.collection('transactions').document(tx_ref)
+        pending_ref = db.collection(PENDING_COLLECTION).document(tx_ref)
+
+        if verification.state == VERIFY_SUCCESS:
+            user_id = (pending or {}).get('userId')
+            if not user_id:
+                # Payments initiated before pending records existed
+                transaction_doc = transaction_ref.get()
+                user_id = transaction_doc.to_dict().get('userId') if transaction_doc.exists else None
+            if not user_id:
+                print(f"Verified Chapa payment {tx_ref} has no known user")
+                return OUTCOME_UNKNOWN
+
+            batch = db.batch()
+            batch.set(transaction_ref, {
+                'userId': user_id,
+                'type': 'deposit',
+                'amount': verification.amount,
+                'currency': verification.currency or 'ETB',
+                'status': 'completed',
+                'paymentMethod': 'chapa',
+                'tx_ref': tx_ref,
+                'chapaReference': verification.reference,
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            }, merge=True)
+            batch.delete(pending_ref)
+            posted = self.ledger.post(ledger_entry_id(tx_ref), user_id, verification.amount, 'deposit', {
+                'tx_ref': tx_ref,
+                'chapaReference': verification.reference,
+                'expectedAmount': (pending or {}).get('amount')
+            }, batch=batch)
+            if not posted:
+                # Already credited (callback and sweep raced); only clean up
+                pending_ref.delete()
+                return OUTCOME_DUPLICATE
+            print(f"Chapa deposit settled: {tx_ref}, user {user_id}, amount: {verification.amount} ETB")
+            return OUTCOME_SETTLED
+
+        if verification.state == VERIFY_FAILED:
+            self._close(db, transaction_ref, pending_ref, 'failed', verification.message)
+            return OUTCOME_FAILED
+
+        if pending is None:
+            return OUTCOME_RETRY
+
+        created_at = pending.get('createdAt') or datetime.now(timezone.utc)
+        max_age = timedelta(hours=get_config().CHAPA_PENDING_MAX_AGE_HOURS)
+        if verification.state in (VERIFY_PENDING, VERIFY_NOT_FOUND) and datetime.now(timezone.utc) - created_at > max_age:
+            self._close(db, transaction_ref, pending_ref, 'expired', verification.message)
+            return OUTCOME_EXPIRED
+
+        # Still pending, or Chapa could not answer: check again later
+        attempts = pending.get('attempts', 0) + (0 if verification.state == VERIFY_RATE_LIMITED else 1)
+        delay = min(FIRST_CHECK_SECONDS * 2 ** attempts, MAX_BACKOFF_SECONDS) * random.uniform(0.8, 1.2)
+        pending_ref.set({
+            'attempts': attempts,
+            'lastState': verification.state,
+            'lastError': verification.message if verification.state in (VERIFY_ERROR, VERIFY_RATE_LIMITED) else None,
+            'nextCheckAt': datetime.now(timezone.utc) + timedelta(seconds=delay)
+        }, merge=True)
+        return OUTCOME_RETRY
+
+    def _close(self, db, transaction_ref, pending_ref, status: str, reason: str) -> None:
+        # A payment that completes after expiry is still credited by a later
+        # callback: closing never writes a ledger entry, nor undoes one
+        if self.ledger.exists(ledger_entry_id(transaction_ref.id)):
+            pending_ref.delete()
+            return
+        batch = db.batch()
+        batch.set(transaction_ref, {
+            'status': status,
+            'statusReason': reason,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+        batch.delete(pending_ref)
+        batch.commit()
+        print(f"Chapa payment {transaction_ref.id} {status}: {reason}")
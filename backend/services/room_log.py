@@ -0,0 +1,240 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from services import win_engine
+
+EVENT_CALL = 'call'
+EVENT_STATUS = 'status'
+EVENT_JOIN = 'join'
+EVENT_LEAVE = 'leave'
+EVENT_WINNERS = 'winners'
+
+# Rooms whose log is cached per process; the least recently used are dropped
+MAX_ROOMS = 2000
+# Players' cards cached per process (cards are write-once)
+MAX_CARDS = 20000
+# Log writes that lose a race with another worker are re-read and retried
+MAX_ATTEMPTS = 5
+
+class RoomLogError(Exception):
+    """Raised when a room's event log cannot be read or advanced"""
+
+class RoomNotFound(RoomLogError):
+    """Raised when the game room does not exist"""
+
+def _player_id(player: Any) -> str:
+    # The players array holds Player objects, or bare uids in rooms created by older clients
+    return str(player.get('id') or player.get('userId') or '') if isinstance(player, dict) else str(player)
+
+def room_state(room: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a room document the event log tracks"""
+    winners = room.get('winnerIds') or ([room['winnerId']] if room.get('winnerId') else [])
+    return {
+        'called': [int(number) for number in room.get('calledNumbers') or []],
+        'status': room.get('status'),
+        'players': [_player_id(player) for player in room.get('players') or []],
+        'winners': list(winners)
+    }
+
+def diff(state: Dict[str, Any], room: Dict[str, Any]) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+    """Events that take the logged state to the room's current state.
+
+    Returns (events, reset); reset is True when the room cannot be reached
+    by appending, i.e. its call sequence was replaced rather than extended.
+    """
+    current = room_state(room)
+    called = state.get('called') or []
+    if current['called'][:len(called)] != called:
+        return [], True
+
+    events: List[Tuple[str, Dict[str, Any]]] = []
+    if current['status'] != state.get('status'):
+        events.append((EVENT_STATUS, {'status': current['status']}))
+    before = set(state.get('players') or [])
+    after = set(current['players'])
+    names = {_player_id(player): player.get('name') for player in room.get('players') or [] if isinstance(player, dict)}
+    events.extend((EVENT_JOIN, {'userId': player, 'name': names.get(player)})
+                  for player in current['players'] if player not in before)
+    events.extend((EVENT_LEAVE, {'userId': player}) for player in state.get('players') or [] if player not in after)
+    events.extend((EVENT_CALL, {'n': number}) for number in current['called'][len(called):])
+    if current['winners'] != (state.get('winners') or []):
+        events.append((EVENT_WINNERS, {'userIds': current['winners'], 'pattern': room.get('winPattern'),
+                                       'amount': room.get('winAmount')}))
+    return events, False
+
+class _Entry:
+    __slots__ = ('lock', 'fetched', 'log', 'room')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetched = 0.0
+        self.log: Optional[Dict[str, Any]] = None
+        self.room: Optional[Dict[str, Any]] = None
+
+class RoomEventLog:
+    """Append-only, sequence-numbered event log per game room for reconnect sync.
+
+    Rooms are written by clients, so the log is kept by diffing: a sync
+    reads the room and ``gameRooms/{id}/sync/log`` together, turns whatever
+    changed since the logged state into events (``call``, ``status``,
+    ``join``, ``leave``, ``winners``) with the next sequence numbers, and
+    writes the log back with an update-time precondition. Two workers that
+    race re-read and agree on one history; the room document itself is
+    never locked, so number calls are not slowed down.
+
+    The log keeps the last SYNC_MAX_EVENTS events. ``sync(since)`` returns
+    the events after ``since``, or a compact snapshot of the room when the
+    client is more than SYNC_MAX_GAP events behind, is older than the kept
+    events, or the room was restarted. Each worker caches a room's log for
+    SYNC_CACHE_SECONDS, so a room full of reconnecting players costs one
+    read per worker per interval.
+    """
+
+    def __init__(self, firebase_manager, max_events: int = 200, max_gap: int = 50, cache_seconds: float = 1.0):
+        self.firebase_manager = firebase_manager
+        self.max_events = max_events
+        self.max_gap = max_gap
+        self.cache_seconds = cache_seconds
+        self._rooms: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._cards: 'OrderedDict[Tuple[str, str], List[int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, firebase_manager, config) -> 'RoomEventLog':
+        return cls(firebase_manager, config.SYNC_MAX_EVENTS, config.SYNC_MAX_GAP, config.SYNC_CACHE_SECONDS)
+
+    def configure(self, config) -> None:
+        """Apply reloaded SYNC_* settings"""
+        self.max_events = config.SYNC_MAX_EVENTS
+        self.max_gap = config.SYNC_MAX_GAP
+        self.cache_seconds = config.SYNC_CACHE_SECONDS
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RoomLogError('Database unavailable')
+        return db
+
+    def _entry(self, game_id: str) -> _Entry:
+        with self._lock:
+            entry = self._rooms.pop(game_id, None) or _Entry()
+            self._rooms[game_id] = entry
+            while len(self._rooms) > MAX_ROOMS:
+                self._rooms.popitem(last=False)
+            return entry
+
+    def sync(self, game_id: str, since: Optional[int] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Events after sequence number ``since``, or a snapshot if they cannot be replayed.
+
+        Returns ``{'seq': n, 'events': [...]}`` or ``{'seq': n, 'snapshot': {...}}``;
+        the client passes ``seq`` as ``since`` on its next call. A snapshot
+        for a player with a card in the room includes the card's ``marks``
+        as a 25-bit mask (win_engine cell layout).
+        """
+        log, room = self.current(game_id)
+        seq = log['seq']
+        if since is None or since < log['base'] or since > seq or seq - since > self.max_gap:
+            snapshot = self.snapshot(log, room)
+            numbers = self._card(game_id, user_id) if user_id else None
+            if numbers:
+                snapshot['marks'] = win_engine.marked_mask(numbers, log['state']['called'])
+            return {'seq': seq, 'snapshot': snapshot}
+        return {'seq': seq, 'events': [event for event in log['events'] if event['s'] > since]}
+
+    def _card(self, game_id: str, user_id: str) -> Optional[List[int]]:
+        key = (game_id, user_id)
+        with self._lock:
+            numbers = self._cards.get(key)
+        if numbers is not None:
+            return numbers
+        doc = self._db().collection('gameRooms').document(game_id).collection('cards').document(user_id).get()
+        if not doc.exists:
+            return None
+        try:
+            numbers = win_engine.card_from_columns(doc.to_dict() or {})
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            self._cards[key] = numbers
+            while len(self._cards) > MAX_CARDS:
+                self._cards.popitem(last=False)
+        return numbers
+
+    @staticmethod
+    def snapshot(log: Dict[str, Any], room: Dict[str, Any]) -> Dict[str, Any]:
+        state = log['state']
+        return {
+            'status': state['status'],
+            'calledNumbers': state['called'],
+            'currentCall': room.get('currentCall'),
+            'players': [{'id': _player_id(player), 'name': player.get('name') if isinstance(player, dict) else None}
+                        for player in room.get('players') or []],
+            'winnerIds': state['winners'],
+            'winPattern': room.get('winPattern'),
+            'winAmount': room.get('winAmount'),
+            'gameMode': room.get('gameMode'),
+            'name': room.get('name')
+        }
+
+    def current(self, game_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(log, room) for a room, at most SYNC_CACHE_SECONDS old"""
+        entry = self._entry(game_id)
+        with entry.lock:
+            # Requests that waited on the lock reuse the read the first one made
+            if entry.log is None or time.monotonic() - entry.fetched >= self.cache_seconds:
+                entry.log, entry.room = self._advance(game_id)
+                entry.fetched = time.monotonic()
+            return entry.log, entry.room
+
+    def _advance(self, game_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        db = self._db()
+        room_ref = db.collection('gameRooms').document(game_id)
+        log_ref = room_ref.collection('sync').document('log')
+        for _ in range(MAX_ATTEMPTS):
+            snaps = {snap.reference.path: snap for snap in db.get_all([room_ref, log_ref])}
+            room_snap, log_snap = snaps[room_ref.path], snaps[log_ref.path]
+            if not room_snap.exists:
+                raise RoomNotFound('Game room not found')
+            room = room_snap.to_dict() or {}
+            log = (log_snap.to_dict() or {}) if log_snap.exists else None
+            updated = self._next(log, room)
+            if updated is log:
+                return log, room
+            try:
+                if log_snap.exists:
+                    log_ref.update({**updated, 'updatedAt': firestore.SERVER_TIMESTAMP},
+                                   option=db.write_option(last_update_time=log_snap.update_time))
+                else:
+                    log_ref.create({**updated, 'updatedAt': firestore.SERVER_TIMESTAMP})
+                return updated, room
+            except (FailedPrecondition, AlreadyExists):
+                continue
+        raise RoomLogError('Room log is busy, try again')
+
+    def _next(self, log: Optional[Dict[str, Any]], room: Dict[str, Any]) -> Dict[str, Any]:
+        """The log after the room's changes are appended (the same object if nothing changed)"""
+        if log is None:
+            # A new log starts past 0, so a client that has seen nothing gets a snapshot
+            return {'seq': 1, 'base': 1, 'events': [], 'state': room_state(room)}
+        changes, reset = diff(log['state'], room)
+        if reset:
+            seq = log['seq'] + 1
+            return {'seq': seq, 'base': seq, 'events': [], 'state': room_state(room)}
+        if not changes:
+            return log
+
+        seq = log['seq']
+        events = list(log.get('events') or [])
+        for event_type, data in changes:
+            seq += 1
+            events.append({'s': seq, 't': event_type, 'd': data})
+        base = log['base']
+        if len(events) > self.max_events:
+            events = events[-self.max_events:]
+            base = events[0]['s'] - 1
+        return {'seq': seq, 'base': base, 'events': events, 'state': room_state(room)}
@@ -0,0 +1,372 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+
+from config.settings import get_config
+from database.sharded_counter import ShardedCounter
+from services.ledger import Ledger
+
+ARCHIVE_COLLECTION = 'gameRoomsArchive'
+
+STATUS_WAITING = 'waiting'
+STATUS_PLAYING = 'playing'
+STATUS_COMPLETED = 'completed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_CANCELLED)
+
+ACTION_CHECK = 'check'
+ACTION_REFUND = 'refund'
+ACTION_ARCHIVE = 'archive'
+
+DEFAULT_MIN_PLAYERS = 2
+# Finished rooms archived per resync
+ARCHIVE_BATCH = 100
+# Deletes per batch when clearing an archived room's subcollections
+DELETE_BATCH = 400
+
+def refund_entry_id(transaction_id: str) -> str:
+    return f'refund_{transaction_id}'
+
+def _epoch(value: Any) -> Optional[float]:
+    """Seconds since the epoch for a Firestore timestamp, datetime or number"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        # Client-side Date.now() values are in milliseconds
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+class RoomScheduler:
+    """Drives game rooms through their lifecycle from an in-process timer heap.
+
+    Each room has at most one pending timer per action. A single daemon
+    thread sleeps until the earliest timer is due, then re-reads the room and
+    acts on its current state:
+
+    - waiting: starts when full; at its start deadline (``scheduledTime``, or
+      ``createdAt`` + ROOM_START_DEADLINE_SECONDS) starts with at least
+      ``minPlayers`` players, otherwise cancels
+    - playing: cancels once ROOM_PLAY_TIMEOUT_SECONDS pass without a result
+    - cancelled: refunds every completed entry payment through the Ledger
+      (``ledger/refund_<transactionId>``, so refunds happen once)
+    - completed or cancelled for ROOM_ARCHIVE_AFTER_SECONDS: moves the room and
+      its roster to ``gameRoomsArchive`` and deletes it from ``gameRooms``
+
+    Every transition is written with an update-time precondition, so several
+    workers running a scheduler never start or cancel a room twice. Timers
+    are rebuilt from Firestore every ROOM_RESYNC_SECONDS, which also picks up
+    rooms created or joined elsewhere; ``watch()`` checks a room right away
+    after a join handled in this process.
+    """
+
+    def __init__(self, firebase_manager, roster_service, ledger: Ledger,
+                 on_start: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.firebase_manager = firebase_manager
+        self.roster_service = roster_service
+        self.ledger = ledger
+        self.on_start = on_start
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._timers: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._next_resync = 0.0
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        return db
+
+    # Timer heap
+
+    def schedule(self, game_id: str, due: float, action: str = ACTION_CHECK) -> None:
+        """Run action for the room at due (epoch seconds), replacing its pending timer"""
+        with self._cond:
+            current = self._timers.get((game_id, action))
+            if current and current[1] == due:
+                # Resyncs reschedule unchanged deadlines; keep the heap small
+                return
+            seq = next(self._seq)
+            self._timers[(game_id, action)] = (seq, due)
+            heapq.heappush(self._heap, (due, seq, game_id, action))
+            # Wake the loop if this is now the earliest timer
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def watch(self, game_id: str) -> None:
+        """Check a room now (after a join, for example); ignored until the scheduler is started"""
+        if self._thread is not None:
+            self.schedule(game_id, time.time())
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._timers)
+
+    def ensure_started(self) -> None:
+        """Start the scheduler thread once per process"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='room-scheduler', daemon=True)
+            self._thread.start()
+        print("Room scheduler started")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Pop and run every timer due by now; returns how many ran"""
+        now = time.time() if now is None else now
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, game_id, action = heapq.heappop(self._heap)
+                # Superseded timers are left in the heap and skipped here
+                if self._timers.get((game_id, action), (None,))[0] == seq:
+                    del self._timers[(game_id, action)]
+                    due.append((game_id, action))
+        for game_id, action in due:
+            try:
+                self.run_action(game_id, action)
+            except Exception as e:
+                print(f"Room scheduler error ({action} {game_id}): {e}")
+        return len(due)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.time()
+                    next_due = self._heap[0][0] if self._heap else float('inf')
+                    wait = min(next_due, self._next_resync) - now
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+                resync = now >= self._next_resync
+                if resync:
+                    self._next_resync = now + get_config().ROOM_RESYNC_SECONDS
+            if resync:
+                try:
+                    self.resync()
+                except Exception as e:
+                    print(f"Room scheduler resync error: {e}")
+            self.run_due()
+
+    # Firestore
+
+    def resync(self) -> int:
+        """Schedule timers for every live room and queue finished rooms for archiving"""
+        db = self._db()
+        config = get_config()
+        now = time.time()
+        rooms = db.collection('gameRooms')
+        scheduled = 0
+
+        for doc in rooms.where('status', '==', STATUS_WAITING).stream():
+            room = doc.to_dict()
+            players = room.get('players')
+            full = isinstance(players, list) and len(players) >= (room.get('maxPlayers') or float('inf'))
+            self.schedule(doc.id, now if full else self._start_deadline(room, config))
+            scheduled += 1
+
+        for doc in rooms.where('status', '==', STATUS_PLAYING).stream():
+            started = _epoch(doc.get('gameStartedAt')) or now
+            self.schedule(doc.id, started + config.ROOM_PLAY_TIMEOUT_SECONDS)
+            scheduled += 1
+
+        for doc in rooms.where('refundsPending', '==', True).stream():
+            self.schedule(doc.id, now, ACTION_REFUND)
+            scheduled += 1
+
+        cutoff = datetime.fromtimestamp(now - config.ROOM_ARCHIVE_AFTER_SECONDS, timezone.utc)
+        for status in FINISHED_STATUSES:
+            query = rooms.where('status', '==', status).where('gameEndedAt', '<', cutoff).limit(ARCHIVE_BATCH)
+            for doc in query.stream():
+                self.schedule(doc.id, now, ACTION_ARCHIVE)
+                scheduled += 1
+        return scheduled
+
+    @staticmethod
+    def _start_deadline(room: Dict[str, Any], config) -> float:
+        scheduled_time = _epoch(room.get('scheduledTime'))
+        if scheduled_time:
+            return scheduled_time
+        return (_epoch(room.get('createdAt')) or time.time()) + config.ROOM_START_DEADLINE_SECONDS
+
+    def _player_count(self, game_id: str, room: Dict[str, Any]) -> int:
+        return self.roster_service.room_player_count(game_id, room, max_staleness=0)
+
+    def run_action(self, game_id: str, action: str) -> Optional[str]:
+        """Act on the room's current state; returns the transition made, if any"""
+        if action == ACTION_REFUND:
+            return 'refunded' if self.refund(game_id) else None
+        if action == ACTION_ARCHIVE:
+            return 'archived' if self.archive(game_id) else None
+
+        db = self._db()
+        config = get_config()
+        room_ref = db.collection('gameRooms').document(game_id)
+        snapshot = room_ref.get()
+        if not snapshot.exists:
+            return None
+        room = snapshot.to_dict()
+        now = time.time()
+
+        if room.get('status') == STATUS_WAITING:
+            count = self._player_count(game_id, room)
+            deadline = self._start_deadline(room, config)
+            max_players = room.get('maxPlayers')
+            if max_players and count >= max_players:
+                return self._start(room_ref, snapshot, count)
+            if now >= deadline:
+                if count >= room.get('minPlayers', DEFAULT_MIN_PLAYERS):
+                    return self._start(room_ref, snapshot, count)
+                return self._cancel(room_ref, snapshot, 'Not enough players joined before the start deadline')
+            self.schedule(game_id, deadline)
+        elif room.get('status') == STATUS_PLAYING:
+            timeout_at = (_epoch(room.get('gameStartedAt')) or now) + config.ROOM_PLAY_TIMEOUT_SECONDS
+            if now >= timeout_at:
+                return self._cancel(room_ref, snapshot, 'Game timed out without a result')
+            self.schedule(game_id, timeout_at)
+        return None
+
+    def _transition(self, room_ref, snapshot, fields: Dict[str, Any]) -> bool:
+        try:
+            room_ref.update(fields, option=self._db().write_option(last_update_time=snapshot.update_time))
+            return True
+        except (FailedPrecondition, NotFound):
+            # Changed since it was read (a join, a manual start, another
+            # scheduler); the next resync sees the new state
+            return False
+
+    def _start(self, room_ref, snapshot, count: int) -> Optional[str]:
+        if not self._transition(room_ref, snapshot, {
+            'status': STATUS_PLAYING,
+            'gameStartedAt': firestore.SERVER_TIMESTAMP,
+            'startedBy': 'scheduler'
+        }):
+            return None
+        print(f"Room {room_ref.id} auto-started with {count} player(s)")
+        self.schedule(room_ref.id, time.time() + get_config().ROOM_PLAY_TIMEOUT_SECONDS)
+        if self.on_start:
+            try:
+                self.on_start(room_ref.id, snapshot.to_dict())
+            except Exception as e:
+                print(f"Room start callback failed for {room_ref.id}: {e}")
+        return 'started'
+
+    def _cancel(self, room_ref, snapshot, reason: str) -> Optional[str]:
+        # refundsPending stays set until every refund is written, so a crash
+        # part way through is finished by the next resync
+        if not self._transition(room_ref, snapshot, {
+            'status': STATUS_CANCELLED,
+            'cancelReason': reason,
+            'gameEndedAt': firestore.SERVER_TIMESTAMP,
+            'refundsPending': True
+        }):
+            return None
+        print(f"Room {room_ref.id} cancelled: {reason}")
+        self.refund(room_ref.id)
+        return 'cancelled'
+
+    def refund(self, game_id: str) -> int:
+        """Refund every completed entry payment for a cancelled room; returns refunds written"""
+        db = self._db()
+        room_ref = db.collection('gameRooms').document(game_id)
+        refunded = 0
+        for doc in db.collection('transactions').where('gameId', '==', game_id).stream():
+            entry = doc.to_dict()
+            if entry.get('type') != 'game_entry' or entry.get('status') != 'completed':
+                continue
+            amount = float(entry.get('amount') or 0)
+            if amount <= 0 or not entry.get('userId'):
+                continue
+            entry_id = refund_entry_id(doc.id)
+            batch = db.batch()
+            batch.set(db.collection('transactions').document(entry_id), {
+                'userId': entry['userId'],
+                'type': 'refund',
+                'amount': amount,
+                'currency': entry.get('currency', 'ETB'),
+                'status': 'completed',
+                'gameId': game_id,
+                'metadata': {'entryTransactionId': doc.id, 'source': 'room_scheduler'},
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+            if self.ledger.post(entry_id, entry['userId'], amount, 'refund',
+                                {'gameId': game_id, 'entryTransactionId': doc.id}, batch=batch):
+                refunded += 1
+        room_ref.update({'refundsPending': False, 'refundedAt': firestore.SERVER_TIMESTAMP})
+        if refunded:
+            print(f"Room {game_id}: refunded {refunded} entr{'y' if refunded == 1 else 'ies'}")
+        return refunded
+
+    def archive(self, game_id: str) -> bool:
+        """Move a finished room to the archive and delete it (with its subcollections) from gameRooms"""
+        db = self._db()
+        room_ref = db.collection('gameRooms').document(game_id)
+        snapshot = room_ref.get()
+        if not snapshot.exists:
+            return False
+        room = snapshot.to_dict()
+        if room.get('status') not in FINISHED_STATUSES or room.get('refundsPending'):
+            return False
+
+        # Created once: a retry after a partial delete must not overwrite the
+        # archive with an incomplete roster
+        archived = {**room, 'archivedAt': firestore.SERVER_TIMESTAMP}
+        if 'rosterShards' in room:
+            archived['roster'] = self.roster_service.list_players(game_id)
+        totals = {}
+        for shard in ShardedCounter.shards_for(room_ref).stream():
+            for field, value in (shard.to_dict() or {}).items():
+                totals[field] = totals.get(field, 0) + value
+        if totals:
+            archived['totals'] = totals
+        try:
+            db.collection(ARCHIVE_COLLECTION).document(game_id).create(archived)
+        except AlreadyExists:
+            pass
+
+        self._delete_tree(db, room_ref)
+        room_ref.delete()
+        print(f"Room {game_id} archived")
+        return True
+
+    def _delete_tree(self, db, doc_ref) -> None:
+        # list_documents() also returns documents that only hold
+        # subcollections (counters/totals), which stream() skips
+        for collection in doc_ref.collections():
+            refs = list(collection.list_documents(page_size=DELETE_BATCH))
+            for start in range(0, len(refs), DELETE_BATCH):
+                chunk = refs[start:start + DELETE_BATCH]
+                for ref in chunk:
+                    self._delete_tree(db, ref)
+                batch = db.batch()
+                for ref in chunk:
+                    batch.delete(ref)
+                batch.commit()
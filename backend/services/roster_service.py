@@ -0,0 +1,166 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from database.sharded_counter import ShardedCounter
+from services import win_engine
+
+class RosterService:
+    """Game room roster stored as per-player documents.
+
+    Layout under ``gameRooms/{gameId}``:
+
+    - ``players/{userId}``: one document per joined player
+    - ``cards/{userId}``: the player's card, dealt by the server on join
+    - ``playerCountShards/{n}``: ``count`` shards incremented on join/leave
+    - ``roster/summary``: compact player count and recent names, refreshed at
+      most once per ``summary_interval`` seconds per process
+
+    Joins never write the room document itself, so a busy room is not one
+    hot document rewritten (and re-sent to every listener) per join. For
+    rooms with ``rosterShards`` the shards are the only player count; older
+    rooms without them are counted from their ``players`` array.
+    """
+
+    SUMMARY_RECENT_PLAYERS = 10
+
+    def __init__(self, firebase_manager, counter: ShardedCounter, summary_interval: float = 1.0):
+        self.firebase_manager = firebase_manager
+        self.counter = counter
+        self.summary_interval = summary_interval
+        self._last_summary: Dict[str, float] = {}
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _room_ref(self, game_id: str):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        return db.collection('gameRooms').document(game_id)
+
+    def room_fields(self) -> Dict[str, Any]:
+        """Fields to store on a newly created room that uses the sharded roster"""
+        return {'rosterShards': self.counter.num_shards, 'players': [], 'playerIds': []}
+
+    @staticmethod
+    def uses_roster(room: Dict[str, Any]) -> bool:
+        """True if the room counts players in the sharded roster rather than its players array"""
+        return 'rosterShards' in room
+
+    def room_player_count(self, game_id: str, room: Dict[str, Any], max_staleness: Optional[float] = None) -> int:
+        """Players in a room, from its one source: the roster shards, or the players array of older rooms"""
+        if self.uses_roster(room):
+            return self.player_count(game_id, max_staleness)
+        return len(room.get('players') or [])
+
+    def add_player(self, game_id: str, player_info: Dict[str, Any], batch=None) -> bool:
+        """Add a player to the room and deal their card.
+
+        Writes already added to batch are committed together with the join.
+        Returns False if they had already joined (nothing is written).
+        """
+        room_ref = self._room_ref(game_id)
+        db = self.firebase_manager.get_db()
+        player_ref = room_ref.collection('players').document(player_info['userId'])
+        card_ref = room_ref.collection('cards').document(player_info['userId'])
+
+        batch = batch if batch is not None else db.batch()
+        batch.create(player_ref, {**player_info, 'joinedAt': firestore.SERVER_TIMESTAMP})
+        batch.create(card_ref, {**win_engine.generate_card(), 'source': 'server',
+                                'createdAt': firestore.SERVER_TIMESTAMP})
+        self.counter.increment(room_ref.collection('playerCountShards'), {'count': 1}, batch)
+        try:
+            batch.commit()
+        except AlreadyExists:
+            return False
+
+        self._maybe_refresh_summary(game_id)
+        return True
+
+    def remove_player(self, game_id: str, user_id: str) -> bool:
+        """Remove a player and their card from the room. Returns False if they were not in it."""
+        room_ref = self._room_ref(game_id)
+        db = self.firebase_manager.get_db()
+        player_ref = room_ref.collection('players').document(user_id)
+
+        @firestore.transactional
+        def _remove(transaction):
+            snapshot = player_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            transaction.delete(player_ref)
+            transaction.delete(room_ref.collection('cards').document(user_id))
+            self.counter.increment(room_ref.collection('playerCountShards'), {'count': -1}, transaction)
+            return True
+
+        removed = _remove(db.transaction())
+        if removed:
+            self._maybe_refresh_summary(game_id)
+        return removed
+
+    def has_player(self, game_id: str, user_id: str) -> bool:
+        """Check whether a player has joined the room"""
+        return self._room_ref(game_id).collection('players').document(user_id).get().exists
+
+    def player_count(self, game_id: str, max_staleness: Optional[float] = None) -> int:
+        """Player count summed over the counter shards (pass 0 for an exact read)"""
+        shards_ref = self._room_ref(game_id).collection('playerCountShards')
+        return int(self.counter.get(shards_ref, 'count', max_staleness))
+
+    def list_players(self, game_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List joined players in join order"""
+        query = self._room_ref(game_id).collection('players').order_by('joinedAt')
+        if limit:
+            query = query.limit(limit)
+        return [doc.to_dict() for doc in query.stream()]
+
+    def get_summary(self, game_id: str) -> Optional[Dict[str, Any]]:
+        """Read the compact summary document (may lag joins by summary_interval)"""
+        doc = self._room_ref(game_id).collection('roster').document('summary').get()
+        return doc.to_dict() if doc.exists else None
+
+    def refresh_summary(self, game_id: str) -> Dict[str, Any]:
+        """Recompute and store the compact summary document"""
+        room_ref = self._room_ref(game_id)
+        recent = room_ref.collection('players') \
+            .order_by('joinedAt', direction=firestore.Query.DESCENDING) \
+            .limit(self.SUMMARY_RECENT_PLAYERS).stream()
+        summary = {
+            'playerCount': self.player_count(game_id, max_staleness=0),
+            'recentPlayers': [doc.to_dict().get('displayName', 'Player') for doc in recent],
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }
+        room_ref.collection('roster').document('summary').set(summary)
+        return summary
+
+    def _maybe_refresh_summary(self, game_id: str) -> None:
+        # Debounce summary writes so the summary document stays under the
+        # one-write-per-second guideline no matter how many joins arrive; a
+        # trailing refresh picks up joins that landed inside the window
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._last_summary.get(game_id, 0)
+            if elapsed < self.summary_interval:
+                if game_id not in self._pending:
+                    self._pending.add(game_id)
+                    timer = threading.Timer(self.summary_interval - elapsed, self._trailing_refresh, args=(game_id,))
+                    timer.daemon = True
+                    timer.start()
+                return
+            self._last_summary[game_id] = now
+        self._safe_refresh(game_id)
+
+    def _trailing_refresh(self, game_id: str) -> None:
+        with self._lock:
+            self._pending.discard(game_id)
+            self._last_summary[game_id] = time.monotonic()
+        self._safe_refresh(game_id)
+
+    def _safe_refresh(self, game_id: str) -> None:
+        try:
+            self.refresh_summary(game_id)
+        except Exception as e:
+            print(f"Error refreshing roster summary for {game_id}: {e}")
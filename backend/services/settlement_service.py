@@ -0,0 +1,230 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from database.sharded_counter import ShardedCounter
+from services import win_engine
+from services.events import Event, GAME_PLAYED, GAME_WON, event_bus
+
+# A Firestore batch holds at most 500 writes; each winner needs a wallet,
+# a transaction record and a stats counter write
+MAX_BATCH_WRITES = 500
+WRITES_PER_WINNER = 3
+
+class SettlementError(Exception):
+    """Raised when a game cannot be settled"""
+
+class SettlementService:
+    """Server-side prize settlement for finished game rooms.
+
+    Winners are determined by replaying the called-number sequence against
+    every card in the room: the earliest call that completes a pattern wins,
+    and every card completing a pattern on that same call shares the prize.
+    All wallet credits, transaction records and the room update are written
+    in one batch together with a ``settlements/{gameId}`` record created with
+    ``create()``, so a second settlement attempt fails as a whole instead of
+    paying twice.
+    """
+
+    def __init__(self, firebase_manager, counter: Optional[ShardedCounter], house_commission: float):
+        self.firebase_manager = firebase_manager
+        self.counter = counter
+        self.house_commission = house_commission
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise SettlementError('Database unavailable')
+        return db
+
+    def settle(self, game_id: str, called_numbers: Optional[Sequence[int]] = None,
+               cards: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Verify winners and pay them out. cards maps userId to a client card."""
+        db = self._db()
+        room_ref = db.collection('gameRooms').document(game_id)
+        room_doc = room_ref.get()
+        if not room_doc.exists:
+            raise SettlementError('Game room not found')
+        room = room_doc.to_dict()
+        if room.get('status') == 'completed':
+            raise SettlementError('Game already settled')
+        if room.get('status') != 'playing':
+            raise SettlementError('Game is not in progress')
+
+        if called_numbers is None:
+            called_numbers = room.get('calledNumbers', [])
+        if cards is None:
+            cards = self._load_cards(room_ref)
+        cards = self._roster_cards(db, room_ref, room, cards)
+        if not cards:
+            raise SettlementError('No cards to settle')
+
+        winners = self.find_winners(called_numbers, cards)
+        if not winners:
+            raise SettlementError('No winning card for the called numbers')
+        if len(winners) * WRITES_PER_WINNER + 2 > MAX_BATCH_WRITES:
+            raise SettlementError('Too many tied winners to settle in one batch')
+
+        prize_pool = self.prize_pool(room_ref, room)
+        payouts = self.compute_payouts(prize_pool, winners, room.get('bonusSystem'))
+        total_paid = round(sum(p['amount'] for p in payouts), 2)
+
+        batch = db.batch()
+        settlement_ref = db.collection('settlements').document(game_id)
+        batch.create(settlement_ref, {
+            'gameId': game_id,
+            'gameMode': room.get('gameMode') or 'classic',
+            'prizePool': prize_pool,
+            'totalPaid': total_paid,
+            'houseRetained': round(max(prize_pool - total_paid, 0), 2),
+            'winningCall': winners[0]['callIndex'],
+            'winners': payouts,
+            'createdAt': firestore.SERVER_TIMESTAMP
+        })
+        for payout in payouts:
+            user_id = payout['userId']
+            batch.set(db.collection('wallets').document(user_id), {
+                'balance': firestore.Increment(payout['amount']),
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            }, merge=True)
+            batch.set(db.collection('transactions').document(f"win_{game_id}_{user_id}"), {
+                'userId': user_id,
+                'type': 'win',
+                'amount': payout['amount'],
+                'currency': 'ETB',
+                'status': 'completed',
+                'gameId': game_id,
+                'description': f"Bingo win: {payout['pattern']}",
+                'metadata': {
+                    'gameId': game_id,
+                    'winPattern': payout['pattern'],
+                    'winPercentage': payout['percentage'],
+                    'tiedWinners': len(payouts),
+                    'source': 'settlement'
+                },
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+            if self.counter:
+                self.counter.increment(ShardedCounter.shards_for(db.collection('users').document(user_id)),
+                                       {'gamesWon': 1, 'totalEarnings': payout['amount']}, batch)
+        batch.update(room_ref, {
+            'status': 'completed',
+            'winnerId': payouts[0]['userId'],
+            'winnerIds': [p['userId'] for p in payouts],
+            'winPattern': payouts[0]['pattern'],
+            'winAmount': total_paid,
+            'gameEndedAt': firestore.SERVER_TIMESTAMP
+        })
+
+        try:
+            batch.commit()
+        except AlreadyExists:
+            raise SettlementError('Game already settled')
+
+        print(f"Settled game {game_id}: {len(payouts)} winner(s), {total_paid} ETB paid")
+        self._publish(game_id, room, cards, payouts)
+        return {'gameId': game_id, 'prizePool': prize_pool, 'totalPaid': total_paid, 'winners': payouts}
+
+    @staticmethod
+    def _publish(game_id: str, room: Dict[str, Any], cards: Dict[str, Any], payouts: List[Dict[str, Any]]) -> None:
+        started = room.get('gameStartedAt')
+        duration = None
+        if isinstance(started, datetime):
+            started = started if started.tzinfo else started.replace(tzinfo=timezone.utc)
+            duration = (datetime.now(timezone.utc) - started).total_seconds()
+        data = {'gameId': game_id, 'gameMode': room.get('gameMode') or 'classic',
+                'players': len(cards), 'durationSeconds': duration}
+        for user_id in cards:
+            event_bus.publish(Event(GAME_PLAYED, user_id, f'played_{game_id}_{user_id}', data))
+        for payout in payouts:
+            event_bus.publish(Event(GAME_WON, payout['userId'], f'won_{game_id}_{payout["userId"]}',
+                                    {**data, 'amount': payout['amount'], 'pattern': payout['pattern']}))
+
+    @staticmethod
+    def find_winners(called_numbers: Sequence[int], cards: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Cards that complete a pattern on the earliest winning call"""
+        earliest = None
+        winners: List[Dict[str, Any]] = []
+        for user_id, card in cards.items():
+            try:
+                numbers = win_engine.card_from_columns(card)
+            except (ValueError, TypeError) as e:
+                print(f"Skipping invalid card for {user_id}: {e}")
+                continue
+            result = win_engine.first_win(numbers, called_numbers)
+            if result is None:
+                continue
+            call_index, pattern = result
+            if earliest is None or call_index < earliest:
+                earliest = call_index
+                winners = []
+            if call_index == earliest:
+                winners.append({'userId': user_id, 'callIndex': call_index, 'pattern': pattern})
+        return winners
+
+    def prize_pool(self, room_ref, room: Dict[str, Any]) -> float:
+        """Net prize pool for a room.
+
+        Rooms created by the web client keep a prizePool field that is already
+        net of commission; bot entries accumulate gross fees in counter shards,
+        so the house commission is taken from those here.
+        """
+        pool = float(room.get('prizePool', 0) or 0)
+        if self.counter:
+            gross = self.counter.get(ShardedCounter.shards_for(room_ref), 'prizePool', max_staleness=0)
+            pool += gross * (1 - self.house_commission)
+        return round(pool, 2)
+
+    @staticmethod
+    def compute_payouts(prize_pool: float, winners: List[Dict[str, Any]],
+                        bonus_system: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Split the prize between tied winners, in whole cents.
+
+        Each winner's pattern percentage applies to the pool and is divided by
+        the number of tied winners; an enabled bonus is split the same way.
+        Leftover cents from rounding stay with the house.
+        """
+        count = len(winners)
+        bonus_cents = 0
+        if bonus_system and bonus_system.get('enabled'):
+            bonus_cents = int(round(float(bonus_system.get('amount', 0)) * 100))
+
+        pool_cents = int(round(prize_pool * 100))
+        payouts = []
+        for winner in winners:
+            pattern = winner['pattern']
+            prize_cents = int(round(pool_cents * pattern.percentage, 4))
+            share_cents = prize_cents // count + bonus_cents // count
+            payouts.append({
+                'userId': winner['userId'],
+                'pattern': pattern.name,
+                'percentage': pattern.percentage,
+                'amount': share_cents / 100
+            })
+        return payouts
+
+    @staticmethod
+    def _load_cards(room_ref) -> Dict[str, Any]:
+        # Cards are stored one document per player under gameRooms/{id}/cards
+        return {doc.id: doc.to_dict() for doc in room_ref.collection('cards').stream()}
+
+    @staticmethod
+    def _roster_cards(db, room_ref, room: Dict[str, Any], cards: Dict[str, Any]) -> Dict[str, Any]:
+        """The cards whose owners are in the room.
+
+        Web joins are listed in the room's players array (Player objects, or
+        bare uids in older rooms); bot joins have a players/{userId} document.
+        Cards of anyone else are dropped.
+        """
+        members = {str(player.get('id') or player.get('userId') or '') if isinstance(player, dict) else str(player)
+                   for player in room.get('players') or []}
+        others = [user_id for user_id in cards if user_id not in members]
+        if others:
+            refs = [room_ref.collection('players').document(user_id) for user_id in others]
+            members.update(snap.id for snap in db.get_all(refs) if snap.exists)
+        dropped = [user_id for user_id in cards if user_id not in members]
+        if dropped:
+            print(f"Ignoring {len(dropped)} card(s) of non-members in game {room_ref.id}")
+        return {user_id: card for user_id, card in cards.items() if user_id in members}
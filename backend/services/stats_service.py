@@ -0,0 +1,347 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from database.firebase import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from config.settings import get_config
+from services.cache import TTLCache
+
+# Each page writes a rollup and an active-player set for every day it touches
+# plus the aggregation state, and may list each transaction as late, so 200
+# source documents stay under the 500-write batch limit
+PAGE_SIZE = 200
+MAX_RANGE_DAYS = 92
+
+STATE_DOC_ID = 'aggregation'
+SOURCES = ('transactions', 'settlements')
+# Transactions still pending when their page was folded, under the state document
+LATE_COLLECTION = 'late'
+PENDING_STATUSES = ('pending', 'processing')
+# Late transactions that have not completed after this long are dropped
+LATE_MAX_DAYS = 30
+
+# Rollup field for each transaction type (the web app and the backend use
+# different names for the same kinds of transaction)
+TRANSACTION_FIELDS = {
+    'deposit': 'deposits',
+    'withdrawal': 'withdrawals',
+    'game_entry': 'entries',
+    'tournament_entry': 'entries',
+    'bet': 'entries',
+    'win': 'payouts',
+    'game_win': 'payouts',
+    'bonus': 'bonuses',
+    'refund': 'refunds',
+}
+ROLLUP_FIELDS = ('deposits', 'withdrawals', 'entries', 'payouts', 'bonuses', 'refunds', 'revenue')
+COUNT_FIELDS = ('depositCount', 'withdrawalCount', 'entryCount', 'payoutCount', 'bonusCount', 'refundCount',
+                'gamesSettled')
+COUNT_FIELD_FOR = {
+    'deposits': 'depositCount',
+    'withdrawals': 'withdrawalCount',
+    'entries': 'entryCount',
+    'payouts': 'payoutCount',
+    'bonuses': 'bonusCount',
+    'refunds': 'refundCount',
+}
+
+class StatsError(Exception):
+    """Raised when stats cannot be aggregated or served"""
+
+def day_doc_id(day: str) -> str:
+    """Document id of the rollup for an ISO day (YYYY-MM-DD)"""
+    return f'daily-{day}'
+
+class StatsAggregator:
+    """Incremental daily rollups for the admin dashboard.
+
+    Completed transactions and settlements are read in ``createdAt`` order
+    from a high-water mark kept in ``stats/aggregation`` and folded into one
+    ``stats/daily-YYYY-MM-DD`` document per day: deposit, withdrawal, entry,
+    payout and bonus totals and counts, distinct active players (users with a
+    game entry) and house revenue per room type (``gameMode``) from
+    settlements.
+
+    Every page is committed in one batch together with the advanced mark,
+    and the batch is conditioned on the state document not having changed
+    since it was read, so a crash never double counts and overlapping runs
+    fail instead of adding the same page twice. Documents newer than
+    STATS_SETTLE_SECONDS are left for the next run so pending transactions
+    have time to complete.
+
+    Transactions that are still pending when the mark passes them (Chapa
+    deposits settled by the reconciler, payouts) are listed under
+    ``stats/aggregation/late``. Each run re-reads that list and folds in the
+    ones that have completed since, on the day they were created, removing
+    them in the same batch; failed ones, and ones still pending after
+    LATE_MAX_DAYS, are just removed.
+    """
+
+    def __init__(self, firebase_manager, page_size: int = PAGE_SIZE):
+        self.firebase_manager = firebase_manager
+        self.page_size = page_size
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise StatsError('Database unavailable')
+        return db
+
+    def run(self, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """Aggregate everything past the high-water mark; returns what was processed"""
+        db = self._db()
+        config = get_config()
+        offset = timedelta(hours=config.STATS_UTC_OFFSET_HOURS)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=config.STATS_SETTLE_SECONDS)
+
+        state_ref = db.collection('stats').document(STATE_DOC_ID)
+        state = self._load_state(state_ref)
+        marks = dict((state.to_dict() or {}).get('marks', {}))
+        update_time = state.update_time
+
+        processed = {source: 0 for source in SOURCES + (LATE_COLLECTION,)}
+        days: Set[str] = set()
+        pages = 0
+        for source in SOURCES:
+            while max_pages is None or pages < max_pages:
+                docs = self._next_page(db, source, marks.get(source), cutoff)
+                if not docs:
+                    break
+                late: List[Any] = []
+                if source == 'transactions':
+                    rollups, players, late = self._fold_transactions(docs, offset)
+                else:
+                    rollups, players = self._fold_settlements(db, docs, offset), {}
+                marks[source] = {'createdAt': docs[-1].get('createdAt'), 'docId': docs[-1].id}
+                update_time = self._commit(db, state_ref, update_time, marks, rollups, players, add_late=late)
+
+                processed[source] += len(docs)
+                days.update(rollups)
+                pages += 1
+                if len(docs) < self.page_size:
+                    break
+
+        after = None
+        while max_pages is None or pages < max_pages:
+            entries = self._late_page(state_ref, after)
+            if not entries:
+                break
+            after = entries[-1]
+            rollups, players, resolved = self._fold_late(db, entries, offset)
+            if resolved:
+                update_time = self._commit(db, state_ref, update_time, marks, rollups, players,
+                                           remove_late=resolved)
+                processed[LATE_COLLECTION] += len(resolved)
+                days.update(rollups)
+                pages += 1
+            if len(entries) < self.page_size:
+                break
+
+        if pages:
+            print(f"Stats aggregation: {processed} over {len(days)} day(s) in {pages} page(s)")
+        return {'processed': processed, 'days': sorted(days), 'pages': pages}
+
+    def _load_state(self, state_ref):
+        state = state_ref.get()
+        if not state.exists:
+            try:
+                state_ref.create({'marks': {}, 'createdAt': firestore.SERVER_TIMESTAMP})
+            except AlreadyExists:
+                pass
+            state = state_ref.get()
+        return state
+
+    def _next_page(self, db, source: str, mark: Optional[Dict[str, Any]], cutoff: datetime) -> List[Any]:
+        collection = db.collection(source)
+        query = (collection.where('createdAt', '<', cutoff)
+                 .order_by('createdAt')
+                 .order_by('__name__')
+                 .limit(self.page_size))
+        if mark:
+            query = query.start_after({
+                'createdAt': mark['createdAt'],
+                '__name__': collection.document(mark['docId'])
+            })
+        return list(query.stream())
+
+    def _late_page(self, state_ref, after) -> List[Any]:
+        late = state_ref.collection(LATE_COLLECTION)
+        query = late.order_by('createdAt').order_by('__name__').limit(self.page_size)
+        if after is not None:
+            query = query.start_after({'createdAt': after.get('createdAt'), '__name__': late.document(after.id)})
+        return list(query.stream())
+
+    def _fold_late(self, db, entries, offset: timedelta):
+        """Rollups of the late transactions that completed, and the entries to remove"""
+        refs = [db.collection('transactions').document(entry.id) for entry in entries]
+        transactions = {doc.id: doc for doc in db.get_all(refs)}
+        expiry = datetime.now(timezone.utc) - timedelta(days=LATE_MAX_DAYS)
+        completed, resolved = [], []
+        for entry in entries:
+            doc = transactions.get(entry.id)
+            status = (doc.to_dict() or {}).get('status') if doc is not None and doc.exists else None
+            if status in PENDING_STATUSES and entry.get('createdAt') >= expiry:
+                continue
+            if status == 'completed':
+                completed.append(doc)
+            resolved.append(entry.id)
+        rollups, players, _ = self._fold_transactions(completed, offset)
+        return rollups, players, resolved
+
+    @staticmethod
+    def _day(created_at: datetime, offset: timedelta) -> str:
+        return (created_at + offset).date().isoformat()
+
+    def _fold_transactions(self, docs, offset: timedelta) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Set[str]],
+                                                                   List[Tuple[str, datetime]]]:
+        """Rollups and active players of the completed transactions, and (id, createdAt) of pending ones"""
+        rollups: Dict[str, Dict[str, Any]] = defaultdict(lambda: defaultdict(int))
+        players: Dict[str, Set[str]] = defaultdict(set)
+        late: List[Tuple[str, datetime]] = []
+        for doc in docs:
+            data = doc.to_dict()
+            field = TRANSACTION_FIELDS.get(data.get('type'))
+            if field and data.get('status') in PENDING_STATUSES:
+                late.append((doc.id, data['createdAt']))
+            if not field or data.get('status') != 'completed':
+                continue
+            day = self._day(data['createdAt'], offset)
+            rollups[day][field] += float(data.get('amount') or 0)
+            rollups[day][COUNT_FIELD_FOR[field]] += 1
+            if field == 'entries' and data.get('userId'):
+                players[day].add(data['userId'])
+        return rollups, players, late
+
+    def _fold_settlements(self, db, docs, offset: timedelta) -> Dict[str, Dict[str, Any]]:
+        # One batched read for the room type of every settled game on the page
+        game_ids = {doc.to_dict().get('gameId') or doc.id for doc in docs}
+        refs = [db.collection('gameRooms').document(game_id) for game_id in game_ids]
+        modes = {room.id: (room.to_dict() or {}).get('gameMode') or 'classic'
+                 for room in db.get_all(refs, field_paths=['gameMode']) if room.exists}
+
+        rollups: Dict[str, Dict[str, Any]] = defaultdict(lambda: defaultdict(int))
+        for doc in docs:
+            data = doc.to_dict()
+            day = self._day(data['createdAt'], offset)
+            revenue = float(data.get('houseRetained') or 0)
+            mode = modes.get(data.get('gameId') or doc.id, 'classic')
+            rollups[day]['revenue'] += revenue
+            rollups[day]['gamesSettled'] += 1
+            rollups[day][('roomTypes', mode, 'revenue')] += revenue
+            rollups[day][('roomTypes', mode, 'games')] += 1
+        return rollups
+
+    def _commit(self, db, state_ref, update_time, marks, rollups, players,
+                add_late: Sequence[Tuple[str, datetime]] = (), remove_late: Sequence[str] = ()) -> Any:
+        """Write one page of rollups and the new mark atomically; returns the state's new update time"""
+        batch = db.batch()
+        late = state_ref.collection(LATE_COLLECTION)
+        for transaction_id, created_at in add_late:
+            batch.set(late.document(transaction_id), {'createdAt': created_at})
+        for transaction_id in remove_late:
+            batch.delete(late.document(transaction_id))
+        day_refs = {day: db.collection('stats').document(day_doc_id(day)) for day in set(rollups) | set(players)}
+
+        # Only players not already counted for the day raise activePlayers
+        player_refs = {day: day_refs[day].collection('players').document('ids') for day in players}
+        day_for_path = {ref.path: day for day, ref in player_refs.items()}
+        seen = {day_for_path[doc.reference.path]: set((doc.to_dict() or {}).get('userIds', []))
+                for doc in db.get_all(list(player_refs.values())) if doc.exists}
+        for day, user_ids in players.items():
+            new_ids = user_ids - seen.get(day, set())
+            if new_ids:
+                batch.set(player_refs[day], {'userIds': firestore.ArrayUnion(sorted(new_ids))}, merge=True)
+                rollups[day]['activePlayers'] += len(new_ids)
+
+        for day, fields in rollups.items():
+            data: Dict[str, Any] = {'day': day, 'updatedAt': firestore.SERVER_TIMESTAMP}
+            for key, value in fields.items():
+                if isinstance(key, tuple):
+                    # ('roomTypes', mode, field) becomes a nested map so merge keeps other modes
+                    group, mode, field = key
+                    data.setdefault(group, {}).setdefault(mode, {})[field] = firestore.Increment(value)
+                else:
+                    data[key] = firestore.Increment(value)
+            batch.set(day_refs[day], data, merge=True)
+
+        batch.update(state_ref, {'marks': marks, 'updatedAt': firestore.SERVER_TIMESTAMP},
+                     option=db.write_option(last_update_time=update_time))
+        try:
+            results = batch.commit()
+        except FailedPrecondition:
+            raise StatsError('Stats were aggregated concurrently by another run; try again')
+        return results[-1].update_time
+
+class StatsService:
+    """Serves daily rollups to the admin API from a short-lived cache"""
+
+    def __init__(self, firebase_manager):
+        self.firebase_manager = firebase_manager
+        self._cache = TTLCache(ttl=60)
+
+    def today(self) -> date:
+        """Current day in the rollup timezone"""
+        offset = timedelta(hours=get_config().STATS_UTC_OFFSET_HOURS)
+        return (datetime.now(timezone.utc) + offset).date()
+
+    def daily(self, start: date, end: date) -> Dict[str, Any]:
+        """Rollups for every day in [start, end] plus range totals"""
+        if end < start:
+            raise StatsError('Start date must not be after end date')
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise StatsError(f'Date range is limited to {MAX_RANGE_DAYS} days')
+
+        key = (start.isoformat(), end.isoformat())
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise StatsError('Database unavailable')
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        refs = [db.collection('stats').document(day_doc_id(day)) for day in days]
+        docs = {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+
+        rollups = [self._normalize(day, docs.get(day_doc_id(day), {})) for day in days]
+        result = {'from': days[0], 'to': days[-1], 'days': rollups, 'totals': self._totals(rollups)}
+        self._cache.set(key, result, ttl=get_config().STATS_CACHE_TTL)
+        return result
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    @staticmethod
+    def _normalize(day: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        rollup: Dict[str, Any] = {'day': day}
+        for field in ROLLUP_FIELDS:
+            rollup[field] = round(float(data.get(field, 0)), 2)
+        for field in COUNT_FIELDS + ('activePlayers',):
+            rollup[field] = int(data.get(field, 0))
+        rollup['roomTypes'] = {
+            mode: {'revenue': round(float(values.get('revenue', 0)), 2), 'games': int(values.get('games', 0))}
+            for mode, values in (data.get('roomTypes') or {}).items()
+        }
+        return rollup
+
+    @staticmethod
+    def _totals(rollups: List[Dict[str, Any]]) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {field: 0 for field in ROLLUP_FIELDS + COUNT_FIELDS}
+        room_types: Dict[str, Dict[str, Any]] = {}
+        for rollup in rollups:
+            for field in ROLLUP_FIELDS + COUNT_FIELDS:
+                totals[field] += rollup[field]
+            for mode, values in rollup['roomTypes'].items():
+                merged = room_types.setdefault(mode, {'revenue': 0, 'games': 0})
+                merged['revenue'] += values['revenue']
+                merged['games'] += values['games']
+        for field in ROLLUP_FIELDS:
+            totals[field] = round(totals[field], 2)
+        for values in room_types.values():
+            values['revenue'] = round(values['revenue'], 2)
+        # Daily active players are distinct per day only, so report the peak
+        totals['peakActivePlayers'] = max((r['activePlayers'] for r in rollups), default=0)
+        totals['roomTypes'] = room_types
+        return totals
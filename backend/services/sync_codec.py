@@ -0,0 +1,263 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from services.room_log import EVENT_CALL, EVENT_JOIN, EVENT_LEAVE, EVENT_STATUS, EVENT_WINNERS
+from services.win_engine import CELL_COUNT
+
+# Clients opt in with this Accept header; everyone else gets JSON
+MEDIA_TYPE = 'application/vnd.bingo.sync'
+CODEC_VERSION = 1
+
+MAX_NUMBER = 75
+CALLED_BYTES = (MAX_NUMBER + 7) // 8
+
+KIND_EVENTS = 0
+KIND_SNAPSHOT = 1
+
+# Events without a dedicated layout carry their type and JSON data
+_EVENT_OTHER = 0
+_EVENT_CODES = {EVENT_CALL: 1, EVENT_STATUS: 2, EVENT_JOIN: 3, EVENT_LEAVE: 4, EVENT_WINNERS: 5}
+_EVENT_NAMES = {code: name for name, code in _EVENT_CODES.items()}
+
+class CodecError(ValueError):
+    """Raised when a sync payload cannot be encoded or is malformed"""
+
+def encode_called(numbers: Iterable[int]) -> bytes:
+    """The called set as a 10-byte bitset (bit n-1 set for number n, least significant bit first)"""
+    bits = bytearray(CALLED_BYTES)
+    for number in numbers:
+        number = int(number)
+        if not 1 <= number <= MAX_NUMBER:
+            raise CodecError(f'Called numbers must be between 1 and {MAX_NUMBER}')
+        bits[(number - 1) >> 3] |= 1 << ((number - 1) & 7)
+    return bytes(bits)
+
+def decode_called(data: bytes) -> List[int]:
+    """Called numbers from a bitset, ascending"""
+    if len(data) != CALLED_BYTES:
+        raise CodecError(f'Called bitset must be {CALLED_BYTES} bytes')
+    return [number for number in range(1, MAX_NUMBER + 1) if data[(number - 1) >> 3] >> ((number - 1) & 7) & 1]
+
+def encode_varint(value: int) -> bytes:
+    """Unsigned LEB128"""
+    if value < 0:
+        raise CodecError('Varints are unsigned')
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+class _Writer:
+    def __init__(self):
+        self.out = bytearray()
+
+    def byte(self, value: int) -> None:
+        self.out.append(value)
+
+    def varint(self, value: int) -> None:
+        self.out += encode_varint(value)
+
+    def text(self, value: Optional[str]) -> None:
+        data = (value or '').encode('utf-8')
+        self.varint(len(data))
+        self.out += data
+
+    def cents(self, amount: Optional[float]) -> None:
+        self.varint(round((amount or 0) * 100))
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def take(self, count: int) -> bytes:
+        if self.pos + count > len(self.data):
+            raise CodecError('Sync payload is truncated')
+        chunk = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return chunk
+
+    def byte(self) -> int:
+        return self.take(1)[0]
+
+    def varint(self) -> int:
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+            if shift > 63:
+                raise CodecError('Varint is too long')
+
+    def text(self) -> Optional[str]:
+        return self.take(self.varint()).decode('utf-8') or None
+
+    def cents(self) -> float:
+        return self.varint() / 100
+
+def encode_events(events: Sequence[Dict[str, Any]]) -> bytes:
+    """Events as a count and a delta stream: seq delta | type | payload per event.
+
+    Sequence numbers are written as the gap to the previous event (the
+    first as is), so a run of consecutive events costs one byte each for
+    the numbering; a number call is three bytes in all.
+    """
+    writer = _Writer()
+    writer.varint(len(events))
+    previous = 0
+    for event in events:
+        if event['s'] < previous:
+            raise CodecError('Events must be in sequence order')
+        writer.varint(event['s'] - previous)
+        previous = event['s']
+        _write_event(writer, event['t'], event.get('d') or {})
+    return bytes(writer.out)
+
+def _write_event(writer: _Writer, event_type: str, data: Dict[str, Any]) -> None:
+    code = _EVENT_CODES.get(event_type, _EVENT_OTHER)
+    if code == _EVENT_CODES[EVENT_CALL] and not 1 <= int(data.get('n') or 0) <= MAX_NUMBER:
+        code = _EVENT_OTHER
+    writer.byte(code)
+    if code == _EVENT_OTHER:
+        writer.text(event_type)
+        writer.text(json.dumps(data, separators=(',', ':'), default=str))
+    elif event_type == EVENT_CALL:
+        writer.byte(int(data['n']))
+    elif event_type == EVENT_STATUS:
+        writer.text(data.get('status'))
+    elif event_type == EVENT_JOIN:
+        writer.text(data.get('userId'))
+        writer.text(data.get('name'))
+    elif event_type == EVENT_LEAVE:
+        writer.text(data.get('userId'))
+    elif event_type == EVENT_WINNERS:
+        user_ids = data.get('userIds') or []
+        writer.varint(len(user_ids))
+        for user_id in user_ids:
+            writer.text(user_id)
+        writer.text(data.get('pattern'))
+        writer.cents(data.get('amount'))
+
+def decode_events(data: bytes) -> List[Dict[str, Any]]:
+    reader = _Reader(data)
+    events = _read_events(reader)
+    if reader.pos != len(data):
+        raise CodecError('Trailing bytes after events')
+    return events
+
+def _read_events(reader: _Reader) -> List[Dict[str, Any]]:
+    events = []
+    seq = 0
+    for _ in range(reader.varint()):
+        seq += reader.varint()
+        code = reader.byte()
+        if code == _EVENT_OTHER:
+            event_type = reader.text() or ''
+            data = json.loads(reader.text() or '{}')
+        elif code not in _EVENT_NAMES:
+            raise CodecError(f'Unknown event code {code}')
+        else:
+            event_type = _EVENT_NAMES[code]
+            if event_type == EVENT_CALL:
+                data = {'n': reader.byte()}
+            elif event_type == EVENT_STATUS:
+                data = {'status': reader.text()}
+            elif event_type == EVENT_JOIN:
+                data = {'userId': reader.text(), 'name': reader.text()}
+            elif event_type == EVENT_LEAVE:
+                data = {'userId': reader.text()}
+            else:
+                data = {'userIds': [reader.text() for _ in range(reader.varint())],
+                        'pattern': reader.text(), 'amount': reader.cents()}
+        events.append({'s': seq, 't': event_type, 'd': data})
+    return events
+
+def encode_sync(result: Dict[str, Any]) -> bytes:
+    """Binary form of a RoomEventLog.sync() result.
+
+    Layout: version:u8 | kind:u8 | seq:varint, then either the event
+    stream (see encode_events) or the snapshot: status | called:10-byte
+    bitset | currentCall:u8 (0 = none) | marks:varint (mask + 1, 0 = no
+    card) | players (count, then id and name each) | winners (count, ids)
+    | winPattern | winAmount:varint cents | gameMode | name. Strings are a
+    varint length and UTF-8. The bitset carries no call order; currentCall
+    gives the latest call.
+    """
+    writer = _Writer()
+    writer.byte(CODEC_VERSION)
+    try:
+        if 'snapshot' in result:
+            writer.byte(KIND_SNAPSHOT)
+            writer.varint(result['seq'])
+            _write_snapshot(writer, result['snapshot'])
+        else:
+            writer.byte(KIND_EVENTS)
+            writer.varint(result['seq'])
+            writer.out += encode_events(result['events'])
+    except (TypeError, ValueError) as e:
+        # Client-written room fields of the wrong type (CodecError is a ValueError too)
+        raise CodecError(str(e)) from e
+    return bytes(writer.out)
+
+def _write_snapshot(writer: _Writer, snapshot: Dict[str, Any]) -> None:
+    writer.text(snapshot.get('status'))
+    writer.out += encode_called(snapshot.get('calledNumbers') or [])
+    current = snapshot.get('currentCall')
+    writer.byte(int(current) if current and 1 <= int(current) <= MAX_NUMBER else 0)
+    marks = snapshot.get('marks')
+    if marks is not None and not 0 <= marks < 1 << CELL_COUNT:
+        raise CodecError(f'Mark masks have {CELL_COUNT} bits')
+    writer.varint(0 if marks is None else marks + 1)
+    players = snapshot.get('players') or []
+    writer.varint(len(players))
+    for player in players:
+        writer.text(player.get('id'))
+        writer.text(player.get('name'))
+    winners = snapshot.get('winnerIds') or []
+    writer.varint(len(winners))
+    for winner in winners:
+        writer.text(winner)
+    writer.text(snapshot.get('winPattern'))
+    writer.cents(snapshot.get('winAmount'))
+    writer.text(snapshot.get('gameMode'))
+    writer.text(snapshot.get('name'))
+
+def decode_sync(data: bytes) -> Dict[str, Any]:
+    """Inverse of encode_sync (called numbers come back ascending)"""
+    reader = _Reader(data)
+    if reader.byte() != CODEC_VERSION:
+        raise CodecError('Unsupported sync payload version')
+    kind = reader.byte()
+    seq = reader.varint()
+    if kind == KIND_EVENTS:
+        result: Dict[str, Any] = {'seq': seq, 'events': _read_events(reader)}
+    elif kind == KIND_SNAPSHOT:
+        result = {'seq': seq, 'snapshot': _read_snapshot(reader)}
+    else:
+        raise CodecError(f'Unknown sync payload kind {kind}')
+    if reader.pos != len(data):
+        raise CodecError('Trailing bytes in sync payload')
+    return result
+
+def _read_snapshot(reader: _Reader) -> Dict[str, Any]:
+    status = reader.text()
+    called = decode_called(reader.take(CALLED_BYTES))
+    current = reader.byte() or None
+    marks = reader.varint()
+    snapshot = {
+        'status': status,
+        'calledNumbers': called,
+        'currentCall': current,
+        'marks': marks - 1 if marks else None,
+        'players': [{'id': reader.text(), 'name': reader.text()} for _ in range(reader.varint())],
+        'winnerIds': [reader.text() for _ in range(reader.varint())],
+    }
+    snapshot.update(winPattern=reader.text(), winAmount=reader.cents(), gameMode=reader.text(), name=reader.text())
+    return snapshot
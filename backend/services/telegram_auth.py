@@ -0,0 +1,147 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from database.firebase import firebase_auth, firestore
+
+from config.settings import get_config
+from services.cache import TTLCache
+
+# Telegram id -> Firebase uid rarely changes; re-checked hourly
+IDENTITY_TTL = 3600
+# Concurrent logins for the same Telegram id share one of these locks
+_LOCK_STRIPES = 64
+
+# Fields signed by the Login Widget (everything except hash)
+_WIDGET_FIELDS = ('id', 'first_name', 'last_name', 'username', 'photo_url', 'auth_date')
+
+class TelegramAuthError(ValueError):
+    """Raised when Telegram login data is missing, forged or expired"""
+
+def _check_signature(fields: Mapping[str, str], received_hash: str, secret: bytes, max_age: float) -> None:
+    if not received_hash:
+        raise TelegramAuthError('Missing hash')
+    data_check_string = '\n'.join(f'{key}={fields[key]}' for key in sorted(fields))
+    expected = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received_hash):
+        raise TelegramAuthError('Invalid hash')
+    try:
+        auth_date = int(fields['auth_date'])
+    except (KeyError, ValueError):
+        raise TelegramAuthError('Missing auth_date')
+    if time.time() - auth_date > max_age:
+        raise TelegramAuthError('Login data has expired')
+
+def verify_login_widget(data: Mapping[str, Any], bot_token: str, max_age: float) -> Dict[str, Any]:
+    """Verify data from the Telegram Login Widget and return the Telegram user.
+
+    The secret is SHA-256 of the bot token; see
+    https://core.telegram.org/widgets/login#checking-authorization
+    """
+    fields = {key: str(data[key]) for key in _WIDGET_FIELDS if data.get(key) is not None}
+    _check_signature(fields, str(data.get('hash') or ''), hashlib.sha256(bot_token.encode()).digest(), max_age)
+    return {key: data[key] for key in fields if key != 'auth_date'}
+
+def verify_init_data(init_data: str, bot_token: str, max_age: float) -> Dict[str, Any]:
+    """Verify Telegram Mini App initData and return the Telegram user.
+
+    The secret is HMAC-SHA-256 of the bot token keyed with "WebAppData"; see
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    fields = dict(parse_qsl(init_data or '', keep_blank_values=True))
+    received_hash = fields.pop('hash', '')
+    fields.pop('signature', None)  # Third-party (Ed25519) signature, not part of the HMAC check
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    _check_signature(fields, received_hash, secret, max_age)
+    try:
+        user = json.loads(fields['user'])
+    except (KeyError, ValueError):
+        raise TelegramAuthError('Missing user')
+    if not isinstance(user, dict) or 'id' not in user:
+        raise TelegramAuthError('Missing user')
+    return user
+
+class TelegramLoginService:
+    """Issues Firebase custom tokens for verified Telegram users.
+
+    A login normally costs a users query, a profile write and an RS256
+    signature. Here the Telegram id -> uid mapping and the last profile
+    written are cached, the profile is only written when the username
+    changed, and a custom token signed for the same uid within
+    TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS is handed out again (custom tokens are
+    valid for an hour). A burst of logins at game start then costs little
+    more than the signature check.
+    """
+
+    def __init__(self, firebase_manager):
+        self.firebase_manager = firebase_manager
+        self._identities = TTLCache(IDENTITY_TTL)
+        self._tokens = TTLCache(600)
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    def login(self, user: Mapping[str, Any]) -> str:
+        """Return a custom token for a verified Telegram user"""
+        telegram_id = str(user['id'])
+        username = user.get('username') or None
+        with self._locks[hash(telegram_id) % _LOCK_STRIPES]:
+            uid, stored_username = self._identity(telegram_id, user)
+            if username != stored_username:
+                self._db().collection('users').document(uid).set({
+                    'telegramChatId': telegram_id,
+                    'telegramUsername': username,
+                    'updatedAt': firestore.SERVER_TIMESTAMP
+                }, merge=True)
+                self._identities.set(telegram_id, (uid, username))
+            return self._token(uid)
+
+    def forget(self, telegram_id: str) -> None:
+        """Drop the cached identity (e.g. after the Telegram account is unlinked)"""
+        self._identities.invalidate(str(telegram_id))
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise RuntimeError('Database unavailable')
+        return db
+
+    def _identity(self, telegram_id: str, user: Mapping[str, Any]) -> Tuple[str, Optional[str]]:
+        """(uid, stored username) from cache, the users collection, or a newly created account"""
+        cached = self._identities.get(telegram_id)
+        if cached is not None:
+            return cached
+
+        db = self._db()
+        for doc in db.collection('users').where('telegramChatId', '==', telegram_id).limit(1).stream():
+            identity = (doc.id, (doc.to_dict() or {}).get('telegramUsername'))
+            break
+        else:
+            uid = f'tg_{telegram_id}'
+            display_name = (f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip()
+                            or user.get('username') or uid)
+            try:
+                user_record = firebase_auth.create_user(uid=uid, display_name=display_name)
+            except firebase_auth.UidAlreadyExistsError:
+                user_record = firebase_auth.get_user(uid)
+            db.collection('users').document(uid).set({
+                'displayName': user_record.display_name or display_name,
+                'telegramChatId': telegram_id,
+                'telegramUsername': user.get('username') or None,
+                'createdAt': firestore.SERVER_TIMESTAMP,
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            }, merge=True)
+            identity = (uid, user.get('username') or None)
+
+        self._identities.set(telegram_id, identity)
+        return identity
+
+    def _token(self, uid: str) -> str:
+        token = self._tokens.get(uid)
+        if token is None:
+            token = firebase_auth.create_custom_token(uid)
+            token = token.decode() if isinstance(token, bytes) else token
+            self._tokens.set(uid, token, ttl=get_config().TELEGRAM_LOGIN_TOKEN_REUSE_SECONDS)
+        return token
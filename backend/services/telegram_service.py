@@ -1,20 +1,31 @@
+from __future__ import annotations
+
 import requests
 import time
-from typing import Dict, Any, Optional
-from firebase_admin import firestore, auth as firebase_auth
+from typing import TYPE_CHECKING, Dict, Any, Optional
+from database.firebase import firestore
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler)
 import logging
 import os
 import asyncio
 
+from database.sharded_counter import ShardedCounter
+from services.bot_templates import BotTemplates
+
+if TYPE_CHECKING:
+    # python-telegram-bot is only needed by AdvancedTelegramBot; it is imported
+    # when the bot is built so web workers do not pay for it at startup
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
 class TelegramService:
     """Telegram bot service"""
     
-    def __init__(self, config):
+    def __init__(self, config, roster_service=None, counter: Optional[ShardedCounter] = None):
         self.bot_token = config.TELEGRAM_BOT_TOKEN
         self.payment_provider_token = config.TELEGRAM_PAYMENT_PROVIDER_TOKEN
+        self.roster_service = roster_service
+        self.counter = counter
     
     def send_message(self, chat_id: str, text: str, parse_mode: str = 'HTML') -> bool:
         """Send a message to a Telegram chat"""
@@ -94,7 +105,8 @@ class TelegramService:
             payload['error_message'] = error_message
         
         try:
-            response = requests.post(url, json=payload)
+            # Telegram drops the checkout after 10 seconds, so never block longer
+            response = requests.post(url, json=payload, timeout=5)
             return response.status_code == 200
         except Exception as e:
             print(f"Error answering pre-checkout query: {e}")
@@ -145,6 +157,13 @@ class TelegramService:
             # Add to transactions collection
             db.collection('transactions').add(transaction_data)
             
+            # Platform deposit totals are sharded to avoid a single hot document
+            if self.counter:
+                self.counter.increment(
+                    ShardedCounter.shards_for(db.collection('stats').document('totals')),
+                    {'deposits': amount, 'depositCount': 1}
+                )
+            
             # Update wallet balance
             wallet_ref = db.collection('wallets').document(user_id)
             wallet_doc = wallet_ref.get()
@@ -204,7 +223,6 @@ class TelegramService:
             game_doc = game_ref.get()
             
             if game_doc.exists:
-                game_data = game_doc.to_dict()
                 user_doc = db.collection('users').document(user_id).get()
                 user_data = user_doc.to_dict() if user_doc.exists else {}
                 
@@ -217,10 +235,27 @@ class TelegramService:
                     'entryAmount': amount
                 }
                 
-                # Add player to game
-                game_ref.update({
-                    'players': firestore.ArrayUnion([player_info])
-                })
+                # Prize pool, player stats and platform totals go to sharded counters,
+                # committed with the join so a repeated entry counts nothing twice
+                batch = db.batch()
+                if self.counter:
+                    self.counter.increment(ShardedCounter.shards_for(game_ref),
+                                           {'prizePool': amount, 'entryCount': 1}, batch)
+                    self.counter.increment(ShardedCounter.shards_for(db.collection('users').document(user_id)),
+                                           {'gamesPlayed': 1}, batch)
+                    self.counter.increment(ShardedCounter.shards_for(db.collection('stats').document('totals')),
+                                           {'gameEntries': amount, 'gameEntryCount': 1}, batch)
+                
+                # Add player to the game roster
+                if self.roster_service:
+                    if not self.roster_service.add_player(game_id, player_info, batch=batch):
+                        print(f"User {user_id} already joined game {game_id}; entry not counted again")
+                        return True
+                else:
+                    batch.update(game_ref, {
+                        'players': firestore.ArrayUnion([player_info])
+                    })
+                    batch.commit()
                 
                 print(f"Processed Telegram game entry: {amount} ETB for user {user_id} in game {game_id}")
                 return True
@@ -232,17 +267,28 @@ class TelegramService:
             print(f"Error processing Telegram game entry: {e}")
             return False 
 
+WELCOME_ANIMATION_URL = 'https://media.giphy.com/media/v1.Y2lkPTc5MGI3NjExb2Z2b2J6d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2/giphy.gif'
+
 # Advanced Telegram Bot with multi-language, animated onboarding, wallet, profile, etc.
 class AdvancedTelegramBot:
-    def __init__(self, token, firebase_manager, supported_languages=None):
+    def __init__(self, token, firebase_manager, supported_languages=None, counter=None, leaderboard=None,
+                 achievement_engine=None):
         self.token = token
         self.firebase_manager = firebase_manager
+        self.counter = counter
+        self.leaderboard = leaderboard
+        self.achievement_engine = achievement_engine
         self.supported_languages = supported_languages or {'en': 'English', 'am': 'Amharic'}
+        self.templates = BotTemplates(self.supported_languages)
+        # Telegram file_id of the welcome animation, cached after the first upload
+        self.welcome_animation_id = None
+        from telegram.ext import Application
         self.application = Application.builder().token(token).build()
         self._setup_handlers()
         self.logger = logging.getLogger('AdvancedTelegramBot')
 
     def _setup_handlers(self):
+        from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler, filters
         self.application.add_handler(CommandHandler('start', self.start))
         self.application.add_handler(CommandHandler('help', self.help))
         self.application.add_handler(CommandHandler('register', self.register))
@@ -250,6 +296,7 @@ class AdvancedTelegramBot:
         self.application.add_handler(CommandHandler('balance', self.balance))
         self.application.add_handler(CommandHandler('wallet', self.wallet))
         self.application.add_handler(CommandHandler('achievements', self.achievements))
+        self.application.add_handler(CommandHandler('leaderboard', self.leaderboard_command))
         self.application.add_handler(CommandHandler('language', self.language))
         self.application.add_handler(CommandHandler('support', self.support))
         self.application.add_handler(CallbackQueryHandler(self.button))
@@ -259,19 +306,14 @@ class AdvancedTelegramBot:
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         lang = self.get_user_language(user.id)
-        welcome_text = self.get_text('welcome', lang).format(name=user.first_name)
-        keyboard = [
-            [InlineKeyboardButton(self.get_text('profile_btn', lang), callback_data='profile')],
-            [InlineKeyboardButton(self.get_text('wallet_btn', lang), callback_data='wallet')],
-            [InlineKeyboardButton(self.get_text('achievements_btn', lang), callback_data='achievements')],
-            [InlineKeyboardButton(self.get_text('language_btn', lang), callback_data='language')],
-            [InlineKeyboardButton(self.get_text('support_btn', lang), callback_data='support')],
-        ]
-        await update.message.reply_animation(
-            animation='https://media.giphy.com/media/v1.Y2lkPTc5MGI3NjExb2Z2b2J6d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2d3F2/giphy.gif',
+        welcome_text = self.templates.render('welcome', lang, name=user.first_name)
+        message = await update.message.reply_animation(
+            animation=self.welcome_animation_id or WELCOME_ANIMATION_URL,
             caption=welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self.templates.keyboard('main_menu', lang)
         )
+        if not self.welcome_animation_id and message.animation:
+            self.welcome_animation_id = message.animation.file_id
 
     async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         lang = self.get_user_language(update.effective_user.id)
@@ -281,17 +323,10 @@ class AdvancedTelegramBot:
         user = update.effective_user
         lang = self.get_user_language(user.id)
         
-        # Create keyboard with contact request button
-        keyboard = [
-            [InlineKeyboardButton(
-                self.get_text('share_phone', lang), 
-                callback_data='request_contact'
-            )]
-        ]
-        
+        # Keyboard with contact request button
         await update.message.reply_text(
             self.get_text('register_instruction', lang),
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self.templates.keyboard('register', lang)
         )
 
     async def profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -306,11 +341,13 @@ class AdvancedTelegramBot:
                 break
         if user_doc:
             data = user_doc.to_dict()
-            profile_text = self.get_text('profile', lang).format(
+            # Stats are the profile field plus whatever has accrued in counter shards
+            stats = self.counter.get_totals(ShardedCounter.shards_for(user_doc.reference)) if self.counter else {}
+            profile_text = self.templates.render('profile', lang,
                 name=data.get('displayName', user.first_name),
                 level=data.get('level', 1),
-                games=data.get('gamesPlayed', 0),
-                wins=data.get('gamesWon', 0),
+                games=data.get('gamesPlayed', 0) + int(stats.get('gamesPlayed', 0)),
+                wins=data.get('gamesWon', 0) + int(stats.get('gamesWon', 0)),
                 achievements=len(data.get('achievements', []))
             )
         else:
@@ -329,7 +366,7 @@ class AdvancedTelegramBot:
                 break
         if wallet_doc:
             balance = wallet_doc.to_dict().get('balance', 0)
-            await update.message.reply_text(self.get_text('balance', lang).format(balance=balance))
+            await update.message.reply_text(self.templates.render('balance', lang, balance=balance))
         else:
             await update.message.reply_text(self.get_text('wallet_not_found', lang))
 
@@ -346,7 +383,17 @@ class AdvancedTelegramBot:
             for doc in users:
                 user_doc = doc
                 break
-        if user_doc:
+        if user_doc and self.achievement_engine:
+            # Server-evaluated progress; the achievements array on the user doc is client-writable
+            progress = self.achievement_engine.progress(user_doc.id)
+            unlocked = [a for a in progress['achievements'] if a['unlocked']]
+            if unlocked:
+                text = (self.get_text('achievements', lang) + '\n'
+                        + '\n'.join(f"{a['icon']} {a['name']}" for a in unlocked)
+                        + '\n' + self.templates.render('achievement_points', lang, points=progress['points']))
+            else:
+                text = self.get_text('no_achievements', lang)
+        elif user_doc:
             achievements = user_doc.to_dict().get('achievements', [])
             if achievements:
                 text = self.get_text('achievements', lang) + '\n' + '\n'.join(f'- {a}' for a in achievements)
@@ -356,13 +403,39 @@ class AdvancedTelegramBot:
             text = self.get_text('profile_not_found', lang)
         await update.message.reply_text(text)
 
+    async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        lang = self.get_user_language(user.id)
+        if not self.leaderboard:
+            await update.message.reply_text(self.get_text('database_error', lang))
+            return
+        from services.leaderboard_service import LeaderboardError
+        try:
+            board_id = self.leaderboard.resolve(context.args[0] if context.args else 'all')
+        except LeaderboardError:
+            await update.message.reply_text(self.get_text('leaderboard_usage', lang))
+            return
+        data = self.leaderboard.top(board_id, 10)
+        if not data['entries']:
+            await update.message.reply_text(self.get_text('leaderboard_empty', lang))
+            return
+        lines = [self.templates.render('leaderboard_title', lang, board=board_id)]
+        lines.extend(self.templates.render('leaderboard_entry', lang, rank=entry['rank'], name=entry['displayName'],
+                                           earnings=entry['earnings'], wins=entry['wins'])
+                     for entry in data['entries'])
+        db = self.firebase_manager.get_db()
+        if db:
+            for doc in db.collection('users').where('telegramChatId', '==', user.id).limit(1).stream():
+                rank = self.leaderboard.rank(board_id, doc.id)
+                if rank:
+                    lines.append('\n' + self.templates.render('leaderboard_rank', lang, rank=rank['rank'], size=rank['size']))
+        await update.message.reply_text('\n'.join(lines))
+
     async def language(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         lang = self.get_user_language(update.effective_user.id)
-        keyboard = [[InlineKeyboardButton(name, callback_data=f'lang_{code}')]
-                    for code, name in self.supported_languages.items()]
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             self.get_text('choose_language', lang),
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self.templates.keyboard('languages', lang)
         )
 
     async def support(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -385,14 +458,11 @@ class AdvancedTelegramBot:
         elif data == 'support':
             await self.support(update, context)
         elif data == 'request_contact':
-            # Send contact request
-            keyboard = [[InlineKeyboardButton(
-                self.get_text('share_phone', self.get_user_language(query.from_user.id)), 
-                request_contact=True
-            )]]
-            await query.edit_message_text(
-                self.get_text('share_phone_prompt', self.get_user_language(query.from_user.id)),
-                reply_markup=InlineKeyboardMarkup(keyboard)
+            # Contact requests need a reply keyboard, so send a fresh message
+            lang = self.get_user_language(query.from_user.id)
+            await query.message.reply_text(
+                self.get_text('share_phone_prompt', lang),
+                reply_markup=self.templates.keyboard('share_contact', lang)
             )
         elif data.startswith('lang_'):
             lang_code = data.split('_', 1)[1]
@@ -485,56 +555,4 @@ class AdvancedTelegramBot:
         pass
 
     def get_text(self, key, lang):
-        texts = {
-            'welcome': {
-                'en': '👋 Welcome, {name}!\nThis is the Bingo Game Bot. Use the menu below to get started.',
-                'am': '👋 እንኳን ደህና መጡ {name}! ይህ የቢንጎ ጨዋታ ቦት ነው። ለመጀመር ዝርዝሩን ይጠቀሙ።'
-            },
-            'profile_btn': {'en': '👤 Profile', 'am': '👤 መገለጫ'},
-            'wallet_btn': {'en': '💰 Wallet', 'am': '💰 ቦሌት'},
-            'achievements_btn': {'en': '🏆 Achievements', 'am': '🏆 ሽልማቶች'},
-            'language_btn': {'en': '🌐 Language', 'am': '🌐 ቋንቋ'},
-            'support_btn': {'en': '🆘 Support', 'am': '🆘 ድጋፍ'},
-            'help': {
-                'en': 'Use the menu or type /profile, /wallet, /achievements, /language, /support, /register.',
-                'am': 'ዝርዝሩን ይጠቀሙ ወይም /profile, /wallet, /achievements, /language, /support, /register ይተይቡ።'
-            },
-            'register_instruction': {
-                'en': '📱 To register your phone number, please share your contact information. This helps us verify your account and provide better service.',
-                'am': '📱 የስልክ ቁጥርዎን ለመመዝገብ እባክዎን የእርስዎን አድራሻ ያጋሩ። ይህ መለያዎን ለመረጋገጥ እና የተሻለ አገልግሎት ለመስጠት ያገለግለናል።'
-            },
-            'share_phone': {
-                'en': '📱 Share Phone Number',
-                'am': '📱 የስልክ ቁጥር ያጋሩ'
-            },
-            'share_phone_prompt': {
-                'en': '📱 Please tap the button below to share your phone number:',
-                'am': '📱 የስልክ ቁጥርዎን ለመጋራት እባክዎን ከታች ያለውን ቁልፍ ይጫኑ:'
-            },
-            'phone_registered_success': {
-                'en': '✅ Phone number registered successfully! You can now use all bot features.',
-                'am': '✅ የስልክ ቁጥር በተሳካት ሁኔታ ተመዝግቧል! አሁን ሁሉንም የቦት ባህሪያት መጠቀም ይችላሉ።'
-            },
-            'invalid_contact': {
-                'en': '❌ Invalid contact. Please share your own phone number.',
-                'am': '❌ የማያገለግል አድራሻ። እባክዎን የራስዎን የስልክ ቁጥር ያጋሩ።'
-            },
-            'database_error': {
-                'en': '❌ Database error. Please try again later.',
-                'am': '❌ የዳታቤዝ ስህተት። እባክዎን በኋላ ዳግም ይሞክሩ።'
-            },
-            'profile': {
-                'en': '👤 Name: {name}\nLevel: {level}\nGames: {games}\nWins: {wins}\nAchievements: {achievements}',
-                'am': '👤 ስም: {name}\nደረጃ: {level}\nጨዋታዎች: {games}\nአሸናፊዎች: {wins}\nሽልማቶች: {achievements}'
-            },
-            'profile_not_found': {'en': 'Profile not found. Please register on the web app.', 'am': 'መገለጫ አልተገኘም። እባክዎን በድህረ ገጹ ይመዝገቡ።'},
-            'balance': {'en': '💰 Your wallet balance: {balance} ETB', 'am': '💰 የእርስዎ ቦሌት ሂሳብ: {balance} ብር'},
-            'wallet_not_found': {'en': 'No wallet found. Please register on the web app.', 'am': 'ቦሌት አልተገኘም። እባክዎን በድህረ ገጹ ይመዝገቡ።'},
-            'achievements': {'en': '🏆 Your Achievements:', 'am': '🏆 የእርስዎ ሽልማቶች:'},
-            'no_achievements': {'en': 'No achievements yet.', 'am': 'ምንም ሽልማት የለም።'},
-            'choose_language': {'en': 'Choose your language:', 'am': 'ቋንቋዎን ይምረጡ።'},
-            'language_set': {'en': 'Language updated!', 'am': 'ቋንቋ ተቀይሯል!'},
-            'support': {'en': 'For support, contact @YourSupportUsername.', 'am': 'ለድጋፍ እባክዎን @YourSupportUsername ያነጋግሩ።'},
-            'unknown_command': {'en': 'Unknown command. Use the menu or /help.', 'am': 'ያልታወቀ ትእዛዝ። ዝርዝሩን ይጠቀሙ ወይም /help ይተይቡ።'}
-        }
-        return texts.get(key, {}).get(lang, texts.get(key, {}).get('en', '')) 
\ No newline at end of file
+        return self.templates.text(key, lang)
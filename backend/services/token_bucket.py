@@ -0,0 +1,50 @@
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst tokens; safe to share between threads.
+
+    ``take`` is for callers that turn work away (request limits): it only
+    spends a token when one is available. ``wait`` is for callers that queue
+    (outbound API calls): it reserves the next token, going into debt if
+    need be, and sleeps until that token is due, so waiting threads are
+    released evenly in arrival order.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', '_lock')
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+
+    def take(self, now: Optional[float] = None) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Reserve the next token; returns seconds until it may be used"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait(self) -> None:
+        """Block until a token is available and spend it"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
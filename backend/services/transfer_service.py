@@ -0,0 +1,371 @@
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from database.firebase import firestore
+
+COLLECTION = 'player_transfers'
+
+# Locks shared by every transfer of this process; a wallet always maps to the same one
+LOCK_STRIPES = 64
+# Firestore transaction attempts; only transfers racing another worker retry
+MAX_ATTEMPTS = 5
+MAX_REASON_LENGTH = 200
+REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Velocity window and the number of recent transfers the new-recipient ratio is taken over
+VELOCITY_WINDOW_SECONDS = 3600
+RATIO_WINDOW = 20
+KNOWN_RECIPIENTS = 50
+MAX_TRACKED_SENDERS = 10000
+
+class TransferError(Exception):
+    """Raised when a transfer cannot be processed"""
+
+class TransferRejected(TransferError):
+    """Raised when a transfer breaks a limit or a wallet cannot take part"""
+
+class TransferNotFound(TransferError):
+    """Raised when a transfer id is unknown"""
+
+class LockStripes:
+    """A fixed pool of locks; a key always maps to the same lock.
+
+    Holding several keys takes their locks in index order, so two
+    transfers between the same wallets in opposite directions cannot
+    deadlock, and keys that share a stripe take it once.
+    """
+
+    def __init__(self, count: int = LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(count)]
+
+    def index(self, key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys: str) -> Iterator[None]:
+        locks = [self._locks[i] for i in sorted({self.index(key) for key in keys})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+class _SenderStats:
+    __slots__ = ('sent', 'hour_amount', 'recipients', 'recent_new', 'new_count')
+
+    def __init__(self):
+        self.sent: Deque[Tuple[float, float]] = deque()
+        self.hour_amount = 0.0
+        self.recipients: 'OrderedDict[str, None]' = OrderedDict()
+        self.recent_new: Deque[bool] = deque()
+        self.new_count = 0
+
+    def expire(self, now: float) -> None:
+        while self.sent and self.sent[0][0] <= now - VELOCITY_WINDOW_SECONDS:
+            self.hour_amount -= self.sent.popleft()[1]
+
+class VelocityTracker:
+    """Per-sender transfer features, updated incrementally in memory.
+
+    For each sender: the transfers and amount of the last hour (a deque
+    trimmed from the front) and the share of new recipients among the last
+    RATIO_WINDOW transfers (a running count over a bounded deque). Features
+    are per process and start empty after a restart; they feed the score
+    that holds a transfer for review, while hard limits are enforced from
+    the wallet in Firestore.
+    """
+
+    def __init__(self, max_senders: int = MAX_TRACKED_SENDERS):
+        self.max_senders = max_senders
+        self._senders: 'OrderedDict[str, _SenderStats]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def features(self, sender: str, recipient: str, now: Optional[float] = None) -> Dict[str, Any]:
+        """Features of a prospective transfer, counting it as made"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._senders.get(sender)
+            if stats is None:
+                return {'transfersLastHour': 1, 'amountLastHour': 0.0, 'newRecipient': True,
+                        'newRecipientRatio': 1.0, 'history': 0}
+            stats.expire(now)
+            new = recipient not in stats.recipients
+            return {
+                'transfersLastHour': len(stats.sent) + 1,
+                'amountLastHour': round(stats.hour_amount, 2),
+                'newRecipient': new,
+                'newRecipientRatio': round((stats.new_count + new) / (len(stats.recent_new) + 1), 3),
+                'history': len(stats.recent_new)
+            }
+
+    def record(self, sender: str, recipient: str, amount: float, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._senders.pop(sender, None) or _SenderStats()
+            self._senders[sender] = stats
+            while len(self._senders) > self.max_senders:
+                self._senders.popitem(last=False)
+            stats.expire(now)
+            stats.sent.append((now, amount))
+            stats.hour_amount += amount
+            new = recipient not in stats.recipients
+            stats.recipients.pop(recipient, None)
+            stats.recipients[recipient] = None
+            if len(stats.recipients) > KNOWN_RECIPIENTS:
+                stats.recipients.popitem(last=False)
+            stats.recent_new.append(new)
+            stats.new_count += new
+            if len(stats.recent_new) > RATIO_WINDOW:
+                stats.new_count -= stats.recent_new.popleft()
+
+def fraud_score(amount: float, features: Dict[str, Any]) -> int:
+    """0-100 risk score; the amount rules match walletService.ts calculateFraudScore"""
+    score = 0
+    if amount > 1000:
+        score += 20
+    if amount > 5000:
+        score += 30
+    # A burst of transfers, or emptying a wallet across many new accounts
+    score += min(max(features['transfersLastHour'] - 3, 0) * 10, 40)
+    if features['newRecipient']:
+        score += 10
+    if features['history'] >= 4 and features['newRecipientRatio'] >= 0.8:
+        score += 20
+    return min(score, 100)
+
+class TransferProcessor:
+    """Player-to-player wallet transfers.
+
+    A transfer runs in a Firestore transaction that reads both wallets and
+    the transfer document, checks the balance, locks and the daily limit,
+    and writes the two balances, the ``player_transfers`` document and a
+    ``transactions`` record for each side. The transaction makes transfers
+    safe across workers; within a worker, transfers touching the same wallet
+    are serialised on striped locks first, so they never race each other
+    into transaction retries.
+
+    A transfer whose fraud score is above TRANSFER_REVIEW_SCORE is stored as
+    ``pending`` without moving money, and an admin approves (through the
+    same transaction) or rejects it. The caller's requestId makes the
+    transfer id deterministic, so a retried request returns the first
+    result instead of paying twice.
+    """
+
+    def __init__(self, firebase_manager, max_amount: float = 10000.0, daily_limit: float = 5000.0,
+                 review_score: int = 50, utc_offset_hours: float = 3.0):
+        self.firebase_manager = firebase_manager
+        self.max_amount = max_amount
+        self.daily_limit = daily_limit
+        self.review_score = review_score
+        self.offset = timedelta(hours=utc_offset_hours)
+        self.locks = LockStripes()
+        self.velocity = VelocityTracker()
+
+    @classmethod
+    def from_config(cls, firebase_manager, config) -> 'TransferProcessor':
+        return cls(firebase_manager, config.TRANSFER_MAX_AMOUNT, config.TRANSFER_DAILY_LIMIT,
+                   config.TRANSFER_REVIEW_SCORE, config.STATS_UTC_OFFSET_HOURS)
+
+    def configure(self, config) -> None:
+        """Apply reloaded TRANSFER_* limits"""
+        self.max_amount = config.TRANSFER_MAX_AMOUNT
+        self.daily_limit = config.TRANSFER_DAILY_LIMIT
+        self.review_score = config.TRANSFER_REVIEW_SCORE
+        self.offset = timedelta(hours=config.STATS_UTC_OFFSET_HOURS)
+
+    def _db(self):
+        db = self.firebase_manager.get_db()
+        if not db:
+            raise TransferError('Database unavailable')
+        return db
+
+    def today(self) -> str:
+        return (datetime.now(timezone.utc) + self.offset).date().isoformat()
+
+    def transfer(self, from_user_id: str, to_user_id: str, amount: Any, reason: str = '',
+                 request_id: Optional[str] = None) -> Dict[str, Any]:
+        """Send amount from one wallet to another, or hold it for review.
+
+        Returns the transfer (``status`` is completed or pending, and
+        ``duplicate`` is True if request_id was seen before).
+        """
+        try:
+            amount = round(float(amount), 2)
+        except (TypeError, ValueError):
+            raise TransferRejected('Invalid transfer amount')
+        reason = (reason or '').strip()[:MAX_REASON_LENGTH]
+        if not to_user_id or to_user_id == from_user_id:
+            raise TransferRejected('Invalid recipient')
+        if not amount > 0:
+            raise TransferRejected('Invalid transfer amount')
+        if amount > self.max_amount:
+            raise TransferRejected('Transfer amount exceeds maximum limit')
+        if request_id is not None and not REQUEST_ID.match(request_id):
+            raise TransferRejected('requestId must be 1-64 letters, digits, _ or -')
+
+        db = self._db()
+        transfer_id = f'{from_user_id}_{request_id}' if request_id else uuid.uuid4().hex
+        features = self.velocity.features(from_user_id, to_user_id)
+        score = fraud_score(amount, features)
+        held = score > self.review_score
+        data = {
+            'fromUserId': from_user_id,
+            'toUserId': to_user_id,
+            'amount': amount,
+            'reason': reason,
+            'status': 'pending' if held else 'completed',
+            'fraudScore': score,
+            'features': features,
+            'adminNotes': 'Held for review' if held else 'Auto-approved by system',
+            'createdAt': firestore.SERVER_TIMESTAMP
+        }
+        transfer_ref = db.collection(COLLECTION).document(transfer_id)
+
+        @firestore.transactional
+        def _run(transaction):
+            existing = transfer_ref.get(transaction=transaction)
+            if existing.exists:
+                return existing.to_dict(), True
+            sender, recipient = self._wallets(db, transaction, from_user_id, to_user_id)
+            self._check(sender, recipient, amount)
+            if not held:
+                self._move(db, transaction, transfer_id, data, sender, recipient)
+            transaction.create(transfer_ref, data)
+            return data, False
+
+        with self.locks.hold(from_user_id, to_user_id):
+            result, duplicate = _run(db.transaction(max_attempts=MAX_ATTEMPTS))
+        if not duplicate:
+            self.velocity.record(from_user_id, to_user_id, amount)
+            print(f"Transfer {transfer_id}: {from_user_id} -> {to_user_id} {amount} ETB "
+                  f"{result['status']} (score {score})")
+        return self._view(transfer_id, result, duplicate)
+
+    def approve(self, transfer_id: str, admin_uid: str, notes: str = '') -> Dict[str, Any]:
+        """Complete a pending transfer, re-checking the balance and limits now"""
+        db = self._db()
+        transfer_ref = db.collection(COLLECTION).document(transfer_id)
+        pending = transfer_ref.get()
+        if not pending.exists:
+            raise TransferNotFound(f'Transfer {transfer_id} not found')
+        parties = pending.get('fromUserId'), pending.get('toUserId')
+        review = {'status': 'completed', 'adminNotes': notes or 'Approved by admin', 'reviewedBy': admin_uid,
+                  'reviewedAt': firestore.SERVER_TIMESTAMP}
+
+        @firestore.transactional
+        def _run(transaction):
+            snapshot = transfer_ref.get(transaction=transaction)
+            transfer = snapshot.to_dict() or {}
+            if transfer.get('status') != 'pending':
+                raise TransferRejected(f"Transfer is already {transfer.get('status')}")
+            sender, recipient = self._wallets(db, transaction, *parties)
+            self._check(sender, recipient, float(transfer['amount']))
+            self._move(db, transaction, transfer_id, transfer, sender, recipient)
+            transaction.update(transfer_ref, review)
+            return {**transfer, **review}
+
+        with self.locks.hold(*parties):
+            result = _run(db.transaction(max_attempts=MAX_ATTEMPTS))
+        print(f"Transfer {transfer_id} approved by {admin_uid}")
+        return self._view(transfer_id, result, False)
+
+    def reject(self, transfer_id: str, admin_uid: str, notes: str = '') -> Dict[str, Any]:
+        """Reject a pending transfer; no money has moved for it"""
+        db = self._db()
+        transfer_ref = db.collection(COLLECTION).document(transfer_id)
+        review = {'status': 'rejected', 'adminNotes': notes or 'Rejected by admin', 'reviewedBy': admin_uid,
+                  'reviewedAt': firestore.SERVER_TIMESTAMP}
+
+        @firestore.transactional
+        def _run(transaction):
+            snapshot = transfer_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                raise TransferNotFound(f'Transfer {transfer_id} not found')
+            transfer = snapshot.to_dict() or {}
+            if transfer.get('status') != 'pending':
+                raise TransferRejected(f"Transfer is already {transfer.get('status')}")
+            transaction.update(transfer_ref, review)
+            return {**transfer, **review}
+
+        result = _run(db.transaction(max_attempts=MAX_ATTEMPTS))
+        print(f"Transfer {transfer_id} rejected by {admin_uid}")
+        return self._view(transfer_id, result, False)
+
+    def pending(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Transfers held for review, highest score first"""
+        query = (self._db().collection(COLLECTION)
+                 .where('status', '==', 'pending')
+                 .order_by('fraudScore', direction=firestore.Query.DESCENDING)
+                 .limit(limit))
+        return [self._view(doc.id, doc.to_dict() or {}, False) for doc in query.stream()]
+
+    @staticmethod
+    def _wallets(db, transaction, from_user_id: str, to_user_id: str):
+        wallets = db.collection('wallets')
+        snapshots = {snap.id: snap for snap in db.get_all(
+            [wallets.document(from_user_id), wallets.document(to_user_id)], transaction=transaction)}
+        return snapshots[from_user_id], snapshots[to_user_id]
+
+    def _check(self, sender, recipient, amount: float) -> None:
+        if not sender.exists:
+            raise TransferRejected('Sender wallet not found')
+        if not recipient.exists:
+            raise TransferRejected('Recipient wallet not found')
+        wallet = sender.to_dict() or {}
+        if wallet.get('isLocked'):
+            raise TransferRejected('Wallet is locked for security reasons')
+        if (recipient.to_dict() or {}).get('isLocked'):
+            raise TransferRejected('Recipient wallet is locked')
+        if float(wallet.get('balance') or 0) < amount:
+            raise TransferRejected('Insufficient balance')
+        if self._used_today(wallet) + amount > float(wallet.get('dailyTransferLimit') or self.daily_limit):
+            raise TransferRejected('Daily transfer limit exceeded')
+
+    def _used_today(self, wallet: Dict[str, Any]) -> float:
+        if wallet.get('lastTransferDate') != self.today():
+            return 0.0
+        return float(wallet.get('dailyTransferUsed') or 0)
+
+    def _move(self, db, transaction, transfer_id: str, transfer: Dict[str, Any], sender, recipient) -> None:
+        amount = float(transfer['amount'])
+        wallet = sender.to_dict() or {}
+        transaction.update(sender.reference, {
+            'balance': round(float(wallet.get('balance') or 0) - amount, 2),
+            'dailyTransferUsed': round(self._used_today(wallet) + amount, 2),
+            'lastTransferDate': self.today(),
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        transaction.update(recipient.reference, {
+            'balance': round(float((recipient.to_dict() or {}).get('balance') or 0) + amount, 2),
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        transactions = db.collection('transactions')
+        reason = transfer.get('reason') or ''
+        for suffix, user_id, signed, description in (
+                ('sent', transfer['fromUserId'], -amount, f"Transfer to {transfer['toUserId']}"),
+                ('received', transfer['toUserId'], amount, f"Transfer from {transfer['fromUserId']}")):
+            transaction.set(transactions.document(f'transfer_{transfer_id}_{suffix}'), {
+                'userId': user_id,
+                'type': f'transfer_{suffix}',
+                'amount': signed,
+                'currency': 'ETB',
+                'status': 'completed',
+                'description': f'{description}: {reason}' if reason else description,
+                'relatedTransferId': transfer_id,
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+
+    @staticmethod
+    def _view(transfer_id: str, transfer: Dict[str, Any], duplicate: bool) -> Dict[str, Any]:
+        view = {key: value for key, value in transfer.items()
+                if key not in ('createdAt', 'reviewedAt', 'features')}
+        return {'id': transfer_id, **view, 'duplicate': duplicate}
@@ -0,0 +1,118 @@
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Cards are flattened row-major: cell index = row * 5 + column (B=0 .. O=4).
+# A 0 marks the free space.
+COLUMNS = ('B', 'I', 'N', 'G', 'O')
+CELL_COUNT = 25
+FREE_SPACE = 0
+FULL_MASK = (1 << CELL_COUNT) - 1
+# Column letter -> (lowest, highest) number it may hold
+COLUMN_RANGES = {letter: (col * 15 + 1, col * 15 + 15) for col, letter in enumerate(COLUMNS)}
+CENTER = 12
+
+def _mask(cells: Iterable[Tuple[int, int]]) -> int:
+    mask = 0
+    for row, col in cells:
+        mask |= 1 << (row * 5 + col)
+    return mask
+
+@dataclass(frozen=True)
+class WinPattern:
+    """A winning pattern as a 25-bit cell mask"""
+    name: str
+    win_type: str
+    percentage: float
+    mask: int
+
+# Same patterns, order and prize percentages as gameService.checkWin on the client
+PATTERNS: Tuple[WinPattern, ...] = (
+    *(WinPattern(f'{letter} Column', 'line', 0.20, _mask((row, col) for row in range(5)))
+      for col, letter in enumerate(COLUMNS)),
+    *(WinPattern(f'Row {row + 1}', 'line', 0.20, _mask((row, col) for col in range(5)))
+      for row in range(5)),
+    WinPattern('Diagonal (\\)', 'line', 0.25, _mask((i, i) for i in range(5))),
+    WinPattern('Diagonal (/)', 'line', 0.25, _mask((4 - i, i) for i in range(5))),
+    WinPattern('Four Corners', 'corners', 0.30, _mask([(0, 0), (0, 4), (4, 0), (4, 4)])),
+    WinPattern('Center Cross', 'center_cross', 0.35,
+               _mask([(row, 2) for row in range(5)] + [(2, col) for col in range(5)])),
+    WinPattern('Full House', 'fullhouse', 1.0, FULL_MASK),
+    WinPattern('Edge Pattern', 'line', 0.40,
+               _mask([(0, col) for col in range(5)] + [(4, col) for col in range(5)] +
+                     [(row, 0) for row in range(1, 4)] + [(row, 4) for row in range(1, 4)])),
+)
+
+def card_from_columns(card: Dict[str, Any]) -> List[int]:
+    """Flatten a client card ({'B': [...], ...}) into 25 numbers, row-major.
+
+    Column entries may be plain numbers or cells like {'number': 12, 'marked': False}.
+    Raises ValueError unless every number is distinct and inside its column's
+    range, with the free space in the centre only.
+    """
+    numbers = [FREE_SPACE] * CELL_COUNT
+    for col, letter in enumerate(COLUMNS):
+        cells = card.get(letter)
+        if not cells or len(cells) != 5:
+            raise ValueError(f'Card column {letter} must have 5 cells')
+        low, high = COLUMN_RANGES[letter]
+        for row, cell in enumerate(cells):
+            number = int(cell.get('number', FREE_SPACE) if isinstance(cell, dict) else cell)
+            index = row * 5 + col
+            if number == FREE_SPACE and index == CENTER:
+                continue
+            if not low <= number <= high:
+                raise ValueError(f'Card column {letter} holds {number}, outside {low}-{high}')
+            numbers[index] = number
+    if len(set(numbers)) != CELL_COUNT:
+        raise ValueError('Card numbers must be distinct')
+    return numbers
+
+def generate_card(rng: Optional[random.Random] = None) -> Dict[str, List[int]]:
+    """A random card in the stored column layout ({'B': [...], ...}, 0 in the centre)"""
+    rng = rng or random.SystemRandom()
+    card = {letter: rng.sample(range(low, high + 1), 5) for letter, (low, high) in COLUMN_RANGES.items()}
+    card['N'][2] = FREE_SPACE
+    return card
+
+def free_mask(numbers: Sequence[int]) -> int:
+    """Mask of free-space cells, which count as marked from the start"""
+    mask = 0
+    for index, number in enumerate(numbers):
+        if number == FREE_SPACE:
+            mask |= 1 << index
+    return mask
+
+def marked_mask(numbers: Sequence[int], called: Iterable[int]) -> int:
+    """Mask of cells covered by the called numbers (free space included)"""
+    called_set = set(called)
+    mask = free_mask(numbers)
+    for index, number in enumerate(numbers):
+        if number in called_set:
+            mask |= 1 << index
+    return mask
+
+def match_pattern(mask: int) -> Optional[WinPattern]:
+    """First pattern fully covered by mask, in client priority order"""
+    for pattern in PATTERNS:
+        if mask & pattern.mask == pattern.mask:
+            return pattern
+    return None
+
+def first_win(numbers: Sequence[int], called_sequence: Sequence[int]) -> Optional[Tuple[int, WinPattern]]:
+    """Index into called_sequence at which the card first wins, and the pattern.
+
+    Patterns are only re-checked when a call actually lands on the card, so a
+    full 75-call replay costs at most 24 pattern scans.
+    """
+    positions = {number: index for index, number in enumerate(numbers) if number != FREE_SPACE}
+    mask = free_mask(numbers)
+    for call_index, number in enumerate(called_sequence):
+        position = positions.get(number)
+        if position is None:
+            continue
+        mask |= 1 << position
+        pattern = match_pattern(mask)
+        if pattern:
+            return call_index, pattern
+    return None
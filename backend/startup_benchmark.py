@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how long the backend takes to become ready to serve /health.
+
+- cold: a fresh interpreter imports app.py and serves /health (Render cold start)
+- fork: a worker forked from a warmed-up master serves /health (gunicorn respawn)
+
+Usage: python startup_benchmark.py [--runs 5] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Heavy modules that should not be loaded just to serve /health
+WATCHED_MODULES = ('telegram', 'telegram.ext', 'google.cloud.firestore', 'firebase_admin.firestore')
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/health')
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'first_request': served - imported,
+    'total': served - started,
+    'firebase_initialized': app.firebase_manager.is_initialized(),
+    'loaded': [m for m in %r if m in sys.modules],
+}))
+""" % (WATCHED_MODULES,)
+
+FORKED_WORKER = """
+import json, os, time
+import app
+app.warm_up()
+read_fd, write_fd = os.pipe()
+started = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    app.app.test_client().get('/health')
+    os.write(write_fd, str(time.perf_counter() - started).encode())
+    os._exit(0)
+os.close(write_fd)
+elapsed = float(os.read(read_fd, 64).decode())
+os.waitpid(pid, 0)
+print(json.dumps({'total': elapsed}))
+"""
+
+def run_python(code, *flags):
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'benchmark failed')
+    # App startup prints status lines; the measurement is the last line
+    return result, json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(label, samples):
+    print(f"{label:<24} median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+def print_import_profile(limit=15):
+    """Top modules by cumulative import time (python -X importtime)"""
+    result, _ = run_python(COLD_START, '-X', 'importtime')
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # import time: self [us] | cumulative | imported package
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), name))
+    print("\nSlowest imports (cumulative):")
+    for cumulative_us, name in sorted(rows, reverse=True)[:limit]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure backend startup time')
+    parser.add_argument('--runs', type=int, default=5, help='runs per measurement')
+    parser.add_argument('--importtime', action='store_true', help='show the slowest imports')
+    args = parser.parse_args()
+
+    cold = [run_python(COLD_START)[1] for _ in range(args.runs)]
+    print(f"Startup benchmark ({args.runs} runs)")
+    summarize('cold: import app', [r['import'] for r in cold])
+    summarize('cold: first /health', [r['first_request'] for r in cold])
+    summarize('cold: total', [r['total'] for r in cold])
+    if hasattr(os, 'fork'):
+        summarize('forked worker: /health', [run_python(FORKED_WORKER)[1]['total'] for _ in range(args.runs)])
+
+    last = cold[-1]
+    print(f"\nFirebase initialized by /health: {'Yes' if last['firebase_initialized'] else 'No'}")
+    print(f"Heavy modules loaded: {', '.join(last['loaded']) or 'none'}")
+
+    if args.importtime:
+        print_import_profile()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import dataclasses
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import firestore_stub
+from config import settings
+from database.firebase import firestore
+
+@pytest.fixture
+def db(monkeypatch):
+    """An empty in-memory Firestore; @firestore.transactional runs on its transactions"""
+    monkeypatch.setattr(firestore, 'transactional', firestore_stub.transactional)
+    return firestore_stub.FakeFirestore()
+
+@pytest.fixture
+def firebase_manager(db):
+    return firestore_stub.FakeFirebaseManager(db)
+
+@pytest.fixture
+def config(monkeypatch):
+    """Swap in a configuration snapshot with some settings changed: config(NAME=value, ...)"""
+    def swap(**changes):
+        snapshot = dataclasses.replace(settings.get_config(), **changes)
+        monkeypatch.setattr(settings, '_current', snapshot)
+        return snapshot
+    return swap
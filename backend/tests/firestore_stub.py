@@ -0,0 +1,313 @@
+"""In-memory stand-in for the parts of the Firestore client the services use.
+
+Documents live in one dict keyed by path. Every write bumps a global
+update time, so write_option(last_update_time=...) preconditions,
+batches that fail as a whole and create() on an existing document behave
+like the real client. Transactions record the update time of what they
+read and abort at commit if any of it changed; ``transactional`` retries
+them like @firestore.transactional does.
+"""
+
+import itertools
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+
+_clock = itertools.count(1)
+_commit_lock = threading.Lock()
+
+def _apply(current: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(current)
+    for field, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            result.pop(field, None)
+        elif value is transforms.SERVER_TIMESTAMP:
+            result[field] = datetime.now(timezone.utc)
+        elif isinstance(value, transforms.Increment):
+            result[field] = result.get(field, 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            existing = list(result.get(field) or [])
+            result[field] = existing + [item for item in value.values if item not in existing]
+        elif isinstance(value, transforms.ArrayRemove):
+            result[field] = [item for item in result.get(field) or [] if item not in value.values]
+        elif isinstance(value, dict):
+            nested = result.get(field)
+            result[field] = _apply(nested if isinstance(nested, dict) else {}, value)
+        else:
+            result[field] = value
+    return result
+
+class WriteResult:
+    def __init__(self, update_time: int):
+        self.update_time = update_time
+
+class DocumentSnapshot:
+    def __init__(self, reference: 'DocumentReference', data: Optional[Dict[str, Any]], update_time: Optional[int]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+class DocumentReference:
+    def __init__(self, db: 'FakeFirestore', path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> 'CollectionReference':
+        return CollectionReference(self._db, self.path.rsplit('/', 1)[0])
+
+    def collection(self, name: str) -> 'CollectionReference':
+        return CollectionReference(self._db, f'{self.path}/{name}')
+
+    def collections(self) -> List['CollectionReference']:
+        prefix = self.path + '/'
+        names = {path[len(prefix):].split('/')[0] for path in self._db.docs if path.startswith(prefix)}
+        return [self.collection(name) for name in sorted(names)]
+
+    def get(self, transaction: Optional['Transaction'] = None) -> DocumentSnapshot:
+        data, update_time = self._db.docs.get(self.path, (None, None))
+        if transaction is not None:
+            transaction.reads[self.path] = update_time
+        return DocumentSnapshot(self, None if data is None else dict(data), update_time)
+
+    def create(self, data: Dict[str, Any]) -> WriteResult:
+        batch = self._db.batch()
+        batch.create(self, data)
+        return batch.commit()[0]
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> WriteResult:
+        batch = self._db.batch()
+        batch.set(self, data, merge=merge)
+        return batch.commit()[0]
+
+    def update(self, data: Dict[str, Any], option: Optional['Precondition'] = None) -> WriteResult:
+        batch = self._db.batch()
+        batch.update(self, data, option=option)
+        return batch.commit()[0]
+
+    def delete(self) -> WriteResult:
+        batch = self._db.batch()
+        batch.delete(self)
+        return batch.commit()[0]
+
+class Query:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    _OPERATORS = {
+        '==': lambda a, b: a == b,
+        '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b,
+        '>=': lambda a, b: a >= b,
+        'in': lambda a, b: a in b,
+        'array_contains': lambda a, b: b in (a or []),
+    }
+
+    def __init__(self, db: 'FakeFirestore', path: str, filters: Tuple = (), orders: Tuple = (),
+                 limit: Optional[int] = None, after: Any = None):
+        self._db = db
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes) -> 'Query':
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, after=self._after)
+        state.update(changes)
+        return Query(self._db, self._path, **state)
+
+    def where(self, field: str, op: str, value: Any) -> 'Query':
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field: str, direction: str = ASCENDING) -> 'Query':
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count: int) -> 'Query':
+        return self._copy(limit=count)
+
+    def start_after(self, cursor: Any) -> 'Query':
+        return self._copy(after=cursor)
+
+    def _key(self, snapshot: DocumentSnapshot) -> Tuple:
+        data = snapshot.to_dict() or {}
+        return tuple(snapshot.id if field == '__name__' else data.get(field) for field, _ in self._orders)
+
+    def stream(self) -> List[DocumentSnapshot]:
+        matches = []
+        for path, (data, update_time) in list(self._db.docs.items()):
+            if path.rsplit('/', 1)[0] != self._path:
+                continue
+            if all(field in data and self._OPERATORS[op](data[field], value) for field, op, value in self._filters):
+                matches.append(DocumentSnapshot(DocumentReference(self._db, path), dict(data), update_time))
+        # Stable sorts from the last ordering to the first give the combined order
+        matches.sort(key=lambda snapshot: snapshot.id)
+        for index in reversed(range(len(self._orders))):
+            field, direction = self._orders[index]
+            matches.sort(key=lambda snapshot: self._key(snapshot)[index], reverse=direction == self.DESCENDING)
+        if isinstance(self._after, dict):
+            # Field-value cursor ({field: value, '__name__': reference}); ascending orders only
+            cursor = tuple(self._after[field].id if field == '__name__' else self._after[field]
+                           for field, _ in self._orders)
+            matches = [snapshot for snapshot in matches if self._key(snapshot) > cursor]
+        elif self._after is not None:
+            position = next((i for i, snapshot in enumerate(matches) if snapshot.id == self._after.id), None)
+            if position is not None:
+                matches = matches[position + 1:]
+        return matches[:self._limit] if self._limit else matches
+
+class CollectionReference(Query):
+    def __init__(self, db: 'FakeFirestore', path: str):
+        super().__init__(db, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        return DocumentReference(self._db, self._path.rsplit('/', 1)[0]) if '/' in self._path else None
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._db, f'{self._path}/{document_id or "auto%d" % next(_clock)}')
+
+    def add(self, data: Dict[str, Any]) -> Tuple[int, DocumentReference]:
+        reference = self.document()
+        return reference.create(data).update_time, reference
+
+    def list_documents(self, page_size: Optional[int] = None) -> List[DocumentReference]:
+        ids = {path[len(self._path) + 1:].split('/')[0] for path in self._db.docs if path.startswith(self._path + '/')}
+        return [self.document(document_id) for document_id in sorted(ids)]
+
+class Precondition:
+    def __init__(self, last_update_time: Optional[int]):
+        self.last_update_time = last_update_time
+
+class WriteBatch:
+    def __init__(self, db: 'FakeFirestore'):
+        self._db = db
+        self._writes: List[Tuple[str, DocumentReference, Any, Any]] = []
+
+    def create(self, reference: DocumentReference, data: Dict[str, Any]) -> None:
+        self._writes.append(('create', reference, data, None))
+
+    def set(self, reference: DocumentReference, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(('merge' if merge else 'set', reference, data, None))
+
+    def update(self, reference: DocumentReference, data: Dict[str, Any],
+               option: Optional[Precondition] = None) -> None:
+        self._writes.append(('update', reference, data, option))
+
+    def delete(self, reference: DocumentReference) -> None:
+        self._writes.append(('delete', reference, None, None))
+
+    def commit(self) -> List[WriteResult]:
+        with _commit_lock:
+            self._check()
+            docs = self._db.docs
+            results = []
+            for kind, reference, data, _ in self._writes:
+                update_time = next(_clock)
+                if kind == 'delete':
+                    docs.pop(reference.path, None)
+                else:
+                    current = docs.get(reference.path, ({}, None))[0] if kind in ('merge', 'update') else {}
+                    docs[reference.path] = (_apply(current, data), update_time)
+                results.append(WriteResult(update_time))
+            self._db.commits += 1
+            return results
+
+    def _check(self) -> None:
+        for kind, reference, _, option in self._writes:
+            exists = reference.path in self._db.docs
+            if kind == 'create' and exists:
+                raise AlreadyExists(f'Document already exists: {reference.path}')
+            if kind == 'update':
+                if not exists:
+                    raise NotFound(f'No document to update: {reference.path}')
+                if option is not None and self._db.docs[reference.path][1] != option.last_update_time:
+                    raise FailedPrecondition(f'Document was updated: {reference.path}')
+
+class _Aborted(Exception):
+    pass
+
+class Transaction(WriteBatch):
+    def __init__(self, db: 'FakeFirestore', max_attempts: int = 5):
+        super().__init__(db)
+        self.max_attempts = max_attempts
+        self.reads: Dict[str, Optional[int]] = {}
+
+    def _check(self) -> None:
+        for path, update_time in self.reads.items():
+            if self._db.docs.get(path, (None, None))[1] != update_time:
+                raise _Aborted(path)
+        super()._check()
+
+def transactional(function):
+    """Runs function(transaction) and commits, retrying when a read document changed"""
+    def run(transaction: Transaction, *args, **kwargs):
+        for attempt in range(transaction.max_attempts):
+            transaction._writes = []
+            transaction.reads = {}
+            result = function(transaction, *args, **kwargs)
+            try:
+                transaction.commit()
+                return result
+            except _Aborted:
+                transaction._db.retries += 1
+                if attempt == transaction.max_attempts - 1:
+                    raise
+    return run
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        self.commits = 0
+        self.retries = 0
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def document(self, path: str) -> DocumentReference:
+        return DocumentReference(self, path)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5) -> Transaction:
+        return Transaction(self, max_attempts)
+
+    def write_option(self, last_update_time: Optional[int] = None) -> Precondition:
+        return Precondition(last_update_time)
+
+    def get_all(self, references, field_paths=None, transaction: Optional[Transaction] = None):
+        return [reference.get(transaction=transaction) for reference in references]
+
+    def data(self, path: str) -> Optional[Dict[str, Any]]:
+        """The stored fields of a document, or None (for assertions)"""
+        entry = self.docs.get(path)
+        return None if entry is None else dict(entry[0])
+
+    def put(self, path: str, data: Dict[str, Any]) -> None:
+        """Store a document directly (for test setup)"""
+        self.docs[path] = (dict(data), next(_clock))
+
+class FakeFirebaseManager:
+    def __init__(self, db: Optional[FakeFirestore]):
+        self.db = db
+
+    def get_db(self) -> Optional[FakeFirestore]:
+        return self.db
+
+    def is_initialized(self) -> bool:
+        return self.db is not None
@@ -0,0 +1,93 @@
+import pytest
+
+from services.achievement_service import COLLECTION, AchievementEngine, AchievementRule
+from services.events import GAME_PLAYED, GAME_WON, LEDGER_POSTED, Event
+
+@pytest.fixture
+def engine(firebase_manager):
+    return AchievementEngine(firebase_manager)
+
+def played(user_id, game_id):
+    return Event(GAME_PLAYED, user_id, f'played_{game_id}_{user_id}')
+
+def won(user_id, game_id, amount=100.0, **data):
+    return Event(GAME_WON, user_id, f'won_{game_id}_{user_id}', {'amount': amount, **data})
+
+def test_unlocks_on_the_first_game_and_win(db, engine):
+    assert engine.process([played('a', 'g1'), won('a', 'g1')]) == {'a': ['first_game', 'first_win']}
+    state = db.data(f'{COLLECTION}/a')
+    assert state['counters'] == {'played': 1, 'won': 1, 'wonCents': 10000, 'unlocked': 2}
+    assert state['points'] == 15
+    assert db.data('users/a')['achievements'] == ['first_game', 'first_win']
+
+def test_a_redelivered_event_is_counted_once(db, engine):
+    engine.process([played('a', 'g1')])
+    commits = db.commits
+    assert engine.process([played('a', 'g1')]) == {}
+    assert db.commits == commits
+    assert db.data(f'{COLLECTION}/a')['counters']['played'] == 1
+
+def test_counter_rules_unlock_at_their_target(db, engine):
+    engine.process([won('a', f'g{i}', amount=100.0) for i in range(9)])
+    assert 'winner_10' not in db.data(f'{COLLECTION}/a')['unlocked']
+    assert engine.process([won('a', 'g9', amount=100.0)]) == {'a': ['winner_10', 'big_winner']}
+
+@pytest.mark.parametrize('data, unlocked', [
+    ({'pattern': 'Full House'}, 'full_house'),
+    ({'gameMode': 'speed', 'durationSeconds': 120}, 'speed_demon'),
+    ({'gameMode': 'tournament', 'players': 16}, 'tournament_champion'),
+])
+def test_conditional_rules(engine, data, unlocked):
+    assert unlocked in engine.process([won('a', 'g1', **data)])['a']
+
+@pytest.mark.parametrize('data', [
+    {'gameMode': 'speed', 'durationSeconds': 240},
+    {'gameMode': 'speed'},
+    {'gameMode': 'tournament', 'players': 8},
+])
+def test_conditional_rules_need_every_condition(engine, data):
+    assert engine.process([won('a', 'g1', **data)]) == {'a': ['first_win']}
+
+def test_only_deposits_count_towards_the_first_deposit(engine):
+    assert engine.process([Event(LEDGER_POSTED, 'a', 'l1', {'kind': 'refund', 'amount': 20})]) == {}
+    assert engine.process([Event(LEDGER_POSTED, 'a', 'l2', {'kind': 'deposit', 'amount': 20})]) == {
+        'a': ['first_deposit']}
+
+def test_unlocking_enough_achievements_unlocks_the_collector(firebase_manager):
+    rules = [AchievementRule(f'r{i}', f'R{i}', '', '', 1, GAME_PLAYED, 'played', i) for i in range(1, 4)]
+    rules.append(AchievementRule('collector', 'Collector', '', '', 10, 'achievement_unlocked', 'unlocked', 3))
+    engine = AchievementEngine(firebase_manager, rules)
+    engine.process([played('a', f'g{i}') for i in range(2)])
+    assert engine.process([played('a', 'g2')]) == {'a': ['r3', 'collector']}
+
+def test_a_concurrent_update_is_reapplied(db, engine, monkeypatch):
+    engine.process([played('a', 'g1')])
+    original = engine.evaluate
+    calls = []
+
+    def racing_evaluate(state, events):
+        # Another worker writes the user between our read and our commit, once
+        if not calls:
+            db.collection(COLLECTION).document('a').update({'counters': {**state['counters'], 'played': 5}})
+        calls.append(1)
+        return original(state, events)
+
+    monkeypatch.setattr(engine, 'evaluate', racing_evaluate)
+    engine.process([played('a', 'g2')])
+    assert len(calls) == 2
+    assert db.data(f'{COLLECTION}/a')['counters']['played'] == 6
+
+def test_progress_lists_the_catalogue(engine):
+    engine.process([played('a', 'g1')])
+    progress = engine.progress('a')
+    assert (progress['points'], progress['unlockedCount']) == (5, 1)
+    regular = next(item for item in progress['achievements'] if item['id'] == 'regular')
+    assert (regular['unlocked'], regular['progress'], regular['maxProgress']) == (False, 1, 50)
+    first = next(item for item in progress['achievements'] if item['id'] == 'first_game')
+    assert first['unlocked'] and first['unlockedAt']
+
+def test_events_queued_from_the_bus_are_flushed(db, engine):
+    engine._queue.put(played('a', 'g1'))
+    engine._queue.put(played('b', 'g1'))
+    assert engine.flush() == 2
+    assert db.data(f'{COLLECTION}/b')['counters']['played'] == 1
@@ -0,0 +1,41 @@
+import pytest
+from flask import Flask, jsonify, request
+
+from routes import auth
+
+@pytest.fixture
+def client(monkeypatch, config):
+    config(ADMIN_UIDS=frozenset({'admin'}))
+    monkeypatch.setattr(auth.firebase_auth, 'verify_id_token', verify)
+    app = Flask(__name__)
+
+    @app.route('/me')
+    @auth.require_auth
+    def me():
+        return jsonify({'uid': request.user['uid']})
+
+    @app.route('/admin')
+    @auth.require_admin
+    def admin():
+        return jsonify({'uid': request.user['uid']})
+
+    return app.test_client()
+
+def verify(token):
+    if token == 'bad':
+        raise ValueError('expired')
+    return {'uid': token}
+
+def get(client, path, token=None):
+    response = client.get(path, headers={'Authorization': f'Bearer {token}'} if token else {})
+    return response.status_code, response.get_json()
+
+def test_require_auth(client):
+    assert get(client, '/me', 'u1') == (200, {'uid': 'u1'})
+    assert get(client, '/me')[0] == 401
+    assert get(client, '/me', 'bad')[0] == 401
+
+def test_require_admin(client):
+    assert get(client, '/admin', 'admin') == (200, {'uid': 'admin'})
+    assert get(client, '/admin', 'u1')[0] == 403
+    assert get(client, '/admin')[0] == 401
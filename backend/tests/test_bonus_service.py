@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+
+from services.bonus_service import CLAIMS_COLLECTION, STREAKS_COLLECTION, BonusService, claim_id
+from services.ledger import Ledger
+
+@pytest.fixture
+def bonus(db, firebase_manager):
+    db.put('achievementProgress/u1', {'counters': {'played': 1}})
+    return BonusService(firebase_manager, Ledger(firebase_manager), amount=5.0, min_days=3, min_games=1)
+
+def days_ago(bonus, days):
+    return (bonus.today() - timedelta(days=days)).isoformat()
+
+def streak(db, **fields):
+    db.put(f'{STREAKS_COLLECTION}/u1', {'userId': 'u1', **fields})
+
+def balance(db):
+    return (db.data('wallets/u1') or {}).get('balance', 0)
+
+def test_checks_in_without_a_bonus_until_qualified(db, bonus):
+    result = bonus.claim('u1')
+    assert (result['awarded'], result['streak'], result['alreadyClaimed']) == (False, 1, False)
+    assert '1/3 days' in result['message']
+    assert db.data(f"{CLAIMS_COLLECTION}/{claim_id('u1', bonus.today().isoformat())}")['amount'] == 0
+    assert balance(db) == 0
+
+def test_pays_once_qualified(db, bonus):
+    streak(db, lastClaimDay=days_ago(bonus, 1), currentStreak=2, longestStreak=2, totalDaysPlayed=2)
+    result = bonus.claim('u1')
+    assert (result['awarded'], result['amount'], result['streak']) == (True, 5.0, 3)
+    assert balance(db) == 5.0
+    state = db.data(f'{STREAKS_COLLECTION}/u1')
+    assert (state['totalDaysPlayed'], state['longestStreak'], state['bonusEarned']) == (3, 3, 5.0)
+    assert db.data(f"transactions/bonus_{claim_id('u1', bonus.today().isoformat())}")['type'] == 'bonus'
+
+def test_claims_once_a_day(db, bonus):
+    streak(db, lastClaimDay=days_ago(bonus, 1), currentStreak=2, totalDaysPlayed=2)
+    bonus.claim('u1')
+    commits = db.commits
+    again = bonus.claim('u1')
+    assert (again['alreadyClaimed'], again['awarded']) == (True, False)
+    assert db.commits == commits
+    assert balance(db) == 5.0
+
+def test_a_racing_claim_for_the_same_day_pays_nothing(db, bonus):
+    streak(db, lastClaimDay=days_ago(bonus, 1), currentStreak=2, totalDaysPlayed=2)
+    # The other claim committed after this one read the streak
+    db.put(f"{CLAIMS_COLLECTION}/{claim_id('u1', bonus.today().isoformat())}", {'userId': 'u1'})
+    assert bonus.claim('u1')['alreadyClaimed']
+    assert balance(db) == 0
+    assert db.data(f'{STREAKS_COLLECTION}/u1')['totalDaysPlayed'] == 2
+
+def test_a_missed_day_restarts_the_streak(db, bonus):
+    streak(db, lastClaimDay=days_ago(bonus, 2), currentStreak=5, longestStreak=5, totalDaysPlayed=5)
+    assert bonus.status('u1')['currentStreak'] == 0
+    result = bonus.claim('u1')
+    assert (result['streak'], result['awarded']) == (1, True)
+    assert db.data(f'{STREAKS_COLLECTION}/u1')['longestStreak'] == 5
+
+def test_players_must_have_played(db, bonus):
+    db.put('achievementProgress/u1', {'counters': {}})
+    streak(db, lastClaimDay=days_ago(bonus, 1), currentStreak=2, totalDaysPlayed=2)
+    assert not bonus.claim('u1')['awarded']
+    assert not db.data(f'{STREAKS_COLLECTION}/u1')['gamesQualified']
+
+def test_status_before_and_after_claiming(db, bonus):
+    assert bonus.status('u1')['canClaim']
+    bonus.claim('u1')
+    status = bonus.status('u1')
+    assert (status['canClaim'], status['claimedToday'], status['currentStreak']) == (False, True, 1)
+
+def test_nightly_evaluation_resets_broken_streaks_and_prequalifies(db, bonus):
+    streak(db, lastClaimDay=days_ago(bonus, 3), currentStreak=4)
+    db.put(f'{STREAKS_COLLECTION}/u2', {'userId': 'u2', 'lastClaimDay': days_ago(bonus, 1), 'currentStreak': 2,
+                                        'gamesQualified': True})
+    db.put(f'{STREAKS_COLLECTION}/u3', {'userId': 'u3', 'lastClaimDay': days_ago(bonus, 30), 'currentStreak': 9})
+
+    assert bonus.evaluate() == {'users': 2, 'reset': 1, 'qualified': 1, 'pages': 1}
+    u1 = db.data(f'{STREAKS_COLLECTION}/u1')
+    assert (u1['currentStreak'], u1['gamesQualified']) == (0, True)
+    assert db.data(f'{STREAKS_COLLECTION}/u2')['currentStreak'] == 2
+    # Inactive for longer than ACTIVE_DAYS: not walked
+    assert db.data(f'{STREAKS_COLLECTION}/u3')['currentStreak'] == 9
+
+def test_nightly_evaluation_pages_through_users(db, bonus, monkeypatch):
+    monkeypatch.setattr('services.bonus_service.PAGE_SIZE', 2)
+    for i in range(5):
+        db.put(f'{STREAKS_COLLECTION}/u{i}', {'userId': f'u{i}', 'lastClaimDay': days_ago(bonus, 3),
+                                              'currentStreak': 1, 'gamesQualified': True})
+    assert bonus.evaluate() == {'users': 5, 'reset': 5, 'qualified': 0, 'pages': 3}
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+from services.call_audio import ALL_CALLS, AudioError, CallAudioCache, TelegramFileIds, normalize_call, phrase
+
+class FakeSynthesizer:
+    """Returns distinct audio per text, counting calls"""
+
+    def __init__(self, fail=()):
+        self.texts = []
+        self.fail = set(fail)
+        self._lock = threading.Lock()
+
+    def synthesize(self, text, voice):
+        with self._lock:
+            self.texts.append(text)
+        if text in self.fail:
+            raise AudioError('TTS unavailable')
+        return f'{voice}:{text}'.encode()
+
+@pytest.fixture
+def synthesizer():
+    return FakeSynthesizer()
+
+@pytest.fixture
+def audio(tmp_path, synthesizer):
+    return CallAudioCache(str(tmp_path), {'default': 'voice-1', 'alt': 'voice-2'}, ('en', 'am'), synthesizer)
+
+@pytest.mark.parametrize('call, expected', [('b12', 'B-12'), ('B12', 'B-12'), (' g-46 ', 'G-46'), ('O75', 'O-75')])
+def test_normalizes_calls(call, expected):
+    assert normalize_call(call) == expected
+
+@pytest.mark.parametrize('call', ['B16', 'I-15', 'X-1', 'B-0', '', None])
+def test_rejects_numbers_outside_their_column(call):
+    with pytest.raises(AudioError):
+        normalize_call(call)
+
+def test_there_are_75_calls():
+    assert len(ALL_CALLS) == 75 and ALL_CALLS[0] == 'B-1' and ALL_CALLS[-1] == 'O-75'
+
+def test_speaks_letters_in_the_language():
+    assert phrase('B-12', 'en') == 'B, 12.'
+    assert phrase('B-12', 'am') == 'ቢ, 12.'
+
+def test_resolves_to_the_default_voice(audio):
+    assert audio.resolve('b7', 'en') == ('B-7', 'en', 'default')
+    with pytest.raises(AudioError, match='language'):
+        audio.resolve('B-7', 'fr')
+    with pytest.raises(AudioError, match='voice'):
+        audio.resolve('B-7', 'en', 'missing')
+
+def test_renders_a_clip_once_under_its_content_digest(audio, synthesizer):
+    digest = audio.get('B-12', 'en', 'default')
+    assert digest == hashlib.sha256(b'voice-1:B, 12.').hexdigest()
+    with open(audio.path_for(digest), 'rb') as f:
+        assert f.read() == b'voice-1:B, 12.'
+    assert audio.get('B-12', 'en', 'default') == digest
+    assert synthesizer.texts == ['B, 12.']
+
+def test_a_new_process_finds_clips_on_disk(audio, tmp_path, synthesizer):
+    digest = audio.get('B-12', 'en', 'default')
+    restarted = CallAudioCache(str(tmp_path), audio.voices, audio.languages, synthesizer=None)
+    assert restarted.lookup('B-12', 'en', 'default') == digest
+    assert restarted.get('B-12', 'en', 'default') == digest
+
+def test_render_keys_depend_on_voice_and_language(audio):
+    keys = {audio.render_key('B-12', language, voice) for language in ('en', 'am') for voice in ('default', 'alt')}
+    assert len(keys) == 4
+
+def test_without_a_synthesizer_missing_clips_fail(tmp_path):
+    audio = CallAudioCache(str(tmp_path), {'default': 'voice-1'}, ('en',))
+    with pytest.raises(AudioError, match='not configured'):
+        audio.get('B-1', 'en', 'default')
+
+def test_concurrent_requests_render_once(audio, synthesizer):
+    threads = [threading.Thread(target=audio.get, args=('N-31', 'en', 'default')) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert synthesizer.texts == ['N, 31.']
+
+def test_prerender_counts_cached_rendered_and_failed(audio, synthesizer):
+    audio.get('B-1', 'en', 'default')
+    synthesizer.fail = {'B, 2.'}
+    assert audio.prerender(languages=['en'], voices=['default'], concurrency=2) == {
+        'cached': 1, 'rendered': 73, 'failed': 1}
+    manifest = audio.manifest('en', 'default')
+    assert manifest['B-2'] is None and all(manifest[call] for call in ALL_CALLS if call != 'B-2')
+
+def test_rejects_paths_that_are_not_digests(audio):
+    with pytest.raises(AudioError):
+        audio.path_for('../../etc/passwd')
+
+def test_no_temporary_files_are_left_behind(audio, tmp_path):
+    audio.get('B-12', 'en', 'default')
+    leftovers = [name for _, _, names in os.walk(tmp_path) for name in names if name.startswith('.tmp-')]
+    assert leftovers == []
+
+def test_file_ids_are_kept_per_bot(db, firebase_manager):
+    file_ids = TelegramFileIds(firebase_manager, '111:token')
+    file_ids.remember('abc', 'file-1')
+    assert db.data('telegramAudioFiles/111_abc')['fileId'] == 'file-1'
+    # A new process reads them back, in one batch for several clips
+    assert TelegramFileIds(firebase_manager, '111:token').get_many(['abc', 'def']) == {'abc': 'file-1'}
+    assert TelegramFileIds(firebase_manager, '222:token').get('abc') is None
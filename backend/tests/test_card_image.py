@@ -0,0 +1,91 @@
+import struct
+import zlib
+
+import pytest
+
+from services import win_engine
+from services.card_image import HEIGHT, TILE, WIDTH, CardRenderer, card_key, encode_png
+
+CARD = (
+    1, 16, 31, 46, 61,
+    2, 17, 32, 47, 62,
+    3, 18, 0, 48, 63,
+    4, 19, 33, 49, 64,
+    5, 20, 34, 50, 65,
+)
+
+def decode(png):
+    """(width, height, bit depth, colour type, palette, pixels) of an indexed PNG"""
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks, offset = {}, 8
+    while offset < len(png):
+        length, = struct.unpack('>I', png[offset:offset + 4])
+        kind, data = png[offset + 4:offset + 8], png[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + data)
+        chunks[kind] = data
+        offset += 12 + length
+    width, height, depth, colour = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+    raw = zlib.decompress(chunks[b'IDAT'])
+    stride = width + 1
+    assert all(raw[y * stride] == 0 for y in range(height))
+    pixels = b''.join(raw[y * stride + 1:(y + 1) * stride] for y in range(height))
+    return width, height, depth, colour, chunks[b'PLTE'], pixels
+
+def cell_fill(pixels, index):
+    """Palette index just inside the grid border of a card cell"""
+    row, column = divmod(index, 5)
+    return pixels[((row + 1) * TILE + 1) * WIDTH + column * TILE + 1]
+
+def test_encodes_an_indexed_png():
+    width, height, depth, colour, palette, pixels = decode(encode_png(bytes(range(6)), 3, 2, bytes(18)))
+    assert (width, height, depth, colour, len(palette)) == (3, 2, 8, 3, 18)
+    assert pixels == bytes(range(6))
+
+def test_renders_the_card_with_its_marks():
+    digest, png = CardRenderer().render('g/u', CARD, 1)
+    width, height, depth, colour, palette, pixels = decode(png)
+    assert (width, height, depth, colour) == (WIDTH, HEIGHT, 8, 3)
+    assert len(pixels) == WIDTH * HEIGHT
+    fills = [cell_fill(pixels, index) for index in (0, 1, 12)]
+    # Marked, unmarked and the free space all differ; the header row is drawn
+    assert len(set(fills)) == 3
+    assert pixels[WIDTH + 1] not in fills
+
+def test_rejects_a_short_card():
+    with pytest.raises(ValueError):
+        CardRenderer().render('g/u', CARD[:24], 0)
+
+def test_an_unchanged_card_keeps_its_digest():
+    renderer = CardRenderer()
+    first = renderer.render('g/u', CARD, 0b101)
+    assert renderer.render('g/u', CARD, 0b101) == first
+    # Another player with the same card and marks shares the image
+    assert renderer.render('g/v', CARD, 0b101)[0] == first[0]
+    assert renderer.render('g/u', CARD, 0b111)[0] != first[0]
+
+def test_redrawing_changed_cells_matches_a_full_render():
+    renderer = CardRenderer()
+    called = []
+    for number in (16, 47, 3, 65, 16):
+        called.append(number)
+        mask = win_engine.marked_mask(CARD, called)
+        assert renderer.render('g/u', CARD, mask) == CardRenderer().render('g/u', CARD, mask)
+    # Clearing marks redraws the cells unmarked again
+    assert renderer.render('g/u', CARD, 0) == CardRenderer().render('g/u', CARD, 0)
+
+def test_a_new_card_under_the_same_key_is_drawn_from_scratch():
+    renderer = CardRenderer()
+    renderer.render('g/u', CARD, 1)
+    other = (6,) + CARD[1:]
+    assert renderer.render('g/u', other, 1) == CardRenderer().render('g/u', other, 1)
+
+def test_keeps_a_bounded_number_of_canvases():
+    renderer = CardRenderer(max_canvases=2)
+    for user_id in ('a', 'b', 'c'):
+        renderer.render(card_key('g1', user_id), CARD, 0)
+    assert list(renderer._canvases) == ['g1/b', 'g1/c']
+
+    renderer.render(card_key('g2', 'a'), CARD, 0)
+    renderer.forget('g1/')
+    assert list(renderer._canvases) == ['g2/a']
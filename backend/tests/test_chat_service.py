@@ -0,0 +1,71 @@
+import pytest
+
+from services.chat_service import ChatError, ChatNotAllowed, ChatRateLimited, ChatService, WordFilter
+
+@pytest.fixture
+def chat(firebase_manager):
+    members = {('g1', 'a'), ('g1', 'b')}
+    return ChatService(firebase_manager, lambda game_id, user_id: (game_id, user_id) in members, flush_seconds=60)
+
+def test_players_read_each_others_messages(chat):
+    first = chat.send('g1', 'a', 'Abebe', 'Hello')
+    second = chat.send('g1', 'b', 'Bekele', 'Hi')
+    assert [message['message'] for message in chat.recent('g1', 'b')] == ['Hello', 'Hi']
+    assert chat.recent('g1', 'a', after=first['id']) == [second]
+
+def test_only_players_read_the_history(chat):
+    chat.send('g1', 'a', 'Abebe', 'Hello')
+    with pytest.raises(ChatNotAllowed):
+        chat.recent('g1', 'outsider')
+    with pytest.raises(ChatNotAllowed):
+        chat.send('g1', 'outsider', 'Outsider', 'Hello')
+
+def test_masks_blocked_words_in_any_case(chat):
+    assert chat.filter.censor('You IDIOT!') == ('You *****!', True)
+    assert chat.filter.censor('Good game') == ('Good game', False)
+
+def test_masks_whole_words_only():
+    word_filter = WordFilter(['ass', 'idiot'])
+    assert word_filter.censor('a classic pass, ass') == ('a classic pass, ***', True)
+    assert word_filter.find('idiots') == []
+
+def test_masks_overlapping_words():
+    word_filter = WordFilter(['he', 'she', 'hers'])
+    assert word_filter.censor('she said hers') == ('*** said ****', True)
+
+def test_amharic_words_have_word_boundaries():
+    word_filter = WordFilter(['ሌባ', 'ውሻ'])
+    # Ethiopic syllables count as letters: a blocked word inside a longer word is left alone
+    assert word_filter.censor('አንተ ሌባ!') == ('አንተ **!', True)
+    assert word_filter.find('ሌባው') == []
+    assert word_filter.censor('ውሻ፣ ሌባ') == ('**፣ **', True)
+
+def test_configured_words_are_added_to_the_defaults(firebase_manager):
+    chat = ChatService(firebase_manager, lambda game_id, user_id: True, blocked_words=['cheater'])
+    message = chat.send('g1', 'a', 'Abebe', 'cheater idiot')
+    assert (message['message'], message['censored']) == ('******* *****', True)
+
+def test_rejects_empty_long_and_unknown_messages(chat):
+    for text, message_type, error in (('  ', 'text', 'empty'), ('x' * 501, 'text', 'limited'),
+                                      ('hi', 'voice', 'type')):
+        with pytest.raises(ChatError, match=error):
+            chat.send('g1', 'a', 'Abebe', text, message_type)
+
+def test_rate_limits_each_player(chat):
+    for i in range(5):
+        chat.send('g1', 'a', 'Abebe', f'message {i}')
+    with pytest.raises(ChatRateLimited) as raised:
+        chat.send('g1', 'a', 'Abebe', 'one too many')
+    assert raised.value.retry_after > 0
+    chat.send('g1', 'b', 'Bekele', 'still fine')
+
+def test_flushes_a_room_as_one_chunk_that_other_workers_load(db, firebase_manager, chat):
+    for text in ('one', 'two', 'three'):
+        chat.send('g1', 'a', 'Abebe', text)
+    commits = db.commits
+    assert chat.flush() == 3
+    assert db.commits == commits + 1
+    assert chat.flush() == 0
+
+    other_worker = ChatService(firebase_manager, lambda game_id, user_id: True)
+    assert [message['message'] for message in other_worker.recent('g1', 'b')] == ['one', 'two', 'three']
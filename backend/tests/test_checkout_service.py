@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from database.sharded_counter import ShardedCounter
+from firestore_stub import FakeFirebaseManager
+from services.checkout_service import PreCheckoutValidator
+from services.invoice_payload import InvoicePayloadCodec
+from services.roster_service import RosterService
+
+USER = 1001
+
+class SlowFirebaseManager(FakeFirebaseManager):
+    """Firestore that answers only once released, to run lookups past the budget"""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.released = threading.Event()
+
+    def get_db(self):
+        self.released.wait(5)
+        return self.db
+
+@pytest.fixture
+def codec():
+    return InvoicePayloadCodec('test-secret')
+
+@pytest.fixture
+def validator(config, firebase_manager, codec):
+    return PreCheckoutValidator(config(PRECHECKOUT_BUDGET_SECONDS=1.0), firebase_manager, codec)
+
+def query(payload, amount, user=USER, currency='ETB'):
+    return {'id': 'q1', 'from': {'id': user}, 'currency': currency,
+            'total_amount': round(amount * 100), 'invoice_payload': payload}
+
+def test_accepts_a_deposit_from_a_new_user(validator, codec):
+    assert validator.validate(query(codec.encode_deposit(USER, 250), 250)) == (True, None)
+
+def test_rejects_a_payload_it_did_not_sign(validator):
+    other = InvoicePayloadCodec('another-secret')
+    assert validator.validate(query(other.encode_deposit(USER, 250), 250)) == (False, 'Invalid payment request')
+
+def test_rejects_an_invoice_issued_to_another_user(validator, codec):
+    ok, error = validator.validate(query(codec.encode_deposit(USER, 250), 250, user=USER + 1))
+    assert not ok and error == 'This invoice was issued to another user'
+
+def test_rejects_a_different_amount_or_currency(validator, codec):
+    payload = codec.encode_deposit(USER, 250)
+    assert validator.validate(query(payload, 251)) == (False, 'Payment amount mismatch')
+    assert validator.validate(query(payload, 250, currency='USD')) == (False, 'Unsupported currency')
+
+def test_rejects_a_locked_wallet(validator, codec, db):
+    db.put('users/u1', {'telegramChatId': str(USER)})
+    db.put('wallets/u1', {'status': 'suspended'})
+    ok, error = validator.validate(query(codec.encode_deposit(USER, 250), 250))
+    assert not ok and 'locked' in error
+
+@pytest.mark.parametrize('room, error', [
+    (None, 'Game not found'),
+    ({'status': 'playing', 'entryFee': 20}, 'This game has already started'),
+    ({'status': 'waiting', 'entryFee': 20, 'maxPlayers': 2, 'players': ['a', 'b']}, 'This game is full'),
+    ({'status': 'waiting', 'entryFee': 25}, 'Entry fee has changed, please request a new invoice'),
+    ({'status': 'waiting', 'entryFee': 20, 'maxPlayers': 3, 'players': ['a', 'b']}, None),
+])
+def test_checks_game_entries_against_the_room(validator, codec, db, room, error):
+    if room is not None:
+        db.put('gameRooms/g1', room)
+    ok, message = validator.validate(query(codec.encode_game_entry(USER, 'g1', 20), 20))
+    assert (ok, message) == (error is None, error)
+
+def test_counts_a_roster_room_from_the_roster_only(config, db, firebase_manager, codec):
+    roster = RosterService(firebase_manager, ShardedCounter(num_shards=4), summary_interval=0)
+    db.put('gameRooms/g1', {'status': 'waiting', 'entryFee': 20, 'maxPlayers': 4, **roster.room_fields(),
+                            'players': [{'id': 'a'}, {'id': 'b'}]})
+    for user_id in ('a', 'b'):
+        roster.add_player('g1', {'userId': user_id, 'displayName': user_id})
+    validator = PreCheckoutValidator(config(PRECHECKOUT_BUDGET_SECONDS=1.0), firebase_manager, codec, roster)
+    assert validator.validate(query(codec.encode_game_entry(USER, 'g1', 20), 20)) == (True, None)
+
+def test_fails_closed_when_a_lookup_misses_the_budget(config, db, codec):
+    manager = SlowFirebaseManager(db)
+    validator = PreCheckoutValidator(config(PRECHECKOUT_BUDGET_SECONDS=0.05), manager, codec)
+    started = time.monotonic()
+    try:
+        ok, error = validator.validate(query(codec.encode_deposit(USER, 250), 250))
+    finally:
+        manager.released.set()
+    assert not ok and error == 'Payment service is busy, please try again'
+    assert time.monotonic() - started < 1
+
+def test_fails_open_when_configured(config, db, codec):
+    manager = SlowFirebaseManager(db)
+    validator = PreCheckoutValidator(config(PRECHECKOUT_BUDGET_SECONDS=0.05, PRECHECKOUT_FAIL_OPEN=True),
+                                     manager, codec)
+    try:
+        assert validator.validate(query(codec.encode_deposit(USER, 250), 250)) == (True, None)
+    finally:
+        manager.released.set()
+
+def test_uses_a_stale_room_when_the_lookup_is_late(config, db, codec):
+    manager = SlowFirebaseManager(db)
+    snapshot = config(PRECHECKOUT_BUDGET_SECONDS=0.05, PRECHECKOUT_CACHE_TTL=0, PRECHECKOUT_FAIL_OPEN=True)
+    validator = PreCheckoutValidator(snapshot, manager, codec)
+    validator.remember_room('g1', {'status': 'playing', 'entryFee': 20})
+    time.sleep(0.01)
+    try:
+        ok, error = validator.validate(query(codec.encode_game_entry(USER, 'g1', 20), 20))
+    finally:
+        manager.released.set()
+    assert not ok and error == 'This game has already started'
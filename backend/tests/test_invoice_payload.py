@@ -0,0 +1,100 @@
+import base64
+import time
+
+import pytest
+
+from config.settings import Config, ConfigError
+from services.invoice_payload import (
+    InvalidPayloadError, InvoicePayloadCodec, KIND_DEPOSIT, KIND_GAME_ENTRY, MAX_PAYLOAD_LENGTH
+)
+
+@pytest.fixture
+def codec():
+    return InvoicePayloadCodec('test-secret')
+
+def raw_bytes(payload):
+    return bytearray(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+def to_payload(data):
+    return base64.urlsafe_b64encode(bytes(data)).rstrip(b'=').decode('ascii')
+
+def test_round_trips_a_deposit(codec):
+    decoded = codec.decode(codec.encode_deposit(123456789012, 150.25))
+    assert (decoded.kind, decoded.user_id, decoded.amount, decoded.game_id) == (KIND_DEPOSIT, 123456789012, 150.25, None)
+    assert abs(decoded.issued_at - time.time()) < 5
+
+def test_round_trips_a_game_entry_within_telegrams_limit(codec):
+    game_id = 'g' * 40
+    payload = codec.encode_game_entry(42, game_id, 20)
+    assert len(payload) <= MAX_PAYLOAD_LENGTH
+    decoded = codec.decode(payload)
+    assert (decoded.kind, decoded.user_id, decoded.amount, decoded.game_id) == (KIND_GAME_ENTRY, 42, 20.0, game_id)
+
+@pytest.mark.parametrize('amount', [0, -5, 50_000_000])
+def test_refuses_amounts_out_of_range(codec, amount):
+    with pytest.raises(ValueError):
+        codec.encode_deposit(42, amount)
+
+def test_refuses_long_or_missing_game_ids(codec):
+    with pytest.raises(ValueError):
+        codec.encode_game_entry(42, 'g' * 41, 20)
+    with pytest.raises(ValueError):
+        codec.encode_game_entry(42, '', 20)
+
+def test_requires_a_secret():
+    with pytest.raises(ValueError):
+        InvoicePayloadCodec('')
+
+def test_rejects_a_payload_signed_with_another_secret(codec):
+    payload = InvoicePayloadCodec('other-secret').encode_deposit(42, 100)
+    with pytest.raises(InvalidPayloadError, match='signature'):
+        codec.decode(payload)
+
+def test_rejects_a_tampered_amount(codec):
+    data = raw_bytes(codec.encode_deposit(42, 100))
+    # The amount in cents is the u32 after version, kind and the u64 user id
+    data[13] ^= 0x01
+    with pytest.raises(InvalidPayloadError, match='signature'):
+        codec.decode(to_payload(data))
+
+@pytest.mark.parametrize('payload', ['', 'not base64!', 'AAAA', 'A' * (MAX_PAYLOAD_LENGTH + 1)])
+def test_rejects_malformed_payloads(codec, payload):
+    with pytest.raises(InvalidPayloadError):
+        codec.decode(payload)
+
+def test_rejects_legacy_pipe_payloads(codec):
+    with pytest.raises(InvalidPayloadError):
+        codec.decode('deposit|42|100')
+
+def test_rejects_expired_payloads(monkeypatch):
+    codec = InvoicePayloadCodec('test-secret', max_age=60)
+    payload = codec.encode_deposit(42, 100)
+    assert codec.decode(payload).amount == 100
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    with pytest.raises(InvalidPayloadError, match='expired'):
+        codec.decode(payload)
+
+SECRET_ERROR = 'INVOICE_PAYLOAD_SECRET must be set to a private value in production'
+
+def config_errors(env):
+    try:
+        return Config.from_env(env).validate()[0]
+    except ConfigError as e:
+        return [str(e)]
+
+@pytest.mark.parametrize('env', [
+    {},
+    {'INVOICE_PAYLOAD_SECRET': 'your-invoice-signing-secret'},
+    {'INVOICE_PAYLOAD_SECRET': 'your-secret-key-here'},
+])
+def test_production_requires_a_private_signing_secret(env):
+    errors = config_errors({'ENVIRONMENT': 'production', 'SECRET_KEY': 'k' * 32, **env})
+    assert any(SECRET_ERROR in error for error in errors)
+
+def test_production_accepts_a_private_signing_secret():
+    errors = config_errors({'ENVIRONMENT': 'production', 'SECRET_KEY': 'k' * 32, 'INVOICE_PAYLOAD_SECRET': 's' * 32})
+    assert not any(SECRET_ERROR in error for error in errors)
+
+def test_development_signs_with_the_secret_key():
+    assert Config.from_env({'SECRET_KEY': 'dev-key'}).INVOICE_PAYLOAD_SECRET == 'dev-key'
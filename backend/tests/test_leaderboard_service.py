@@ -0,0 +1,111 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.leaderboard_service import (
+    BOARD_ALL, CHECKPOINT_DOC_ID, COLLECTION, Board, LeaderboardError, LeaderboardService, SkipList
+)
+
+def test_skip_list_ranks_match_a_sorted_list():
+    random.seed(7)
+    keys = random.sample(range(10000), 500)
+    skip_list = SkipList()
+    for key in keys:
+        skip_list.insert(key)
+    for key in keys[:200]:
+        assert skip_list.remove(key)
+    assert not skip_list.remove(keys[0])
+
+    expected = sorted(keys[200:])
+    assert len(skip_list) == len(expected)
+    assert all(skip_list.rank(key) == position for position, key in enumerate(expected, 1))
+    assert skip_list.rank(keys[0]) is None
+    assert list(skip_list.iter_from(1)) == expected
+    assert list(skip_list.iter_from(101))[:3] == expected[100:103]
+
+def test_boards_rank_by_earnings_then_wins():
+    board = Board()
+    board.add('a', 5000, 1)
+    board.add('b', 5000, 2)
+    board.add('c', 9000, 1)
+    board.add('a', 500, 1)
+    assert board.top(10) == [('c', 9000, 1), ('a', 5500, 2), ('b', 5000, 2)]
+    assert [board.rank(user_id) for user_id in ('a', 'b', 'c', 'd')] == [2, 3, 1, None]
+    assert board.top(1, offset=1) == [('a', 5500, 2)]
+
+NOW = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+def settle(db, game_id, winners, mode='classic', when=NOW):
+    db.put(f'settlements/{game_id}', {'gameId': game_id, 'gameMode': mode, 'createdAt': when,
+                                      'winners': [{'userId': user_id, 'amount': amount} for user_id, amount in winners]})
+
+@pytest.fixture
+def leaderboard(db, firebase_manager):
+    db.put('users/a', {'displayName': 'Abebe'})
+    return LeaderboardService(firebase_manager, utc_offset_hours=3, refresh_seconds=0)
+
+def test_ranks_players_from_settlements(db, leaderboard):
+    settle(db, 'g1', [('a', 50.0)])
+    settle(db, 'g2', [('b', 80.0)], mode='speed', when=NOW + timedelta(seconds=1))
+    settle(db, 'g3', [('a', 40.0)], when=NOW + timedelta(seconds=2))
+
+    top = leaderboard.top(BOARD_ALL)
+    assert [(entry['userId'], entry['earnings'], entry['wins']) for entry in top['entries']] == [
+        ('a', 90.0, 2), ('b', 80.0, 1)]
+    assert top['entries'][0]['displayName'] == 'Abebe'
+    assert top['entries'][1]['displayName'] == 'Player'
+    assert leaderboard.rank(BOARD_ALL, 'b') == {'board': BOARD_ALL, 'rank': 2, 'size': 2, 'earnings': 80.0,
+                                                'wins': 1}
+    assert leaderboard.rank('mode-speed', 'b')['rank'] == 1
+    assert leaderboard.rank('mode-speed', 'a') is None
+    assert leaderboard.rank(leaderboard.daily_board(NOW), 'a')['earnings'] == 90.0
+
+def test_a_local_settlement_is_not_counted_again_by_the_catch_up(db, leaderboard):
+    leaderboard.ensure_loaded()
+    settle(db, 'g1', [('a', 50.0)])
+    leaderboard.record_settlement('g1', 'classic', [{'userId': 'a', 'amount': 50.0}], NOW)
+    leaderboard.record_settlement('g1', 'classic', [{'userId': 'a', 'amount': 50.0}], NOW)
+    assert leaderboard.sync(force=True) == 1
+    assert leaderboard.rank(BOARD_ALL, 'a')['earnings'] == 50.0
+
+def test_catches_up_only_past_the_mark(db, leaderboard):
+    settle(db, 'g1', [('a', 50.0)])
+    leaderboard.ensure_loaded()
+    settle(db, 'g2', [('a', 10.0)], when=NOW + timedelta(seconds=1))
+    assert leaderboard.sync(force=True) == 1
+    assert leaderboard.sync(force=True) == 0
+    assert leaderboard.rank(BOARD_ALL, 'a')['earnings'] == 60.0
+
+def test_a_new_worker_resumes_from_the_checkpoint(db, firebase_manager, leaderboard):
+    settle(db, 'g1', [('a', 50.0), ('b', 50.0)])
+    leaderboard.ensure_loaded()
+    assert leaderboard.checkpoint()
+    # Nothing new to write
+    assert not leaderboard.checkpoint()
+    assert db.data(f'{COLLECTION}/{CHECKPOINT_DOC_ID}')['mark']['docId'] == 'g1'
+
+    settle(db, 'g2', [('b', 5.0)], when=NOW + timedelta(seconds=1))
+    restarted = LeaderboardService(firebase_manager, utc_offset_hours=3, refresh_seconds=0)
+    restarted.ensure_loaded()
+    assert [entry['userId'] for entry in restarted.top(BOARD_ALL)['entries']] == ['b', 'a']
+    assert restarted.rank(BOARD_ALL, 'b')['wins'] == 2
+
+@pytest.mark.parametrize('name, board', [
+    ('all', 'all'),
+    ('speed', 'mode-speed'),
+    ('daily-2024-01-31', 'daily-2024-01-31'),
+    ('weekly-2024-W05', 'weekly-2024-W05'),
+])
+def test_resolves_board_names(leaderboard, name, board):
+    assert leaderboard.resolve(name) == board
+
+def test_rejects_unknown_boards(leaderboard):
+    with pytest.raises(LeaderboardError):
+        leaderboard.resolve('../users')
+
+def test_days_follow_the_stats_offset(leaderboard):
+    # 22:30 UTC is already the next day in UTC+3
+    late = datetime(2024, 1, 31, 22, 30, tzinfo=timezone.utc)
+    assert leaderboard.daily_board(late) == 'daily-2024-02-01'
+    assert leaderboard.boards_for(late, None)[-1] == 'mode-classic'
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.chapa_service import (
+    ChapaSubmission, ChapaVerification, SUBMIT_ACCEPTED, SUBMIT_DUPLICATE, SUBMIT_REFUSED, SUBMIT_REJECTED,
+    VERIFY_ERROR, VERIFY_FAILED, VERIFY_NOT_FOUND, VERIFY_PENDING, VERIFY_SUCCESS
+)
+from services.payout_service import (
+    COLLECTION, MAX_POLLS, NOT_FOUND_GRACE_SECONDS, OUTCOME_FAILED, OUTCOME_PAID, OUTCOME_RETRY, OUTCOME_REVIEW,
+    OUTCOME_SUBMITTED, STATUS_FAILED, STATUS_PAID, STATUS_QUEUED, STATUS_REVIEW, STATUS_SUBMITTED, PayoutQueue,
+    WithdrawalRejected
+)
+from services.token_bucket import TokenBucket
+
+class FakeChapa:
+    """Scripted Chapa transfers API.
+
+    ``submit`` maps the transfers of a bulk request to a ChapaSubmission;
+    ``transfers`` holds the verification answer per reference.
+    """
+
+    def __init__(self):
+        self.submit = lambda transfers: ChapaSubmission(SUBMIT_ACCEPTED, batch_id='batch-1')
+        self.transfers = {}
+        self.requests = []
+        self.checks = []
+
+    def bulk_transfer(self, title, transfers):
+        self.requests.append([transfer['reference'] for transfer in transfers])
+        return self.submit(transfers)
+
+    def check_transfer(self, reference):
+        self.checks.append(reference)
+        return self.transfers.get(reference, ChapaVerification(VERIFY_PENDING))
+
+@pytest.fixture
+def chapa():
+    return FakeChapa()
+
+@pytest.fixture
+def queue(db, firebase_manager, chapa):
+    db.put('wallets/u1', {'balance': 1000.0})
+    return PayoutQueue(firebase_manager, chapa, min_amount=50, max_amount=5000, chunk_size=10, concurrency=1,
+                       rate_per_second=1000)
+
+def withdraw(queue, amount=100, account='1000123', request_id=None):
+    return queue.request('u1', amount, 'Abebe', account, 946, request_id)['id']
+
+def withdrawal(db, key):
+    return db.data(f'{COLLECTION}/{key}')
+
+def wallet(db):
+    data = db.data('wallets/u1')
+    return data['balance'], data.get('reservedBalance', 0)
+
+def make_due(db, key, **fields):
+    """Bring a withdrawal's next check forward, as if time had passed"""
+    db.put(f'{COLLECTION}/{key}', {**withdrawal(db, key), 'nextCheckAt': datetime.now(timezone.utc), **fields})
+
+def test_a_request_reserves_the_funds(db, queue):
+    key = withdraw(queue, 300, request_id='r1')
+    assert wallet(db) == (700.0, 300.0)
+    assert withdrawal(db, key)['status'] == STATUS_QUEUED
+    assert db.data(f'transactions/{key}')['status'] == 'pending'
+
+    # A retried request reserves nothing more
+    assert queue.request('u1', 300, 'Abebe', '1000123', 946, 'r1')['duplicate']
+    assert wallet(db) == (700.0, 300.0)
+
+@pytest.mark.parametrize('amount, error', [(20, 'Minimum'), (6000, 'Maximum'), (2000, 'Insufficient')])
+def test_rejects_requests_the_wallet_cannot_pay(db, queue, amount, error):
+    with pytest.raises(WithdrawalRejected, match=error):
+        withdraw(queue, amount)
+    assert wallet(db) == (1000.0, 0)
+
+def test_submits_then_settles_a_paid_withdrawal(db, queue, chapa):
+    key = withdraw(queue)
+    assert queue.process() == {OUTCOME_SUBMITTED: 1}
+    record = withdrawal(db, key)
+    assert (record['status'], record['inFlight'], record['attempts'], record['polls']) == (STATUS_SUBMITTED, True, 1, 0)
+    assert record['submittedAt'] is not None
+    # Not due again until Chapa has had a moment
+    assert queue.process() == {}
+
+    chapa.transfers[key] = ChapaVerification(VERIFY_SUCCESS)
+    make_due(db, key)
+    assert queue.process() == {OUTCOME_PAID: 1}
+    assert withdrawal(db, key)['status'] == STATUS_PAID
+    assert 'nextCheckAt' not in withdrawal(db, key)
+    assert wallet(db) == (900.0, 0.0)
+    assert db.data(f'transactions/{key}')['status'] == 'completed'
+
+def test_a_failed_transfer_returns_the_funds(db, queue, chapa):
+    key = withdraw(queue)
+    queue.process()
+    chapa.transfers[key] = ChapaVerification(VERIFY_FAILED, message='Account closed')
+    make_due(db, key)
+    assert queue.process() == {OUTCOME_FAILED: 1}
+    assert wallet(db) == (1000.0, 0.0)
+    assert withdrawal(db, key)['statusReason'] == 'Account closed'
+
+def test_a_rejected_chunk_fails_only_the_bad_transfer(db, queue, chapa):
+    good = [withdraw(queue, account=f'10001{i}') for i in range(3)]
+    bad = withdraw(queue, account='bad')
+    chapa.submit = lambda transfers: ChapaSubmission(
+        SUBMIT_REJECTED if any(t['account_number'] == 'bad' for t in transfers) else SUBMIT_ACCEPTED,
+        message='Invalid account')
+
+    assert queue.process() == {OUTCOME_SUBMITTED: 3, OUTCOME_FAILED: 1}
+    assert len(chapa.requests[0]) == 4 and len(chapa.requests) == 5
+    assert withdrawal(db, bad)['status'] == STATUS_FAILED
+    assert all(withdrawal(db, key)['status'] == STATUS_SUBMITTED for key in good)
+    assert wallet(db) == (700.0, 300.0)
+
+def test_a_reused_reference_counts_as_submitted(db, queue, chapa):
+    key = withdraw(queue)
+    chapa.submit = lambda transfers: ChapaSubmission(SUBMIT_DUPLICATE, message='Reference already used')
+    assert queue.process() == {OUTCOME_SUBMITTED: 1}
+    assert withdrawal(db, key)['status'] == STATUS_SUBMITTED
+    assert wallet(db) == (900.0, 100.0)
+
+def test_a_refusal_leaves_everything_queued_and_stops_the_run(db, queue, chapa):
+    queue.chunk_size = 1
+    keys = [withdraw(queue, account=f'10001{i}') for i in range(3)]
+    chapa.submit = lambda transfers: ChapaSubmission(SUBMIT_REFUSED, message='Insufficient balance')
+
+    assert queue.process() == {OUTCOME_RETRY: 3}
+    assert len(chapa.requests) == 1
+    for key in keys:
+        record = withdrawal(db, key)
+        assert (record['status'], record['inFlight'], record['attempts']) == (STATUS_QUEUED, False, 0)
+    assert wallet(db) == (700.0, 300.0)
+
+def test_an_unknown_outcome_is_verified_before_resending(db, queue, chapa):
+    key = withdraw(queue)
+    chapa.submit = lambda transfers: ChapaSubmission(VERIFY_ERROR, message='Timeout')
+    assert queue.process() == {OUTCOME_RETRY: 1}
+    assert withdrawal(db, key)['inFlight']
+
+    # Chapa may not list a just-queued transfer yet: not resent, not failed
+    chapa.transfers[key] = ChapaVerification(VERIFY_NOT_FOUND)
+    chapa.submit = lambda transfers: ChapaSubmission(SUBMIT_ACCEPTED)
+    make_due(db, key)
+    assert queue.process() == {OUTCOME_RETRY: 1}
+    assert (chapa.checks, len(chapa.requests)) == ([key], 1)
+    assert wallet(db) == (900.0, 100.0)
+
+    # Still unknown to Chapa well after it was sent: the same reference is sent again
+    sent = datetime.now(timezone.utc) - timedelta(seconds=NOT_FOUND_GRACE_SECONDS + 1)
+    make_due(db, key, submittedAt=sent)
+    assert queue.process() == {OUTCOME_SUBMITTED: 1}
+    assert chapa.requests[-1] == [key]
+    assert (withdrawal(db, key)['status'], withdrawal(db, key)['attempts']) == (STATUS_SUBMITTED, 2)
+
+def test_a_pending_answer_means_the_unknown_submission_arrived(db, queue, chapa):
+    key = withdraw(queue)
+    chapa.submit = lambda transfers: ChapaSubmission(VERIFY_ERROR, message='Timeout')
+    queue.process()
+    make_due(db, key)
+    assert queue.process() == {OUTCOME_RETRY: 1}
+    assert withdrawal(db, key)['status'] == STATUS_SUBMITTED
+    assert len(chapa.requests) == 1
+
+def test_holds_for_review_after_too_many_polls(db, queue, chapa):
+    key = withdraw(queue)
+    queue.process()
+    make_due(db, key, polls=MAX_POLLS - 1)
+    assert queue.process() == {OUTCOME_REVIEW: 1}
+    record = withdrawal(db, key)
+    assert record['status'] == STATUS_REVIEW and 'nextCheckAt' not in record
+    # The funds stay reserved for an operator
+    assert wallet(db) == (900.0, 100.0)
+    assert queue.process() == {}
+
+def test_a_withdrawal_claimed_by_another_run_is_not_settled_twice(db, queue, chapa):
+    key = withdraw(queue)
+    queue.process()
+    chapa.transfers[key] = ChapaVerification(VERIFY_SUCCESS)
+    make_due(db, key)
+    snapshot = db.collection(COLLECTION).document(key).get()
+    item = (snapshot.reference, snapshot.to_dict(), snapshot.update_time)
+    assert queue._apply_verification(db, item, chapa.check_transfer(key)) == OUTCOME_PAID
+    assert queue._apply_verification(db, item, chapa.check_transfer(key)) != OUTCOME_PAID
+    assert wallet(db) == (900.0, 0.0)
+
+def test_token_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(rate=2, burst=2)
+    start = bucket.updated
+    assert bucket.take(start) == 0 and bucket.take(start) == 0
+    assert bucket.take(start) == pytest.approx(0.5)
+    assert bucket.take(start + 0.5) == 0
+
+def test_token_bucket_reservations_queue_in_order():
+    bucket = TokenBucket(rate=4)
+    start = bucket.updated
+    assert [bucket.reserve(start) for _ in range(3)] == [0.0, pytest.approx(0.25), pytest.approx(0.5)]
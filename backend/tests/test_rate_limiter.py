@@ -0,0 +1,68 @@
+import pytest
+
+from services.rate_limiter import (
+    MemoryBucketStore, RateLimiter, SCOPE_IP, SCOPE_USER, Limit, create_store, per_minute
+)
+
+RULE = '/api/wallet/transfers'
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(policies={RULE: (Limit(SCOPE_USER, 0.001, 2), Limit(SCOPE_IP, 0.001, 3))})
+
+def test_per_minute_limits():
+    assert per_minute(SCOPE_USER, 30) == Limit(SCOPE_USER, 0.5, 30)
+    assert per_minute(SCOPE_IP, 30, burst=10).burst == 10
+
+def test_each_user_has_a_bucket(limiter):
+    assert [limiter.check(RULE, '1.1.1.1', 'Bearer a') for _ in range(2)] == [0, 0]
+    assert limiter.check(RULE, '1.1.1.1', 'Bearer a') > 0
+    assert limiter.check(RULE, '2.2.2.2', 'Bearer b') == 0
+
+def test_the_ip_limit_covers_every_user_behind_it(limiter):
+    for token in ('a', 'b', 'c'):
+        assert limiter.check(RULE, '1.1.1.1', f'Bearer {token}') == 0
+    assert limiter.check(RULE, '1.1.1.1', 'Bearer d') > 0
+
+def test_requests_without_a_token_are_keyed_by_ip(limiter):
+    assert [limiter.check(RULE, '1.1.1.1') for _ in range(2)] == [0, 0]
+    assert limiter.check(RULE, '1.1.1.1') > 0
+
+def test_routes_without_a_policy_are_not_limited(limiter):
+    assert all(limiter.check('/api/games', '1.1.1.1') == 0 for _ in range(10))
+    assert limiter.check(None, '1.1.1.1') == 0
+
+def test_user_keys_hash_the_token():
+    key = RateLimiter.user_key('Bearer secret-token')
+    assert key and 'secret' not in key
+    assert RateLimiter.user_key('Basic abc') is None
+
+@pytest.mark.parametrize('proxies, forwarded, expected', [
+    (1, '9.9.9.9, 10.0.0.1', '10.0.0.1'),
+    (2, '9.9.9.9, 10.0.0.1', '9.9.9.9'),
+    (0, '9.9.9.9', '127.0.0.1'),
+    (3, '9.9.9.9', '127.0.0.1'),
+    (1, None, '127.0.0.1'),
+])
+def test_client_ip_trusts_only_known_proxies(proxies, forwarded, expected):
+    assert RateLimiter(trusted_proxies=proxies).client_ip('127.0.0.1', forwarded) == expected
+
+def test_memory_store_drops_the_least_recently_used_bucket():
+    store = MemoryBucketStore(max_buckets=2)
+    limit = Limit(SCOPE_IP, 0.001, 1)
+    store.take('a', limit)
+    store.take('b', limit)
+    store.take('c', limit)
+    # 'a' was dropped, so it starts with a full bucket again
+    assert store.take('a', limit) == 0
+    assert store.take('c', limit) > 0
+
+def test_memory_store_follows_reloaded_limits():
+    store = MemoryBucketStore()
+    store.take('a', Limit(SCOPE_IP, 0.001, 1))
+    assert store.take('a', Limit(SCOPE_IP, 0.001, 1)) > 900
+    # The same empty bucket now refills in a millisecond
+    assert store.take('a', Limit(SCOPE_IP, 1000.0, 1)) <= 0.001
+
+def test_an_empty_storage_url_limits_in_process():
+    assert isinstance(create_store(None), MemoryBucketStore)
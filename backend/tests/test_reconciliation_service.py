@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.chapa_service import (
+    ChapaVerification, VERIFY_ERROR, VERIFY_FAILED, VERIFY_NOT_FOUND, VERIFY_PENDING, VERIFY_RATE_LIMITED,
+    VERIFY_SUCCESS
+)
+from services.ledger import Ledger
+from services.reconciliation_service import (
+    OUTCOME_DUPLICATE, OUTCOME_EXPIRED, OUTCOME_FAILED, OUTCOME_RETRY, OUTCOME_SETTLED, PENDING_COLLECTION,
+    PaymentReconciler
+)
+
+class FakeChapa:
+    """Answers verify calls from a dict of tx_ref -> ChapaVerification"""
+
+    def __init__(self, answers=None):
+        self.answers = answers or {}
+        self.calls = []
+
+    def check_payment(self, tx_ref):
+        self.calls.append(tx_ref)
+        return self.answers.get(tx_ref, ChapaVerification(VERIFY_PENDING))
+
+def paid(amount):
+    return ChapaVerification(VERIFY_SUCCESS, amount=amount, currency='ETB', reference='chapa-ref')
+
+@pytest.fixture
+def chapa():
+    return FakeChapa()
+
+@pytest.fixture
+def reconciler(config, firebase_manager, chapa):
+    config(CHAPA_VERIFY_RATE_PER_SECOND=1000.0, CHAPA_RECONCILE_CONCURRENCY=1, CHAPA_PENDING_MAX_AGE_HOURS=24.0)
+    return PaymentReconciler(firebase_manager, chapa, Ledger(firebase_manager))
+
+def pending(db, tx_ref, user_id='u1', amount=100, age=timedelta(minutes=5), attempts=0):
+    now = datetime.now(timezone.utc)
+    db.put(f'transactions/{tx_ref}', {'userId': user_id, 'type': 'deposit', 'amount': amount, 'status': 'pending'})
+    db.put(f'{PENDING_COLLECTION}/{tx_ref}', {'userId': user_id, 'amount': amount, 'attempts': attempts,
+                                              'createdAt': now - age, 'nextCheckAt': now - timedelta(seconds=1)})
+
+def test_records_a_pending_payment_for_later(db, reconciler):
+    reconciler.record_pending('tx1', 'u1', 100)
+    assert db.data('transactions/tx1')['status'] == 'pending'
+    record = db.data(f'{PENDING_COLLECTION}/tx1')
+    assert record['nextCheckAt'] > datetime.now(timezone.utc)
+    # Not due yet
+    assert reconciler.sweep() == {}
+
+def test_credits_a_verified_payment_once(db, reconciler, chapa):
+    pending(db, 'tx1')
+    chapa.answers['tx1'] = paid(100)
+
+    assert reconciler.reconcile('tx1') == OUTCOME_SETTLED
+    assert db.data('wallets/u1')['balance'] == 100
+    assert db.data('transactions/tx1')['status'] == 'completed'
+    assert db.data(f'{PENDING_COLLECTION}/tx1') is None
+    assert db.data('ledger/chapa_tx1')['amount'] == 100
+
+    # The callback and a sweep both reporting it
+    assert reconciler.reconcile('tx1') == OUTCOME_DUPLICATE
+    assert db.data('wallets/u1')['balance'] == 100
+
+def test_credits_the_verified_amount_not_the_expected_one(db, reconciler, chapa):
+    pending(db, 'tx1', amount=100)
+    chapa.answers['tx1'] = paid(80)
+    reconciler.reconcile('tx1')
+    assert db.data('wallets/u1')['balance'] == 80
+    assert db.data('ledger/chapa_tx1')['metadata']['expectedAmount'] == 100
+
+def test_sweeps_due_payments(db, reconciler, chapa):
+    pending(db, 'tx1')
+    pending(db, 'tx2', user_id='u2', amount=50)
+    pending(db, 'tx3')
+    chapa.answers.update(tx1=paid(100), tx2=ChapaVerification(VERIFY_FAILED, message='Declined'))
+
+    assert reconciler.sweep() == {OUTCOME_SETTLED: 1, OUTCOME_FAILED: 1, OUTCOME_RETRY: 1}
+    assert db.data('wallets/u1')['balance'] == 100
+    assert db.data('wallets/u2') is None
+    assert db.data('transactions/tx2')['status'] == 'failed'
+    retry = db.data(f'{PENDING_COLLECTION}/tx3')
+    assert retry['attempts'] == 1
+    assert retry['nextCheckAt'] > datetime.now(timezone.utc)
+
+def test_backs_off_exponentially(db, reconciler):
+    pending(db, 'tx1', attempts=3)
+    before = datetime.now(timezone.utc)
+    reconciler.sweep()
+    record = db.data(f'{PENDING_COLLECTION}/tx1')
+    # 120s * 2**4, +-20% jitter
+    assert timedelta(seconds=1536) <= record['nextCheckAt'] - before <= timedelta(seconds=2305)
+
+def test_expires_old_payments_chapa_never_settled(db, reconciler, chapa):
+    pending(db, 'tx1', age=timedelta(hours=25))
+    chapa.answers['tx1'] = ChapaVerification(VERIFY_NOT_FOUND)
+    assert reconciler.sweep() == {OUTCOME_EXPIRED: 1}
+    assert db.data('transactions/tx1')['status'] == 'expired'
+    assert db.data(f'{PENDING_COLLECTION}/tx1') is None
+
+def test_errors_do_not_expire_payments(db, reconciler, chapa):
+    pending(db, 'tx1', age=timedelta(hours=25))
+    chapa.answers['tx1'] = ChapaVerification(VERIFY_ERROR, message='Timeout')
+    assert reconciler.sweep() == {OUTCOME_RETRY: 1}
+    assert db.data(f'{PENDING_COLLECTION}/tx1')['lastError'] == 'Timeout'
+
+def test_a_payment_completing_after_expiry_is_still_credited(db, reconciler, chapa):
+    pending(db, 'tx1', age=timedelta(hours=25))
+    chapa.answers['tx1'] = ChapaVerification(VERIFY_PENDING)
+    reconciler.sweep()
+    chapa.answers['tx1'] = paid(100)
+    assert reconciler.reconcile('tx1') == OUTCOME_SETTLED
+    assert db.data('wallets/u1')['balance'] == 100
+    assert db.data('transactions/tx1')['status'] == 'completed'
+
+def test_stops_verifying_after_a_rate_limit(db, reconciler, chapa):
+    for tx_ref in ('tx1', 'tx2', 'tx3'):
+        pending(db, tx_ref, attempts=2)
+    chapa.answers['tx1'] = ChapaVerification(VERIFY_RATE_LIMITED, message='Too many requests')
+
+    assert reconciler.sweep() == {OUTCOME_RETRY: 3}
+    assert chapa.calls == ['tx1']
+    # A rate limit is not an attempt
+    assert {db.data(f'{PENDING_COLLECTION}/{tx_ref}')['attempts'] for tx_ref in ('tx1', 'tx2', 'tx3')} == {2}
+
+def test_a_record_claimed_by_another_sweep_is_skipped(db, reconciler):
+    pending(db, 'tx1')
+    snapshot = db.collection(PENDING_COLLECTION).document('tx1').get()
+    db.collection(PENDING_COLLECTION).document('tx1').update({'claimedAt': datetime.now(timezone.utc)})
+    assert not reconciler._claim(db, snapshot, datetime.now(timezone.utc))
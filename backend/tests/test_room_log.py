@@ -0,0 +1,107 @@
+import pytest
+
+from services import win_engine
+from services.room_log import (
+    EVENT_CALL, EVENT_JOIN, EVENT_LEAVE, EVENT_STATUS, EVENT_WINNERS, RoomEventLog, RoomNotFound, diff, room_state
+)
+
+def room(db, **fields):
+    data = {'status': 'waiting', 'calledNumbers': [], 'players': [], 'name': 'Evening', **fields}
+    db.put('gameRooms/g1', data)
+    return data
+
+@pytest.fixture
+def log(firebase_manager):
+    return RoomEventLog(firebase_manager, max_events=5, max_gap=3, cache_seconds=0)
+
+def test_diff_turns_room_changes_into_events():
+    before = room_state({'status': 'waiting', 'calledNumbers': [5], 'players': ['a', {'id': 'b', 'name': 'B'}]})
+    events, reset = diff(before, {'status': 'playing', 'calledNumbers': [5, 17, 33],
+                                  'players': [{'id': 'a', 'name': 'A'}, {'id': 'c', 'name': 'C'}],
+                                  'winnerIds': ['a'], 'winPattern': 'Row 1', 'winAmount': 80})
+    assert not reset
+    assert events == [
+        (EVENT_STATUS, {'status': 'playing'}),
+        (EVENT_JOIN, {'userId': 'c', 'name': 'C'}),
+        (EVENT_LEAVE, {'userId': 'b'}),
+        (EVENT_CALL, {'n': 17}),
+        (EVENT_CALL, {'n': 33}),
+        (EVENT_WINNERS, {'userIds': ['a'], 'pattern': 'Row 1', 'amount': 80}),
+    ]
+
+def test_a_replaced_call_sequence_is_a_reset():
+    assert diff(room_state({'calledNumbers': [5, 17]}), {'calledNumbers': [9]}) == ([], True)
+
+def test_a_new_client_gets_a_snapshot(db, log):
+    room(db)
+    result = log.sync('g1')
+    assert result['seq'] == 1
+    assert result['snapshot']['status'] == 'waiting' and result['snapshot']['name'] == 'Evening'
+
+def test_a_client_that_is_close_behind_gets_the_events(db, log):
+    room(db)
+    seq = log.sync('g1')['seq']
+    room(db, status='playing', calledNumbers=[5, 17])
+    result = log.sync('g1', since=seq)
+    assert result == {'seq': 4, 'events': [
+        {'s': 2, 't': EVENT_STATUS, 'd': {'status': 'playing'}},
+        {'s': 3, 't': EVENT_CALL, 'd': {'n': 5}},
+        {'s': 4, 't': EVENT_CALL, 'd': {'n': 17}},
+    ]}
+    assert log.sync('g1', since=4) == {'seq': 4, 'events': []}
+
+def test_a_client_too_far_behind_gets_a_snapshot(db, log):
+    room(db, status='playing')
+    seq = log.sync('g1')['seq']
+    room(db, status='playing', calledNumbers=[1, 2, 3, 4])
+    result = log.sync('g1', since=seq)
+    assert result['seq'] == seq + 4 and result['snapshot']['calledNumbers'] == [1, 2, 3, 4]
+
+@pytest.mark.parametrize('since', [0, 99])
+def test_a_position_outside_the_log_gets_a_snapshot(db, log, since):
+    room(db)
+    log.sync('g1')
+    assert 'snapshot' in log.sync('g1', since=since)
+
+def test_keeps_only_the_last_events(db, log):
+    room(db, status='playing')
+    log.sync('g1')
+    called = []
+    for number in range(1, 9):
+        called.append(number)
+        room(db, status='playing', calledNumbers=list(called))
+        log.sync('g1')
+    stored = db.data('gameRooms/g1/sync/log')
+    assert (stored['seq'], stored['base'], len(stored['events'])) == (9, 4, 5)
+    # Within the kept events and the gap
+    assert [event['d']['n'] for event in log.sync('g1', since=6)['events']] == [6, 7, 8]
+    # Older than the kept events
+    assert 'snapshot' in log.sync('g1', since=3)
+
+def test_a_restarted_room_starts_a_new_base(db, log):
+    room(db, status='playing', calledNumbers=[5, 17])
+    seq = log.sync('g1')['seq']
+    room(db, status='playing', calledNumbers=[9])
+    result = log.sync('g1', since=seq)
+    assert result['seq'] == seq + 1 and result['snapshot']['calledNumbers'] == [9]
+
+def test_snapshots_carry_the_players_marks(db, log):
+    card = win_engine.generate_card()
+    numbers = win_engine.card_from_columns(card)
+    called = [number for number in numbers if number][:3]
+    room(db, status='playing', calledNumbers=called)
+    db.put('gameRooms/g1/cards/a', card)
+    snapshot = log.sync('g1', user_id='a')['snapshot']
+    assert snapshot['marks'] == win_engine.marked_mask(numbers, called)
+    assert 'marks' not in log.sync('g1', user_id='nobody')['snapshot']
+
+def test_an_unchanged_room_is_not_rewritten(db, log):
+    room(db)
+    log.sync('g1')
+    commits = db.commits
+    log.sync('g1', since=1)
+    assert db.commits == commits
+
+def test_unknown_rooms(log):
+    with pytest.raises(RoomNotFound):
+        log.sync('missing')
@@ -0,0 +1,110 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.sharded_counter import ShardedCounter
+from services.ledger import Ledger
+from services.room_scheduler import (
+    ACTION_ARCHIVE, ACTION_CHECK, ARCHIVE_COLLECTION, STATUS_CANCELLED, STATUS_PLAYING, RoomScheduler,
+    refund_entry_id
+)
+from services.roster_service import RosterService
+
+@pytest.fixture
+def roster(firebase_manager):
+    return RosterService(firebase_manager, ShardedCounter(num_shards=4), summary_interval=0)
+
+@pytest.fixture
+def scheduler(config, firebase_manager, roster):
+    config(ROOM_START_DEADLINE_SECONDS=600, ROOM_PLAY_TIMEOUT_SECONDS=3600, ROOM_ARCHIVE_AFTER_SECONDS=60)
+    started = []
+    scheduler = RoomScheduler(firebase_manager, roster, Ledger(firebase_manager),
+                              on_start=lambda game_id, room: started.append(game_id))
+    scheduler.started = started
+    return scheduler
+
+def room(db, roster, players=(), created=None, **fields):
+    created = created or datetime.now(timezone.utc)
+    db.put('gameRooms/g1', {'status': 'waiting', 'maxPlayers': 4, 'minPlayers': 2, 'createdAt': created,
+                            **roster.room_fields(), **fields})
+    for user_id in players:
+        roster.add_player('g1', {'userId': user_id, 'displayName': user_id})
+
+def entry(db, user_id, amount=20.0, status='completed'):
+    db.put(f'transactions/entry_{user_id}', {'userId': user_id, 'type': 'game_entry', 'amount': amount,
+                                             'status': status, 'gameId': 'g1'})
+
+def status(db):
+    return db.data('gameRooms/g1')['status']
+
+def test_a_full_room_starts_at_once(db, roster, scheduler):
+    room(db, roster, players=('a', 'b', 'c', 'd'))
+    assert scheduler.run_action('g1', ACTION_CHECK) == 'started'
+    assert status(db) == STATUS_PLAYING
+    assert scheduler.started == ['g1']
+
+def test_waits_for_players_until_the_deadline(db, roster, scheduler):
+    room(db, roster, players=('a', 'b'))
+    assert scheduler.run_action('g1', ACTION_CHECK) is None
+    assert status(db) == 'waiting'
+    assert scheduler.pending() == 1
+
+def test_starts_at_the_deadline_with_enough_players(db, roster, scheduler):
+    room(db, roster, players=('a', 'b'), created=datetime.now(timezone.utc) - timedelta(seconds=601))
+    assert scheduler.run_action('g1', ACTION_CHECK) == 'started'
+
+def test_cancels_at_the_deadline_and_refunds_entries(db, roster, scheduler):
+    room(db, roster, players=('a',), scheduledTime=time.time() - 1)
+    entry(db, 'a')
+    entry(db, 'b', status='pending')
+    assert scheduler.run_action('g1', ACTION_CHECK) == 'cancelled'
+    cancelled = db.data('gameRooms/g1')
+    assert (cancelled['status'], cancelled['refundsPending']) == (STATUS_CANCELLED, False)
+    assert db.data('wallets/a')['balance'] == 20.0
+    assert db.data(f"transactions/{refund_entry_id('entry_a')}")['type'] == 'refund'
+    # Only completed entries are refunded
+    assert db.data('wallets/b') is None
+
+def test_refunds_happen_once(db, roster, scheduler):
+    room(db, roster, status=STATUS_CANCELLED, refundsPending=True)
+    entry(db, 'a')
+    assert scheduler.refund('g1') == 1
+    assert scheduler.refund('g1') == 0
+    assert db.data('wallets/a')['balance'] == 20.0
+
+def test_a_game_without_a_result_times_out(db, roster, scheduler):
+    room(db, roster, status=STATUS_PLAYING, gameStartedAt=datetime.now(timezone.utc) - timedelta(hours=2))
+    entry(db, 'a')
+    assert scheduler.run_action('g1', ACTION_CHECK) == 'cancelled'
+    assert db.data('gameRooms/g1')['cancelReason'] == 'Game timed out without a result'
+    assert db.data('wallets/a')['balance'] == 20.0
+
+def test_a_room_changed_since_it_was_read_is_left_alone(db, roster, scheduler):
+    room(db, roster, players=('a', 'b', 'c', 'd'))
+    snapshot = db.collection('gameRooms').document('g1').get()
+    db.collection('gameRooms').document('g1').update({'status': STATUS_CANCELLED})
+    assert scheduler._start(snapshot.reference, snapshot, 4) is None
+    assert status(db) == STATUS_CANCELLED
+    assert scheduler.started == []
+
+def test_archives_finished_rooms_with_their_roster(db, roster, scheduler):
+    room(db, roster, players=('a', 'b'), status='completed',
+         gameEndedAt=datetime.now(timezone.utc) - timedelta(minutes=5))
+    roster.counter.increment(ShardedCounter.shards_for(db.document('gameRooms/g1')), {'prizePool': 40.0})
+    assert scheduler.resync() == 1
+    assert scheduler.run_due() == 1
+    archived = db.data(f'{ARCHIVE_COLLECTION}/g1')
+    assert [player['userId'] for player in archived['roster']] == ['a', 'b']
+    assert archived['totals'] == {'prizePool': 40.0}
+    assert not [path for path in db.docs if path.startswith('gameRooms/g1')]
+
+def test_rooms_awaiting_refunds_are_not_archived(db, roster, scheduler):
+    room(db, roster, status=STATUS_CANCELLED, refundsPending=True)
+    assert not scheduler.run_action('g1', ACTION_ARCHIVE)
+
+def test_later_timers_replace_earlier_ones(scheduler):
+    scheduler.schedule('g1', 100)
+    scheduler.schedule('g1', 200)
+    assert scheduler.pending() == 1
+    assert scheduler.run_due(now=150) == 0
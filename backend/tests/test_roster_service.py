@@ -0,0 +1,48 @@
+import pytest
+
+from database.sharded_counter import ShardedCounter
+from services import win_engine
+from services.roster_service import RosterService
+
+@pytest.fixture
+def roster(db, firebase_manager):
+    service = RosterService(firebase_manager, ShardedCounter(num_shards=4), summary_interval=0)
+    db.put('gameRooms/g1', {'status': 'waiting', **service.room_fields()})
+    return service
+
+def join(roster, user_id):
+    return roster.add_player('g1', {'userId': user_id, 'displayName': user_id.upper()})
+
+def test_joining_deals_a_valid_card(db, roster):
+    assert join(roster, 'a')
+    card = db.data('gameRooms/g1/cards/a')
+    assert card['source'] == 'server'
+    assert len(win_engine.card_from_columns(card)) == win_engine.CELL_COUNT
+    assert db.data('gameRooms/g1/players/a')['displayName'] == 'A'
+    assert roster.player_count('g1', max_staleness=0) == 1
+
+def test_joining_never_writes_the_room_document(db, roster):
+    before = db.docs['gameRooms/g1']
+    join(roster, 'a')
+    join(roster, 'b')
+    assert db.docs['gameRooms/g1'] == before
+    assert roster.room_player_count('g1', db.data('gameRooms/g1'), max_staleness=0) == 2
+
+def test_rooms_without_a_roster_count_their_players_array(roster):
+    assert roster.room_player_count('g1', {'players': [{'id': 'a'}, {'id': 'b'}]}) == 2
+
+def test_joining_twice_keeps_the_first_card(db, roster):
+    join(roster, 'a')
+    card = db.data('gameRooms/g1/cards/a')
+    assert not join(roster, 'a')
+    assert db.data('gameRooms/g1/cards/a') == card
+    assert roster.player_count('g1', max_staleness=0) == 1
+
+def test_leaving_removes_the_player_and_their_card(db, roster):
+    join(roster, 'a')
+    join(roster, 'b')
+    assert roster.remove_player('g1', 'a')
+    assert db.data('gameRooms/g1/cards/a') is None
+    assert db.data('gameRooms/g1/players/a') is None
+    assert roster.player_count('g1', max_staleness=0) == 1
+    assert not roster.remove_player('g1', 'a')
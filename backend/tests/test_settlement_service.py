@@ -0,0 +1,105 @@
+import pytest
+
+from services.settlement_service import SettlementError, SettlementService
+from services.win_engine import COLUMNS, FREE_SPACE
+
+def columns(rows):
+    return {letter: [row[col] for row in rows] for col, letter in enumerate(COLUMNS)}
+
+# Both win on row 1 with the fifth call
+CARD_A = columns([
+    [1, 16, 31, 46, 61],
+    [2, 17, 32, 47, 62],
+    [3, 18, FREE_SPACE, 48, 63],
+    [4, 19, 34, 49, 64],
+    [5, 20, 35, 50, 65],
+])
+CARD_B = columns([
+    [1, 16, 31, 46, 61],
+    [6, 21, 36, 51, 66],
+    [7, 22, FREE_SPACE, 52, 67],
+    [8, 23, 38, 53, 68],
+    [9, 24, 39, 54, 69],
+])
+# Wins on row 2 with the sixth call
+CARD_C = columns([
+    [10, 25, 40, 55, 70],
+    [2, 17, 32, 47, 62],
+    [11, 26, FREE_SPACE, 56, 71],
+    [12, 27, 42, 57, 72],
+    [13, 28, 43, 58, 73],
+])
+CALLED = [1, 16, 31, 46, 61, 2, 17, 32, 47, 62]
+
+@pytest.fixture
+def settlement(firebase_manager):
+    return SettlementService(firebase_manager, None, house_commission=0.1)
+
+def start_game(db, players, cards, **room):
+    db.put('gameRooms/g1', {'status': 'playing', 'prizePool': 1000, 'calledNumbers': CALLED,
+                            'players': players, **room})
+    for user_id, card in cards.items():
+        db.put(f'gameRooms/g1/cards/{user_id}', card)
+
+def test_pays_the_earliest_winner(db, settlement):
+    start_game(db, [{'id': 'a', 'name': 'A'}, {'id': 'c', 'name': 'C'}], {'a': CARD_A, 'c': CARD_C})
+    result = settlement.settle('g1')
+
+    assert [(w['userId'], w['pattern'], w['amount']) for w in result['winners']] == [('a', 'Row 1', 200.0)]
+    assert db.data('wallets/a')['balance'] == 200.0
+    assert db.data('wallets/c') is None
+    assert db.data('transactions/win_g1_a')['amount'] == 200.0
+    room = db.data('gameRooms/g1')
+    assert (room['status'], room['winnerIds'], room['winAmount']) == ('completed', ['a'], 200.0)
+    assert db.data('settlements/g1')['houseRetained'] == 800.0
+
+def test_tied_winners_share_the_prize_in_whole_cents(db, settlement):
+    start_game(db, ['a', 'b'], {'a': CARD_A, 'b': CARD_B}, prizePool=100.05)
+    result = settlement.settle('g1')
+
+    assert sorted(w['userId'] for w in result['winners']) == ['a', 'b']
+    # 20% of 100.05 is 2001 cents; the odd cent stays with the house
+    assert [w['amount'] for w in result['winners']] == [10.0, 10.0]
+    assert result['totalPaid'] == 20.0
+
+def test_ignores_cards_of_players_not_in_the_room(db, settlement):
+    start_game(db, [{'id': 'c'}], {'a': CARD_A, 'c': CARD_C})
+    result = settlement.settle('g1')
+    assert [w['userId'] for w in result['winners']] == ['c']
+    assert db.data('wallets/a') is None
+
+def test_counts_bot_joins_from_the_roster(db, settlement):
+    start_game(db, [], {'a': CARD_A, 'c': CARD_C})
+    db.put('gameRooms/g1/players/a', {'name': 'A'})
+    assert [w['userId'] for w in settlement.settle('g1')['winners']] == ['a']
+
+def test_cards_sent_by_the_caller_must_belong_to_players(db, settlement):
+    start_game(db, [{'id': 'c'}], {'c': CARD_C})
+    result = settlement.settle('g1', cards={'a': CARD_A, 'c': CARD_C})
+    assert [w['userId'] for w in result['winners']] == ['c']
+
+def test_pays_once(db, settlement):
+    start_game(db, ['a'], {'a': CARD_A})
+    settlement.settle('g1')
+    with pytest.raises(SettlementError, match='already settled'):
+        settlement.settle('g1')
+    assert db.data('wallets/a')['balance'] == 200.0
+
+def test_a_concurrent_second_settlement_writes_nothing(db, settlement):
+    start_game(db, ['a'], {'a': CARD_A})
+    db.put('settlements/g1', {'gameId': 'g1'})
+    with pytest.raises(SettlementError, match='already settled'):
+        settlement.settle('g1')
+    assert db.data('wallets/a') is None
+    assert db.data('gameRooms/g1')['status'] == 'playing'
+
+@pytest.mark.parametrize('status', ['waiting', 'cancelled'])
+def test_only_games_in_progress_are_settled(db, settlement, status):
+    start_game(db, ['a'], {'a': CARD_A}, status=status)
+    with pytest.raises(SettlementError, match='not in progress'):
+        settlement.settle('g1')
+
+def test_refuses_when_nobody_has_won(db, settlement):
+    start_game(db, ['a'], {'a': CARD_A}, calledNumbers=[1, 2, 3])
+    with pytest.raises(SettlementError, match='No winning card'):
+        settlement.settle('g1')
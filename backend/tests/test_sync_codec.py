@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from services.room_log import EVENT_CALL, EVENT_JOIN, EVENT_LEAVE, EVENT_STATUS, EVENT_WINNERS
+from services.sync_codec import (
+    CALLED_BYTES, CodecError, decode_called, decode_events, decode_sync, encode_called, encode_events, encode_sync,
+    encode_varint
+)
+
+EVENTS = [
+    {'s': 7, 't': EVENT_STATUS, 'd': {'status': 'playing'}},
+    {'s': 8, 't': EVENT_JOIN, 'd': {'userId': 'u1', 'name': 'አበበ'}},
+    {'s': 9, 't': EVENT_CALL, 'd': {'n': 75}},
+    {'s': 12, 't': EVENT_LEAVE, 'd': {'userId': 'u2'}},
+    {'s': 13, 't': EVENT_WINNERS, 'd': {'userIds': ['u1', 'u3'], 'pattern': 'Row 1', 'amount': 80.5}},
+    {'s': 14, 't': 'bonus', 'd': {'amount': 5, 'note': 'x'}},
+]
+
+SNAPSHOT = {
+    'status': 'playing',
+    'calledNumbers': [75, 1, 33, 8],
+    'currentCall': 33,
+    'marks': (1 << 25) - 1,
+    'players': [{'id': 'u1', 'name': 'Abebe'}, {'id': 'u2', 'name': None}],
+    'winnerIds': ['u1'],
+    'winPattern': 'Full House',
+    'winAmount': 120.25,
+    'gameMode': 'classic',
+    'name': 'Evening game',
+}
+
+@pytest.mark.parametrize('value, encoded', [(0, b'\x00'), (127, b'\x7f'), (128, b'\x80\x01'), (300, b'\xac\x02')])
+def test_varints(value, encoded):
+    assert encode_varint(value) == encoded
+
+def test_called_numbers_round_trip_as_a_bitset():
+    random.seed(3)
+    called = random.sample(range(1, 76), 40)
+    data = encode_called(called)
+    assert len(data) == CALLED_BYTES
+    assert decode_called(data) == sorted(called)
+    assert encode_called([1]) == b'\x01' + bytes(9)
+
+@pytest.mark.parametrize('numbers', [[0], [76]])
+def test_called_numbers_must_be_on_the_board(numbers):
+    with pytest.raises(CodecError):
+        encode_called(numbers)
+
+def test_events_round_trip():
+    assert decode_events(encode_events(EVENTS)) == EVENTS
+
+def test_a_number_call_costs_three_bytes():
+    # Count, then per event: seq delta, type and the number
+    assert len(encode_events([{'s': 1, 't': EVENT_CALL, 'd': {'n': 5}}])) == 4
+
+def test_an_out_of_range_call_falls_back_to_json():
+    events = [{'s': 1, 't': EVENT_CALL, 'd': {'n': 99}}]
+    assert decode_events(encode_events(events)) == events
+
+def test_events_must_be_in_order():
+    with pytest.raises(CodecError):
+        encode_events(list(reversed(EVENTS)))
+
+def test_event_results_round_trip():
+    result = {'seq': 14, 'events': EVENTS}
+    assert decode_sync(encode_sync(result)) == result
+
+def test_snapshots_round_trip():
+    decoded = decode_sync(encode_sync({'seq': 300, 'snapshot': SNAPSHOT}))
+    assert decoded == {'seq': 300, 'snapshot': {**SNAPSHOT, 'calledNumbers': [1, 8, 33, 75]}}
+
+def test_a_snapshot_without_a_card_or_call():
+    snapshot = {**SNAPSHOT, 'marks': None, 'currentCall': None, 'winAmount': None}
+    decoded = decode_sync(encode_sync({'seq': 1, 'snapshot': snapshot}))['snapshot']
+    assert (decoded['marks'], decoded['currentCall'], decoded['winAmount']) == (None, None, 0.0)
+
+def test_is_smaller_than_json():
+    import json
+    result = {'seq': 14, 'events': EVENTS}
+    assert len(encode_sync(result)) < len(json.dumps(result)) / 2
+
+@pytest.mark.parametrize('snapshot', [
+    {**SNAPSHOT, 'marks': 1 << 25},
+    {**SNAPSHOT, 'calledNumbers': ['x']},
+    {**SNAPSHOT, 'currentCall': 'soon'},
+])
+def test_rejects_snapshots_it_cannot_encode(snapshot):
+    with pytest.raises(CodecError):
+        encode_sync({'seq': 1, 'snapshot': snapshot})
+
+def test_rejects_malformed_payloads():
+    data = encode_sync({'seq': 14, 'events': EVENTS})
+    for bad in (data[:-1], data + b'\x00', b'\x02' + data[1:], data[:1] + b'\x09' + data[2:]):
+        with pytest.raises(CodecError):
+            decode_sync(bad)
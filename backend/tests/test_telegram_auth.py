@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import pytest
+
+from services import telegram_auth
+from services.telegram_auth import TelegramAuthError, TelegramLoginService, verify_init_data, verify_login_widget
+
+BOT_TOKEN = '123456:test-token'
+USER = {'id': 1001, 'first_name': 'Abebe', 'username': 'abebe'}
+
+def check_string(fields):
+    return '\n'.join(f'{key}={fields[key]}' for key in sorted(fields)).encode()
+
+def widget_data(auth_date=None, **fields):
+    data = {**USER, 'auth_date': int(auth_date or time.time()), **fields}
+    secret = hashlib.sha256(BOT_TOKEN.encode()).digest()
+    data['hash'] = hmac.new(secret, check_string({k: str(v) for k, v in data.items()}), hashlib.sha256).hexdigest()
+    return data
+
+def init_data(auth_date=None, user=USER):
+    fields = {'query_id': 'AAH', 'user': json.dumps(user), 'auth_date': str(int(auth_date or time.time()))}
+    secret = hmac.new(b'WebAppData', BOT_TOKEN.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret, check_string(fields), hashlib.sha256).hexdigest()
+    fields['signature'] = 'ed25519-signature'
+    return urlencode(fields)
+
+def test_accepts_signed_login_widget_data():
+    assert verify_login_widget(widget_data(), BOT_TOKEN, 60) == USER
+
+def test_ignores_unsigned_widget_fields():
+    data = {**widget_data(), 'is_admin': True}
+    assert 'is_admin' not in verify_login_widget(data, BOT_TOKEN, 60)
+
+@pytest.mark.parametrize('change, error', [
+    ({'username': 'someone_else'}, 'Invalid hash'),
+    ({'hash': ''}, 'Missing hash'),
+])
+def test_rejects_altered_widget_data(change, error):
+    with pytest.raises(TelegramAuthError, match=error):
+        verify_login_widget({**widget_data(), **change}, BOT_TOKEN, 60)
+
+def test_rejects_widget_data_signed_by_another_bot():
+    with pytest.raises(TelegramAuthError, match='Invalid hash'):
+        verify_login_widget(widget_data(), '654321:other-token', 60)
+
+def test_rejects_expired_widget_data():
+    with pytest.raises(TelegramAuthError, match='expired'):
+        verify_login_widget(widget_data(auth_date=time.time() - 120), BOT_TOKEN, 60)
+
+def test_accepts_signed_init_data():
+    assert verify_init_data(init_data(), BOT_TOKEN, 60) == USER
+
+def test_widget_secret_does_not_verify_init_data():
+    # The Mini App secret is keyed with "WebAppData", not the plain token hash
+    fields = dict(pair.split('=', 1) for pair in init_data().split('&'))
+    data = widget_data()
+    fields['hash'] = data['hash']
+    with pytest.raises(TelegramAuthError, match='Invalid hash'):
+        verify_init_data(urlencode(fields), BOT_TOKEN, 60)
+
+@pytest.mark.parametrize('mangle, error', [
+    (lambda data: data.replace('Abebe', 'Bekele'), 'Invalid hash'),
+    (lambda data: data.split('&hash=')[0], 'Missing hash'),
+    (lambda data: '', 'Missing hash'),
+])
+def test_rejects_altered_init_data(mangle, error):
+    with pytest.raises(TelegramAuthError, match=error):
+        verify_init_data(mangle(init_data()), BOT_TOKEN, 60)
+
+def test_rejects_expired_init_data():
+    with pytest.raises(TelegramAuthError, match='expired'):
+        verify_init_data(init_data(auth_date=time.time() - 120), BOT_TOKEN, 60)
+
+def test_rejects_init_data_without_a_user():
+    with pytest.raises(TelegramAuthError, match='Missing user'):
+        verify_init_data(init_data(user={'first_name': 'Abebe'}), BOT_TOKEN, 60)
+
+class FakeAuth:
+    UidAlreadyExistsError = type('UidAlreadyExistsError', (Exception,), {})
+
+    def __init__(self):
+        self.created = []
+        self.signed = []
+
+    def create_user(self, uid, display_name):
+        self.created.append(uid)
+        return SimpleNamespace(display_name=display_name)
+
+    def create_custom_token(self, uid):
+        self.signed.append(uid)
+        return f'token-{uid}-{len(self.signed)}'.encode()
+
+@pytest.fixture
+def auth(monkeypatch):
+    fake = FakeAuth()
+    monkeypatch.setattr(telegram_auth, 'firebase_auth', fake)
+    return fake
+
+def test_first_login_creates_the_account(db, firebase_manager, auth):
+    token = TelegramLoginService(firebase_manager).login(USER)
+    assert token == 'token-tg_1001-1'
+    assert auth.created == ['tg_1001']
+    user = db.data('users/tg_1001')
+    assert (user['displayName'], user['telegramChatId'], user['telegramUsername']) == ('Abebe', '1001', 'abebe')
+
+def test_repeated_logins_reuse_the_identity_and_token(db, firebase_manager, auth):
+    db.put('users/u1', {'telegramChatId': '1001', 'telegramUsername': 'abebe'})
+    service = TelegramLoginService(firebase_manager)
+    commits = db.commits
+    assert service.login(USER) == service.login(USER) == 'token-u1-1'
+    assert auth.created == [] and auth.signed == ['u1']
+    assert db.commits == commits
+
+def test_a_new_username_is_written_back(db, firebase_manager, auth):
+    db.put('users/u1', {'telegramChatId': '1001', 'telegramUsername': 'abebe'})
+    service = TelegramLoginService(firebase_manager)
+    service.login(USER)
+    service.login({**USER, 'username': 'abebe_k'})
+    assert db.data('users/u1')['telegramUsername'] == 'abebe_k'
@@ -0,0 +1,36 @@
+import pytest
+
+from database.sharded_counter import ShardedCounter
+from services.roster_service import RosterService
+from services.telegram_service import TelegramService
+
+@pytest.fixture
+def counter():
+    return ShardedCounter(num_shards=4)
+
+@pytest.fixture
+def service(config, db, firebase_manager, counter):
+    roster = RosterService(firebase_manager, counter, summary_interval=0)
+    db.put('gameRooms/g1', {'status': 'waiting', **roster.room_fields()})
+    db.put('users/u1', {'displayName': 'Abebe', 'telegramChatId': '1001'})
+    return TelegramService(config(), roster, counter)
+
+def enter(service, db, charge='c1'):
+    return service.process_telegram_game_entry('u1', 'g1', 20.0, charge, f'p-{charge}', db)
+
+def totals(db, counter, path):
+    return counter.get_totals(ShardedCounter.shards_for(db.document(path)), max_staleness=0)
+
+def test_an_entry_joins_the_room_and_counts_once(db, service, counter):
+    assert enter(service, db)
+    assert db.data('gameRooms/g1/players/u1')['entryPaid']
+    assert totals(db, counter, 'gameRooms/g1') == {'prizePool': 20.0, 'entryCount': 1}
+    assert totals(db, counter, 'users/u1') == {'gamesPlayed': 1}
+
+def test_a_repeated_entry_is_not_counted_again(db, service, counter):
+    enter(service, db)
+    assert enter(service, db, charge='c2')
+    assert totals(db, counter, 'gameRooms/g1') == {'prizePool': 20.0, 'entryCount': 1}
+    assert totals(db, counter, 'users/u1') == {'gamesPlayed': 1}
+    assert totals(db, counter, 'stats/totals') == {'gameEntries': 20.0, 'gameEntryCount': 1}
+    assert service.roster_service.player_count('g1', max_staleness=0) == 1
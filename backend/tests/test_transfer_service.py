@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+from services.transfer_service import (
+    RATIO_WINDOW, VELOCITY_WINDOW_SECONDS, TransferNotFound, TransferProcessor, TransferRejected, VelocityTracker,
+    fraud_score
+)
+
+QUIET = {'transfersLastHour': 1, 'newRecipient': False, 'newRecipientRatio': 0.0, 'history': 0}
+
+def test_first_transfer_features():
+    assert VelocityTracker().features('a', 'b', now=0) == {
+        'transfersLastHour': 1, 'amountLastHour': 0.0, 'newRecipient': True, 'newRecipientRatio': 1.0, 'history': 0}
+
+def test_counts_the_last_hour_and_expires_older_transfers():
+    tracker = VelocityTracker()
+    tracker.record('a', 'b', 100, now=0)
+    tracker.record('a', 'c', 50, now=600)
+    features = tracker.features('a', 'b', now=1200)
+    assert (features['transfersLastHour'], features['amountLastHour']) == (3, 150.0)
+    assert not features['newRecipient']
+
+    features = tracker.features('a', 'd', now=VELOCITY_WINDOW_SECONDS + 1)
+    assert (features['transfersLastHour'], features['amountLastHour']) == (2, 50.0)
+    assert features['newRecipient']
+
+def test_new_recipient_ratio_covers_the_recent_window():
+    tracker = VelocityTracker()
+    for i in range(RATIO_WINDOW):
+        tracker.record('a', f'r{i}', 1, now=i)
+    assert tracker.features('a', 'r0', now=RATIO_WINDOW)['newRecipientRatio'] == round(RATIO_WINDOW / (RATIO_WINDOW + 1), 3)
+    for i in range(RATIO_WINDOW):
+        tracker.record('a', 'r0', 1, now=RATIO_WINDOW + i)
+    # Only the last RATIO_WINDOW transfers count, and they all went to a known recipient
+    features = tracker.features('a', 'r0', now=2 * RATIO_WINDOW)
+    assert (features['history'], features['newRecipientRatio']) == (RATIO_WINDOW, 0.0)
+
+def test_tracks_a_bounded_number_of_senders():
+    tracker = VelocityTracker(max_senders=2)
+    for sender in ('a', 'b', 'c'):
+        tracker.record(sender, 'x', 1, now=0)
+    assert tracker.features('a', 'x', now=1)['history'] == 0
+    assert tracker.features('c', 'x', now=1)['history'] == 1
+
+@pytest.mark.parametrize('amount, features, score', [
+    (100, QUIET, 0),
+    (1500, QUIET, 20),
+    (6000, QUIET, 50),
+    (100, {**QUIET, 'newRecipient': True}, 10),
+    (100, {**QUIET, 'transfersLastHour': 6}, 30),
+    (100, {**QUIET, 'transfersLastHour': 20}, 40),
+    (100, {**QUIET, 'history': 4, 'newRecipientRatio': 0.8}, 20),
+    (100, {**QUIET, 'history': 3, 'newRecipientRatio': 1.0}, 0),
+    (9000, {'transfersLastHour': 20, 'newRecipient': True, 'newRecipientRatio': 1.0, 'history': 10}, 100),
+])
+def test_fraud_score(amount, features, score):
+    assert fraud_score(amount, features) == score
+
+@pytest.fixture
+def processor(db, firebase_manager):
+    db.put('wallets/a', {'balance': 10000.0})
+    db.put('wallets/b', {'balance': 0.0})
+    return TransferProcessor(firebase_manager, max_amount=10000, daily_limit=8000, review_score=50)
+
+def balances(db):
+    return db.data('wallets/a')['balance'], db.data('wallets/b')['balance']
+
+def test_moves_money_and_records_both_sides(db, processor):
+    result = processor.transfer('a', 'b', 250, reason='Lunch', request_id='r1')
+    assert (result['status'], result['duplicate']) == ('completed', False)
+    assert balances(db) == (9750.0, 250.0)
+    sent = db.data(f"transactions/transfer_{result['id']}_sent")
+    received = db.data(f"transactions/transfer_{result['id']}_received")
+    assert (sent['amount'], received['amount']) == (-250.0, 250.0)
+    assert db.data('wallets/a')['dailyTransferUsed'] == 250.0
+
+def test_a_retried_request_pays_once(db, processor):
+    first = processor.transfer('a', 'b', 250, request_id='r1')
+    again = processor.transfer('a', 'b', 250, request_id='r1')
+    assert again['duplicate'] and again['id'] == first['id']
+    assert balances(db) == (9750.0, 250.0)
+
+@pytest.mark.parametrize('recipient, amount, wallet, error', [
+    ('a', 10, {}, 'Invalid recipient'),
+    ('b', 0, {}, 'Invalid transfer amount'),
+    ('b', 'ten', {}, 'Invalid transfer amount'),
+    ('b', 10001, {}, 'exceeds maximum'),
+    ('b', 200, {'balance': 100.0}, 'Insufficient balance'),
+    ('b', 10, {'isLocked': True}, 'locked'),
+    ('c', 10, {}, 'Recipient wallet not found'),
+])
+def test_rejects_invalid_transfers(db, processor, recipient, amount, wallet, error):
+    db.put('wallets/a', {'balance': 10000.0, **wallet})
+    with pytest.raises(TransferRejected, match=error):
+        processor.transfer('a', recipient, amount)
+    assert db.data('wallets/b')['balance'] == 0.0
+
+def test_enforces_the_daily_limit(db, processor):
+    db.put('wallets/a', {'balance': 10000.0, 'dailyTransferUsed': 7900.0, 'lastTransferDate': processor.today()})
+    with pytest.raises(TransferRejected, match='Daily transfer limit'):
+        processor.transfer('a', 'b', 200)
+    # Yesterday's total does not count
+    db.put('wallets/a', {'balance': 10000.0, 'dailyTransferUsed': 7900.0, 'lastTransferDate': '2000-01-01'})
+    assert processor.transfer('a', 'b', 200)['status'] == 'completed'
+
+def test_holds_risky_transfers_for_review(db, processor):
+    held = processor.transfer('a', 'b', 6000)
+    assert (held['status'], held['fraudScore']) == ('pending', 60)
+    assert balances(db) == (10000.0, 0.0)
+    assert [transfer['id'] for transfer in processor.pending()] == [held['id']]
+
+    approved = processor.approve(held['id'], 'admin')
+    assert approved['status'] == 'completed'
+    assert balances(db) == (4000.0, 6000.0)
+    with pytest.raises(TransferRejected, match='already completed'):
+        processor.approve(held['id'], 'admin')
+    assert balances(db) == (4000.0, 6000.0)
+
+def test_approval_rechecks_the_balance(db, processor):
+    held = processor.transfer('a', 'b', 6000)
+    db.put('wallets/a', {'balance': 100.0})
+    with pytest.raises(TransferRejected, match='Insufficient balance'):
+        processor.approve(held['id'], 'admin')
+    assert db.data(f"player_transfers/{held['id']}")['status'] == 'pending'
+
+def test_rejecting_moves_nothing(db, processor):
+    held = processor.transfer('a', 'b', 6000)
+    assert processor.reject(held['id'], 'admin', 'Suspicious')['status'] == 'rejected'
+    with pytest.raises(TransferRejected):
+        processor.approve(held['id'], 'admin')
+    assert balances(db) == (10000.0, 0.0)
+    with pytest.raises(TransferNotFound):
+        processor.reject('missing', 'admin')
+
+def test_concurrent_transfers_never_overdraw(db, processor):
+    db.put('wallets/a', {'balance': 1000.0})
+    processor.daily_limit = 100000
+    processor.review_score = 100
+    results = []
+
+    def send(index):
+        try:
+            results.append(processor.transfer('a', 'b', 100, request_id=f'r{index}')['status'])
+        except TransferRejected:
+            results.append('rejected')
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(15)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count('completed') == 10
+    assert balances(db) == (0.0, 1000.0)
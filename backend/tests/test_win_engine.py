@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from services import win_engine
+from services.win_engine import COLUMN_RANGES, COLUMNS, FREE_SPACE
+
+def columns(rows):
+    """Client card layout ({'B': [...], ...}) from five rows of five numbers"""
+    return {letter: [row[col] for row in rows] for col, letter in enumerate(COLUMNS)}
+
+ROWS = [
+    [1, 16, 31, 46, 61],
+    [2, 17, 32, 47, 62],
+    [3, 18, FREE_SPACE, 48, 63],
+    [4, 19, 34, 49, 64],
+    [5, 20, 35, 50, 65],
+]
+
+def test_flattens_columns_row_major():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    assert numbers[:5] == ROWS[0]
+    assert numbers[win_engine.CENTER] == FREE_SPACE
+
+def test_reads_cells_with_marks():
+    card = {letter: [{'number': number, 'marked': False} for number in cells]
+            for letter, cells in columns(ROWS).items()}
+    assert win_engine.card_from_columns(card) == [number for row in ROWS for number in row]
+
+@pytest.mark.parametrize('change, message', [
+    ((0, 0, 16), 'outside'),
+    ((4, 4, 76), 'outside'),
+    ((1, 0, 1), 'distinct'),
+    ((0, 2, FREE_SPACE), 'outside'),
+    ((2, 2, 33), None),
+])
+def test_validates_numbers_against_their_column(change, message):
+    row, col, number = change
+    rows = [list(cells) for cells in ROWS]
+    rows[row][col] = number
+    if message is None:
+        assert win_engine.card_from_columns(columns(rows))[row * 5 + col] == number
+    else:
+        with pytest.raises(ValueError, match=message):
+            win_engine.card_from_columns(columns(rows))
+
+def test_rejects_short_columns():
+    card = columns(ROWS)
+    card['G'] = card['G'][:4]
+    with pytest.raises(ValueError):
+        win_engine.card_from_columns(card)
+
+def test_generated_cards_are_valid():
+    rng = random.Random(7)
+    for _ in range(200):
+        card = win_engine.generate_card(rng)
+        numbers = win_engine.card_from_columns(card)
+        assert card['N'][2] == FREE_SPACE
+        for letter, (low, high) in COLUMN_RANGES.items():
+            assert all(low <= number <= high for number in card[letter] if number != FREE_SPACE)
+        assert len(set(numbers)) == 25
+
+def test_first_win_reports_the_completing_call():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    called = [75, 1, 16, 70, 31, 46, 61, 2]
+    call_index, pattern = win_engine.first_win(numbers, called)
+    assert (call_index, pattern.name, pattern.percentage) == (6, 'Row 1', 0.20)
+
+def test_the_free_space_counts_as_marked():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    call_index, pattern = win_engine.first_win(numbers, [3, 18, 48, 63])
+    assert (call_index, pattern.name) == (3, 'Row 3')
+
+def test_patterns_are_checked_in_client_order():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    # Completes the B column and row 1 on the same call; the column comes first
+    _, pattern = win_engine.first_win(numbers, [2, 3, 4, 5, 16, 31, 46, 61, 1])
+    assert pattern.name == 'B Column'
+
+def test_no_win_without_a_pattern():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    assert win_engine.first_win(numbers, [1, 17, 34, 50, 70]) is None
+
+def test_marked_mask_includes_the_free_space():
+    numbers = win_engine.card_from_columns(columns(ROWS))
+    assert win_engine.marked_mask(numbers, []) == 1 << win_engine.CENTER
+    assert win_engine.marked_mask(numbers, [1, 65]) == 1 | 1 << win_engine.CENTER | 1 << 24
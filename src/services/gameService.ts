@@ -3,6 +3,7 @@ import {
   doc, 
   addDoc, 
   updateDoc, 
+  setDoc,
  
 
   getDoc,
@@ -12,6 +13,7 @@ import {
   orderBy,
   
   arrayUnion,
+  arrayRemove,
  
   increment,
   serverTimestamp,
@@ -93,6 +95,7 @@ class GameService {
         name: roomName,
         hostId,
         players: [],
+        playerIds: [],
         maxPlayers,
         entryFee,
         prizePool: 0,
@@ -178,8 +181,24 @@ class GameService {
 
       await updateDoc(gameRoomRef, {
         players: arrayUnion(player),
+        playerIds: arrayUnion(player.id),
         prizePool: newPrizePool
       });
+
+      // Settlement pays from the stored card; the rules only accept it from
+      // players on the roster while the room is waiting
+      const cardRef = doc(db, 'gameRooms', gameRoomId, 'cards', player.id);
+      if (!(await getDoc(cardRef)).exists()) {
+        const card = this.generateBingoCard(player.id);
+        await setDoc(cardRef, {
+          B: card.B.map(cell => cell.number),
+          I: card.I.map(cell => cell.number),
+          N: card.N.map(cell => cell.number),
+          G: card.G.map(cell => cell.number),
+          O: card.O.map(cell => cell.number),
+          createdAt: serverTimestamp()
+        });
+      }
     } catch (error) {
       handleFirestoreError(error, 'join game room');
       throw error;
@@ -219,6 +238,7 @@ class GameService {
 
         await updateDoc(gameRoomRef, {
             players: updatedPlayers,
+            playerIds: arrayRemove(playerId),
             prizePool: newPrizePool
         });
     } catch (error) {
@@ -209,6 +209,7 @@ export interface GameRoom {
   name: string;
   hostId: string;
   players: Player[];
+  playerIds?: string[];
   maxPlayers: number;
   entryFee: number;
   prizePool: number;
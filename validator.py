@@ -2,7 +2,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import json
+import sys
+
+# Backend checks live with the backend configuration so the server runs the
+# same validation at startup and on every reload
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from config.settings import Config, ConfigError
 
 def check_env_var(key):
     value = os.getenv(key)
@@ -11,40 +16,30 @@ def check_env_var(key):
     else:
         print(f"[ERROR] {key} is missing!")
 
-def check_service_account():
-    # Check env variable
-    key_env = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
-    if key_env:
-        try:
-            json.loads(key_env)
-            print("[OK] FIREBASE_SERVICE_ACCOUNT_KEY env variable is valid JSON.")
-        except Exception:
-            print("[ERROR] FIREBASE_SERVICE_ACCOUNT_KEY env variable is not valid JSON!")
-    # Check file
-    for fname in ["serviceAccountKey.json", "serviceAccountkey.json"]:
-        if os.path.isfile(fname):
-            try:
-                with open(fname) as f:
-                    json.load(f)
-                print(f"[OK] {fname} exists and is valid JSON.")
-            except Exception:
-                print(f"[ERROR] {fname} exists but is not valid JSON!")
-            return
-    print("[ERROR] No service account key file found!")
+def check_backend_config():
+    try:
+        config = Config.from_env()
+    except ConfigError as e:
+        for error in str(e).split('; '):
+            print(f"[ERROR] {error}")
+        return
+    _, warnings = config.validate()
+    for warning in warnings:
+        print(f"[ERROR] {warning}")
+    if not warnings:
+        print("[OK] Backend configuration is valid.")
 
 def main():
-    print("Checking required environment variables...")
+    print("Checking frontend environment variables...")
     required_env = [
         "VITE_FIREBASE_API_KEY", "VITE_FIREBASE_AUTH_DOMAIN", "VITE_FIREBASE_PROJECT_ID",
-        "VITE_FIREBASE_STORAGE_BUCKET", "VITE_FIREBASE_MESSAGING_SENDER_ID", "VITE_FIREBASE_APP_ID",
-        "CHAPA_SECRET_KEY", "CHAPA_PUBLIC_KEY", "CHAPA_BASE_URL",
-        "TELEGRAM_BOT_TOKEN", "TELEGRAM_PAYMENT_PROVIDER_TOKEN"
+        "VITE_FIREBASE_STORAGE_BUCKET", "VITE_FIREBASE_MESSAGING_SENDER_ID", "VITE_FIREBASE_APP_ID"
     ]
     for key in required_env:
         check_env_var(key)
-    print("\nChecking Firebase service account...")
-    check_service_account()
+    print("\nChecking backend configuration...")
+    check_backend_config()
     print("\nDone.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()